@@ -0,0 +1,194 @@
+"""
+Aggregator Pipeline for Project Horizon
+process_trade runs an ordered list of aggregators (sessions, IBs, volume, candles,
+VWAPs, TPO...) per trade; each can be switched off per contract and is timed per stage
+"""
+import os
+import time
+
+
+class TradeContext:
+    """One trade as seen by every aggregator (event time, already filtered/normalised)"""
+
+    __slots__ = ('record', 'price', 'size', 'side', 'ts', 'et', 'hhmm', 'contract',
+                 'session_id', 'session_name', 'events')
+
+    def __init__(self, record, price, size, side, ts, et, contract):
+        self.record = record
+        self.price = price
+        self.size = size
+        self.side = side              # 'A' = buy aggressor, 'B' = sell aggressor
+        self.ts = ts                  # Event time (epoch seconds)
+        self.et = et                  # Event time in ET
+        self.hhmm = et.hour * 100 + et.minute
+        self.contract = contract
+        self.session_id = None        # Filled in by the session aggregator
+        self.session_name = None
+        self.events = []              # Boundaries raised during this trade
+
+    def emit(self, kind, detail=None):
+        """Raise a boundary (session change, candle roll) - delivered after the current stage"""
+        self.events.append((kind, detail))
+
+
+class Aggregator:
+    """A pipeline stage. Pass hooks as callables or subclass and override them.
+
+    on_trade(ctx)                 every trade
+    on_boundary(kind, detail, ctx) session change / candle roll raised by an earlier stage
+    snapshot()                    JSON-able view of what this stage maintains
+    """
+
+    def __init__(self, name, on_trade=None, on_boundary=None, snapshot=None, required=False):
+        self.name = name
+        self.required = required      # Required stages cannot be disabled
+        if on_trade is not None:
+            self.on_trade = on_trade
+        if on_boundary is not None:
+            self.on_boundary = on_boundary
+        if snapshot is not None:
+            self.snapshot = snapshot
+
+    def on_trade(self, ctx):
+        pass
+
+    def on_boundary(self, kind, detail, ctx):
+        pass
+
+    def snapshot(self):
+        return None
+
+
+def _parse_disabled(spec):
+    """AGGREGATORS_DISABLED='NQ:footprint,tpo;*:ib_poc' -> {contract: {names}}"""
+    disabled = {}
+    for part in (spec or '').split(';'):
+        if ':' not in part:
+            continue
+        contract, names = part.split(':', 1)
+        disabled.setdefault(contract.strip(), set()).update(n.strip() for n in names.split(',') if n.strip())
+    return disabled
+
+
+class AggregatorPipeline:
+    """Ordered aggregators with per-contract enablement and per-stage timing.
+
+    Not thread-safe on its own - run() is called under the state lock.
+    """
+
+    def __init__(self, histogram=None):
+        self.stages = []
+        self.by_name = {}
+        self.disabled = _parse_disabled(os.environ.get('AGGREGATORS_DISABLED'))
+        self.enabled = {}             # contract -> {names} enabled for it despite a '*' disable
+        self.histogram = histogram    # Optional MetricFamily labelled by stage
+        self.stats = {}               # name -> [calls, total_ns, max_ns, boundary_errors, trade_errors]
+        self.last_error = {}          # name -> last exception text
+        self._active = {}             # contract -> stages enabled for it (cached)
+
+    def register(self, aggregator):
+        if aggregator.name in self.by_name:
+            raise ValueError(f"aggregator '{aggregator.name}' already registered")
+        self.stages.append(aggregator)
+        self.by_name[aggregator.name] = aggregator
+        self.stats[aggregator.name] = [0, 0, 0, 0, 0]
+        self._active.clear()
+        return aggregator
+
+    def is_enabled(self, name, contract):
+        stage = self.by_name.get(name)
+        if stage is None:
+            return False
+        if stage.required:
+            return True
+        if name in self.disabled.get(contract, ()):
+            return False
+        return name in self.enabled.get(contract, ()) or name not in self.disabled.get('*', ())
+
+    def set_enabled(self, name, enabled, contract='*'):
+        """Enable/disable a stage for one contract ('*' = all). Returns False if not allowed."""
+        stage = self.by_name.get(name)
+        if stage is None or (stage.required and not enabled):
+            return False
+        names = self.disabled.setdefault(contract, set())
+        if enabled:
+            names.discard(name)
+            if contract != '*':
+                self.enabled.setdefault(contract, set()).add(name)    # Overrides a '*' disable
+        else:
+            names.add(name)
+            self.enabled.get(contract, set()).discard(name)
+        self._active.clear()
+        return True
+
+    def active(self, contract):
+        stages = self._active.get(contract)
+        if stages is None:
+            stages = self._active[contract] = [s for s in self.stages if self.is_enabled(s.name, contract)]
+        return stages
+
+    def run(self, ctx):
+        """Run every enabled stage for ctx.contract, delivering boundaries as they are raised"""
+        stages = self.active(ctx.contract)
+        for stage in stages:
+            stats = self.stats[stage.name]
+            started = time.perf_counter_ns()
+            try:
+                stage.on_trade(ctx)
+            except Exception as e:
+                # One stage's bad input must not cost the later stages this trade
+                stats[4] += 1
+                self.last_error[stage.name] = f'{type(e).__name__}: {e}'
+                if stats[4] == 1 or stats[4] % 1000 == 0:
+                    print(f"⚠️  Aggregator {stage.name} failed ({stats[4]}x): {e}")
+            elapsed = time.perf_counter_ns() - started
+            stats[0] += 1
+            stats[1] += elapsed
+            if elapsed > stats[2]:
+                stats[2] = elapsed
+            if self.histogram is not None:
+                self.histogram.labels(stage.name).observe_ns(elapsed)
+            if ctx.events:
+                events, ctx.events = ctx.events, []
+                for kind, detail in events:
+                    self.boundary(kind, detail, ctx, stages)
+
+    def boundary(self, kind, detail, ctx, stages=None):
+        for stage in stages if stages is not None else self.active(ctx.contract):
+            try:
+                stage.on_boundary(kind, detail, ctx)
+            except Exception as e:
+                self.stats[stage.name][3] += 1
+                self.last_error[stage.name] = f'{type(e).__name__}: {e}'
+                print(f"⚠️  Aggregator {stage.name} boundary {kind} failed: {e}")
+
+    def snapshot(self, name):
+        stage = self.by_name.get(name)
+        return stage.snapshot() if stage else None
+
+    def report(self, contract=None):
+        """Per-stage timing and enablement, slowest first"""
+        rows = []
+        for stage in self.stages:
+            calls, total_ns, max_ns, boundary_errors, trade_errors = self.stats[stage.name]
+            row = {
+                'name': stage.name,
+                'required': stage.required,
+                'calls': calls,
+                'total_ms': round(total_ns / 1e6, 3),
+                'avg_us': round(total_ns / calls / 1e3, 2) if calls else 0,
+                'max_us': round(max_ns / 1e3, 1),
+                'boundary_errors': boundary_errors,
+                'trade_errors': trade_errors,
+                'last_error': self.last_error.get(stage.name),
+            }
+            if contract:
+                row['enabled'] = self.is_enabled(stage.name, contract)
+            rows.append(row)
+        rows.sort(key=lambda r: r['total_ms'], reverse=True)
+        return {
+            'stages': rows,
+            'order': [s.name for s in self.stages],
+            'disabled': {c: sorted(n) for c, n in self.disabled.items() if n},
+            'enabled': {c: sorted(n) for c, n in self.enabled.items() if n},
+        }
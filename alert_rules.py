@@ -0,0 +1,344 @@
+"""
+Alert Rule Engine for Project Horizon
+User-defined conditions ("delta_30m < -2500 and price > pdpoc") compiled once to
+closures, indexed by the fields they read, with hysteresis and cooldowns
+"""
+import ast
+import json
+import os
+import threading
+import time
+from collections import deque
+
+DEFAULT_COOLDOWN = 300      # Seconds between firings of one rule
+MAX_FIRINGS = 200           # Recent firings kept for /alerts and SSE catch-up
+ZONES_FIELD = 'zones'       # Pseudo-field: tuple of zone prices supplied by the caller
+NAN = float('nan')
+
+
+class RuleError(ValueError):
+    pass
+
+
+# ============================================
+# CONDITION COMPILER
+# ============================================
+# Every node compiles to f(cur, prev, hold) where hold is None when testing whether the
+# rule should fire, or the hysteresis slack when testing whether a fired rule is still on.
+_ARITH = {
+    ast.Add: lambda a, b: a + b,
+    ast.Sub: lambda a, b: a - b,
+    ast.Mult: lambda a, b: a * b,
+    ast.Div: lambda a, b: a / b if b else 0.0,
+}
+
+
+def _number(value):
+    """Field value as a float; missing = 0, anything non-numeric = NaN (compares false)"""
+    if value is None:
+        return 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    return NAN
+
+
+def _value(node, deps):
+    """Numeric sub-expression -> g(values)"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        value = float(node.value)
+        return lambda v: value
+    if isinstance(node, ast.Name):
+        name = node.id
+        deps.add(name)
+        return lambda v: _number(v.get(name))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        inner = _value(node.operand, deps)
+        return lambda v: -inner(v)
+    if isinstance(node, ast.BinOp) and type(node.op) in _ARITH:
+        op = _ARITH[type(node.op)]
+        left, right = _value(node.left, deps), _value(node.right, deps)
+        return lambda v: op(left(v), right(v))
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'abs' and len(node.args) == 1:
+        inner = _value(node.args[0], deps)
+        return lambda v: abs(inner(v))
+    raise RuleError(f"unsupported expression: {ast.dump(node)[:80]}")
+
+
+def _compare(op, left, right):
+    if isinstance(op, (ast.Lt, ast.LtE)):
+        strict = isinstance(op, ast.Lt)
+
+        def test(cur, prev, hold):
+            a, b = left(cur), right(cur)
+            if hold is not None:
+                return a < b + hold
+            return a < b if strict else a <= b
+        return test
+    if isinstance(op, (ast.Gt, ast.GtE)):
+        strict = isinstance(op, ast.Gt)
+
+        def test(cur, prev, hold):
+            a, b = left(cur), right(cur)
+            if hold is not None:
+                return a > b - hold
+            return a > b if strict else a >= b
+        return test
+    if isinstance(op, ast.Eq):
+        return lambda cur, prev, hold: left(cur) == right(cur)
+    if isinstance(op, ast.NotEq):
+        def test(cur, prev, hold):
+            a, b = left(cur), right(cur)
+            return a == a and b == b and a != b     # NaN (non-numeric field) never matches
+        return test
+    raise RuleError(f"unsupported comparison: {type(op).__name__}")
+
+
+def _crosses(direction, left, right):
+    """Edge on entry (prev on the other side), level while held"""
+    def test(cur, prev, hold):
+        a, b = left(cur), right(cur)
+        if hold is not None:
+            return a > b - hold if direction > 0 else a < b + hold
+        if prev is None:
+            return False
+        pa, pb = left(prev), right(prev)
+        if direction > 0:
+            return pa <= pb and a > b
+        return pa >= pb and a < b
+    return test
+
+
+def _predicate(node, deps):
+    if isinstance(node, ast.BoolOp):
+        parts = [_predicate(v, deps) for v in node.values]
+        if isinstance(node.op, ast.And):
+            return lambda cur, prev, hold: all(p(cur, prev, hold) for p in parts)
+        return lambda cur, prev, hold: any(p(cur, prev, hold) for p in parts)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        inner = _predicate(node.operand, deps)
+        return lambda cur, prev, hold: not inner(cur, prev, None)
+    if isinstance(node, ast.Compare):
+        tests = []
+        left = _value(node.left, deps)
+        for op, comparator in zip(node.ops, node.comparators):
+            right = _value(comparator, deps)
+            tests.append(_compare(op, left, right))
+            left = right
+        if len(tests) == 1:
+            return tests[0]
+        return lambda cur, prev, hold: all(t(cur, prev, hold) for t in tests)
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+        name, args = node.func.id, node.args
+        if name in ('crosses_above', 'crosses_below') and len(args) == 2:
+            return _crosses(1 if name == 'crosses_above' else -1, _value(args[0], deps), _value(args[1], deps))
+        if name == 'near' and len(args) == 3:
+            a, b, tol = (_value(arg, deps) for arg in args)
+            return lambda cur, prev, hold: abs(a(cur) - b(cur)) <= tol(cur) + (hold or 0.0)
+        if name == 'near_zone' and len(args) == 1:
+            tol = _value(args[0], deps)
+            deps.update(('price', ZONES_FIELD))
+
+            def test(cur, prev, hold):
+                price, limit = cur.get('price') or 0.0, tol(cur) + (hold or 0.0)
+                return any(abs(price - z) <= limit for z in cur.get(ZONES_FIELD) or ())
+            return test
+        raise RuleError(f"unknown function {name}() or wrong argument count")
+    if isinstance(node, ast.Name):
+        name = node.id
+        deps.add(name)
+        return lambda cur, prev, hold: bool(cur.get(name))
+    raise RuleError(f"unsupported condition: {ast.dump(node)[:80]}")
+
+
+def compile_condition(expr):
+    """'delta_30m < -2500 and crosses_above(price, pdpoc)' -> (predicate, fields read)"""
+    try:
+        tree = ast.parse(expr, mode='eval')
+    except SyntaxError as e:
+        raise RuleError(f"syntax error: {e.msg}")
+    deps = set()
+    return _predicate(tree.body, deps), frozenset(deps)
+
+
+# ============================================
+# RULES
+# ============================================
+class AlertRule:
+    def __init__(self, spec):
+        if not spec.get('id') or not spec.get('when'):
+            raise RuleError("rule needs 'id' and 'when'")
+        self.id = str(spec['id'])
+        self.when = str(spec['when'])
+        self.name = spec.get('name') or self.id
+        self.hysteresis = float(spec.get('hysteresis', 0))
+        self.cooldown = float(spec.get('cooldown', DEFAULT_COOLDOWN))
+        self.contracts = spec.get('contracts') or None
+        self.channels = spec.get('channels') or ['sse']
+        self.enabled = bool(spec.get('enabled', True))
+        self.predicate, self.deps = compile_condition(self.when)
+        self.active = False           # Fired and not yet re-armed
+        self.last_fired = 0.0
+        self.fired = 0
+        self.suppressed = 0           # Entries swallowed by the cooldown
+
+    def spec(self):
+        return {'id': self.id, 'name': self.name, 'when': self.when, 'hysteresis': self.hysteresis,
+                'cooldown': self.cooldown, 'contracts': self.contracts, 'channels': self.channels,
+                'enabled': self.enabled}
+
+    def status(self):
+        return dict(self.spec(), fields=sorted(self.deps), active=self.active, fired=self.fired,
+                    suppressed=self.suppressed, last_fired=self.last_fired or None)
+
+
+class AlertEngine:
+    """Rules indexed by field. evaluate() only runs rules whose inputs changed.
+    Not thread-safe - evaluate under the state lock, manage rules under it too."""
+
+    def __init__(self):
+        self.rules = {}
+        self.index = {}               # field -> {rule_id}
+        self.last = None              # Field values at the previous evaluation
+        self.evaluations = 0
+        self.rule_checks = 0
+
+    def _reindex(self):
+        self.index = {}
+        for rule in self.rules.values():
+            for field in rule.deps:
+                self.index.setdefault(field, set()).add(rule.id)
+        self.last = None              # New fields - compare everything next tick
+
+    def reset(self):
+        """Forget previous values and re-arm every rule (contract switch)"""
+        self.last = None
+        for rule in self.rules.values():
+            rule.active = False
+
+    @property
+    def fields(self):
+        return self.index.keys()
+
+    def uses(self, field):
+        return field in self.index
+
+    def upsert(self, spec):
+        rule = AlertRule(spec)
+        self.rules[rule.id] = rule
+        self._reindex()
+        return rule
+
+    def remove(self, rule_id):
+        removed = self.rules.pop(rule_id, None) is not None
+        if removed:
+            self._reindex()
+        return removed
+
+    def evaluate(self, lookup, now, contract=None):
+        """lookup(field) -> current value. Returns firings (dicts) for this tick."""
+        if not self.index:
+            return []
+        self.evaluations += 1
+        cur = {field: lookup(field) for field in self.index}
+        prev = self.last
+        if prev is None:
+            candidates = self.rules.keys()
+        else:
+            candidates = set()
+            for field, value in cur.items():
+                if prev.get(field) != value:
+                    candidates |= self.index[field]
+        self.last = cur
+        firings = []
+        for rule_id in candidates:
+            rule = self.rules[rule_id]
+            if not rule.enabled or (rule.contracts and contract not in rule.contracts):
+                continue
+            self.rule_checks += 1
+            if rule.active:
+                if not rule.predicate(cur, prev, rule.hysteresis):
+                    rule.active = False   # Re-armed
+                continue
+            if not rule.predicate(cur, prev, None):
+                continue
+            rule.active = True
+            if now - rule.last_fired < rule.cooldown:
+                rule.suppressed += 1
+                continue
+            rule.last_fired = now
+            rule.fired += 1
+            values = {f: cur[f] for f in sorted(rule.deps) if f != ZONES_FIELD}
+            firings.append({
+                'rule': rule.id,
+                'name': rule.name,
+                'when': rule.when,
+                'ts': now,
+                'contract': contract,
+                'values': values,
+                'channels': rule.channels,
+                'message': f"{rule.name}: {rule.when} (" + ', '.join(f"{k}={v}" for k, v in values.items()) + ")",
+            })
+        return firings
+
+    def stats(self):
+        return {'rules': len(self.rules), 'fields': sorted(self.index), 'evaluations': self.evaluations,
+                'rule_checks': self.rule_checks}
+
+    def load(self, path, defaults=()):
+        """Rules from a JSON list; defaults are used when the file does not exist"""
+        specs = list(defaults)
+        if os.path.exists(path):
+            with open(path) as f:
+                specs = json.load(f)
+        errors = {}
+        for spec in specs:
+            try:
+                self.upsert(spec)
+            except RuleError as e:
+                errors[spec.get('id', '?')] = str(e)
+        return errors
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump([rule.spec() for rule in self.rules.values()], f, indent=2)
+        os.replace(tmp, path)
+
+
+# ============================================
+# FIRING STREAM (SSE)
+# ============================================
+class AlertStream:
+    """Recent firings with sequence numbers; SSE clients block in wait()"""
+
+    def __init__(self, maxlen=MAX_FIRINGS):
+        self.firings = deque(maxlen=maxlen)
+        self.seq = 0
+        self.cond = threading.Condition()
+
+    def publish(self, firing):
+        with self.cond:
+            self.seq += 1
+            firing['seq'] = self.seq
+            self.firings.append(firing)
+            self.cond.notify_all()
+
+    def since(self, seq):
+        with self.cond:
+            return [f for f in self.firings if f['seq'] > seq]
+
+    def wait(self, seq, timeout):
+        """Firings newer than seq, waiting up to timeout for the first one"""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while self.seq <= seq:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self.cond.wait(remaining)
+            return [f for f in self.firings if f['seq'] > seq]
+
+    def recent(self, limit=50):
+        with self.cond:
+            return list(self.firings)[-limit:][::-1]
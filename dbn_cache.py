@@ -0,0 +1,212 @@
+"""
+DBN Cache for Project Horizon
+Local cache for Databento Historical timeseries queries. A request is split into
+trading-day chunks (18:00 ET -> 18:00 ET); each completed chunk is fetched once,
+stored as a DBN file named by a hash of (dataset, schema, symbols, stype, start, end)
+and never requested again. Only the unfinished current day goes to Databento every time.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import databento as db
+
+NS = 1_000_000_000
+DAY_NS = 86400 * NS
+CHUNK_OFFSET_NS = 23 * 3600 * NS    # Chunks start at 23:00 UTC (18:00 ET, same fixed UTC-5 as get_et_now)
+SETTLE_NS = 3600 * NS               # A chunk is final once it ended this long ago
+FETCH_WORKERS = 4                   # Missing chunks fetched in parallel
+
+
+def to_ns(value):
+    """UNIX ns from an ISO string ('Z' or naive = UTC), datetime or int"""
+    if isinstance(value, int):
+        return value
+    import pandas as pd
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize('UTC')
+    return int(ts.value)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def get_range_to_file(client, directory=None, **kwargs):
+    """client.timeseries.get_range() streamed to a temporary DBN file instead of into memory:
+    to_ndarray(count=...) then decodes it batch by batch. The file goes with the store"""
+    directory = directory or tempfile.gettempdir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'range-{uuid.uuid4().hex}.dbn')
+    try:
+        store = client.timeseries.get_range(path=path, **kwargs)
+    except Exception:
+        _remove(path)
+        raise
+    weakref.finalize(store, _remove, path)
+    return store
+
+
+def chunk_bounds(start_ns, end_ns):
+    """[(chunk_start, chunk_end), ...] covering [start_ns, end_ns)"""
+    first = (start_ns - CHUNK_OFFSET_NS) // DAY_NS * DAY_NS + CHUNK_OFFSET_NS
+    return [(s, s + DAY_NS) for s in range(first, end_ns, DAY_NS)]
+
+
+class CachedRange:
+    """Stands in for the DBNStore of one get_range() call: iterate records or to_df().
+    parts are (store, lo, hi) - lo/hi bound ts_index when a chunk sticks out of the range."""
+
+    def __init__(self, parts, schema):
+        self.parts = parts
+        self.schema = schema
+
+    def __iter__(self):
+        for store, lo, hi in self.parts:
+            if lo is None:
+                yield from store
+            else:
+                for record in store:
+                    if lo <= record.ts_index < hi:
+                        yield record
+
+    def to_ndarray(self, count=None):
+        """One structured array, or with count an iterator of arrays of at most count records"""
+        if count is not None:
+            return self._iter_ndarray(count)
+        import numpy as np
+        arrays = [self._clip(store.to_ndarray(), lo, hi) for store, lo, hi in self.parts]
+        if not arrays:
+            # No chunk in the range: an empty array of the schema's records, like DBNStore gives
+            from databento.common.constants import SCHEMA_STRUCT_MAP
+            return np.empty(0, dtype=SCHEMA_STRUCT_MAP[db.Schema(self.schema)]._dtypes)
+        return np.concatenate(arrays) if len(arrays) > 1 else arrays[0]
+
+    def _iter_ndarray(self, count):
+        for store, lo, hi in self.parts:
+            for array in store.to_ndarray(count=count):
+                yield self._clip(array, lo, hi)
+
+    @staticmethod
+    def _clip(array, lo, hi):
+        if lo is None or not len(array):
+            return array
+        index = array['ts_recv' if 'ts_recv' in array.dtype.names else 'ts_event']
+        return array[(index >= lo) & (index < hi)]
+
+    def to_df(self, **kwargs):
+        import pandas as pd
+        frames = []
+        for store, lo, hi in self.parts:
+            df = store.to_df(**kwargs)
+            if lo is not None and len(df):
+                index = df.index.asi8 if hasattr(df.index, 'asi8') else df.index
+                df = df[(index >= lo) & (index < hi)]
+            frames.append(df)
+        if not frames:
+            return pd.DataFrame()
+        return frames[0] if len(frames) == 1 else pd.concat(frames)
+
+
+class DBNCache:
+    def __init__(self, root, settle_ns=SETTLE_NS):
+        self.root = root
+        self.tmp = os.path.join(root, 'tmp')    # Running-day ranges, removed with their store
+        self.settle_ns = settle_ns
+        if os.path.isdir(self.tmp):
+            for name in os.listdir(self.tmp):   # Left over by a previous process
+                _remove(os.path.join(self.tmp, name))
+        self.key_locks = {}
+        self.key_locks_lock = threading.Lock()
+        self.stats = {'requests': 0, 'chunk_hits': 0, 'chunk_fetches': 0, 'live_fetches': 0,
+                      'fetch_seconds': 0.0, 'bytes_fetched': 0, 'errors': 0}
+
+    def path(self, dataset, schema, symbols, stype_in, start_ns, end_ns):
+        key = json.dumps([dataset, schema, sorted(symbols), stype_in, start_ns, end_ns])
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+        day = time.strftime('%Y%m%d', time.gmtime((end_ns - 1) // NS))
+        return os.path.join(self.root, dataset, schema, f'{day}-{digest}.dbn')
+
+    def _key_lock(self, path):
+        with self.key_locks_lock:
+            return self.key_locks.setdefault(path, threading.Lock())
+
+    def _fetch_chunk(self, client, dataset, schema, symbols, stype_in, start_ns, end_ns):
+        """Completed chunk from disk, fetching and storing it first if missing"""
+        path = self.path(dataset, schema, symbols, stype_in, start_ns, end_ns)
+        with self._key_lock(path):      # Two loaders asking for the same day fetch it once
+            if os.path.exists(path):
+                self.stats['chunk_hits'] += 1
+                return db.DBNStore.from_file(path)
+            started = time.time()
+            try:
+                # Streamed straight to disk - the day is never held in memory
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = path + '.tmp'
+                _remove(tmp)
+                client.timeseries.get_range(dataset=dataset, schema=schema, symbols=symbols,
+                                            stype_in=stype_in, start=start_ns, end=end_ns, path=tmp)
+                os.replace(tmp, path)
+            except Exception:
+                self.stats['errors'] += 1
+                raise
+            self.stats['chunk_fetches'] += 1
+            self.stats['fetch_seconds'] += time.time() - started
+            self.stats['bytes_fetched'] += os.path.getsize(path)
+            return db.DBNStore.from_file(path)
+
+    def get_range(self, client, dataset, schema, symbols, start, end, stype_in='raw_symbol'):
+        """Same arguments and iteration / to_df() behaviour as client.timeseries.get_range"""
+        symbols = [symbols] if isinstance(symbols, str) else list(symbols)
+        start_ns, end_ns = to_ns(start), to_ns(end)
+        final_before = time.time_ns() - self.settle_ns
+        self.stats['requests'] += 1
+
+        chunks, tail = [], None
+        for chunk_start, chunk_end in chunk_bounds(start_ns, end_ns):
+            if chunk_end <= final_before:
+                chunks.append((chunk_start, chunk_end))
+            else:
+                tail = (max(start_ns, chunk_start), end_ns)
+                break
+
+        stores = []
+        if chunks:
+            with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(chunks))) as pool:
+                stores = list(pool.map(
+                    lambda c: self._fetch_chunk(client, dataset, schema, symbols, stype_in, c[0], c[1]), chunks))
+
+        parts = []
+        for (chunk_start, chunk_end), store in zip(chunks, stores):
+            if start_ns <= chunk_start and chunk_end <= end_ns:
+                parts.append((store, None, None))
+            else:
+                parts.append((store, start_ns, end_ns))
+        if tail is not None:
+            # Current trading day is still changing - always asked for, never stored
+            started = time.time()
+            parts.append((get_range_to_file(client, self.tmp, dataset=dataset, schema=schema, symbols=symbols,
+                                            stype_in=stype_in, start=tail[0], end=tail[1]), None, None))
+            self.stats['live_fetches'] += 1
+            self.stats['fetch_seconds'] += time.time() - started
+        return CachedRange(parts, schema)
+
+    def report(self):
+        files, size = 0, 0
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith('.dbn') and folder != self.tmp:
+                    files += 1
+                    size += os.path.getsize(os.path.join(folder, name))
+        stats = dict(self.stats, fetch_seconds=round(self.stats['fetch_seconds'], 2))
+        return {'root': self.root, 'chunks': files, 'mb': round(size / 1048576, 1), 'stats': stats}
@@ -0,0 +1,466 @@
+"""
+Feed Metrics for Project Horizon
+HDR-style latency histograms (log-linear buckets, O(1) record) for
+exchange -> receive -> processed -> published timing of live records,
+plus cheap counters/histograms/gauges rendered in Prometheus text format
+"""
+import os
+import sys
+import threading
+import time
+from array import array
+
+SUB_BUCKET_BITS = 4                       # 16 linear sub-buckets per power of two (~6% precision)
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+BUCKET_COUNT = 64 * SUB_BUCKETS           # Covers the full 64-bit range
+
+# Latency stages (values recorded in microseconds)
+LATENCY_STAGES = {
+    'exchange_to_recv': 'ts_event -> ts_recv (exchange to Databento gateway)',
+    'recv_to_processed': 'ts_recv -> local state updated',
+    'processed_to_published': 'state updated -> served in HTTP payload',
+}
+
+
+def _bucket_index(value):
+    """Log-linear bucket: exact below 2*SUB_BUCKETS, then SUB_BUCKETS per power of two"""
+    if value < 2 * SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+
+
+def _bucket_low(index):
+    """Smallest value that lands in bucket index"""
+    if index < 2 * SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    return (index - shift * SUB_BUCKETS) << shift
+
+
+class LatencyHistogram:
+    """Fixed-size log-linear histogram of non-negative integer values"""
+
+    __slots__ = ('counts', 'count', 'total', 'max', 'min')
+
+    def __init__(self):
+        self.counts = array('q', bytes(8 * BUCKET_COUNT))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.min = 0
+
+    def record(self, value):
+        value = int(value)
+        if value < 0:
+            value = 0  # Clock skew between exchange and local host
+        self.counts[_bucket_index(value)] += 1
+        if self.count == 0 or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+
+    def percentile(self, pct):
+        """Value at percentile (upper edge of the matching bucket, capped at max)"""
+        if self.count == 0:
+            return 0
+        target = max(1, int(self.count * pct / 100.0 + 0.5))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c:
+                seen += c
+                if seen >= target:
+                    return min(_bucket_low(i + 1) - 1, self.max)
+        return self.max
+
+    def buckets(self):
+        """Non-empty buckets as [(upper_bound, cumulative_count), ...]"""
+        result = []
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c:
+                seen += c
+                result.append((_bucket_low(i + 1) - 1, seen))
+        return result
+
+    def summary(self, scale=1.0):
+        """Count, mean and percentiles divided by scale (e.g. 1000 for us -> ms)"""
+        if self.count == 0:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count / scale, 3),
+            'min': round(self.min / scale, 3),
+            'p50': round(self.percentile(50) / scale, 3),
+            'p90': round(self.percentile(90) / scale, 3),
+            'p99': round(self.percentile(99) / scale, 3),
+            'p999': round(self.percentile(99.9) / scale, 3),
+            'max': round(self.max / scale, 3),
+        }
+
+
+class LatencyTracker:
+    """Latency histograms per (stage, contract, session)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+
+    def record(self, stage, contract, session, value_us):
+        key = (stage, contract, session or 'unknown')
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = LatencyHistogram()
+            hist.record(value_us)
+
+    def reset(self, contract=None):
+        with self.lock:
+            if contract is None:
+                self.histograms.clear()
+            else:
+                for key in [k for k in self.histograms if k[1] == contract]:
+                    del self.histograms[key]
+
+    def merged(self, stage, contract=None, session=None):
+        """Histogram merged across sessions (and contracts if contract is None)"""
+        merged = LatencyHistogram()
+        with self.lock:
+            items = list(self.histograms.items())
+        for (s, c, sess), hist in items:
+            if s != stage or (contract and c != contract) or (session and sess != session):
+                continue
+            for i, n in enumerate(hist.counts):
+                if n:
+                    merged.counts[i] += n
+            if merged.count == 0 or hist.min < merged.min:
+                merged.min = hist.min
+            merged.max = max(merged.max, hist.max)
+            merged.count += hist.count
+            merged.total += hist.total
+        return merged
+
+    def totals(self, contract=None):
+        """Per-stage totals only (what summary() reports as 'all'), in milliseconds"""
+        return {stage: self.merged(stage, contract).summary(1000.0) for stage in LATENCY_STAGES}
+
+    def summary(self, contract=None):
+        """Per-stage totals plus per-session breakdown, in milliseconds"""
+        result = {}
+        for stage in LATENCY_STAGES:
+            sessions = {}
+            with self.lock:
+                items = list(self.histograms.items())
+            for (s, c, sess), hist in items:
+                if s == stage and (contract is None or c == contract):
+                    sessions[f"{c}:{sess}" if contract is None else sess] = hist.summary(1000.0)
+            result[stage] = {
+                'all': self.merged(stage, contract).summary(1000.0),
+                'sessions': sessions,
+            }
+        return result
+
+
+# ============================================
+# PROMETHEUS EXPOSITION
+# ============================================
+# Hot paths only touch a child object (one small lock + an int add); all
+# formatting happens at scrape time. Families cap their label sets so an
+# unexpected path or symbol can't grow memory without bound.
+
+MAX_LABEL_SETS = 64
+DURATION_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    """Prometheus histogram backed by a LatencyHistogram of integer units"""
+
+    __slots__ = ('hist', 'unit', '_lock')
+
+    def __init__(self, unit):
+        self.hist = LatencyHistogram()
+        self.unit = unit          # Seconds per recorded unit (1e-6 for us), 1 for sizes
+        self._lock = threading.Lock()
+
+    def observe_ns(self, ns):
+        """Record a perf_counter_ns() duration"""
+        with self._lock:
+            self.hist.record(ns // 1000)
+
+    def observe(self, value):
+        """Record a value in the family's base unit (seconds or bytes)"""
+        with self._lock:
+            self.hist.record(value / self.unit)
+
+    def record_unlocked(self, us):
+        """Record from a caller that already serializes access (e.g. inside a held lock)"""
+        self.hist.record(us)
+
+
+class MetricFamily:
+    def __init__(self, kind, name, help_text, labelnames, factory, buckets=None):
+        self.kind = kind
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.factory = factory
+        self.buckets = buckets
+        self.children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            with self._lock:
+                child = self.children.get(values)
+                if child is None:
+                    if len(self.children) >= MAX_LABEL_SETS:
+                        values = ('other',) * len(self.labelnames)
+                        child = self.children.get(values)
+                    if child is None:
+                        child = self.children[values] = self.factory()
+        return child
+
+    def render(self, lines):
+        lines.append(f'# HELP {self.name} {self.help}')
+        lines.append(f'# TYPE {self.name} {self.kind}')
+        for values, child in list(self.children.items()):
+            if self.kind == 'counter':
+                lines.append(f'{self.name}{_format_labels(self.labelnames, values)} {child.value}')
+                continue
+            with child._lock:
+                edges = child.hist.buckets()
+                count = child.hist.count
+                total = child.hist.total
+            # Cumulative count at each Prometheus bound from the log-linear buckets
+            i = 0
+            cumulative = 0
+            for bound in self.buckets:
+                limit = bound / child.unit
+                while i < len(edges) and edges[i][0] <= limit:
+                    cumulative = edges[i][1]
+                    i += 1
+                le = _format_labels(self.labelnames, values, f'le="{bound}"')
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            inf = _format_labels(self.labelnames, values, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{inf} {count}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, values)} {total * child.unit}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, values)} {count}')
+
+
+class MetricsRegistry:
+    """Counters, histograms and scrape-time gauges rendered in Prometheus text format"""
+
+    def __init__(self, prefix='horizon'):
+        self.prefix = prefix
+        self.families = []
+        self.gauges = []      # (name, help, fn) - fn() yields (labels_dict, value)
+        self.started = time.time()
+
+    def counter(self, name, help_text, labelnames=()):
+        family = MetricFamily('counter', f'{self.prefix}_{name}', help_text, labelnames, Counter)
+        self.families.append(family)
+        return family
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DURATION_BUCKETS, unit=1e-6):
+        family = MetricFamily('histogram', f'{self.prefix}_{name}', help_text, labelnames,
+                              lambda: Histogram(unit), buckets)
+        self.families.append(family)
+        return family
+
+    def gauge(self, name, help_text, fn):
+        self.gauges.append((f'{self.prefix}_{name}', help_text, fn))
+
+    def render(self):
+        lines = []
+        for family in self.families:
+            family.render(lines)
+        for name, help_text, fn in self.gauges:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            try:
+                for labels, value in fn():
+                    names = tuple(labels.keys())
+                    lines.append(f'{name}{_format_labels(names, tuple(labels.values()))} {value}')
+            except Exception as e:
+                lines.append(f'# error collecting {name}: {_escape(e)}')
+        lines.append(f'# TYPE {self.prefix}_uptime_seconds gauge')
+        lines.append(f'{self.prefix}_uptime_seconds {time.time() - self.started:.1f}')
+        return '\n'.join(lines) + '\n'
+
+
+class TimedLock:
+    """Drop-in threading.Lock that records wait and hold time histograms.
+
+    Both observations are made while the lock is held, so the histograms
+    need no extra synchronisation. With profile=True every acquisition is
+    also attributed to its call site (file:line function) and domain.
+    """
+
+    def __init__(self, wait_histogram, hold_histogram, profile=False):
+        self._lock = threading.Lock()
+        self._wait = wait_histogram
+        self._hold = hold_histogram
+        self._acquired_at = 0
+        self._site = None
+        self.profile = profile
+        self.sites = {}       # (domain, site) -> [acquisitions, contended, wait_us, max_wait_us, hold_us, max_hold_us]
+        self.profile_started = time.time()
+
+    def acquire(self, blocking=True, timeout=-1, domain='state'):
+        # Uncontended fast path skips the timers entirely
+        if self._lock.acquire(False):
+            now = time.perf_counter_ns()
+            waited = 0
+            contended = False
+        else:
+            if not blocking:
+                return False
+            start = time.perf_counter_ns()
+            if not self._lock.acquire(True, timeout):
+                return False
+            now = time.perf_counter_ns()
+            waited = (now - start) // 1000
+            contended = True
+        self._acquired_at = now
+        self._wait.record_unlocked(waited)
+        if self.profile:
+            key = (domain, _caller_site())
+            stats = self.sites.get(key)
+            if stats is None:
+                stats = self.sites[key] = [0, 0, 0, 0, 0, 0]
+            stats[0] += 1
+            if contended:
+                stats[1] += 1
+                stats[2] += waited
+                if waited > stats[3]:
+                    stats[3] = waited
+            self._site = stats
+        return True
+
+    def release(self):
+        held = (time.perf_counter_ns() - self._acquired_at) // 1000
+        self._hold.record_unlocked(held)
+        stats = self._site
+        if stats is not None:
+            self._site = None
+            stats[4] += held
+            if held > stats[5]:
+                stats[5] = held
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    def set_profiling(self, enabled, reset=False):
+        if reset or (enabled and not self.profile):
+            self.sites = {}
+            self.profile_started = time.time()
+        self.profile = enabled
+
+    def contention_report(self, limit=25):
+        """Call sites ordered by total wait (then hold) time, in milliseconds"""
+        rows = []
+        for (domain, site), (count, contended, wait_us, max_wait, hold_us, max_hold) in list(self.sites.items()):
+            rows.append({
+                'domain': domain,
+                'site': site,
+                'acquisitions': count,
+                'contended': contended,
+                'contended_pct': round(contended / count * 100, 2) if count else 0,
+                'wait_total_ms': round(wait_us / 1000, 3),
+                'wait_max_ms': round(max_wait / 1000, 3),
+                'hold_total_ms': round(hold_us / 1000, 3),
+                'hold_avg_ms': round(hold_us / count / 1000, 4) if count else 0,
+                'hold_max_ms': round(max_hold / 1000, 3),
+            })
+        rows.sort(key=lambda r: (r['wait_total_ms'], r['hold_total_ms']), reverse=True)
+
+        domains = {}
+        for row in rows:
+            d = domains.setdefault(row['domain'], {'acquisitions': 0, 'contended': 0, 'wait_total_ms': 0.0, 'hold_total_ms': 0.0})
+            d['acquisitions'] += row['acquisitions']
+            d['contended'] += row['contended']
+            d['wait_total_ms'] = round(d['wait_total_ms'] + row['wait_total_ms'], 3)
+            d['hold_total_ms'] = round(d['hold_total_ms'] + row['hold_total_ms'], 3)
+
+        elapsed = time.time() - self.profile_started
+        return {
+            'profiling': self.profile,
+            'window_seconds': round(elapsed, 1),
+            'domains': domains,
+            'sites': rows[:limit],
+        }
+
+
+class LockDomain:
+    """Named view of a lock so acquisitions are attributed to a state domain.
+
+    Domains share the underlying lock until they are pointed at their own
+    TimedLock - call sites don't change when the lock is split.
+    """
+
+    def __init__(self, lock, domain):
+        self.lock = lock
+        self.domain = domain
+
+    def acquire(self, blocking=True, timeout=-1):
+        return self.lock.acquire(blocking, timeout, domain=self.domain)
+
+    def release(self):
+        self.lock.release()
+
+    def locked(self):
+        return self.lock.locked()
+
+    def __enter__(self):
+        self.lock.acquire(domain=self.domain)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.lock.release()
+
+
+def _caller_site():
+    """First frame outside this module as 'file.py:line function'"""
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_code.co_filename == __file__:
+        frame = frame.f_back
+    if frame is None:
+        return 'unknown'
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}"
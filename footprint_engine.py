@@ -0,0 +1,219 @@
+"""
+Footprint Engine for Project Horizon
+Per-candle bid/ask volume-at-price with diagonal imbalances, stacked runs,
+candle POC and unfinished auctions - all updated incrementally per trade
+"""
+from array import array
+from collections import deque
+
+# Candle timeframes tracked (label -> seconds), same clock-aligned candles as volume_5m..volume_1h
+FOOTPRINT_TIMEFRAMES = {'5m': 300, '15m': 900, '30m': 1800, '1h': 3600}
+
+IMBALANCE_RATIO = 3.0      # 300% diagonal imbalance
+IMBALANCE_MIN_VOLUME = 5   # Ignore imbalances on thin levels
+STACKED_MIN_RUN = 3        # 3+ consecutive imbalanced levels = stacked
+MAX_CANDLES = 120          # Completed candles kept per timeframe
+
+
+class FootprintCandle:
+    """Volume-at-price for one candle. Levels are tick indexes offset from base_tick."""
+
+    __slots__ = ('start', 'base_tick', 'bid', 'ask', 'buy_imb', 'sell_imb',
+                 'open_tick', 'high_tick', 'low_tick', 'close_tick',
+                 'poc_tick', 'poc_volume', 'buy_volume', 'sell_volume',
+                 'stacked_buy', 'stacked_sell', 'trades')
+
+    def __init__(self, start, tick):
+        self.start = start
+        self.base_tick = tick
+        self.bid = array('q', [0])        # Sell aggressor volume (hit the bid)
+        self.ask = array('q', [0])        # Buy aggressor volume (lifted the ask)
+        self.buy_imb = bytearray(1)
+        self.sell_imb = bytearray(1)
+        self.open_tick = tick
+        self.high_tick = tick
+        self.low_tick = tick
+        self.close_tick = tick
+        self.poc_tick = tick
+        self.poc_volume = 0
+        self.buy_volume = 0
+        self.sell_volume = 0
+        self.stacked_buy = 0
+        self.stacked_sell = 0
+        self.trades = 0
+
+    def _ensure_level(self, tick):
+        """Grow level arrays so tick is addressable, return its offset"""
+        offset = tick - self.base_tick
+        if offset < 0:
+            pad = -offset
+            self.bid = array('q', bytes(8 * pad)) + self.bid
+            self.ask = array('q', bytes(8 * pad)) + self.ask
+            self.buy_imb = bytearray(pad) + self.buy_imb
+            self.sell_imb = bytearray(pad) + self.sell_imb
+            self.base_tick = tick
+            return 0
+        if offset >= len(self.bid):
+            pad = offset - len(self.bid) + 1
+            self.bid.extend(array('q', bytes(8 * pad)))
+            self.ask.extend(array('q', bytes(8 * pad)))
+            self.buy_imb.extend(bytearray(pad))
+            self.sell_imb.extend(bytearray(pad))
+        return offset
+
+    def add(self, tick, size, side):
+        """Add one trade. side: 'A' = buy aggressor, 'B' = sell aggressor"""
+        i = self._ensure_level(tick)
+        if side == 'A':
+            self.ask[i] += size
+            self.buy_volume += size
+        elif side == 'B':
+            self.bid[i] += size
+            self.sell_volume += size
+        else:
+            return
+        self.trades += 1
+
+        if tick > self.high_tick:
+            self.high_tick = tick
+        if tick < self.low_tick:
+            self.low_tick = tick
+        self.close_tick = tick
+
+        level_volume = self.bid[i] + self.ask[i]
+        if level_volume > self.poc_volume:
+            self.poc_volume = level_volume
+            self.poc_tick = tick
+
+        # Only the diagonals touching this level can change:
+        # buy imbalance compares ask[i] vs bid[i-1], sell imbalance compares bid[i] vs ask[i+1]
+        if side == 'A':
+            buy_changed = self._update_buy_imbalance(i)
+            sell_changed = self._update_sell_imbalance(i - 1)
+        else:
+            buy_changed = self._update_buy_imbalance(i + 1)
+            sell_changed = self._update_sell_imbalance(i)
+        if buy_changed:
+            self.stacked_buy = _longest_run(self.buy_imb)
+        if sell_changed:
+            self.stacked_sell = _longest_run(self.sell_imb)
+
+    def _update_buy_imbalance(self, i):
+        if i < 0 or i >= len(self.ask):
+            return False
+        ask = self.ask[i]
+        bid_below = self.bid[i - 1] if i > 0 else 0
+        flag = 1 if ask >= IMBALANCE_MIN_VOLUME and ask >= IMBALANCE_RATIO * bid_below else 0
+        if self.buy_imb[i] != flag:
+            self.buy_imb[i] = flag
+            return True
+        return False
+
+    def _update_sell_imbalance(self, i):
+        if i < 0 or i >= len(self.bid):
+            return False
+        bid = self.bid[i]
+        ask_above = self.ask[i + 1] if i + 1 < len(self.ask) else 0
+        flag = 1 if bid >= IMBALANCE_MIN_VOLUME and bid >= IMBALANCE_RATIO * ask_above else 0
+        if self.sell_imb[i] != flag:
+            self.sell_imb[i] = flag
+            return True
+        return False
+
+    def to_dict(self, tick_size):
+        """Compact JSON view: levels run from low to high as parallel arrays"""
+        lo = self.low_tick - self.base_tick
+        hi = self.high_tick - self.base_tick + 1
+        bid = self.bid[lo:hi]
+        ask = self.ask[lo:hi]
+        top = hi - lo - 1
+        return {
+            'ts': self.start,
+            'tick_size': tick_size,
+            'low': round(self.low_tick * tick_size, 6),
+            'high': round(self.high_tick * tick_size, 6),
+            'open': round(self.open_tick * tick_size, 6),
+            'close': round(self.close_tick * tick_size, 6),
+            'bid': bid.tolist(),
+            'ask': ask.tolist(),
+            'buy_volume': self.buy_volume,
+            'sell_volume': self.sell_volume,
+            'delta': self.buy_volume - self.sell_volume,
+            'trades': self.trades,
+            'poc': round(self.poc_tick * tick_size, 6),
+            'poc_volume': self.poc_volume,
+            'buy_imbalances': [round((self.low_tick + j) * tick_size, 6) for j, f in enumerate(self.buy_imb[lo:hi]) if f],
+            'sell_imbalances': [round((self.low_tick + j) * tick_size, 6) for j, f in enumerate(self.sell_imb[lo:hi]) if f],
+            'stacked_buy': self.stacked_buy,
+            'stacked_sell': self.stacked_sell,
+            # Unfinished auction = both sides traded at the extreme (no zero print)
+            'unfinished_high': bool(bid[top] > 0 and ask[top] > 0),
+            'unfinished_low': bool(bid[0] > 0 and ask[0] > 0),
+        }
+
+
+def _longest_run(flags):
+    """Longest run of consecutive set flags"""
+    best = run = 0
+    for f in flags:
+        if f:
+            run += 1
+            if run > best:
+                best = run
+        else:
+            run = 0
+    return best
+
+
+class FootprintEngine:
+    """Footprint candles for every timeframe, rolled on clock-aligned boundaries"""
+
+    def __init__(self, tick_size, timeframes=None, max_candles=MAX_CANDLES):
+        self.tick_size = tick_size
+        self.timeframes = dict(timeframes or FOOTPRINT_TIMEFRAMES)
+        self.max_candles = max_candles
+        self.current = {tf: None for tf in self.timeframes}
+        self.history = {tf: deque(maxlen=max_candles) for tf in self.timeframes}
+
+    def reset(self, tick_size=None):
+        """Drop all candles (contract switch / new day)"""
+        if tick_size:
+            self.tick_size = tick_size
+        for tf in self.timeframes:
+            self.current[tf] = None
+            self.history[tf].clear()
+
+    def on_trade(self, ts, price, size, side):
+        """Add a trade to the current candle of every timeframe"""
+        tick = int(round(price / self.tick_size))
+        for tf, seconds in self.timeframes.items():
+            start = int(ts // seconds) * seconds
+            candle = self.current[tf]
+            if candle is None or candle.start != start:
+                if candle is not None and candle.trades > 0:
+                    self.history[tf].append(candle)
+                candle = FootprintCandle(start, tick)
+                self.current[tf] = candle
+            candle.add(tick, size, side)
+
+    def stacked_imbalances(self, tf='5m'):
+        """(stacked_buy, stacked_sell) for the developing candle"""
+        candle = self.current.get(tf)
+        if candle is None:
+            return 0, 0
+        return candle.stacked_buy, candle.stacked_sell
+
+    def get_candles(self, tf='5m', start=None, end=None, limit=20):
+        """Candles (oldest first) with start <= ts <= end, at most limit most recent"""
+        if tf not in self.timeframes:
+            return []
+        candles = list(self.history[tf])
+        if self.current[tf] is not None and self.current[tf].trades > 0:
+            candles.append(self.current[tf])
+        if start is not None:
+            candles = [c for c in candles if c.start >= start]
+        if end is not None:
+            candles = [c for c in candles if c.start <= end]
+        if limit:
+            candles = candles[-limit:]
+        return [c.to_dict(self.tick_size) for c in candles]
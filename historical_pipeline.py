@@ -0,0 +1,515 @@
+"""
+Historical Pipeline for Project Horizon
+Columnar (numpy) trades shared by the startup loaders. Each trading day is loaded
+once into a TradeFrame, the front month is picked once, and PD levels, IBs, session
+OHLC, TPO profiles and candle volumes are array reductions over the same frames
+instead of separate downloads with per-record Python loops. Consumers that only need
+OHLC (session history, weekly OHLC) use 1-minute BarFrames instead of trades
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+NS = 1_000_000_000
+MINUTE_NS = 60 * NS
+HOUR_NS = 3600 * NS
+DAY_NS = 86400 * NS
+DAY_OFFSET_NS = 23 * HOUR_NS        # Trading days start 23:00 UTC (18:00 ET, fixed UTC-5 like get_et_now)
+SETTLE_NS = HOUR_NS                 # A day is final once it ended this long ago
+MAX_DAYS = 10                       # Completed days kept in memory (PD + 7 days of candles)
+BAR_DAYS = 75                       # Completed 1-minute bar days kept (VSI history + 5 past weeks)
+CURRENT_TTL = 90                    # Seconds the still-running day is reused before reloading
+LOAD_WORKERS = 4
+BATCH_RECORDS = 100_000             # Records decoded at a time when streaming DBN data
+ET_OFFSET_NS = -5 * HOUR_NS         # Session clocks use the same fixed UTC-5 as get_et_now
+EPOCH = date(1970, 1, 1)
+
+
+def day_start(ts_ns):
+    """Start (ns) of the trading day containing ts"""
+    return (ts_ns - DAY_OFFSET_NS) // DAY_NS * DAY_NS + DAY_OFFSET_NS
+
+
+# ============================================
+# Streaming DBN consumption
+# ============================================
+def iter_batches(data, count=BATCH_RECORDS):
+    """Structured arrays of at most `count` records from a DBNStore or CachedRange, so memory
+    is one batch however long the range (a store can be iterated again for a second pass)"""
+    for batch in data.to_ndarray(count=count):
+        if len(batch):
+            yield batch
+
+
+def iter_rows(data, fields):
+    """Tuples of `fields` per record, decoded batch by batch - for loops that stay per record"""
+    for batch in iter_batches(data):
+        yield from zip(*(batch[field].tolist() for field in fields))
+
+
+def instrument_totals(data, field=None):
+    """{instrument_id: record count, or the sum of `field`} in one streaming pass"""
+    totals = {}
+    for batch in iter_batches(data):
+        ids, inverse = np.unique(batch['instrument_id'], return_inverse=True)
+        weights = None if field is None else batch[field].astype(np.float64)
+        sums = np.bincount(inverse, weights=weights, minlength=len(ids))
+        for iid, total in zip(ids.tolist(), sums.tolist()):
+            totals[iid] = totals.get(iid, 0) + total
+    return totals
+
+
+# ============================================
+# Column frames
+# ============================================
+class ColumnFrame:
+    """Parallel column arrays sorted by ts (int64 ns); subclasses name the columns"""
+    COLUMNS = ()
+    DTYPES = ()
+    __slots__ = ('_most_active',)
+
+    def __init__(self, *columns):
+        ts = columns[0]
+        if len(ts) > 1 and not np.all(ts[1:] >= ts[:-1]):
+            order = np.argsort(ts, kind='stable')
+            columns = [column[order] for column in columns]
+        for name, column in zip(self.COLUMNS, columns):
+            setattr(self, name, column)
+        self._most_active = False
+
+    @classmethod
+    def empty(cls):
+        return cls(*(np.empty(0, dtype) for dtype in cls.DTYPES))
+
+    @classmethod
+    def from_batches(cls, batches):
+        """From iter_batches(): only the columns are kept, never the whole structured range"""
+        return cls.concat([cls.from_dbn(batch) for batch in batches])
+
+    @classmethod
+    def concat(cls, frames):
+        frames = [f for f in frames if len(f)]
+        if not frames:
+            return cls.empty()
+        if len(frames) == 1:
+            return frames[0]
+        return cls(*(np.concatenate([getattr(f, name) for f in frames]) for name in cls.COLUMNS))
+
+    def __len__(self):
+        return len(self.ts)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.COLUMNS)
+
+    def _take(self, index):
+        return type(self)(*(getattr(self, name)[index] for name in self.COLUMNS))
+
+    def between(self, start_ns=None, end_ns=None):
+        """Rows with start_ns <= ts < end_ns (None = unbounded)"""
+        lo = 0 if start_ns is None else int(np.searchsorted(self.ts, start_ns, 'left'))
+        hi = len(self.ts) if end_ns is None else int(np.searchsorted(self.ts, end_ns, 'left'))
+        if lo == 0 and hi == len(self.ts):
+            return self
+        return self._take(slice(lo, hi))
+
+    def select(self, instrument_id=None, price_min=None, price_max=None):
+        """One instrument and/or a valid price band"""
+        mask = np.ones(len(self.ts), bool)
+        if instrument_id is not None:
+            mask &= self.instrument_id == instrument_id
+        low, high = self._price_range()
+        if price_min is not None:
+            mask &= low >= price_min
+        if price_max is not None:
+            mask &= high <= price_max
+        return self if mask.all() else self._take(mask)
+
+    def most_active(self):
+        """instrument_id with the most activity (the front month), None when empty"""
+        if self._most_active is False:
+            if len(self.instrument_id):
+                ids, inverse = np.unique(self.instrument_id, return_inverse=True)
+                totals = np.bincount(inverse, weights=self._activity(), minlength=len(ids))
+                self._most_active = int(ids[np.argmax(totals)])
+            else:
+                self._most_active = None
+        return self._most_active
+
+
+class TradeFrame(ColumnFrame):
+    """Trades as parallel arrays sorted by ts_event: ts (int64 ns), price (float64),
+    size (int64), side (int8: +1 buyer aggressor 'A', -1 seller 'B', 0 none), instrument_id"""
+    COLUMNS = ('ts', 'price', 'size', 'side', 'instrument_id')
+    DTYPES = (np.int64, np.float64, np.int64, np.int8, np.uint32)
+    __slots__ = COLUMNS
+
+    @classmethod
+    def from_dbn(cls, array):
+        """Structured array from DBNStore.to_ndarray() (trades schema, fixed-point prices)"""
+        side = np.zeros(len(array), np.int8)
+        side[array['side'] == b'A'] = 1
+        side[array['side'] == b'B'] = -1
+        return cls(array['ts_event'].astype(np.int64), array['price'] / 1e9, array['size'].astype(np.int64),
+                   side, array['instrument_id'].astype(np.uint32))
+
+    @classmethod
+    def from_ticks(cls, rows, tick_size):
+        """Tick archive rows (ts_event, price in ticks, size, instrument_id, side char code)"""
+        side = np.zeros(len(rows), np.int8)
+        side[rows['side'] == ord('A')] = 1
+        side[rows['side'] == ord('B')] = -1
+        return cls(rows['ts_event'].astype(np.int64), rows['price'] * tick_size, rows['size'].astype(np.int64),
+                   side, rows['instrument_id'].astype(np.uint32))
+
+    def ohlcv(self):
+        return self.price, self.price, self.price, self.price, self.size
+
+    def _price_range(self):
+        return self.price, self.price
+
+    def _activity(self):
+        return None     # Trade count
+
+
+class BarFrame(ColumnFrame):
+    """OHLCV bars sorted by bar start: ts (int64 ns), open, high, low, close (float64),
+    volume (int64), instrument_id - for consumers that need no delta or trade-level prices"""
+    COLUMNS = ('ts', 'open', 'high', 'low', 'close', 'volume', 'instrument_id')
+    DTYPES = (np.int64, np.float64, np.float64, np.float64, np.float64, np.int64, np.uint32)
+    __slots__ = COLUMNS
+
+    @classmethod
+    def from_dbn(cls, array):
+        """Structured array of an ohlcv-* schema (fixed-point prices)"""
+        return cls(array['ts_event'].astype(np.int64), array['open'] / 1e9, array['high'] / 1e9,
+                   array['low'] / 1e9, array['close'] / 1e9, array['volume'].astype(np.int64),
+                   array['instrument_id'].astype(np.uint32))
+
+    @classmethod
+    def from_trades(cls, frame, minutes=1):
+        """Bars of `minutes` per instrument built from a TradeFrame (e.g. tick archive trades
+        past the end of the Historical bars)"""
+        if not len(frame):
+            return cls.empty()
+        bucket = frame.ts // (minutes * MINUTE_NS)
+        order = np.lexsort((frame.instrument_id, bucket))       # Stable: trade order kept inside a bar
+        bucket, iid, price, size = bucket[order], frame.instrument_id[order], frame.price[order], frame.size[order]
+        starts = np.concatenate(([0], np.flatnonzero((np.diff(bucket) != 0) | (np.diff(iid) != 0)) + 1))
+        ends = np.append(starts[1:], len(bucket))
+        return cls(bucket[starts] * minutes * MINUTE_NS, price[starts], np.maximum.reduceat(price, starts),
+                   np.minimum.reduceat(price, starts), price[ends - 1], np.add.reduceat(size, starts), iid[starts])
+
+    def ohlcv(self):
+        return self.open, self.high, self.low, self.close, self.volume
+
+    def _price_range(self):
+        return self.low, self.high
+
+    def _activity(self):
+        return self.volume.astype(np.float64)
+
+
+# ============================================
+# Reductions
+# ============================================
+def ohlc(frame):
+    """(open, high, low, close) of a TradeFrame or BarFrame; None when empty"""
+    if not len(frame):
+        return None
+    opens, highs, lows, closes, _ = frame.ohlcv()
+    return float(opens[0]), float(highs.max()), float(lows.min()), float(closes[-1])
+
+
+def summary(frame):
+    """OHLC, buy/sell volume and VWAP sums of a frame; None when empty"""
+    if not len(frame):
+        return None
+    size = frame.size
+    buy = int(size[frame.side > 0].sum())
+    sell = int(size[frame.side < 0].sum())
+    return {
+        'count': len(frame),
+        'open': float(frame.price[0]),
+        'high': float(frame.price.max()),
+        'low': float(frame.price.min()),
+        'close': float(frame.price[-1]),
+        'first_ts': int(frame.ts[0]),
+        'last_ts': int(frame.ts[-1]),
+        'buy': buy,
+        'sell': sell,
+        'vwap_num': float(np.dot(frame.price, size)),
+        'vwap_den': int(size.sum()),
+    }
+
+
+def volume_profile(frame, tick_size):
+    """(price levels ascending, volume at each, index of each level's first trade)
+    with prices rounded to tick_size"""
+    ticks = np.rint(frame.price / tick_size).astype(np.int64)
+    levels, first, inverse = np.unique(ticks, return_index=True, return_inverse=True)
+    volumes = np.bincount(inverse, weights=frame.size, minlength=len(levels))
+    return levels * tick_size, volumes, first
+
+
+def bar_volume_profile(frame, tick_size):
+    """volume_profile() of a BarFrame: each bar's volume spread evenly over the ticks from
+    its low to its high (first = index of the first bar touching each level)"""
+    low = np.rint(frame.low / tick_size).astype(np.int64)
+    width = np.maximum(np.rint(frame.high / tick_size).astype(np.int64) - low + 1, 1)
+    bar = np.repeat(np.arange(len(low)), width)
+    ticks = low[bar] + np.arange(len(bar)) - np.repeat(np.cumsum(width) - width, width)
+    levels, first, inverse = np.unique(ticks, return_index=True, return_inverse=True)
+    volumes = np.bincount(inverse, weights=(frame.volume / width)[bar], minlength=len(levels))
+    return levels * tick_size, volumes, bar[first]
+
+
+def profile_value_area(frame, tick_size):
+    """(poc, vah, val) of a TradeFrame or BarFrame"""
+    profile = volume_profile if isinstance(frame, TradeFrame) else bar_volume_profile
+    return value_area(*profile(frame, tick_size))
+
+
+def value_area(levels, volumes, first=None, share=0.70):
+    """(poc, vah, val): POC is the busiest level (ties: the one traded first), the value
+    area grows from it one level at a time toward the side with more volume until
+    `share` of the volume is inside"""
+    if not len(levels):
+        return 0.0, 0.0, 0.0
+    top = np.flatnonzero(volumes == volumes.max())
+    poc_idx = int(top[np.argmin(first[top])] if first is not None else top[0])
+    vols = volumes.tolist()
+    target = float(volumes.sum()) * share
+    current = vols[poc_idx]
+    hi_idx = lo_idx = poc_idx
+    last = len(vols) - 1
+    while current < target and (hi_idx < last or lo_idx > 0):
+        above = vols[hi_idx + 1] if hi_idx < last else 0
+        below = vols[lo_idx - 1] if lo_idx > 0 else 0
+        if above >= below and hi_idx < last:
+            hi_idx += 1
+            current += above
+        elif lo_idx > 0:
+            lo_idx -= 1
+            current += below
+        else:
+            break
+    return float(levels[poc_idx]), float(levels[hi_idx]), float(levels[lo_idx])
+
+
+def candles(frame, minutes):
+    """Per-candle arrays for buckets of `minutes` (aligned to the epoch): start (s), buy,
+    sell, price open/high/low/close and the open/high/low of the running in-candle delta"""
+    if not len(frame):
+        return None
+    bucket = frame.ts // (minutes * MINUTE_NS)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(bucket)) + 1))
+    ends = np.append(starts[1:], len(bucket))
+    buy = np.where(frame.side > 0, frame.size, 0)
+    sell = np.where(frame.side < 0, frame.size, 0)
+    running = np.cumsum(buy - sell)
+    running -= np.repeat(running[starts] - (buy - sell)[starts], ends - starts)
+    return {
+        'start': bucket[starts] * minutes * 60,
+        'buy': np.add.reduceat(buy, starts),
+        'sell': np.add.reduceat(sell, starts),
+        'open': frame.price[starts],
+        'high': np.maximum.reduceat(frame.price, starts),
+        'low': np.minimum.reduceat(frame.price, starts),
+        'close': frame.price[ends - 1],
+        'delta_open': running[starts],
+        'delta_high': np.maximum.reduceat(running, starts),
+        'delta_low': np.minimum.reduceat(running, starts),
+    }
+
+
+def local_minutes(ts, tz):
+    """Minute of day in tz for each ts - DST-aware, one utcoffset lookup per distinct hour"""
+    if not len(ts):
+        return np.empty(0, np.int64)
+    hours, inverse = np.unique(ts // HOUR_NS, return_inverse=True)
+    offsets = np.array([int(datetime.fromtimestamp(int(h) * 3600, tz).utcoffset().total_seconds()) * NS
+                        for h in hours], np.int64)
+    return (ts + offsets[inverse]) // MINUTE_NS % 1440
+
+
+def session_table(windows):
+    """ET minute-of-day -> index of the first (start_minute, end_minute) window containing
+    it, -1 for none (1440 entries); a window with end < start runs over midnight"""
+    minutes = np.arange(1440)
+    table = np.full(1440, -1, np.int64)
+    for i, (start, end) in enumerate(windows):
+        if start <= end:
+            inside = (minutes >= start) & (minutes < end)
+        else:
+            inside = (minutes >= start) | (minutes < end)
+        table[inside & (table < 0)] = i
+    return table
+
+
+def _session_keys(frame, table, offset_ns):
+    """(trading day, session index) of every row"""
+    local = frame.ts + offset_ns
+    day = (local + (DAY_NS - DAY_OFFSET_NS - offset_ns)) // DAY_NS    # Same boundaries as day_start()
+    return day, table[local // MINUTE_NS % 1440]
+
+
+def session_bars(frame, table, offset_ns=ET_OFFSET_NS):
+    """OHLC, volume and row count per (trading day, session) of a TradeFrame or 1-minute
+    BarFrame spanning any number of days (plus buy/sell for trades). day is the trading day
+    as days since the epoch of the ET date it closes on (18:00 ET rolls over); session
+    indexes the windows of session_table()"""
+    day, session = _session_keys(frame, table, offset_ns)
+    inside = np.flatnonzero(session >= 0)
+    key = day[inside] * 1440 + session[inside]
+    if len(key) > 1 and not np.all(key[1:] >= key[:-1]):
+        inside = inside[np.argsort(key, kind='stable')]
+        key = day[inside] * 1440 + session[inside]
+    trades = isinstance(frame, TradeFrame)
+    if not len(key):
+        names = ('day', 'session', 'open', 'high', 'low', 'close', 'volume', 'count') + (('buy', 'sell') if trades else ())
+        return {name: np.empty(0, np.int64) for name in names}
+    opens, highs, lows, closes, volumes = (column[inside] for column in frame.ohlcv())
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(key)) + 1))
+    ends = np.append(starts[1:], len(key))
+    bars = {
+        'day': key[starts] // 1440,
+        'session': key[starts] % 1440,
+        'open': opens[starts],
+        'high': np.maximum.reduceat(highs, starts),
+        'low': np.minimum.reduceat(lows, starts),
+        'close': closes[ends - 1],
+        'volume': np.add.reduceat(volumes, starts),
+        'count': ends - starts,
+    }
+    if trades:
+        side = frame.side[inside]
+        bars['buy'] = np.add.reduceat(np.where(side > 0, volumes, 0), starts)
+        bars['sell'] = np.add.reduceat(np.where(side < 0, volumes, 0), starts)
+    return bars
+
+
+def session_value_areas(frame, table, tick_size, offset_ns=ET_OFFSET_NS):
+    """{(day, session): (poc, vah, val)} of every session_bars() group"""
+    day, session = _session_keys(frame, table, offset_ns)
+    key = day * 1440 + session
+    return {(k // 1440, k % 1440): profile_value_area(frame._take(key == k), tick_size)
+            for k in np.unique(key[session >= 0]).tolist()}
+
+
+def bar_date(day):
+    """date of a session_bars() day number"""
+    return EPOCH + timedelta(days=int(day))
+
+
+# ============================================
+# Shared day cache
+# ============================================
+class TradeHistory:
+    """Trading-day frames shared by every historical consumer.
+
+    load(contract, start_ns, end_ns, complete) returns the frame (frame_type: TradeFrame,
+    or BarFrame for a bar history) of one trading day. Completed days never change and
+    are kept (LRU, max_days); the running day is reused for `ttl` seconds so a burst of
+    startup loaders shares one download.
+    """
+
+    def __init__(self, load, max_days=MAX_DAYS, ttl=CURRENT_TTL, frame_type=TradeFrame):
+        self.load = load
+        self.max_days = max_days
+        self.ttl = ttl
+        self.frame_type = frame_type
+        self.days = OrderedDict()       # (contract, day_start) -> frame
+        self.current = {}               # (contract, day_start) -> (loaded_at, frame)
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        self.stats = {'hits': 0, 'loads': 0, 'load_seconds': 0.0, 'rows_loaded': 0}
+
+    def _key_lock(self, key):
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    def day(self, contract, start, keep=True):
+        """Frame of the trading day starting at `start`; keep=False streams a completed day
+        through without evicting the recent days the other consumers use"""
+        key = (contract, start)
+        complete = start + DAY_NS <= time.time_ns() - SETTLE_NS
+        with self._key_lock(key):       # Concurrent loaders asking for the same day load it once
+            with self.lock:
+                if complete and key in self.days:
+                    self.days.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return self.days[key]
+                cached = self.current.get(key)
+                if not complete and cached and time.time() - cached[0] < self.ttl:
+                    self.stats['hits'] += 1
+                    return cached[1]
+            started = time.time()
+            frame = self.load(contract, start, start + DAY_NS, complete)
+            with self.lock:
+                self.stats['loads'] += 1
+                self.stats['load_seconds'] += time.time() - started
+                self.stats['rows_loaded'] += len(frame)
+                if not complete:
+                    self.current[key] = (time.time(), frame)
+                    return frame
+                self.current.pop(key, None)
+                if keep:
+                    self.days[key] = frame
+                    while len(self.days) > self.max_days:
+                        self.days.popitem(last=False)
+        return frame
+
+    def cached(self, contract, start):
+        """Completed day frame if it is already in memory, else None (never loads)"""
+        with self.lock:
+            return self.days.get((contract, start))
+
+    def day_starts(self, start_ns, end_ns=None):
+        end_ns = time.time_ns() if end_ns is None else end_ns
+        return list(range(day_start(start_ns), end_ns, DAY_NS))
+
+    def prefetch(self, contract, start_ns, end_ns=None):
+        """Load every day of a range in parallel (the union window of the startup loaders)"""
+        starts = self.day_starts(start_ns, end_ns)
+        with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as pool:
+            list(pool.map(lambda s: self.day(contract, s), starts))
+
+    def window(self, contract, start_ns, end_ns=None):
+        """Trades with start_ns <= ts < end_ns; end_ns=None means everything loaded so far
+        (the running day may extend past the Databento delay via the tick archive)"""
+        return self.frame_type.concat([self.day(contract, s).between(start_ns, end_ns)
+                                       for s in self.day_starts(start_ns, end_ns)])
+
+    def front_month(self, contract, lookback_days=5):
+        """Most active instrument of the latest trading day that has trades"""
+        start = day_start(time.time_ns())
+        for i in range(lookback_days):
+            try:
+                iid = self.day(contract, start - i * DAY_NS).most_active()
+            except Exception:
+                continue            # Running day not available yet (weekend / Databento delay)
+            if iid is not None:
+                return iid
+        return None
+
+    def clear(self, contract=None):
+        with self.lock:
+            for store in (self.days, self.current):
+                for key in [k for k in store if contract is None or k[0] == contract]:
+                    del store[key]
+
+    def report(self):
+        with self.lock:
+            frames = list(self.days.values()) + [f for _, f in self.current.values()]
+            days = [{'contract': c, 'day': time.strftime('%Y-%m-%d', time.gmtime((s + DAY_NS) // NS)), 'rows': len(f)}
+                    for (c, s), f in self.days.items()]
+            current = [{'contract': c, 'rows': len(f), 'age': round(time.time() - at, 1)}
+                       for (c, s), (at, f) in self.current.items()]
+            stats = dict(self.stats, load_seconds=round(self.stats['load_seconds'], 2))
+        return {'days': days, 'current': current, 'stats': stats,
+                'mb': round(sum(f.nbytes for f in frames) / 1048576, 1)}
@@ -0,0 +1,285 @@
+"""
+Market-by-Order Book Engine for Project Horizon
+Rebuilds the CME order book from Databento MBO records and detects
+iceberg refills and absorption at price levels, incrementally per event
+"""
+import threading
+from bisect import bisect_left, insort
+from collections import deque, OrderedDict
+
+MAX_LEVELS = 40                 # Levels kept per side around the touch
+REFILL_WINDOW_NS = 5_000_000    # Refill must follow the fill within 5ms (exchange-native iceberg)
+ABSORPTION_MULTIPLE = 3.0       # Traded >= 3x the size displayed when the level became the touch
+ABSORPTION_MIN_VOLUME = 20      # Ignore absorption on tiny levels
+TOUCH_MEMORY_NS = 1_000_000_000 # Touch returning within 1s continues its absorption window
+MAX_EVENTS = 200                # Iceberg / absorption events kept
+PRICE_SCALE = 1e9               # Databento fixed-point prices
+
+
+class MBOBook:
+    """Order book with per-level FIFO queues and an order-id hash.
+
+    Prices are kept as Databento fixed-point ints (no float keys). Each side has a
+    sorted price array plus price -> {order_id: size} queues (dict order = priority).
+    Follows Databento semantics: A/C/M/R change the book, F/T only report executions.
+    """
+
+    def __init__(self, max_levels=MAX_LEVELS):
+        self.max_levels = max_levels
+        self.lock = threading.Lock()
+        self.iceberg_levels = OrderedDict()         # (side, price) -> iceberg stats
+        self.icebergs = deque(maxlen=MAX_EVENTS)    # Refill events
+        self.absorptions = deque(maxlen=MAX_EVENTS)
+        self.clear()
+
+    def clear(self):
+        """Drop the book (R action, contract switch, reconnect)"""
+        self.orders = {}                            # order_id -> [side, price, size]
+        self.queues = {'B': {}, 'A': {}}            # price -> {order_id: size}
+        self.level_size = {'B': {}, 'A': {}}        # price -> total displayed size
+        self.prices = {'B': [], 'A': []}            # Sorted ascending
+        self.level_stats = {'B': {}, 'A': {}}       # price -> absorption tracking while at touch
+        self.recent_fills = {}                      # order_id -> ts of fill that emptied its display
+        self.depleted = {}                          # (side, price) -> ts level emptied by a fill
+        self.touch = {'B': None, 'A': None}
+        self.events = 0
+        self.last_ts = 0
+
+    # ----------------------------------------
+    # Book maintenance
+    # ----------------------------------------
+    def _add_order(self, order_id, side, price, size):
+        queue = self.queues[side].get(price)
+        if queue is None:
+            queue = self.queues[side][price] = {}
+            self.level_size[side][price] = 0
+            insort(self.prices[side], price)
+            self._trim(side)
+            if price not in self.queues[side]:
+                return  # Trimmed straight away - outside the tracked window
+        queue[order_id] = size
+        self.level_size[side][price] += size
+        self.orders[order_id] = [side, price, size]
+
+    def _remove_size(self, order_id, size):
+        order = self.orders.get(order_id)
+        if order is None:
+            return None
+        side, price, current = order
+        removed = min(size, current)
+        order[2] = current - removed
+        self.level_size[side][price] -= removed
+        if order[2] <= 0:
+            del self.orders[order_id]
+            queue = self.queues[side][price]
+            queue.pop(order_id, None)
+            if not queue:
+                self._drop_level(side, price)
+        else:
+            self.queues[side][price][order_id] = order[2]
+        return order
+
+    def _drop_level(self, side, price):
+        self.queues[side].pop(price, None)
+        self.level_size[side].pop(price, None)
+        prices = self.prices[side]
+        i = bisect_left(prices, price)
+        if i < len(prices) and prices[i] == price:
+            del prices[i]
+
+    def _trim(self, side):
+        """Keep at most max_levels per side, dropping the levels furthest from the touch"""
+        prices = self.prices[side]
+        while len(prices) > self.max_levels:
+            far = prices[0] if side == 'B' else prices[-1]
+            for order_id in self.queues[side][far]:
+                self.orders.pop(order_id, None)
+            self._drop_level(side, far)
+
+    def best(self, side):
+        prices = self.prices[side]
+        if not prices:
+            return None
+        return prices[-1] if side == 'B' else prices[0]
+
+    def _update_touch(self, side, ts):
+        """Open an absorption window when a new price becomes the touch.
+
+        A level that is emptied and refilled (iceberg) flickers away from the touch
+        for a moment, so a touch returning within TOUCH_MEMORY_NS keeps its window.
+        """
+        best = self.best(side)
+        if best == self.touch[side]:
+            return
+        self.touch[side] = best
+        if best is None:
+            return
+        stats = self.level_stats[side]
+        current = stats.get(best)
+        if current is None or ts - current['last'] > TOUCH_MEMORY_NS:
+            stats[best] = {
+                'displayed': self.level_size[side].get(best, 0),
+                'traded': 0,
+                'since': ts,
+                'last': ts,
+                'fired': False,
+            }
+            if len(stats) > 4 * self.max_levels:
+                for price in [p for p in stats if p not in self.queues[side]]:
+                    del stats[price]
+        else:
+            current['last'] = ts
+
+    # ----------------------------------------
+    # Event processing
+    # ----------------------------------------
+    def apply(self, action, side, order_id, price, size, ts_event):
+        """Apply one MBO event (raw fields, fixed-point price)"""
+        with self.lock:
+            self.events += 1
+            self.last_ts = ts_event
+
+            if action == 'R':
+                self.clear()
+                return
+
+            if action == 'A':
+                if side not in self.queues:
+                    return
+                self._check_refill(order_id, side, price, size, ts_event)
+                self._add_order(order_id, side, price, size)
+            elif action == 'C':
+                order = self._remove_size(order_id, size)
+                if order is None:
+                    return
+                side = order[0]
+            elif action == 'M':
+                order = self.orders.get(order_id)
+                if order is None:
+                    # Unknown (trimmed or pre-snapshot) order - treat as an add
+                    if side in self.queues:
+                        self._check_refill(order_id, side, price, size, ts_event)
+                        self._add_order(order_id, side, price, size)
+                else:
+                    old_side, old_price, old_size = order
+                    side = old_side
+                    if price == old_price and size <= old_size:
+                        # Size decrease keeps queue priority
+                        self._remove_size(order_id, old_size - size)
+                    else:
+                        # Price change or size increase loses priority
+                        if price == old_price and size > old_size:
+                            self._check_refill(order_id, side, price, size - old_size, ts_event)
+                        self._remove_size(order_id, old_size)
+                        self._add_order(order_id, side, price, size)
+            elif action == 'F':
+                order = self.orders.get(order_id)
+                if order is None:
+                    return
+                side, level_price, remaining = order
+                self._on_fill(order_id, side, level_price, size, remaining, ts_event)
+                return
+            else:
+                return  # T (aggressor print) and N carry no book change
+
+            if side in self.queues:
+                self._update_touch(side, ts_event)
+
+    def _on_fill(self, order_id, side, price, size, remaining, ts):
+        stats = self.level_stats[side].get(price)
+        if stats is not None:
+            stats['traded'] += size
+            stats['last'] = ts
+            if (not stats['fired'] and stats['traded'] >= ABSORPTION_MIN_VOLUME
+                    and stats['traded'] >= ABSORPTION_MULTIPLE * max(stats['displayed'], 1)):
+                stats['fired'] = True
+                self.absorptions.append({
+                    'ts': ts,
+                    'side': 'BID' if side == 'B' else 'ASK',
+                    'price': price / PRICE_SCALE,
+                    'traded': stats['traded'],
+                    'displayed': stats['displayed'],
+                    'ratio': round(stats['traded'] / max(stats['displayed'], 1), 2),
+                    'duration_ms': round((ts - stats['since']) / 1e6, 1),
+                })
+
+        level = self.iceberg_levels.get((side, price))
+        if level is not None:
+            level['filled'] += size
+
+        # Display emptied by this fill - a refill at the same price is an iceberg tranche
+        if size >= remaining:
+            self.recent_fills[order_id] = ts
+            if size >= self.level_size[side].get(price, 0):
+                self.depleted[(side, price)] = ts
+            if len(self.recent_fills) > 10000:
+                self.recent_fills.clear()
+            if len(self.depleted) > 1000:
+                self.depleted.clear()
+
+    def _check_refill(self, order_id, side, price, size, ts):
+        """Same order id re-displayed, or a new order at a level a fill just emptied"""
+        filled_ts = self.recent_fills.pop(order_id, None)
+        same_order = filled_ts is not None
+        level_ts = self.depleted.pop((side, price), None)
+        if filled_ts is None:
+            filled_ts = level_ts
+        if filled_ts is None or ts - filled_ts > REFILL_WINDOW_NS:
+            return
+
+        key = (side, price)
+        level = self.iceberg_levels.pop(key, None)
+        if level is None:
+            level = {'side': 'BUY' if side == 'B' else 'SELL', 'price': price / PRICE_SCALE,
+                     'refills': 0, 'refill_volume': 0, 'filled': 0, 'first_ts': ts}
+        level['refills'] += 1
+        level['refill_volume'] += size
+        level['last_ts'] = ts
+        level['chunk'] = size
+        self.iceberg_levels[key] = level  # Most recently active last
+        while len(self.iceberg_levels) > MAX_EVENTS:
+            self.iceberg_levels.popitem(last=False)
+
+        self.icebergs.append({'ts': ts, 'side': level['side'], 'price': level['price'],
+                              'size': size, 'refills': level['refills'],
+                              'same_order': same_order})
+
+    # ----------------------------------------
+    # Snapshots
+    # ----------------------------------------
+    def depth(self, levels=10):
+        """Top levels per side: [(price, size, order_count), ...] best first"""
+        with self.lock:
+            bids = self.prices['B'][-levels:][::-1]
+            asks = self.prices['A'][:levels]
+            return {
+                'bids': [(p / PRICE_SCALE, self.level_size['B'][p], len(self.queues['B'][p])) for p in bids],
+                'asks': [(p / PRICE_SCALE, self.level_size['A'][p], len(self.queues['A'][p])) for p in asks],
+            }
+
+    def get_icebergs(self, limit=20):
+        """Price levels with detected refills, most recently active first"""
+        with self.lock:
+            levels = list(self.iceberg_levels.values())[-limit:][::-1]
+            return [dict(level, confidence='HIGH' if level['refills'] >= 3 else 'MEDIUM') for level in levels]
+
+    def get_absorptions(self, limit=20):
+        with self.lock:
+            return list(self.absorptions)[-limit:][::-1]
+
+    def summary(self):
+        with self.lock:
+            best_bid = self.best('B')
+            best_ask = self.best('A')
+            return {
+                'best_bid': best_bid / PRICE_SCALE if best_bid is not None else None,
+                'best_ask': best_ask / PRICE_SCALE if best_ask is not None else None,
+                'orders': len(self.orders),
+                'bid_levels': len(self.prices['B']),
+                'ask_levels': len(self.prices['A']),
+                'iceberg_levels': len(self.iceberg_levels),
+                'iceberg_events': len(self.icebergs),
+                'absorption_events': len(self.absorptions),
+                'events': self.events,
+                'last_ts': self.last_ts,
+            }
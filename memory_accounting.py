@@ -0,0 +1,192 @@
+"""
+Memory Accounting for Project Horizon
+Approximate size / element count of the long-lived structures, per-structure
+budgets and tracemalloc snapshot diffs between calls (leak hunting)
+"""
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from itertools import islice
+
+SAMPLE_ITEMS = 200      # Elements measured per container, the rest is extrapolated
+MAX_DEPTH = 6           # Nesting followed before an object is counted shallow
+TRACEMALLOC_FRAMES = int(os.environ.get('TRACEMALLOC_FRAMES', 1))
+
+
+def _parse_budgets(spec):
+    """MEMORY_BUDGETS='delta_history=20,tpo_state=50' (MB) -> {name: bytes}"""
+    budgets = {}
+    for part in (spec or '').split(','):
+        if '=' not in part:
+            continue
+        name, mb = part.split('=', 1)
+        try:
+            budgets[name.strip()] = int(float(mb) * 1024 * 1024)
+        except ValueError:
+            pass
+    return budgets
+
+
+def approx_sizeof(obj, depth=0):
+    """Deep size in bytes. Large containers are sampled (first SAMPLE_ITEMS) and
+    extrapolated, so cost stays bounded however big the structure grows."""
+    size = sys.getsizeof(obj)
+    if depth >= MAX_DEPTH or isinstance(obj, (str, bytes, bytearray, int, float, bool)) or obj is None:
+        return size
+    if isinstance(obj, dict):
+        n = len(obj)
+        if not n:
+            return size
+        sample = list(islice(obj.items(), SAMPLE_ITEMS))
+        sampled = sum(approx_sizeof(k, depth + 1) + approx_sizeof(v, depth + 1) for k, v in sample)
+        return size + sampled * n // len(sample)
+    if isinstance(obj, (list, tuple, set, frozenset)) or hasattr(obj, 'maxlen'):
+        n = len(obj)
+        if not n:
+            return size
+        sample = list(islice(obj, SAMPLE_ITEMS))
+        sampled = sum(approx_sizeof(item, depth + 1) for item in sample)
+        return size + sampled * n // len(sample)
+    if hasattr(obj, '__dict__'):
+        return size + approx_sizeof(vars(obj), depth + 1)
+    return size
+
+
+def element_count(obj):
+    try:
+        return len(obj)
+    except TypeError:
+        return None
+
+
+def rss_bytes():
+    """Current resident set size (Linux /proc), falling back to peak RSS"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except (ImportError, ValueError):
+        return None
+
+
+class MemoryAccountant:
+    """Registry of named structures (name -> getter) measured on demand"""
+
+    def __init__(self, budgets=None):
+        self.sources = {}           # name -> (subsystem, getter)
+        self.budgets = dict(budgets if budgets is not None else _parse_budgets(os.environ.get('MEMORY_BUDGETS')))
+        self.previous = {}          # name -> bytes at previous report
+        self.previous_ts = None
+        self.snapshot = None        # Last tracemalloc snapshot
+        self.snapshot_ts = None
+        self._lock = threading.Lock()
+
+    def register(self, name, getter, subsystem='core'):
+        """getter() returns the live object - looked up at report time so rebinding is fine"""
+        self.sources[name] = (subsystem, getter)
+
+    def measure(self, lock=None):
+        """Size every registered structure. Holding `lock` keeps the ingest thread
+        from mutating deques/dicts mid-iteration."""
+        rows = []
+        for name, (subsystem, getter) in self.sources.items():
+            try:
+                if lock is not None:
+                    with lock:
+                        obj = getter()
+                        size = approx_sizeof(obj)
+                        count = element_count(obj)
+                else:
+                    obj = getter()
+                    size = approx_sizeof(obj)
+                    count = element_count(obj)
+            except Exception as e:
+                rows.append({'name': name, 'subsystem': subsystem, 'error': str(e)})
+                continue
+            rows.append({'name': name, 'subsystem': subsystem, 'bytes': size, 'count': count})
+        return rows
+
+    def report(self, lock=None):
+        now = time.time()
+        with self._lock:
+            rows = self.measure(lock)
+            subsystems = {}
+            for row in rows:
+                if 'bytes' not in row:
+                    continue
+                name = row['name']
+                row['mb'] = round(row['bytes'] / 1048576, 3)
+                if name in self.previous:
+                    row['growth_bytes'] = row['bytes'] - self.previous[name]
+                budget = self.budgets.get(name) or self.budgets.get(row['subsystem'])
+                if budget:
+                    row['budget_mb'] = round(budget / 1048576, 3)
+                    row['over_budget'] = row['bytes'] > budget
+                self.previous[name] = row['bytes']
+                subsystems[row['subsystem']] = subsystems.get(row['subsystem'], 0) + row['bytes']
+            rows.sort(key=lambda r: r.get('bytes', 0), reverse=True)
+            report = {
+                'timestamp': now,
+                'since_previous_seconds': round(now - self.previous_ts, 1) if self.previous_ts else None,
+                'rss_mb': round((rss_bytes() or 0) / 1048576, 1),
+                'tracked_mb': round(sum(subsystems.values()) / 1048576, 3),
+                'subsystems': {k: round(v / 1048576, 3) for k, v in sorted(subsystems.items(), key=lambda kv: -kv[1])},
+                'structures': rows,
+            }
+            self.previous_ts = now
+            return report
+
+    # ----------------------------------------
+    # tracemalloc
+    # ----------------------------------------
+    def start_tracing(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        with self._lock:
+            self.snapshot = None
+
+    def stop_tracing(self):
+        with self._lock:
+            self.snapshot = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def tracemalloc_diff(self, limit=20):
+        """Top allocation sites by growth since the previous call (first call = baseline)"""
+        if not tracemalloc.is_tracing():
+            return {'tracing': False}
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        now = time.time()
+        current, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            previous, previous_ts = self.snapshot, self.snapshot_ts
+            self.snapshot, self.snapshot_ts = snapshot, now
+        result = {
+            'tracing': True,
+            'traced_mb': round(current / 1048576, 3),
+            'peak_mb': round(peak / 1048576, 3),
+        }
+        if previous is None:
+            result['baseline'] = True
+            result['top'] = [{'site': str(stat.traceback), 'size_kb': round(stat.size / 1024, 1), 'count': stat.count}
+                             for stat in snapshot.statistics('lineno')[:limit]]
+            return result
+        result['since_seconds'] = round(now - previous_ts, 1)
+        result['growth'] = [
+            {'site': str(stat.traceback), 'size_diff_kb': round(stat.size_diff / 1024, 1),
+             'size_kb': round(stat.size / 1024, 1), 'count_diff': stat.count_diff}
+            for stat in snapshot.compare_to(previous, 'lineno')[:limit]
+        ]
+        return result
@@ -0,0 +1,209 @@
+"""
+Notification Dispatcher for Project Horizon
+Discord webhook delivery on a background thread - callers enqueue and return at once.
+Repeats of the same alert within a window are coalesced into one message, and
+each webhook is rate limited (honouring Discord's 429 retry_after)
+"""
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+
+COALESCE_WINDOW = 60        # Seconds a key waits after a send before its next message
+MIN_INTERVAL = 0.5          # Seconds between requests to one webhook (Discord allows ~5 per 2s)
+MAX_PENDING = 100           # Distinct keys waiting for delivery; new keys beyond this are dropped
+MAX_ATTEMPTS = 3            # Delivery attempts for non rate-limit failures
+TIMEOUT = 10
+
+
+class Notification:
+    __slots__ = ('key', 'url', 'title', 'message', 'color', 'first_ts', 'last_ts', 'count', 'due', 'attempts')
+
+    def __init__(self, key, url, title, message, color, now, due):
+        self.key = key
+        self.url = url
+        self.title = title
+        self.message = message
+        self.color = color
+        self.first_ts = now
+        self.last_ts = now
+        self.count = 1
+        self.due = due
+        self.attempts = 0
+
+    def merge(self, title, message, color, now):
+        """Keep the latest text, count the repeats"""
+        self.title, self.message, self.color = title, message, color
+        self.last_ts = now
+        self.count += 1
+
+    def payload(self, footer):
+        message = self.message
+        if self.count > 1:
+            message += f"\n\n_x{self.count} in {self.last_ts - self.first_ts:.0f}s (coalesced)_"
+        return {
+            "embeds": [{
+                "title": self.title,
+                "description": message[:4000],
+                "color": self.color,
+                "timestamp": datetime.fromtimestamp(self.last_ts, timezone.utc).isoformat(),
+                "footer": {"text": footer}
+            }]
+        }
+
+
+class NotificationDispatcher:
+    """Bounded, coalescing queue drained by one worker thread.
+
+    notify() never blocks on the network: it merges into a pending message with the
+    same key or adds a new one, and returns False if the queue is full.
+    """
+
+    def __init__(self, default_url=None, footer='Project Horizon Monitor', window=COALESCE_WINDOW,
+                 min_interval=MIN_INTERVAL, max_pending=MAX_PENDING, counter=None):
+        self.default_url = default_url
+        self.footer = footer
+        self.window = window
+        self.min_interval = min_interval
+        self.max_pending = max_pending
+        self.counter = counter        # Optional MetricFamily labelled by outcome
+        self.pending = {}             # key -> Notification
+        self.last_sent = {}           # key -> ts of last delivery
+        self.blocked_until = {}       # url -> earliest next request (rate limit)
+        self.stats = {'queued': 0, 'coalesced': 0, 'sent': 0, 'failed': 0, 'dropped': 0, 'rate_limited': 0}
+        self.last_error = None
+        self.send_seconds = 0.0
+        self.cond = threading.Condition()
+        self.thread = None
+
+    def _count(self, outcome, amount=1):
+        self.stats[outcome] += amount
+        if self.counter is not None:
+            self.counter.labels(outcome).inc(amount)
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, name='notification_dispatcher', daemon=True)
+            self.thread.start()
+
+    def notify(self, title, message, color=16711680, key=None, url=None):
+        """Queue a message; repeats of `key` (default: title) within the window are merged"""
+        url = url or self.default_url
+        if not url:
+            return False
+        key = key or title
+        now = time.time()
+        with self.cond:
+            notification = self.pending.get(key)
+            if notification is not None:
+                notification.merge(title, message, color, now)
+                self._count('coalesced')
+                return True
+            if len(self.pending) >= self.max_pending:
+                self._count('dropped')
+                return False
+            due = max(now, self.last_sent.get(key, 0) + self.window)
+            self.pending[key] = Notification(key, url, title, message, color, now, due)
+            self._count('queued')
+            self.cond.notify()
+        return True
+
+    # ----------------------------------------
+    # Worker
+    # ----------------------------------------
+    def _next(self):
+        """Block until a notification is due (and its webhook is not rate limited), then pop it"""
+        with self.cond:
+            while True:
+                now = time.time()
+                best, best_at = None, None
+                for notification in self.pending.values():
+                    at = max(notification.due, self.blocked_until.get(notification.url, 0))
+                    if best_at is None or at < best_at:
+                        best, best_at = notification, at
+                if best is not None and best_at <= now:
+                    return self.pending.pop(best.key)
+                self.cond.wait(None if best is None else best_at - now)
+
+    def _requeue(self, notification, due):
+        """Put a failed message back, folding in anything queued for its key meanwhile"""
+        with self.cond:
+            newer = self.pending.get(notification.key)
+            if newer is not None:
+                notification.merge(newer.title, newer.message, newer.color, newer.last_ts)
+                notification.count += newer.count - 1
+            notification.due = due
+            self.pending[notification.key] = notification
+            self.cond.notify()
+
+    def _post(self, notification):
+        """(ok, retry_after seconds or None, error)"""
+        data = json.dumps(notification.payload(self.footer)).encode('utf-8')
+        req = urllib.request.Request(
+            notification.url,
+            data=data,
+            headers={'Content-Type': 'application/json', 'User-Agent': 'ProjectHorizon/1.0'}
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=TIMEOUT) as response:
+                # Bucket exhausted: wait for the reset before the next request
+                if response.headers.get('X-RateLimit-Remaining') == '0':
+                    reset_after = float(response.headers.get('X-RateLimit-Reset-After') or 0)
+                    self.blocked_until[notification.url] = time.time() + reset_after
+                return True, None, None
+        except urllib.error.HTTPError as e:
+            if e.code == 429:
+                retry_after = e.headers.get('Retry-After')
+                try:
+                    retry_after = float(json.loads(e.read().decode('utf-8')).get('retry_after', retry_after))
+                except (ValueError, AttributeError, TypeError):
+                    pass
+                return False, float(retry_after or 1), 'HTTP 429'
+            return False, None, f'HTTP {e.code}'
+        except Exception as e:
+            return False, None, str(e)
+
+    def _run(self):
+        while True:
+            notification = self._next()
+            started = time.time()
+            ok, retry_after, error = self._post(notification)
+            finished = time.time()
+            self.send_seconds += finished - started
+            self.blocked_until[notification.url] = max(self.blocked_until.get(notification.url, 0),
+                                                       finished + self.min_interval)
+            if ok:
+                self.last_sent[notification.key] = finished
+                self._count('sent')
+                print(f"📨 Discord alert sent: {notification.title}"
+                      + (f" (x{notification.count})" if notification.count > 1 else ""))
+                continue
+            self.last_error = {'ts': finished, 'title': notification.title, 'error': error}
+            if retry_after is not None:
+                self._count('rate_limited')
+                self.blocked_until[notification.url] = finished + retry_after
+                self._requeue(notification, finished + retry_after)
+                continue
+            notification.attempts += 1
+            if notification.attempts < MAX_ATTEMPTS:
+                self._requeue(notification, finished + 2 ** notification.attempts)
+            else:
+                self._count('failed')
+                print(f"⚠️  Discord alert failed: {error}")
+
+    def report(self):
+        now = time.time()
+        with self.cond:
+            pending = [{'key': n.key, 'title': n.title, 'count': n.count, 'attempts': n.attempts,
+                        'due_in': round(max(0.0, n.due - now), 1)} for n in self.pending.values()]
+        return {
+            'running': self.thread is not None and self.thread.is_alive(),
+            'stats': dict(self.stats),
+            'pending': pending,
+            'rate_limited_for': {url[-12:]: round(ts - now, 1) for url, ts in self.blocked_until.items() if ts > now},
+            'send_seconds': round(self.send_seconds, 3),
+            'last_error': self.last_error,
+            'window': self.window,
+        }
@@ -11,16 +11,29 @@ warnings.filterwarnings('ignore', category=DeprecationWarning)
 
 print("🆕 BUILD 2026-01-26-fix-warnings LOADED")
 import os
+import sys
 import json
 import threading
 import time
 from datetime import datetime, timedelta, timezone
-from collections import deque
 from http.server import HTTPServer, BaseHTTPRequestHandler, ThreadingHTTPServer
 import urllib.request
 import urllib.error
 import ssl
 import pytz
+from feed_metrics import LatencyTracker, MetricsRegistry, TimedLock, LockDomain, SIZE_BUCKETS
+import sampling_profiler
+from memory_accounting import MemoryAccountant, rss_bytes
+from ring_buffer import RingBuffer
+from aggregator_pipeline import Aggregator, AggregatorPipeline, TradeContext
+from vwap_engine import VWAPEngine
+from alert_rules import AlertEngine, AlertStream, RuleError
+from notification_dispatcher import NotificationDispatcher
+from trade_idea_store import TradeIdeaStore
+from session_store import SessionStore
+from startup_orchestrator import StartupOrchestrator
+from tick_archive import TickArchive, trading_day
+import state_checkpoint
 
 # Load .env file if it exists (fallback for API key)
 def load_env_file():
@@ -44,6 +57,12 @@ load_env_file()
 
 try:
     import databento as db
+    from dbn_cache import DBNCache, get_range_to_file
+    from historical_pipeline import (TradeFrame, TradeHistory, summary, volume_profile, value_area,
+                                     candles, local_minutes, session_table, session_bars, day_start,
+                                     iter_batches, iter_rows, instrument_totals, BarFrame, ohlc, BAR_DAYS,
+                                     session_value_areas, profile_value_area, DAY_NS, SETTLE_NS)
+    import numpy as np
     HAS_DATABENTO = True
 except ImportError:
     HAS_DATABENTO = False
@@ -87,6 +106,24 @@ except ImportError:
     HAS_TRADE_METRICS = False
     print("⚠️  trade_metrics_helpers not found")
 
+# Footprint engine (bid/ask volume-at-price per candle)
+try:
+    from footprint_engine import FootprintEngine, IMBALANCE_RATIO as FOOTPRINT_IMBALANCE_RATIO
+    HAS_FOOTPRINT = True
+    print("✅ Footprint engine loaded")
+except ImportError:
+    HAS_FOOTPRINT = False
+    print("⚠️  footprint_engine not found - stacked imbalances disabled")
+
+# MBO order book engine (CME icebergs / absorption)
+try:
+    from mbo_book import MBOBook
+    HAS_MBO_BOOK = True
+    print("✅ MBO book engine loaded")
+except ImportError:
+    HAS_MBO_BOOK = False
+    print("⚠️  mbo_book not found - CME iceberg detection disabled")
+
 # Discord webhook for alerts
 DISCORD_WEBHOOK_URL = os.environ.get('DISCORD_WEBHOOK_URL', 'https://discord.com/api/webhooks/839103546740703323/OmhtJBeEAvzFvJ2BtzIC7XhydCvEe0XigPaHC2HhKziNzCVZNlup6UrGrgkzM-Fcw8yq')
 
@@ -165,47 +202,37 @@ startup_complete = False  # Flag to prevent HTTP blocking during startup
 # ============================================
 # UNIFIED TRADE IDEAS RECORDING SYSTEM
 # ============================================
-# Records both Zone Participation and Clawd trade ideas in trades_data.json
-# Uses the existing persistent file for durability across deployments
+# Records both Zone Participation and Clawd trade ideas in a WAL-mode SQLite file next to
+# the legacy trades_data.json (imported once on first start)
 trades_data_file = os.path.join(os.path.dirname(__file__), 'trades_data.json')
+trade_ideas_db_file = os.environ.get('TRADE_IDEAS_DB', os.path.join(os.path.dirname(__file__), 'trade_ideas.db'))
 trade_ideas_lock = threading.Lock()
+trade_store = TradeIdeaStore(trade_ideas_db_file)
+try:
+    migrated = trade_store.migrate_json(trades_data_file)
+    if migrated:
+        print(f"💾 Migrated {migrated} trade ideas from trades_data.json to {os.path.basename(trade_ideas_db_file)}")
+except Exception as e:
+    print(f"⚠️ Error migrating trades data: {e}")
 
 def load_trades_data():
-    """Load all trades data from persistent file."""
+    """All recorded ideas, oldest first."""
     try:
-        if os.path.exists(trades_data_file):
-            with open(trades_data_file, 'r') as f:
-                return json.load(f)
+        return trade_store.query()
     except Exception as e:
         print(f"⚠️ Error loading trades data: {e}")
     return []
 
-def save_trades_data(data):
-    """Save trades data to persistent file."""
-    try:
-        with open(trades_data_file, 'w') as f:
-            json.dump(data, f, indent=2)
-        print(f"💾 Saved {len(data)} trades to trades_data.json")
-    except Exception as e:
-        print(f"⚠️ Error saving trades data: {e}")
-
 def record_zone_idea(asset, zone_data, current_price):
     """Record a Zone Participation trade idea with full Entry/SL/TP details."""
     with trade_ideas_lock:
-        trades = load_trades_data()
-
         zone_name = zone_data.get('name', '')
         zone_price = zone_data.get('price', 0)
         now = time.time()
 
         # Check for duplicates (same zone within 30 min)
-        for existing in trades[-100:]:
-            if (existing.get('source') == 'ZONE' and
-                existing.get('zone_name') == zone_name and
-                existing.get('contract', '').startswith(asset[:2]) and
-                abs(existing.get('zone_price', 0) - zone_price) < 5 and
-                now - existing.get('timestamp_unix', 0) < 1800):
-                return None  # Already recorded
+        if trade_store.recent_zone_idea(zone_name, asset[:2], zone_price, now - 1800):
+            return None  # Already recorded
 
         trade_framework = zone_data.get('trade', {})
         targets = trade_framework.get('targets', [])
@@ -263,28 +290,18 @@ def record_zone_idea(asset, zone_data, current_price):
             'outcome': None
         }
 
-        trades.append(idea)
-
-        # Keep file manageable (last 1000 trades)
-        if len(trades) > 1000:
-            trades = trades[-1000:]
-
-        save_trades_data(trades)
+        trade_store.insert(idea)
         print(f"📝 ZONE idea recorded: {asset} {direction} @ {zone_name} ({zone_price}) - Entry: {entry_price}, SL: {stop_price}, T1: {t1}")
         return idea
 
 def record_clawd_signal(contract, signal_data):
     """Record a Clawd Bot trade signal with full Entry/SL/TP details."""
     with trade_ideas_lock:
-        trades = load_trades_data()
         now = time.time()
 
         # Check for duplicates (same signal within 5 min)
-        for existing in trades[-50:]:
-            if (existing.get('source') == 'CLAWD' and
-                existing.get('contract') == contract and
-                now - existing.get('timestamp_unix', 0) < 300):
-                return None  # Already recorded
+        if trade_store.recent_signal('CLAWD', contract, now - 300):
+            return None  # Already recorded
 
         # Parse signal data
         bias = signal_data.get('bias', 'NEUTRAL').upper()
@@ -330,49 +347,24 @@ def record_clawd_signal(contract, signal_data):
             'outcome': signal_data.get('outcome', None)
         }
 
-        trades.append(idea)
-
-        if len(trades) > 1000:
-            trades = trades[-1000:]
-
-        save_trades_data(trades)
+        trade_store.insert(idea)
         print(f"📝 CLAWD signal recorded: {contract} {direction} - Entry: {entry}, SL: {stop}, Targets: {targets}")
         return idea
 
 def update_trade_outcome(trade_id_or_timestamp, outcome_data):
     """Update a trade's outcome (WIN/LOSS)."""
     with trade_ideas_lock:
-        trades = load_trades_data()
-        for trade in trades:
-            if (trade.get('timestamp') == trade_id_or_timestamp or
-                trade.get('timestamp_unix') == trade_id_or_timestamp):
-                trade['outcome'] = outcome_data
-                trade['status'] = outcome_data.get('result', 'EVALUATED')
-                save_trades_data(trades)
-                return True
-        return False
+        return trade_store.update_outcome(trade_id_or_timestamp, outcome_data)
 
 def get_zone_ideas(asset=None, days=7):
     """Get Zone ideas for comparison."""
-    trades = load_trades_data()
     cutoff = time.time() - (days * 24 * 3600)
-
-    zone_trades = [t for t in trades
-                   if t.get('source') == 'ZONE'
-                   and t.get('timestamp_unix', 0) > cutoff
-                   and (asset is None or t.get('asset') == asset)]
-    return zone_trades
+    return trade_store.query(source='ZONE', asset=asset, since=cutoff)
 
 def get_clawd_signals(asset=None, days=7):
     """Get Clawd signals for comparison."""
-    trades = load_trades_data()
     cutoff = time.time() - (days * 24 * 3600)
-
-    clawd_trades = [t for t in trades
-                    if t.get('source') == 'CLAWD'
-                    and t.get('timestamp_unix', 0) > cutoff
-                    and (asset is None or t.get('asset') == asset)]
-    return clawd_trades
+    return trade_store.query(source='CLAWD', asset=asset, since=cutoff)
 
 # Legacy compatibility - redirect to new system
 def load_zone_ideas():
@@ -693,10 +685,45 @@ def generate_btc_backtest_from_zones(start_date='2025-01-30'):
         import traceback
         return {'error': str(e), 'traceback': traceback.format_exc()}
 
+# ============================================
+# METRICS (/metrics, Prometheus text format)
+# ============================================
+# Hot paths only bump counters / record into fixed histograms; gauges are computed at scrape
+metrics_registry = MetricsRegistry()
+TRADES_TOTAL = metrics_registry.counter('trades_total', 'Trades applied to state', ('contract',))
+QUOTES_TOTAL = metrics_registry.counter('quotes_total', 'Top-of-book quotes received', ('contract',))
+RECORDS_DROPPED = metrics_registry.counter('records_dropped_total', 'Live records dropped before processing', ('reason',))
+PROCESS_TRADE_SECONDS = metrics_registry.histogram('process_trade_seconds', 'process_trade duration')
+AGGREGATOR_SECONDS = metrics_registry.histogram('aggregator_seconds', 'Per-stage process_trade duration', ('stage',))
+LOCK_WAIT_SECONDS = metrics_registry.histogram('lock_wait_seconds', 'Time spent waiting for the global state lock')
+LOCK_HOLD_SECONDS = metrics_registry.histogram('lock_hold_seconds', 'Time the global state lock is held')
+HTTP_REQUEST_SECONDS = metrics_registry.histogram('http_request_seconds', 'HTTP handler duration', ('method', 'route'))
+HTTP_RESPONSE_BYTES = metrics_registry.histogram('http_response_bytes', 'HTTP response body size', ('method', 'route'), buckets=SIZE_BUCKETS, unit=1)
+CACHE_REQUESTS = metrics_registry.counter('cache_requests_total', 'TTL cache lookups', ('cache', 'result'))
+RECONNECTS = metrics_registry.counter('databento_reconnects_total', 'Databento live reconnect attempts', ('stream',))
+WS_MESSAGES = metrics_registry.counter('websocket_messages_total', 'Crypto websocket messages received', ('exchange',))
+
+
+def cache_is_fresh(name, cache, now):
+    """TTL cache check that also counts hits/misses for /metrics"""
+    fresh = bool(cache['data']) and (now - cache['timestamp']) < cache['ttl']
+    CACHE_REQUESTS.labels(name, 'hit' if fresh else 'miss').inc()
+    return fresh
+
+
 # ============================================
 # GLOBAL STATE
 # ============================================
-lock = threading.Lock()
+# LOCK_PROFILE=true attributes every acquisition to its call site (see /debug/locks)
+lock = TimedLock(LOCK_WAIT_SECONDS.labels(), LOCK_HOLD_SECONDS.labels(),
+                 profile=os.environ.get('LOCK_PROFILE', 'false').lower() == 'true')
+
+# Lock domains - all share the global lock today. To split one out, point it at
+# its own TimedLock (e.g. LockDomain(TimedLock(...), 'tpo')); call sites stay the same.
+tpo_lock = LockDomain(lock, 'tpo')          # tpo_state profiles / metrics
+candles_lock = LockDomain(lock, 'candles')  # volume candles, footprint
+cache_lock = LockDomain(lock, 'caches')     # merging live state into cached history
+zones_lock = LockDomain(lock, 'zones')      # zone ranking + idea recording
 
 # Get initial config based on ACTIVE_CONTRACT
 _init_config = CONTRACT_CONFIG.get(ACTIVE_CONTRACT, CONTRACT_CONFIG['GC'])
@@ -711,6 +738,12 @@ state = {
     'spot_gold_price': 0.0,  # XAUUSD spot price from Yahoo Finance
     'bid': 0.0,
     'ask': 0.0,
+    'bid_size': 0,
+    'ask_size': 0,
+    'spread': 0.0,
+    'quote_imbalance': 0.0,  # (bid_size - ask_size) / (bid_size + ask_size), -1..1
+    'microprice': 0.0,
+    'quote_ts': 0,  # Local time of last applied quote (0 = no quote stream)
     'data_source': 'INITIALIZING',
     
     # Delta tracking
@@ -783,6 +816,7 @@ state = {
     'us_ib_vwap_denominator': 0.0,
     'us_ib_vwap_date': '',
     'ny_1h_vwap': 0.0,  # Anchored from 09:30 ET (NY open)
+    'week_vwap': 0.0,  # Anchored from Sunday 18:00 ET
     'ny_1h_vwap_numerator': 0.0,
     'ny_1h_vwap_denominator': 0.0,
     'ny_1h_vwap_date': '',
@@ -841,6 +875,7 @@ state = {
     'buying_imbalance_pct': 0,
     'absorption_ratio': 0.0,
     'stacked_buy_imbalances': 0,
+    'stacked_sell_imbalances': 0,
     'current_phase': 'INITIALIZING',
     'current_session_id': '',
     'current_session_name': '',
@@ -866,12 +901,35 @@ state = {
     
     # Latency
     'last_update': '',
+    'last_processed_ns': 0,  # Local time.time_ns() when the last trade finished processing
+    'last_ts_event': 0,      # Exchange timestamp of the last processed trade
     'market_open': False
 }
 
-delta_history = deque(maxlen=36000)
-volume_history = deque(maxlen=36000)  # (timestamp, buy_vol, sell_vol)
-price_history = deque(maxlen=1000)
+# Columnar ring buffers (array('d') per column) - range queries bisect on ts
+delta_history = RingBuffer(('ts', 'delta'), 36000)
+volume_history = RingBuffer(('ts', 'buy', 'sell'), 36000)
+price_history = RingBuffer(('ts', 'price'), 1000)
+
+# Feed latency: exchange -> recv -> processed -> published, per contract and session
+latency_tracker = LatencyTracker()
+LATENCY_TOTALS_TTL = 1.0  # Live payloads reuse the per-stage totals for this long
+_latency_totals = {'ts': 0.0, 'contract': None, 'totals': {}}
+profiler = sampling_profiler.SamplingProfiler()  # /debug/profile - one run at a time
+last_published_ns = 0  # last_processed_ns already measured at first publish
+
+
+def latency_totals(contract):
+    """Per-stage latency totals for the live payload, merged at most once per LATENCY_TOTALS_TTL"""
+    now = time.time()
+    cached = _latency_totals
+    if cached['contract'] != contract or now - cached['ts'] >= LATENCY_TOTALS_TTL:
+        cached.update(ts=now, contract=contract, totals=latency_tracker.totals(contract))
+    return cached['totals']
+
+
+# Footprint candles (5m/15m/30m/1h) - fed from process_trade under lock
+footprint = FootprintEngine(CONTRACT_CONFIG[ACTIVE_CONTRACT]['tick_size']) if HAS_FOOTPRINT else None
 last_session_id = None
 front_month_instrument_id = None  # Will be set from historical data
 
@@ -1166,7 +1224,7 @@ def load_tpo_cache(contract=None):
         # Restore day profile
         if 'day' in cache_data:
             day_cache = cache_data['day']
-            with lock:
+            with tpo_lock:
                 tpo_state['day']['profiles'] = day_cache.get('profiles', {})
                 tpo_state['day']['poc'] = day_cache.get('poc', 0)
                 tpo_state['day']['vah'] = day_cache.get('vah', 0)
@@ -1185,7 +1243,7 @@ def load_tpo_cache(contract=None):
         if 'sessions' in cache_data:
             for session_key, session_cache in cache_data['sessions'].items():
                 if session_key in tpo_state['sessions']:
-                    with lock:
+                    with tpo_lock:
                         tpo_state['sessions'][session_key]['profiles'] = session_cache.get('profiles', {})
                         tpo_state['sessions'][session_key]['poc'] = session_cache.get('poc', 0)
                         tpo_state['sessions'][session_key]['vah'] = session_cache.get('vah', 0)
@@ -1303,9 +1361,12 @@ def get_historical_big_trades_cached(contract=None, max_age_seconds=300):
     if (now - cache['last_loaded'] > max_age_seconds or
         cache['contract'] != contract or
         len(cache['trades']) == 0):
+        CACHE_REQUESTS.labels('historical_big_trades', 'miss').inc()
         cache['trades'] = load_historical_big_trades(contract)
         cache['last_loaded'] = now
         cache['contract'] = contract
+    else:
+        CACHE_REQUESTS.labels('historical_big_trades', 'hit').inc()
 
     return cache['trades']
 
@@ -1341,7 +1402,8 @@ def fetch_historical_big_trades_from_databento():
         print(f"   Querying trades from {start_ts} to {end_ts}...")
 
         client = db.Historical(key=API_KEY)
-        data = client.timeseries.get_range(
+        data = historical_range(
+            client,
             dataset='GLBX.MDP3',
             symbols=[symbol],
             stype_in='parent',
@@ -1350,72 +1412,64 @@ def fetch_historical_big_trades_from_databento():
             end=end_ts
         )
 
-        records = list(data)
-        print(f"   Got {len(records)} trade records")
-
-        if not records:
+        # Pass 1 (streamed in batches): trades and a size histogram per instrument, enough
+        # for the front month and its P90 size without keeping any trades
+        size_counts = {}
+        for batch in iter_batches(data):
+            ids, inverse = np.unique(batch['instrument_id'], return_inverse=True)
+            for i, iid in enumerate(ids.tolist()):
+                counts = np.bincount(batch['size'][inverse == i])
+                previous = size_counts.get(iid)
+                if previous is not None:
+                    if len(previous) > len(counts):
+                        previous, counts = counts, previous
+                    counts[:len(previous)] += previous
+                size_counts[iid] = counts
+
+        total_records = sum(int(counts.sum()) for counts in size_counts.values())
+        print(f"   Got {total_records} trade records")
+
+        if not total_records:
             return
 
         # Find front month instrument (most trades)
-        by_instrument = {}
-        for r in records:
-            iid = r.instrument_id
-            by_instrument[iid] = by_instrument.get(iid, 0) + 1
-
-        front_month_iid = max(by_instrument.items(), key=lambda x: x[1])[0]
+        front_month_iid = max(size_counts, key=lambda iid: size_counts[iid].sum())
         print(f"   Front month instrument ID: {front_month_iid}")
 
         # Calculate 90th percentile threshold from this data
-        trade_sizes = []
-        for r in records:
-            if r.instrument_id != front_month_iid:
-                continue
-            size = getattr(r, 'size', 1)
-            trade_sizes.append(size)
-
-        if len(trade_sizes) < 100:
+        front_sizes = size_counts[front_month_iid]
+        trade_count = int(front_sizes.sum())
+        if trade_count < 100:
             threshold = 5  # Default
         else:
-            sorted_sizes = sorted(trade_sizes)
-            p90_idx = int(len(sorted_sizes) * 0.90)
-            threshold = max(5, sorted_sizes[p90_idx])  # Minimum threshold of 5
+            p90_idx = int(trade_count * 0.90)
+            p90_size = int(np.searchsorted(np.cumsum(front_sizes), p90_idx, side='right'))
+            threshold = max(5, p90_size)  # Minimum threshold of 5
 
-        print(f"   Calculated P90 threshold: {threshold} contracts (from {len(trade_sizes)} trades)")
+        print(f"   Calculated P90 threshold: {threshold} contracts (from {trade_count} trades)")
 
-        # Extract big trades (above threshold)
+        # Pass 2: extract big trades (above threshold)
         big_trades = []
-        for r in records:
-            if r.instrument_id != front_month_iid:
-                continue
-
-            size = getattr(r, 'size', 1)
-            if size < threshold:
-                continue
-
-            p = r.price / 1e9 if r.price > 1e6 else r.price
-            if p < price_min or p > price_max:
-                continue
-
-            # Determine side from aggressor field
-            side_code = getattr(r, 'side', None)
-            if side_code == 'A':
-                side = 'BUY'
-            elif side_code == 'B':
-                side = 'SELL'
-            else:
-                side = 'BUY' if r.price > 0 else 'SELL'  # Fallback
-
-            ts_ns = r.ts_event if hasattr(r, 'ts_event') else getattr(r, 'ts_recv', 0)
-            ts_sec = ts_ns / 1e9
+        for batch in iter_batches(data):
+            batch = batch[(batch['instrument_id'] == front_month_iid) & (batch['size'] >= threshold)]
+            prices = batch['price'] / 1e9
+            valid = (prices >= price_min) & (prices <= price_max)
+            batch, prices = batch[valid], prices[valid]
+
+            for ts_ns, p, size, side_code in zip(batch['ts_event'].tolist(), prices.tolist(),
+                                                 batch['size'].tolist(), batch['side'].tolist()):
+                # Determine side from aggressor field
+                side = 'SELL' if side_code == b'B' else 'BUY'
+                ts_sec = ts_ns / 1e9
 
-            big_trades.append({
-                'ts': ts_sec,
-                'price': p,
-                'size': size,
-                'side': side,
-                'delta_impact': size if side == 'BUY' else -size,
-                'date': datetime.fromtimestamp(ts_sec).strftime('%Y-%m-%d')
-            })
+                big_trades.append({
+                    'ts': ts_sec,
+                    'price': p,
+                    'size': size,
+                    'side': side,
+                    'delta_impact': size if side == 'BUY' else -size,
+                    'date': datetime.fromtimestamp(ts_sec).strftime('%Y-%m-%d')
+                })
 
         print(f"   Found {len(big_trades)} big trades (>= {threshold} contracts)")
 
@@ -1433,8 +1487,7 @@ def fetch_historical_big_trades_from_databento():
 
     except Exception as e:
         print(f"❌ Error fetching historical big trades: {e}")
-        import traceback
-        traceback.print_exc()
+        raise  # Startup task fails (/ready)
 
 def save_big_trade_to_cache(trades, contract=None, date_str=None):
     """Save multiple trades to cache file"""
@@ -2374,9 +2427,9 @@ def calculate_mp_fp_confluence(current_price, delta, delta_history_5m=None):
 # ============================================
 # TIME UTILITIES (ET)
 # ============================================
-def get_et_now():
-    """Get current time in ET (UTC-5)"""
-    utc_now = datetime.now(timezone.utc)
+def get_et_now(ts=None):
+    """Get current time (or epoch seconds ts) in ET (UTC-5)"""
+    utc_now = datetime.now(timezone.utc) if ts is None else datetime.fromtimestamp(ts, timezone.utc)
     et_offset = timedelta(hours=-5)
     return utc_now + et_offset
 
@@ -3355,7 +3408,6 @@ def fetch_pd_levels():
     if not HAS_DATABENTO or not API_KEY:
         print("⚠️  Cannot fetch PD levels - no Databento connection")
         return
-    symbol = config['symbol']
     price_min = config['price_min']
     price_max = config['price_max']
 
@@ -3402,106 +3454,25 @@ def fetch_pd_levels():
 
         print(f"   PD Session: {session_start_date} 18:00 ET → {session_end_date} 17:00 ET")
 
-        client = db.Historical(key=API_KEY)
-
-        # Fetch TRADES to filter by most active instrument (front month)
-        print(f"   Querying {symbol} trades for session {session_start_date} to {session_end_date}...")
-        data = client.timeseries.get_range(
-            dataset='GLBX.MDP3',
-            symbols=[symbol],
-            stype_in='parent',
-            schema='trades',
-            start=start_ts,
-            end=end_ts
-        )
-
-        records = list(data)
-        print(f"   Got {len(records)} trade records")
+        # Shared trade history: the day is loaded once for every historical consumer
+        frame = trade_history.window(ACTIVE_CONTRACT, _utc_str_to_ns(start_ts), _utc_str_to_ns(end_ts))
+        print(f"   Got {len(frame)} trade records")
 
-        # Group trades by instrument_id and track volume profile for VPOC
-        by_instrument = {}
-        volume_profile = {}  # price level -> total volume
+        iid = history_front_month()
         tick_size = config.get('tick_size', 0.10)
-
-        for r in records:
-            iid = r.instrument_id
-            p = r.price / 1e9 if r.price > 1e6 else r.price
-            size = getattr(r, 'size', 1)
-
-            # Skip invalid prices using contract-specific range
-            if p < price_min or p > price_max:
-                continue
-
-            if iid not in by_instrument:
-                by_instrument[iid] = {'count': 0, 'high': 0, 'low': float('inf'), 'first': p, 'last': p, 'volume_profile': {}}
-            by_instrument[iid]['count'] += 1
-            by_instrument[iid]['last'] = p
-            if p > by_instrument[iid]['high']:
-                by_instrument[iid]['high'] = p
-            if p < by_instrument[iid]['low']:
-                by_instrument[iid]['low'] = p
-
-            # Track volume at each price level (rounded to tick size)
-            price_level = round(p / tick_size) * tick_size
-            if price_level not in by_instrument[iid]['volume_profile']:
-                by_instrument[iid]['volume_profile'][price_level] = 0
-            by_instrument[iid]['volume_profile'][price_level] += size
-
-        if not by_instrument:
+        frame = frame.select(iid, price_min, price_max)
+        data = summary(frame)
+        if data is None:
             print("⚠️  No valid trades found for PD")
             return
 
-        # Find front month = instrument with most trades
-        front_month = max(by_instrument.items(), key=lambda x: x[1]['count'])
-        iid, data = front_month
-
-        # Set front month ID for live trade filtering (if not already set)
-        if front_month_instrument_id is None:
-            front_month_instrument_id = iid
-            print(f"   🎯 Front month instrument ID: {iid}")
-
         pd_high = data['high']
         pd_low = data['low']
-        pd_open = data['first']
-        pd_close = data['last']
-
-        # Calculate true VPOC (Volume Point of Control) - price with highest volume
-        volume_profile = data['volume_profile']
-        if volume_profile:
-            pdpoc = max(volume_profile.items(), key=lambda x: x[1])[0]
-        else:
-            # Fallback to typical price if no volume data
-            pdpoc = (pd_high + pd_low + pd_close) / 3
-
-        # Calculate PD VAH/VAL (70% of volume around POC)
-        pd_vah = pdpoc
-        pd_val = pdpoc
-        if volume_profile:
-            sorted_prices = sorted(volume_profile.keys())
-            total_volume = sum(volume_profile.values())
-            poc_idx = sorted_prices.index(pdpoc) if pdpoc in sorted_prices else len(sorted_prices) // 2
-
-            # Start from POC and expand outward until 70% of volume captured
-            vah_idx = poc_idx
-            val_idx = poc_idx
-            current_vol = volume_profile.get(sorted_prices[poc_idx], 0) if poc_idx < len(sorted_prices) else 0
-            target_vol = total_volume * 0.70
-
-            while current_vol < target_vol and (vah_idx < len(sorted_prices) - 1 or val_idx > 0):
-                vol_above = volume_profile.get(sorted_prices[vah_idx + 1], 0) if vah_idx < len(sorted_prices) - 1 else 0
-                vol_below = volume_profile.get(sorted_prices[val_idx - 1], 0) if val_idx > 0 else 0
-
-                if vol_above >= vol_below and vah_idx < len(sorted_prices) - 1:
-                    vah_idx += 1
-                    current_vol += vol_above
-                elif val_idx > 0:
-                    val_idx -= 1
-                    current_vol += vol_below
-                else:
-                    break
+        pd_open = data['open']
+        pd_close = data['close']
 
-            pd_vah = sorted_prices[vah_idx] if vah_idx < len(sorted_prices) else pd_high
-            pd_val = sorted_prices[val_idx] if val_idx >= 0 else pd_low
+        # True VPOC (price with highest volume) and the 70% value area around it
+        pdpoc, pd_vah, pd_val = value_area(*volume_profile(frame, tick_size))
 
         print(f"   Front month (ID {iid}): {data['count']} trades")
 
@@ -3525,15 +3496,15 @@ def fetch_pd_levels():
         print(f"✅ PD Levels loaded: High=${pd_high:.2f}, Low=${pd_low:.2f}, POC=${pdpoc:.2f}, VAH=${pd_vah:.2f}, VAL=${pd_val:.2f}")
 
         # Also fetch PD US IB and NY 1H from the same session data
-        fetch_pd_ny_sessions(records, iid, price_min, price_max, config.get('tick_size', 0.10), session_end_date)
+        fetch_pd_ny_sessions(frame, tick_size, session_end_date)
 
     except Exception as e:
         print(f"❌ Error fetching PD levels: {e}")
         import traceback
         traceback.print_exc()
 
-def fetch_pd_ny_sessions(records, front_month_iid, price_min, price_max, tick_size, session_end_date):
-    """Extract PD US IB and NY 1H from the already-fetched historical records"""
+def fetch_pd_ny_sessions(frame, tick_size, session_end_date):
+    """Extract PD US IB and NY 1H from the already-loaded front-month PD session trades"""
     global state
 
     try:
@@ -3541,86 +3512,25 @@ def fetch_pd_ny_sessions(records, front_month_iid, price_min, price_max, tick_si
         # NY 1H: 09:30-10:30 ET = 14:30-15:30 UTC
         # session_end_date is the calendar date when the session ended (17:00 ET)
         # So US IB and NY 1H happened on session_end_date itself
-
-        from datetime import datetime
-        import pytz
-        utc = pytz.UTC
-
-        # Calculate UTC timestamps for US IB and NY 1H on the end date
-        us_ib_start = datetime.strptime(f"{session_end_date} 13:20:00", "%Y-%m-%d %H:%M:%S").replace(tzinfo=utc)
-        us_ib_end = datetime.strptime(f"{session_end_date} 14:30:00", "%Y-%m-%d %H:%M:%S").replace(tzinfo=utc)
-        ny_1h_start = datetime.strptime(f"{session_end_date} 14:30:00", "%Y-%m-%d %H:%M:%S").replace(tzinfo=utc)
-        ny_1h_end = datetime.strptime(f"{session_end_date} 15:30:00", "%Y-%m-%d %H:%M:%S").replace(tzinfo=utc)
-
-        us_ib_start_ns = int(us_ib_start.timestamp() * 1e9)
-        us_ib_end_ns = int(us_ib_end.timestamp() * 1e9)
-        ny_1h_start_ns = int(ny_1h_start.timestamp() * 1e9)
-        ny_1h_end_ns = int(ny_1h_end.timestamp() * 1e9)
-
-        # Filter records for each session
-        us_ib_data = {'high': 0.0, 'low': float('inf'), 'volume_profile': {}, 'vwap_num': 0.0, 'vwap_den': 0.0}
-        ny_1h_data = {'high': 0.0, 'low': float('inf'), 'volume_profile': {}, 'vwap_num': 0.0, 'vwap_den': 0.0}
-
-        for r in records:
-            if r.instrument_id != front_month_iid:
-                continue
-
-            p = r.price / 1e9 if r.price > 1e6 else r.price
-            size = getattr(r, 'size', 1)
-            ts_ns = r.ts_event if hasattr(r, 'ts_event') else getattr(r, 'ts_recv', 0)
-
-            if p < price_min or p > price_max:
+        windows = {
+            'pd_us_ib': ('PD US IB', f"{session_end_date}T13:20:00Z", f"{session_end_date}T14:30:00Z"),
+            'pd_ny_1h': ('PD NY 1H', f"{session_end_date}T14:30:00Z", f"{session_end_date}T15:30:00Z"),
+        }
+        for key, (label, utc_start, utc_end) in windows.items():
+            window = frame.between(_utc_str_to_ns(utc_start), _utc_str_to_ns(utc_end))
+            stats = summary(window)
+            if stats is None:
                 continue
-
-            price_level = round(p / tick_size) * tick_size
-
-            # US IB (08:20-09:30 ET)
-            if us_ib_start_ns <= ts_ns < us_ib_end_ns:
-                if p > us_ib_data['high']:
-                    us_ib_data['high'] = p
-                if p < us_ib_data['low']:
-                    us_ib_data['low'] = p
-                us_ib_data['vwap_num'] += p * size
-                us_ib_data['vwap_den'] += size
-                us_ib_data['volume_profile'][price_level] = us_ib_data['volume_profile'].get(price_level, 0) + size
-
-            # NY 1H (09:30-10:30 ET)
-            if ny_1h_start_ns <= ts_ns < ny_1h_end_ns:
-                if p > ny_1h_data['high']:
-                    ny_1h_data['high'] = p
-                if p < ny_1h_data['low']:
-                    ny_1h_data['low'] = p
-                ny_1h_data['vwap_num'] += p * size
-                ny_1h_data['vwap_den'] += size
-                ny_1h_data['volume_profile'][price_level] = ny_1h_data['volume_profile'].get(price_level, 0) + size
-
-        # Calculate POC and VWAP for each session
-        with lock:
-            # US IB
-            if us_ib_data['high'] > 0 and us_ib_data['low'] < float('inf'):
-                us_ib_vwap = us_ib_data['vwap_num'] / us_ib_data['vwap_den'] if us_ib_data['vwap_den'] > 0 else 0
-                us_ib_poc = max(us_ib_data['volume_profile'].items(), key=lambda x: x[1])[0] if us_ib_data['volume_profile'] else 0
-                state['pd_us_ib'] = {
-                    'high': us_ib_data['high'],
-                    'low': us_ib_data['low'],
-                    'mid': (us_ib_data['high'] + us_ib_data['low']) / 2,
-                    'poc': us_ib_poc,
-                    'vwap': us_ib_vwap
-                }
-                print(f"✅ PD US IB: H=${us_ib_data['high']:.2f}, L=${us_ib_data['low']:.2f}, POC=${us_ib_poc:.2f}")
-
-            # NY 1H
-            if ny_1h_data['high'] > 0 and ny_1h_data['low'] < float('inf'):
-                ny_1h_vwap = ny_1h_data['vwap_num'] / ny_1h_data['vwap_den'] if ny_1h_data['vwap_den'] > 0 else 0
-                ny_1h_poc = max(ny_1h_data['volume_profile'].items(), key=lambda x: x[1])[0] if ny_1h_data['volume_profile'] else 0
-                state['pd_ny_1h'] = {
-                    'high': ny_1h_data['high'],
-                    'low': ny_1h_data['low'],
-                    'mid': (ny_1h_data['high'] + ny_1h_data['low']) / 2,
-                    'poc': ny_1h_poc,
-                    'vwap': ny_1h_vwap
+            poc, _, _ = value_area(*volume_profile(window, tick_size))
+            with lock:
+                state[key] = {
+                    'high': stats['high'],
+                    'low': stats['low'],
+                    'mid': (stats['high'] + stats['low']) / 2,
+                    'poc': poc,
+                    'vwap': stats['vwap_num'] / stats['vwap_den'] if stats['vwap_den'] > 0 else 0
                 }
-                print(f"✅ PD NY 1H: H=${ny_1h_data['high']:.2f}, L=${ny_1h_data['low']:.2f}, POC=${ny_1h_poc:.2f}")
+            print(f"✅ {label}: H=${stats['high']:.2f}, L=${stats['low']:.2f}, POC=${poc:.2f}")
 
     except Exception as e:
         print(f"⚠️ Error fetching PD NY sessions: {e}")
@@ -3637,7 +3547,6 @@ def fetch_all_ibs():
 
     if not HAS_DATABENTO or not API_KEY:
         return
-    symbol = config['symbol']
     price_min = config['price_min']
     price_max = config['price_max']
 
@@ -3722,7 +3631,6 @@ def fetch_all_ibs():
             },
         }
 
-        client = db.Historical(key=API_KEY)
         print("📊 Fetching historical IB data for ended sessions...")
 
         for ib_key, ib_def in ib_definitions.items():
@@ -3806,50 +3714,14 @@ def fetch_all_ibs():
                 print(f"   (Active session - querying up to {utc_end})", flush=True)
 
             try:
-                print(f"   Fetching {ib_def['name']} ({utc_start} to {utc_end})...", flush=True)
-
-                data = client.timeseries.get_range(
-                    dataset='GLBX.MDP3',
-                    symbols=[symbol],
-                    stype_in='parent',
-                    schema='trades',
-                    start=utc_start,
-                    end=utc_end
-                )
+                print(f"   Loading {ib_def['name']} ({utc_start} to {utc_end})...", flush=True)
 
-                records = list(data)
-                print(f"   Got {len(records)} records for {ib_def['name']}", flush=True)
-
-                if not records:
+                frame = trade_history.window(ACTIVE_CONTRACT, _utc_str_to_ns(utc_start), _utc_str_to_ns(utc_end))
+                ib_data = summary(frame.select(history_front_month(), price_min, price_max))
+                if ib_data is None:
                     print(f"   ⚠️  No trades found for {ib_def['name']}", flush=True)
                     continue
 
-                # Group trades by instrument_id to find front month
-                by_instrument = {}
-                for r in records:
-                    iid = r.instrument_id
-                    p = r.price / 1e9 if r.price > 1e6 else r.price
-                    if p < price_min or p > price_max:
-                        continue
-                    if iid not in by_instrument:
-                        by_instrument[iid] = {'count': 0, 'high': 0, 'low': float('inf')}
-                    by_instrument[iid]['count'] += 1
-                    if p > by_instrument[iid]['high']:
-                        by_instrument[iid]['high'] = p
-                    if p < by_instrument[iid]['low']:
-                        by_instrument[iid]['low'] = p
-
-                if not by_instrument:
-                    continue
-
-                # Use front month (most trades)
-                front_month = max(by_instrument.items(), key=lambda x: x[1]['count'])
-                iid, ib_data = front_month
-
-                # Store front month ID if not set
-                if front_month_instrument_id is None:
-                    front_month_instrument_id = iid
-
                 ib_high = ib_data['high']
                 ib_low = ib_data['low']
 
@@ -3876,14 +3748,391 @@ def fetch_all_ibs():
 
     except Exception as e:
         print(f"❌ Error fetching IBs: {e}")
-        import traceback
-        traceback.print_exc()
+        raise  # Startup task fails (/ready)
 
 def fetch_todays_ib():
     """Wrapper for backwards compatibility - calls fetch_all_ibs"""
     fetch_all_ibs()
 
 
+# ============================================
+# DBN CACHE (Databento Historical)
+# ============================================
+# Historical loaders overlap heavily (PD levels, IBs, TPO, 60-day session history...) and
+# run on every startup and contract switch. Completed trading days are fetched once and
+# kept under .cache/dbn; only the current day is requested from Databento each time.
+DBN_CACHE_ENABLED = os.environ.get('DBN_CACHE', '1') != '0'
+DBN_CACHE_DIR = os.environ.get('DBN_CACHE_DIR', os.path.join(os.path.dirname(__file__), '.cache', 'dbn'))
+dbn_cache = DBNCache(DBN_CACHE_DIR) if HAS_DATABENTO and DBN_CACHE_ENABLED else None
+
+
+def historical_range(client, **kwargs):
+    """client.timeseries.get_range() through the DBN cache (records iterate / to_df() the same);
+    without the cache streamed to a temporary file so iter_batches() stays one batch in memory"""
+    if dbn_cache is None:
+        return get_range_to_file(client, **kwargs)
+    return dbn_cache.get_range(client, **kwargs)
+
+
+# ============================================
+# TICK ARCHIVE
+# ============================================
+# Live front-month trades are kept on disk (.cache/ticks/<contract>/<YYYYMMDD>.ticks),
+# so startup loaders read what this process (or a previous one) recorded and only ask
+# Databento Historical for the part that was never recorded
+TICK_ARCHIVE_ENABLED = os.environ.get('TICK_ARCHIVE', '1') != '0'
+TICK_ARCHIVE_DIR = os.environ.get('TICK_ARCHIVE_DIR', os.path.join(os.path.dirname(__file__), '.cache', 'ticks'))
+tick_archive = TickArchive(TICK_ARCHIVE_DIR)
+
+
+def _utc_str_to_ns(value):
+    return int(datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc).timestamp()) * 1_000_000_000
+
+
+# ============================================
+# HISTORICAL PIPELINE
+# ============================================
+# Startup loaders (PD levels, IBs, ended sessions, TPO, current session, candle volumes,
+# VSI history) read one shared set of per-day numpy frames: each trading day is
+# downloaded once, the front month is picked once, and every consumer is an array
+# reduction over a window of it
+def load_trade_frame(client, symbol, contract, start_ns, end_ns, extend_to_recorded=False):
+    """Trades of [start_ns, end_ns) as a TradeFrame: the recorded part from the tick archive, the
+    rest streamed from Databento Historical in batches. With extend_to_recorded the archive may
+    also return trades past end_ns (ends are only capped for Databento's ~20 min delay)."""
+    frames = []
+    covered = tick_archive.covered_until(contract, start_ns) if TICK_ARCHIVE_ENABLED else None
+    if covered is not None:
+        local_end = covered + 1 if extend_to_recorded else min(covered + 1, end_ns)
+        frames = [TradeFrame.from_ticks(rows, tick_size)
+                  for rows, tick_size in tick_archive.window(contract, start_ns, local_end)]
+        print(f"   💽 {sum(len(f) for f in frames)} trades from tick archive (+{(local_end - start_ns) / 6e10:.0f} min)")
+        start_ns = local_end
+    if start_ns < end_ns:
+        data = historical_range(
+            client,
+            dataset='GLBX.MDP3',
+            symbols=[symbol],
+            stype_in='parent',
+            schema='trades',
+            start=start_ns,
+            end=end_ns
+        )
+        frames.append(TradeFrame.from_batches(iter_batches(data)))
+    return TradeFrame.concat(frames)
+
+
+def _load_trade_day(contract, start_ns, end_ns, complete):
+    """One trading day for trade_history; the running day stops ~20 min back (Databento
+    Historical delay) unless the tick archive recorded further"""
+    config = CONTRACT_CONFIG.get(contract, CONTRACT_CONFIG['GC'])
+    client = db.Historical(key=API_KEY)
+    if not complete:
+        end_ns = min(end_ns, time.time_ns() - 20 * 60 * 1_000_000_000)
+    return load_trade_frame(client, config['symbol'], contract, start_ns, end_ns, extend_to_recorded=not complete)
+
+
+def _load_bar_day(contract, start_ns, end_ns, complete):
+    """One trading day of 1-minute bars for bar_history (ohlcv-1m, ~1/100th of the trades
+    bytes); the running day's bars past the Databento delay are built from the tick archive"""
+    config = CONTRACT_CONFIG.get(contract, CONTRACT_CONFIG['GC'])
+    client = db.Historical(key=API_KEY)
+    frames = []
+    if not complete:
+        end_ns = min(end_ns, (time.time_ns() - 20 * 60 * 1_000_000_000) // 60_000_000_000 * 60_000_000_000)
+    if start_ns < end_ns:
+        data = historical_range(
+            client,
+            dataset='GLBX.MDP3',
+            symbols=[config['symbol']],
+            stype_in='parent',
+            schema='ohlcv-1m',
+            start=start_ns,
+            end=end_ns
+        )
+        frames.append(BarFrame.from_batches(iter_batches(data)))
+    covered = tick_archive.covered_until(contract, end_ns) if TICK_ARCHIVE_ENABLED and not complete else None
+    if covered is not None:
+        trades = TradeFrame.concat([TradeFrame.from_ticks(rows, tick_size)
+                                    for rows, tick_size in tick_archive.window(contract, end_ns, covered + 1)])
+        frames.append(BarFrame.from_trades(trades))
+    return BarFrame.concat(frames)
+
+
+trade_history = TradeHistory(_load_trade_day) if HAS_DATABENTO else None
+bar_history = TradeHistory(_load_bar_day, max_days=BAR_DAYS, frame_type=BarFrame) if HAS_DATABENTO else None
+
+
+def history_front_month():
+    """Front month for the historical loaders: the live one if known, else the most
+    active instrument of the latest trading day (picked once, shared by every loader)"""
+    global front_month_instrument_id
+    if front_month_instrument_id is None:
+        iid = trade_history.front_month(ACTIVE_CONTRACT)
+        if iid is not None and front_month_instrument_id is None:
+            front_month_instrument_id = iid
+            print(f"   🎯 Front month instrument ID: {iid}")
+    return front_month_instrument_id
+
+
+def warm_trade_history(days=8):
+    """Load the union window of the startup loaders (PD session, 7 days of candles, today)
+    in parallel before they run, so each one is a slice of memory"""
+    started = time.time()
+    try:
+        trade_history.prefetch(ACTIVE_CONTRACT, time.time_ns() - days * 86400 * 1_000_000_000)
+    finally:
+        # Incomplete: the task fails, the loaders still run and retry per day
+        history_front_month()
+    print(f"📦 Trade history warmed: {days} days in {time.time() - started:.1f}s")
+
+
+def history_session_table(session_defs):
+    """ET minute-of-day -> index into session_defs ((id, name, start_h, start_m, end_h, end_m), ...)"""
+    return session_table([(d[2] * 60 + d[3], d[4] * 60 + d[5]) for d in session_defs])
+
+
+def tpo_session_tables():
+    """(session keys, ET minute-of-day -> TPO session index or -1, -> that session's period index)"""
+    keys = list(TPO_SESSIONS)
+    session_of = np.full(1440, -1, np.int64)
+    period_of = np.zeros(1440, np.int64)
+    for minute in range(1440):
+        hhmm = minute // 60 * 100 + minute % 60
+        for i, sconfig in enumerate(TPO_SESSIONS.values()):
+            start_hhmm, end_hhmm = sconfig['start'], sconfig['end']
+            if end_hhmm < start_hhmm:  # Overnight session
+                inside = hhmm >= start_hhmm or hhmm < end_hhmm
+            else:
+                inside = start_hhmm <= hhmm < end_hhmm
+            if inside:
+                session_of[minute] = i
+                period_of[minute] = get_session_period_index(keys[i], hhmm)
+                break
+    return keys, session_of, period_of
+
+
+# ============================================
+# SESSION STORE
+# ============================================
+# One row per (contract, trading day, session) plus a 'day' row - OHLC, volume, delta,
+# POC/VAH/VAL, IB and day type - in .cache/sessions.db. Completed days are backfilled
+# once from 1-minute bars and sessions that end live are written at the session change;
+# VSI, weekly session OHLC, historic TPO and the week levels are slices of it
+SESSION_STORE_DB = os.environ.get('SESSION_STORE_DB', os.path.join(os.path.dirname(__file__), '.cache', 'sessions.db'))
+session_store = SessionStore(SESSION_STORE_DB)
+session_store_lock = threading.Lock()  # One backfill at a time - a concurrent caller then finds its days written
+session_store_live = {'written': 0, 'last': None}
+session_backfill_jobs = set()           # (contract, first, last) ranges queued by queue_session_backfill
+session_backfill_lock = threading.Lock()
+EMPTY_RETRY_SECONDS = 3600              # A weekday found without bars is asked for again after this...
+EMPTY_CHECKS = 2                        # ...until it came back empty this many times (holiday)
+last_session_day = None  # Trading day of last_session_id (closing date)
+
+# Stored session windows (ET): id, name, start_h, start_m, end_h, end_m - the VSI / weekly OHLC sessions
+SESSION_DEFS = [
+    ('pre_asia', 'Pre-Asia', 18, 0, 19, 0),
+    ('japan_ib', 'Japan IB', 19, 0, 20, 0),
+    ('china', 'China', 20, 0, 23, 0),
+    ('asia_close', 'Asia Closing', 23, 0, 2, 0),  # Overnight
+    ('deadzone', 'Deadzone', 2, 0, 3, 0),
+    ('london', 'London', 3, 0, 6, 0),
+    ('low_volume', 'Low Volume', 6, 0, 8, 20),
+    ('us_ib', 'US IB', 8, 20, 9, 30),
+    ('ny_1h', 'NY 1H', 9, 30, 10, 30),
+    ('ny_2h', 'NY 2H', 10, 30, 11, 30),
+    ('lunch', 'Lunch', 11, 30, 13, 30),
+    ('ny_pm', 'NY PM', 13, 30, 16, 0),
+    ('ny_close', 'NY Close', 16, 0, 17, 0),
+]
+SESSION_IDS = {d[0] for d in SESSION_DEFS}
+IB_SESSION = 'ny_1h'  # Initial Balance 09:30-10:30 ET
+
+
+def session_trading_day(et):
+    """'YYYY-MM-DD' of the trading day (18:00 ET -> 17:00 ET) an ET time belongs to"""
+    return (et + timedelta(hours=6)).strftime('%Y-%m-%d')
+
+
+def ib_day_type(high, low, ib_high, ib_low):
+    """Day type from the range extension beyond the IB (normal without an IB)"""
+    ib_range = (ib_high - ib_low) if ib_high and ib_low else None
+    if not ib_range:
+        return 'normal'
+    ext_up = max(0, high - ib_high)
+    ext_down = max(0, ib_low - low)
+    ext_pct = (ext_up + ext_down) / ib_range * 100 if ib_range > 0 else 0
+    if ext_pct > 150 and (ext_up < ib_range * 0.1 or ext_down < ib_range * 0.1):
+        return 'trend'
+    if ext_pct > 100:
+        return 'normal_var'
+    if ext_up > ib_range * 0.3 and ext_down > ib_range * 0.3:
+        return 'neutral'
+    if ext_pct < 30:
+        return 'non_trend'
+    return 'normal'
+
+
+def _trading_day_starts(first_date, last_date):
+    """[(start ns, closing date), ...] of the trading days closing first_date..last_date that have started"""
+    first_ns = _utc_str_to_ns(f"{(first_date - timedelta(days=1)).isoformat()}T23:00:00Z")  # 18:00 ET the day before
+    end_ns = min(_utc_str_to_ns(f"{last_date.isoformat()}T23:00:00Z"), time.time_ns())
+    return [(start_ns, datetime.fromtimestamp((start_ns + DAY_NS) // 1_000_000_000, timezone.utc).date())
+            for start_ns in range(first_ns, end_ns, DAY_NS)]
+
+
+def session_summary_rows(contract, start_ns, frame, trades=None):
+    """Store rows of one trading day - one per session plus the 'day' row - from its 1-minute
+    bars (that day's front month); delta only when the day's trades are given"""
+    config = CONTRACT_CONFIG.get(contract, CONTRACT_CONFIG['GC'])
+    price_min, price_max, tick_size = config['price_min'], config['price_max'], config['tick_size']
+    end_ns = start_ns + DAY_NS - 3600 * 1_000_000_000  # 17:00 ET close
+    iid = frame.most_active()
+    frame = frame.between(start_ns, end_ns).select(iid, price_min, price_max)
+    day = ohlc(frame)
+    if day is None:
+        return []
+    table = history_session_table(SESSION_DEFS)
+    bars = session_bars(frame, table)
+    areas = session_value_areas(frame, table, tick_size)
+    deltas = {}
+    if trades is not None:
+        traded = session_bars(trades.between(start_ns, end_ns).select(iid, price_min, price_max), table)
+        deltas = {s: buy - sell for s, buy, sell in zip(traded['session'].tolist(), traded['buy'].tolist(),
+                                                         traded['sell'].tolist())}
+    date_str = time.strftime('%Y-%m-%d', time.gmtime((start_ns + DAY_NS) // 1_000_000_000))
+
+    rows = []
+    for d, s, o, h, l, c, v in zip(bars['day'].tolist(), bars['session'].tolist(), bars['open'].tolist(),
+                                   bars['high'].tolist(), bars['low'].tolist(), bars['close'].tolist(),
+                                   bars['volume'].tolist()):
+        poc, vah, val = areas[(d, s)]
+        rows.append({'contract': contract, 'trading_day': date_str, 'session': SESSION_DEFS[s][0],
+                     'open': o, 'high': h, 'low': l, 'close': c, 'volume': v, 'delta': deltas.get(s),
+                     'poc': poc, 'vah': vah, 'val': val, 'source': 'bars'})
+    ib = next((r for r in rows if r['session'] == IB_SESSION), None)
+    ib_high, ib_low = (ib['high'], ib['low']) if ib else (None, None)
+    poc, vah, val = profile_value_area(frame, tick_size)
+    rows.append({'contract': contract, 'trading_day': date_str, 'session': 'day',
+                 'open': day[0], 'high': day[1], 'low': day[2], 'close': day[3], 'volume': int(frame.volume.sum()),
+                 'delta': sum(deltas.values()) if deltas else None, 'poc': poc, 'vah': vah, 'val': val,
+                 'ib_high': ib_high, 'ib_low': ib_low, 'day_type': ib_day_type(day[1], day[2], ib_high, ib_low),
+                 'source': 'bars'})
+    return rows
+
+
+def final_session_days(contract, first_date, last_date):
+    """(final, recent) trading days closing first_date..last_date. final: stored with a 'day'
+    row, or empty for good - a weekend close, or a weekday that came back empty EMPTY_CHECKS
+    times (holiday). recent: other empty ones asked for within EMPTY_RETRY_SECONDS"""
+    first, last = first_date.isoformat(), last_date.isoformat()
+    final, recent = set(session_store.stored_days(contract, first, last)), set()
+    now = time.time()
+    for day, (checks, updated) in session_store.empty_days(contract, first, last).items():
+        if datetime.strptime(day, '%Y-%m-%d').date().weekday() >= 5 or checks >= EMPTY_CHECKS:
+            final.add(day)
+        elif now - updated < EMPTY_RETRY_SECONDS:
+            recent.add(day)
+    return final, recent
+
+
+def backfill_session_store(first_date, last_date, contract=None):
+    """Write the settled trading days closing first_date..last_date that the store does not
+    have yet (delta too when the day's trades are still in trade_history); returns the count"""
+    contract = contract or ACTIVE_CONTRACT
+    settled_ns = time.time_ns() - SETTLE_NS
+    added = 0
+    with session_store_lock:
+        final, recent = final_session_days(contract, first_date, last_date)
+        for start_ns, closing in _trading_day_starts(first_date, last_date):
+            if start_ns + DAY_NS > settled_ns or closing.isoformat() in final or closing.isoformat() in recent:
+                continue
+            try:
+                frame = bar_history.day(contract, start_ns)
+            except Exception as e:
+                print(f"   ⚠️ Session store: skipping {closing}: {e}")
+                continue
+            rows = session_summary_rows(contract, start_ns, frame, trade_history.cached(contract, start_ns))
+            if rows:
+                session_store.upsert(rows)
+                added += 1
+            else:
+                # Weekend / holiday - or a short reply, asked for again after EMPTY_RETRY_SECONDS
+                session_store.mark_empty(contract, closing.isoformat(), 'bars')
+    if added:
+        print(f"🗄️ Session store: backfilled {added} trading days ({contract})")
+    return added
+
+
+def _queue_session_job(job, fn, label):
+    """Run fn() on a background 'session_backfill' thread unless job is already queued"""
+    with session_backfill_lock:
+        if job in session_backfill_jobs:
+            return False
+        session_backfill_jobs.add(job)
+
+    def run():
+        try:
+            fn()
+        except Exception as e:
+            print(f"   ⚠️ Session store: background {label} failed: {e}")
+        finally:
+            with session_backfill_lock:
+                session_backfill_jobs.discard(job)
+
+    threading.Thread(target=run, name='session_backfill', daemon=True).start()
+    return True
+
+
+def queue_session_backfill(first_date, last_date, contract=None, then=None):
+    """backfill_session_store on a background thread (request handlers serve what is stored);
+    then() runs after it when it wrote days. A range already queued is not queued twice"""
+    contract = contract or ACTIVE_CONTRACT
+
+    def run():
+        if backfill_session_store(first_date, last_date, contract) and then:
+            then()
+
+    return _queue_session_job(('days', contract, first_date, last_date), run, f"backfill {first_date}..{last_date}")
+
+
+def session_summaries(first_date, last_date, contract=None, load=True):
+    """{trading_day: {session: row}} for the trading days closing first_date..last_date:
+    settled days from the store (missing ones backfilled first), the running day from its
+    bars so far. load=False only reads what is stored."""
+    contract = contract or ACTIVE_CONTRACT
+    if load:
+        backfill_session_store(first_date, last_date, contract)
+    days = session_store.by_day(contract, first_date.isoformat(), last_date.isoformat())
+    if load:
+        settled_ns = time.time_ns() - SETTLE_NS
+        for start_ns, closing in _trading_day_starts(first_date, last_date):
+            if start_ns + DAY_NS <= settled_ns:
+                continue
+            try:
+                rows = session_summary_rows(contract, start_ns, bar_history.day(contract, start_ns))
+            except Exception as e:
+                # Running day not available yet (weekend / holiday / Databento delay)
+                print(f"   ⚠️ Session summaries: skipping running day {closing}: {e}")
+                continue
+            if rows:
+                days[closing.isoformat()] = {r['session']: r for r in rows}
+    return days
+
+
+def _session_store_on_boundary(kind, detail, ctx):
+    """A session that ended live -> its store row (written off the trade path)"""
+    if kind != 'session_end':
+        return
+    date_str, session_id, ended = detail
+    if session_id not in SESSION_IDS:
+        return
+    row = dict(ended, contract=ctx.contract, trading_day=date_str, session=session_id, source='live')
+    session_store_live['written'] += 1
+    session_store_live['last'] = {'trading_day': date_str, 'session': session_id}
+    threading.Thread(target=session_store.upsert, args=([row],), daemon=True).start()
+    extend_current_week(date_str, session_id, ended)
+
 def fetch_todays_tpo_data():
     """Fetch full day's trade data and rebuild TPO profiles from session start.
 
@@ -3903,7 +4152,6 @@ def fetch_todays_tpo_data():
 
     try:
         config = CONTRACT_CONFIG.get(ACTIVE_CONTRACT, CONTRACT_CONFIG['GC'])
-        symbol = config['symbol']  # Use 'GC.FUT' format for parent symbology
         tick_size = config['tick_size']
         price_min = config['price_min']
         price_max = config['price_max']
@@ -3924,154 +4172,75 @@ def fetch_todays_tpo_data():
         reset_tpo_for_new_day()
         print(f"📊 TPO state reset for loading historical data")
 
-        # Convert to UTC (subtract 20 minutes to account for Databento data delay)
         day_start_utc = day_start_et.astimezone(pytz.UTC)
-        now_utc = (now_et - timedelta(minutes=20)).astimezone(pytz.UTC)
 
         print(f"📊 Loading full day TPO data from {day_start_et.strftime('%Y-%m-%d %H:%M')} ET...")
 
-        client = db.Historical(key=API_KEY)
-
-        # Fetch all trades for today's session
-        data = client.timeseries.get_range(
-            dataset='GLBX.MDP3',
-            symbols=[symbol],
-            stype_in='parent',
-            schema='trades',
-            start=day_start_utc.strftime('%Y-%m-%dT%H:%M:%SZ'),
-            end=now_utc.strftime('%Y-%m-%dT%H:%M:%SZ')
-        )
-
-        records = list(data)
-        print(f"   Got {len(records)} trades for TPO reconstruction")
+        # Today's trades from the shared history (archive-extended past the Databento delay)
+        frame = trade_history.window(ACTIVE_CONTRACT, int(day_start_utc.timestamp()) * 1_000_000_000)
+        print(f"   Got {len(frame)} trades for TPO reconstruction")
 
-        if not records:
+        if not len(frame):
             print("   ⚠️  No historical trades found")
             return
 
-        # Filter to front month
-        if front_month_instrument_id:
-            fm_records = [r for r in records if r.instrument_id == front_month_instrument_id]
-            if fm_records:
-                records = fm_records
-                print(f"   Using {len(records)} front month trades")
+        frame = frame.select(history_front_month(), price_min, price_max)
+        print(f"   Using {len(frame)} front month trades")
+
+        # Per-trade ET minute -> DAY period, TPO session and session period, as arrays
+        minute = local_minutes(frame.ts, et_tz)
+        day_start_ns = int(day_start_et.timestamp()) * 1_000_000_000
+        day_period = np.maximum(0, (frame.ts - day_start_ns) // 60_000_000_000 // 30)
+        session_keys, session_of, period_of = tpo_session_tables()
+        session_idx = session_of[minute]
+        session_period = period_of[minute]
+        ticks = np.rint(frame.price / tick_size).astype(np.int64)
+
+        def add_letters(profiles, ticks, periods):
+            """One letter per distinct (price, period) pair"""
+            for pair in np.unique(ticks * 4096 + periods).tolist():
+                profiles.setdefault((pair // 4096) * tick_size, set()).add(get_tpo_letter(pair % 4096))
+
+        def widen(target, high_key, low_key, prices):
+            if len(prices):
+                target[high_key] = max(target.get(high_key, 0), float(prices.max()))
+                target[low_key] = min(target.get(low_key, 999999), float(prices.min()))
 
         # Rebuild TPO profiles from historical data
-        with lock:
+        with tpo_lock:
             # Clear existing profiles
             tpo_state['day']['profiles'] = {}
 
             for session_key in tpo_state['sessions']:
                 tpo_state['sessions'][session_key]['profiles'] = {}
 
-            # Process each trade
-            for r in records:
-                price = r.price / 1e9 if r.price > 1e6 else r.price
+            day = tpo_state['day']
+            add_letters(day['profiles'], ticks, day_period)
+            if day.get('open_price', 0) == 0:
+                day['open_price'] = float(frame.price[0])
 
-                # Filter invalid prices
-                if price < price_min or price > price_max:
+            for i, session_key in enumerate(session_keys):
+                in_session = session_idx == i
+                if not in_session.any():
                     continue
-
-                # Get trade timestamp in ET
-                ts_ns = r.ts_event
-                ts_sec = ts_ns / 1e9
-                trade_time = datetime.fromtimestamp(ts_sec, tz=pytz.UTC).astimezone(et_tz)
-                trade_hhmm = trade_time.hour * 100 + trade_time.minute
-
-                # Calculate DAY period (from 18:00 ET)
-                minutes_from_day_start = int((trade_time - day_start_et).total_seconds() / 60)
-                day_period_idx = max(0, minutes_from_day_start // 30)
-                day_letter = get_tpo_letter(day_period_idx)
-
-                # Round price to tick size
-                tpo_price = round(price / tick_size) * tick_size
-
-                # Add to day profile
-                if tpo_price not in tpo_state['day']['profiles']:
-                    tpo_state['day']['profiles'][tpo_price] = set()
-                tpo_state['day']['profiles'][tpo_price].add(day_letter)
-
-                # Determine which session this trade belongs to
-                session_key = None
-                for skey, sconfig in TPO_SESSIONS.items():
-                    start_hhmm = sconfig['start']
-                    end_hhmm = sconfig['end']
-
-                    if end_hhmm < start_hhmm:  # Overnight session
-                        if trade_hhmm >= start_hhmm or trade_hhmm < end_hhmm:
-                            session_key = skey
-                            break
-                    else:
-                        if start_hhmm <= trade_hhmm < end_hhmm:
-                            session_key = skey
-                            break
-
-                # Add to session profile
-                if session_key:
-                    session_data = tpo_state['sessions'][session_key]
-                    session_config = TPO_SESSIONS[session_key]
-
-                    # Calculate session period
-                    session_period_idx = get_session_period_index(session_key, trade_hhmm)
-                    session_letter = get_tpo_letter(session_period_idx)
-
-                    if tpo_price not in session_data['profiles']:
-                        session_data['profiles'][tpo_price] = set()
-                    session_data['profiles'][tpo_price].add(session_letter)
-
-                    # Track open price for session (first trade)
-                    if session_data.get('open_price', 0) == 0:
-                        session_data['open_price'] = price
-
-                    # Track session high/low
-                    if price > session_data.get('high', 0):
-                        session_data['high'] = price
-                    if price < session_data.get('low', 999999):
-                        session_data['low'] = price
-
-                    # Track A/B period ranges for US AM session (Open Type detection)
-                    if session_key == 'tpo3_us_am':
-                        if session_period_idx == 0:  # A period (09:30-10:00)
-                            if price > session_data.get('a_high', 0):
-                                session_data['a_high'] = price
-                            if price < session_data.get('a_low', 999999):
-                                session_data['a_low'] = price
-                        elif session_period_idx == 1:  # B period (10:00-10:30)
-                            if price > session_data.get('b_high', 0):
-                                session_data['b_high'] = price
-                            if price < session_data.get('b_low', 999999):
-                                session_data['b_low'] = price
-
-                        # Also copy to day profile for RTH
-                        day = tpo_state['day']
-                        if day.get('rth_open', 0) == 0:
-                            day['rth_open'] = price
-                        if session_period_idx == 0:
-                            if price > day.get('a_high', 0):
-                                day['a_high'] = price
-                            if price < day.get('a_low', 999999):
-                                day['a_low'] = price
-                        elif session_period_idx == 1:
-                            if price > day.get('b_high', 0):
-                                day['b_high'] = price
-                            if price < day.get('b_low', 999999):
-                                day['b_low'] = price
-
-                        # Track IB (first 2 periods = first hour)
-                        if session_period_idx < 2:
-                            if price > day.get('ib_high', 0):
-                                day['ib_high'] = price
-                            if price < day.get('ib_low', 999999):
-                                day['ib_low'] = price
-                            if price > session_data.get('ib_high', 0):
-                                session_data['ib_high'] = price
-                            if price < session_data.get('ib_low', 999999):
-                                session_data['ib_low'] = price
-
-                # Track day open (first trade of day)
-                day = tpo_state['day']
-                if day.get('open_price', 0) == 0:
-                    day['open_price'] = price
+                session_data = tpo_state['sessions'][session_key]
+                prices = frame.price[in_session]
+                periods = session_period[in_session]
+                add_letters(session_data['profiles'], ticks[in_session], periods)
+
+                # Session open (first trade) and high/low
+                if session_data.get('open_price', 0) == 0:
+                    session_data['open_price'] = float(prices[0])
+                widen(session_data, 'high', 'low', prices)
+
+                # A/B period ranges and IB for the US AM session (Open Type detection), also on the day (RTH)
+                if session_key == 'tpo3_us_am':
+                    if day.get('rth_open', 0) == 0:
+                        day['rth_open'] = float(prices[0])
+                    for target in (session_data, day):
+                        widen(target, 'a_high', 'a_low', prices[periods == 0])
+                        widen(target, 'b_high', 'b_low', prices[periods == 1])
+                        widen(target, 'ib_high', 'ib_low', prices[periods < 2])
 
             # Update period counts to current
             day_minutes_elapsed = int((now_et - day_start_et).total_seconds() / 60)
@@ -4162,7 +4331,8 @@ def fetch_last_trading_day_tpo():
 
     client = db.Historical(key=API_KEY)
 
-    data = client.timeseries.get_range(
+    data = historical_range(
+        client,
         dataset='GLBX.MDP3',
         symbols=[symbol],
         stype_in='parent',
@@ -4171,44 +4341,42 @@ def fetch_last_trading_day_tpo():
         end=day_end_utc.strftime('%Y-%m-%dT%H:%M:%SZ')
     )
 
-    records = list(data)
-    print(f"   Got {len(records)} trades from last trading day")
+    # Streamed twice in batches: instrument counts, then the profile from the kept trades
+    instrument_trades = instrument_totals(data)
+    print(f"   Got {int(sum(instrument_trades.values()))} trades from last trading day")
 
-    if not records:
+    if not instrument_trades:
         raise Exception("No trades found for last trading day")
 
     # Filter to front month if we have the instrument ID
-    if front_month_instrument_id:
-        fm_records = [r for r in records if r.instrument_id == front_month_instrument_id]
-        if fm_records:
-            records = fm_records
-            print(f"   Using {len(records)} front month trades")
+    front_month = None
+    if instrument_trades.get(front_month_instrument_id):
+        front_month = front_month_instrument_id
+        print(f"   Using {int(instrument_trades[front_month])} front month trades")
 
     # Build TPO profiles
-    with lock:
+    day_start_ns = int(day_start_utc.timestamp()) * 1_000_000_000
+    with tpo_lock:
         tpo_state['day']['profiles'] = {}
         for session_key in tpo_state['sessions']:
             tpo_state['sessions'][session_key]['profiles'] = {}
 
-        for r in records:
-            price = r.price / 1e9 if r.price > 1e6 else r.price
-
-            if price < price_min or price > price_max:
-                continue
-
-            ts_ns = r.ts_event
-            ts_sec = ts_ns / 1e9
-            trade_time = datetime.fromtimestamp(ts_sec, tz=pytz.UTC).astimezone(et_tz)
-
-            minutes_from_day_start = int((trade_time - day_start_et).total_seconds() / 60)
-            day_period_idx = max(0, minutes_from_day_start // 30)
-            day_letter = get_tpo_letter(day_period_idx)
-
-            tpo_price = round(price / tick_size) * tick_size
-
-            if tpo_price not in tpo_state['day']['profiles']:
-                tpo_state['day']['profiles'][tpo_price] = set()
-            tpo_state['day']['profiles'][tpo_price].add(day_letter)
+        for batch in iter_batches(data):
+            if front_month is not None:
+                batch = batch[batch['instrument_id'] == front_month]
+            prices = batch['price'] / 1e9
+            valid = (prices >= price_min) & (prices <= price_max)
+            ticks = np.rint(prices[valid] / tick_size).astype(np.int64)
+            periods = np.maximum(0, (batch['ts_event'][valid].astype(np.int64) - day_start_ns) // (30 * 60 * 1_000_000_000))
+
+            # One letter per distinct (price, 30-min period) of the batch, in first-trade order
+            _, first = np.unique(ticks * 4096 + periods, return_index=True)
+            first.sort()
+            for tick, period in zip(ticks[first].tolist(), periods[first].tolist()):
+                tpo_price = tick * tick_size
+                if tpo_price not in tpo_state['day']['profiles']:
+                    tpo_state['day']['profiles'][tpo_price] = set()
+                tpo_state['day']['profiles'][tpo_price].add(get_tpo_letter(period))
 
         # Calculate metrics
         calculate_tpo_metrics()
@@ -4233,7 +4401,6 @@ def fetch_ended_sessions_ohlc():
 
     if not HAS_DATABENTO or not API_KEY:
         return
-    symbol = config['symbol']
     price_min = config['price_min']
     price_max = config['price_max']
 
@@ -4262,95 +4429,31 @@ def fetch_ended_sessions_ohlc():
     print(f"📊 Fetching OHLC for {len(ended_sessions)} ended sessions...")
 
     try:
-        client = db.Historical(key=API_KEY)
-        et_now = get_et_now()
-        today = et_now.date()
+        # One pass over the running trading day partitions every session at once
+        session_ids = list(session_times)
+        table = session_table([(int(start[:2]) * 60 + int(start[3:]), int(end[:2]) * 60 + int(end[3:]))
+                               for start, end in session_times.values()])
+        frame = trade_history.window(ACTIVE_CONTRACT, day_start(time.time_ns()))
+        bars = session_bars(frame.select(history_front_month(), price_min, price_max), table)
+        by_session = {session_ids[session]: i for i, session in enumerate(bars['session'].tolist())}
 
         for session_id in ended_sessions:
-            if session_id not in session_times:
+            if session_id not in by_session:
                 continue
 
-            start_str, end_str = session_times[session_id]
-            start_hour, start_min = map(int, start_str.split(':'))
-            end_hour, end_min = map(int, end_str.split(':'))
-
-            # Determine the date for session start
-            session_date = today
-            if start_hour >= 18:  # Pre-midnight sessions
-                if et_now.hour < 18:  # We're past midnight
-                    session_date = today - timedelta(days=1)
-
-            # Build UTC timestamps
-            start_et = datetime(session_date.year, session_date.month, session_date.day, start_hour, start_min)
-            end_date = session_date
-            if end_hour < start_hour:  # Session crosses midnight
-                end_date = session_date + timedelta(days=1)
-            end_et = datetime(end_date.year, end_date.month, end_date.day, end_hour, end_min)
-
-            # Convert to UTC (ET + 5)
-            utc_start = (start_et + timedelta(hours=5)).strftime('%Y-%m-%dT%H:%M:%SZ')
-            utc_end = (end_et + timedelta(hours=5)).strftime('%Y-%m-%dT%H:%M:%SZ')
-
             try:
-                data = client.timeseries.get_range(
-                    dataset='GLBX.MDP3',
-                    symbols=[symbol],
-                    stype_in='parent',
-                    schema='trades',
-                    start=utc_start,
-                    end=utc_end
-                )
-
-                records = list(data)
-                if not records:
-                    continue
-
-                # Process trades
-                session_data = {
-                    'high': 0, 'low': float('inf'),
-                    'first_ts': float('inf'), 'first_price': 0,
-                    'last_ts': 0, 'last_price': 0, 'count': 0,
-                    'buy': 0, 'sell': 0  # Track volume
-                }
-
-                for r in records:
-                    if front_month_instrument_id and r.instrument_id != front_month_instrument_id:
-                        continue
-                    p = r.price / 1e9 if r.price > 1e6 else r.price
-                    if p < price_min or p > price_max:
-                        continue
-
-                    ts = r.ts_event
-                    size = r.size
-                    side = r.side
-                    session_data['count'] += 1
-
-                    # Track buy/sell volume: A = Ask (hit) = Buy, B = Bid (hit) = Sell
-                    if side == 'A':
-                        session_data['buy'] += size
-                    elif side == 'B':
-                        session_data['sell'] += size
-
-                    if p > session_data['high']:
-                        session_data['high'] = p
-                    if p < session_data['low']:
-                        session_data['low'] = p
-                    if ts < session_data['first_ts']:
-                        session_data['first_ts'] = ts
-                        session_data['first_price'] = p
-                    if ts > session_data['last_ts']:
-                        session_data['last_ts'] = ts
-                        session_data['last_price'] = p
+                i = by_session[session_id]
+                session_data = {name: bars[name][i].item() for name in ('open', 'high', 'low', 'close', 'buy', 'sell', 'count')}
 
                 if session_data['count'] > 0:
                     session_volume = session_data['buy'] + session_data['sell']
                     session_delta = session_data['buy'] - session_data['sell']
                     with lock:
                         state['ended_sessions'][session_id] = {
-                            'open': session_data['first_price'],
+                            'open': session_data['open'],
                             'high': session_data['high'],
                             'low': session_data['low'],
-                            'close': session_data['last_price'],
+                            'close': session_data['close'],
                             'volume': session_volume,
                             'delta': session_delta
                         }
@@ -4360,9 +4463,9 @@ def fetch_ended_sessions_ohlc():
                         if session_data['low'] < state['day_low']:
                             state['day_low'] = session_data['low']
                         if state['day_open'] == 0 and session_id == 'pre_asia':
-                            state['day_open'] = session_data['first_price']
+                            state['day_open'] = session_data['open']
 
-                    print(f"   ✅ {session_id}: O={session_data['first_price']:.2f} H={session_data['high']:.2f} L={session_data['low']:.2f} C={session_data['last_price']:.2f} V={session_volume} D={session_delta}")
+                    print(f"   ✅ {session_id}: O={session_data['open']:.2f} H={session_data['high']:.2f} L={session_data['low']:.2f} C={session_data['close']:.2f} V={session_volume} D={session_delta}")
 
             except Exception as e:
                 print(f"   ⚠️ Error fetching {session_id}: {e}")
@@ -4370,8 +4473,7 @@ def fetch_ended_sessions_ohlc():
 
     except Exception as e:
         print(f"❌ Error fetching ended sessions OHLC: {e}")
-        import traceback
-        traceback.print_exc()
+        raise  # Startup task fails (/ready)
 
 
 # Cache for session history - stores raw daily ranges (pre-computed on startup)
@@ -4391,90 +4493,201 @@ historical_sessions_ohlc_cache = {
 }
 
 # Multi-week cache for historical data (5 historic weeks + current)
-# File-based persistence for faster startup
+# Keyed by absolute ISO week ('2026-W42'): w1..w5 / current are resolved against today on
+# every lookup. A completed week (its Friday settled) is built once from the session store
+# and kept as sessions_<contract>_<ISO week>.json - never refetched. The current week is
+# built from the store and then extended by live session-end events.
 CACHE_DIR = os.path.join(os.path.dirname(__file__), '..', '.cache')
-weekly_sessions_cache = {
-    'w5': {'data': None, 'timestamp': 0, 'ready': False},  # Oldest
-    'w4': {'data': None, 'timestamp': 0, 'ready': False},
-    'w3': {'data': None, 'timestamp': 0, 'ready': False},
-    'w2': {'data': None, 'timestamp': 0, 'ready': False},
-    'w1': {'data': None, 'timestamp': 0, 'ready': False},  # Most recent historic
-    'current': {'data': None, 'timestamp': 0, 'ready': False}  # Building week
-}
+WEEK_IDS = ['w5', 'w4', 'w3', 'w2', 'w1', 'current']  # Oldest to newest
+weekly_sessions_cache = {}  # ISO week -> {'data', 'timestamp', 'ready', 'complete'}
+weekly_sessions_lock = threading.Lock()
 
-def get_week_date_range(week_id):
-    """Get start and end dates for a specific week (dynamically calculated)"""
-    et_now = get_et_now()
-    today = et_now.date()
+def iso_week(day):
+    year, week, _ = day.isocalendar()
+    return f'{year}-W{week:02d}'
+
+def week_key(week_id):
+    """ISO week of a relative id (current, w1 = last week, w2, ...) or of an ISO week id; None if unknown"""
+    try:
+        if week_id == 'current':
+            return iso_week(get_et_now().date())
+        if week_id.startswith('w') and week_id[1:].isdigit():
+            return iso_week(get_et_now().date() - timedelta(weeks=int(week_id[1:])))
+        week_monday(week_id)
+        return week_id
+    except (ValueError, OverflowError):
+        return None
 
-    # Find Monday of current week
-    days_since_monday = today.weekday()  # Monday=0
-    current_monday = today - timedelta(days=days_since_monday)
+def week_monday(key):
+    return datetime.strptime(key + '-1', '%G-W%V-%u').date()
 
-    if week_id == 'current':
-        # Current week: Monday of this week to today (or Friday if weekend)
-        # Limit to trading days (Mon-Fri)
-        end_date = min(today, current_monday + timedelta(days=4))  # Cap at Friday
-        return (current_monday.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+def week_is_complete(key):
+    """Friday's trading day of the week has ended (17:00 ET) and settled"""
+    friday = week_monday(key) + timedelta(days=4)
+    return _utc_str_to_ns(f"{friday.isoformat()}T23:00:00Z") + 3600 * 1_000_000_000 <= time.time_ns()
 
-    # Parse week offset from id (w1=1 week ago, w2=2 weeks ago, etc.)
-    if not week_id.startswith('w') or not week_id[1:].isdigit():
-        return None
+def week_days_final(key, contract=None):
+    """Every weekday of the week is final in the session store (a 'day' row or an EMPTY marker
+    for good) - a week with a failed or retried day is not saved"""
+    monday = week_monday(key)
+    final, _ = final_session_days(contract or ACTIVE_CONTRACT, monday, monday + timedelta(days=4))
+    return all((monday + timedelta(days=i)).isoformat() in final for i in range(5))
 
-    weeks_ago = int(week_id[1:])
+def week_cache(week_id):
+    """Cache entry of a week (relative or ISO id) - a not-ready placeholder if never built"""
+    return weekly_sessions_cache.get(week_key(week_id)) or {'data': None, 'timestamp': 0, 'ready': False, 'complete': False}
 
-    # Go back N weeks
-    target_monday = current_monday - timedelta(weeks=weeks_ago)
-    target_friday = target_monday + timedelta(days=4)
+def get_week_date_range(week_id):
+    """Monday and Friday (today for the running week) of a week, relative or ISO id"""
+    key = week_key(week_id)
+    if key is None:
+        return None
+    monday = week_monday(key)
+    end_date = min(get_et_now().date(), monday + timedelta(days=4))  # Cap at Friday
+    return (monday.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
 
-    return (target_monday.strftime('%Y-%m-%d'), target_friday.strftime('%Y-%m-%d'))
+def week_cache_file(key):
+    # Include contract in filename so each instrument has separate cache
+    return os.path.join(CACHE_DIR, f'sessions_{ACTIVE_CONTRACT}_{key}.json')
 
 def load_cache_from_file(week_id):
-    """Load cached data from file (includes contract in filename for multi-instrument support)"""
-    global ACTIVE_CONTRACT
+    """Load a completed week saved by an earlier run (contract in the filename for multi-instrument support)"""
+    key = week_key(week_id)
     try:
-        # Include contract in filename so each instrument has separate cache
-        cache_file = os.path.join(CACHE_DIR, f'sessions_{ACTIVE_CONTRACT}_{week_id}.json')
+        cache_file = week_cache_file(key)
         if os.path.exists(cache_file):
             with open(cache_file, 'r') as f:
                 data = json.load(f)
-                weekly_sessions_cache[week_id]['data'] = data['data']
-                weekly_sessions_cache[week_id]['timestamp'] = data['timestamp']
-                weekly_sessions_cache[week_id]['ready'] = True
-                print(f"✅ Loaded {week_id} from cache file ({ACTIVE_CONTRACT})")
-                return True
+            with weekly_sessions_lock:
+                weekly_sessions_cache[key] = {'data': data['data'], 'timestamp': data['timestamp'],
+                                              'ready': True, 'complete': True}
+            print(f"✅ Loaded {week_id} ({key}) from cache file ({ACTIVE_CONTRACT})")
+            return True
     except Exception as e:
         print(f"⚠️ Could not load cache for {week_id}: {e}")
     return False
 
-def save_cache_to_file(week_id):
-    """Save cached data to file (includes contract in filename for multi-instrument support)"""
-    global ACTIVE_CONTRACT
+def save_cache_to_file(key):
+    """Save a completed week - its sessions never change again"""
     try:
         os.makedirs(CACHE_DIR, exist_ok=True)
-        # Include contract in filename so each instrument has separate cache
-        cache_file = os.path.join(CACHE_DIR, f'sessions_{ACTIVE_CONTRACT}_{week_id}.json')
+        cache_file = week_cache_file(key)
         cache_data = {
-            'data': weekly_sessions_cache[week_id]['data'],
-            'timestamp': weekly_sessions_cache[week_id]['timestamp']
+            'data': weekly_sessions_cache[key]['data'],
+            'timestamp': weekly_sessions_cache[key]['timestamp']
         }
-        with open(cache_file, 'w') as f:
+        tmp = cache_file + '.tmp'
+        with open(tmp, 'w') as f:
             json.dump(cache_data, f)
-        print(f"💾 Saved {week_id} to cache file ({ACTIVE_CONTRACT})")
+        os.replace(tmp, cache_file)
+        print(f"💾 Saved {key} to cache file ({ACTIVE_CONTRACT})")
     except Exception as e:
-        print(f"⚠️ Could not save cache for {week_id}: {e}")
+        print(f"⚠️ Could not save cache for {key}: {e}")
 
 def load_all_caches():
-    """Load all week caches from files on startup"""
-    for week_id in weekly_sessions_cache.keys():
+    """Load completed weeks from files and the current week from the session store on startup"""
+    for week_id in WEEK_IDS[:-1]:
         load_cache_from_file(week_id)
+    build_current_week(load=False)
 
-    # After loading caches, initialize week levels from historical data
-    initialize_week_levels_from_history()
+    # After loading caches, initialize week levels from the stored sessions (no downloads yet)
+    initialize_week_levels_from_history(load=False)
 
     # Also initialize weekly open from Monday's data
     initialize_weekly_open_from_history()
 
+def week_trading_days(week_id):
+    """Trading dates of a week, most recent first (Fri at top, Mon at bottom)"""
+    date_range = get_week_date_range(week_id)
+    if not date_range:
+        return []
+    start_date = datetime.strptime(date_range[0], '%Y-%m-%d').date()
+    check_date = datetime.strptime(date_range[1], '%Y-%m-%d').date()
+    trading_days = []
+    while check_date >= start_date:
+        if check_date.weekday() < 5:  # Mon-Fri
+            trading_days.append(check_date)
+        check_date -= timedelta(days=1)
+    return trading_days
+
+def build_current_week(load=True):
+    """(Re)build the running week from the session store; load=False uses only stored days"""
+    key = week_key('current')
+    trading_days = week_trading_days('current')
+    if not trading_days or CONTRACT_CONFIG.get(ACTIVE_CONTRACT, {}).get('is_spot', False):
+        return None
+    summaries = session_summaries(min(trading_days), max(trading_days), load=load)
+    if not summaries:
+        return None
+    result = fetch_sessions_ohlc_days(trading_days, SESSION_DEFS, summaries)
+    with weekly_sessions_lock:
+        weekly_sessions_cache[key] = {'data': result, 'timestamp': time.time(), 'ready': True, 'complete': False}
+    return result
+
+def extend_current_week(date_str, session_id, ended):
+    """Fold a session that ended live into its week's cached days. Copy-on-write: a new list
+    with a new day dict replaces the old one, so a reader serializing it is never disturbed"""
+    trading_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+    if trading_date.weekday() >= 5:
+        return
+    key = iso_week(trading_date)
+    session = {'o': ended['open'], 'h': ended['high'], 'l': ended['low'], 'c': ended['close']}
+    with weekly_sessions_lock:
+        cached = weekly_sessions_cache.get(key)
+        if not cached or not cached['ready'] or cached['complete']:
+            return  # Built from the session store when first asked for
+        days = list(cached['data'])
+        index = next((i for i, d in enumerate(days) if d['date'] == date_str), None)
+        if index is None:
+            days.append({'date': date_str, 'label': trading_date.strftime('%m-%d %a'), 'sessions': {},
+                         'day': {'o': 0, 'h': 0, 'l': 999999, 'c': 0}})
+            days.sort(key=lambda d: d['date'], reverse=True)
+            index = next(i for i, d in enumerate(days) if d['date'] == date_str)
+        old = days[index]
+        day = old['day']
+        days[index] = dict(old, sessions=dict(old['sessions'], **{session_id: session}), day={
+            'o': day['o'] or session['o'],
+            'h': max(day['h'], session['h']),
+            'l': min(day['l'], session['l']),
+            'c': session['c'],
+        })
+        weekly_sessions_cache[key] = dict(cached, data=days, timestamp=time.time())
+
+def overlay_live_sessions(days):
+    """days (a cached [{date, sessions, day}, ...] list) with the running trading day's entry
+    replaced by a copy carrying the live day OHLC and today's ended sessions - the cached
+    list is never modified"""
+    date_str = session_trading_day(get_et_now())
+    index = next((i for i, d in enumerate(days or []) if d.get('date') == date_str), None)
+    if index is None:
+        return days
+    with cache_lock:
+        ended = dict(state.get('ended_sessions', {}))
+        day_high = state.get('day_high', 0)
+        day_low = state.get('day_low', 999999)
+        day_open = state.get('day_open', 0)
+        current_price = state.get('current_price', 0)
+    entry = days[index]
+    sessions = dict(entry['sessions'])
+    for sid, sdata in ended.items():
+        sessions[sid] = {
+            'o': sdata.get('open', 0),
+            'h': sdata.get('high', 0),
+            'l': sdata.get('low', 0),
+            'c': sdata.get('close', 0)
+        }
+    day = entry['day']
+    if day_high > 0:
+        day = {
+            'o': day_open,
+            'h': day_high,
+            'l': day_low if day_low < 999999 else day_high,
+            'c': current_price
+        }
+    days = list(days)
+    days[index] = dict(entry, sessions=sessions, day=day)
+    return days
+
 def initialize_weekly_open_from_history():
     """Initialize weekly_open from Monday's pre_asia session open if not set"""
     global state
@@ -4486,8 +4699,7 @@ def initialize_weekly_open_from_history():
             return
 
     # Get current week data from cache
-    current_week = weekly_sessions_cache.get('current', {})
-    week_data = current_week.get('data')
+    week_data = week_cache('current')['data']
 
     if not week_data:
         print("   ⚠️ No current week data available for weekly open initialization")
@@ -4531,31 +4743,31 @@ def initialize_weekly_open_from_history():
     else:
         print("   ⚠️ Could not find Monday data for weekly open initialization")
 
-def initialize_week_levels_from_history():
-    """Initialize week_high, week_low, and rolling_20d from historical session data"""
-    global state, weekly_sessions_cache
-
-    # Get current week data
-    current_week = weekly_sessions_cache.get('current', {})
-    week_data = current_week.get('data', [])
-
-    if week_data:
-        # Calculate week high/low from all sessions in current week
-        week_high = 0.0
-        week_low = 999999.0
-
-        for day in week_data:
-            sessions = day.get('sessions', {})
-            for sess_key, sess in sessions.items():
-                sess_high = sess.get('h', 0)
-                sess_low = sess.get('l', 0)
-                if sess_high > 0 and sess_high > week_high:
-                    week_high = sess_high
-                if sess_low > 0 and sess_low < week_low:
-                    week_low = sess_low
+def initialize_week_levels_from_history(load=True):
+    """Initialize week_high, week_low, and rolling_20d from the session store's day rows
+    (load=False: only what is already stored - no downloads)"""
+    global state
 
-        if week_high > 0:
-            with lock:
+    today = get_et_now().date()
+    current_monday = today - timedelta(days=today.weekday())
+    # Current week plus the 4 before it
+    days = session_summaries(current_monday - timedelta(weeks=4), today, load=load)
+    day_rows = {d: rows['day'] for d, rows in days.items() if 'day' in rows}
+
+    week = [row for d, row in day_rows.items() if d >= current_monday.isoformat()]
+    # The running day so far from the live levels (restored checkpoint / live trades) - the
+    # stored rows only have it when load=True rebuilt it from its bars
+    with lock:
+        day_high, day_low = state['day_high'], state['day_low']
+    if day_high > 0 and 0 < day_low < 999999:
+        week.append({'high': day_high, 'low': day_low})
+    if week:
+        # Calculate week high/low from all days in current week
+        week_high = max(row['high'] for row in week)
+        week_low = min(row['low'] for row in week)
+
+        if week_high > 0:
+            with lock:
                 if state['week_high'] == 0 or state['week_high'] < week_high:
                     state['week_high'] = week_high
                 if state['week_low'] == 999999.0 or state['week_low'] > week_low:
@@ -4563,27 +4775,9 @@ def initialize_week_levels_from_history():
             print(f"   📊 Week H/L initialized from history: H=${week_high:.2f}, L=${week_low:.2f}")
 
     # Calculate rolling 20-day high/low from multiple weeks
-    all_highs = []
-    all_lows = []
-
-    # Collect from current week and past weeks
-    for week_id in ['current', 'w1', 'w2', 'w3', 'w4']:
-        cache_data = weekly_sessions_cache.get(week_id, {})
-        if cache_data.get('ready') or week_id == 'current':
-            week_days = cache_data.get('data') or []
-            for day in week_days:
-                sessions = day.get('sessions', {})
-                for sess_key, sess in sessions.items():
-                    sess_high = sess.get('h', 0)
-                    sess_low = sess.get('l', 0)
-                    if sess_high > 0:
-                        all_highs.append(sess_high)
-                    if sess_low > 0:
-                        all_lows.append(sess_low)
-
-    if all_highs and all_lows:
-        rolling_high = max(all_highs)
-        rolling_low = min(all_lows)
+    if day_rows:
+        rolling_high = max(row['high'] for row in day_rows.values())
+        rolling_low = min(row['low'] for row in day_rows.values())
         with lock:
             state['rolling_20d_high'] = rolling_high
             state['rolling_20d_low'] = rolling_low
@@ -4591,12 +4785,14 @@ def initialize_week_levels_from_history():
 
 def fetch_btc_week_sessions_ohlc(week_id):
     """Fetch historical session OHLC for BTC-SPOT from Binance"""
-    global weekly_sessions_cache
-
     date_range = get_week_date_range(week_id)
     if not date_range:
         print(f"⚠️  Unknown week: {week_id}")
         return None
+    key = week_key(week_id)
+    cached = weekly_sessions_cache.get(key)
+    if cached and cached['complete']:
+        return cached['data']  # Completed weeks never change
 
     start_date_str, end_date_str = date_range
     start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
@@ -4717,12 +4913,14 @@ def fetch_btc_week_sessions_ohlc(week_id):
 
         # Cache the result
         if result:
-            weekly_sessions_cache[week_id] = {
-                'ready': True,
-                'data': result,
-                'timestamp': time.time()
-            }
-            print(f"✅ BTC {week_id} cached: {len(result)} days")
+            with weekly_sessions_lock:
+                weekly_sessions_cache[key] = {
+                    'ready': True,
+                    'data': result,
+                    'timestamp': time.time(),
+                    'complete': week_is_complete(key)
+                }
+            print(f"✅ BTC {week_id} ({key}) cached: {len(result)} days")
 
         return result
 
@@ -4732,9 +4930,8 @@ def fetch_btc_week_sessions_ohlc(week_id):
 
 
 def fetch_week_sessions_ohlc(week_id):
-    """Fetch historical session OHLC for a specific week"""
-    global weekly_sessions_cache, ACTIVE_CONTRACT, front_month_instrument_id
-
+    """Session OHLC of a week (w1..w5 / current or an ISO week) from the session store.
+    A completed week is built once and saved; later calls return it without fetching."""
     # Use BTC-specific fetcher for spot contracts
     config = CONTRACT_CONFIG.get(ACTIVE_CONTRACT, CONTRACT_CONFIG['GC'])
     if config.get('is_spot', False):
@@ -4744,138 +4941,38 @@ def fetch_week_sessions_ohlc(week_id):
         print(f"⚠️  No Databento credentials for {week_id}")
         return None
 
-    date_range = get_week_date_range(week_id)
-    if not date_range:
+    key = week_key(week_id)
+    if key is None:
         print(f"⚠️  Unknown week: {week_id}")
         return None
+    cached = weekly_sessions_cache.get(key)
+    if cached and cached['complete']:
+        return cached['data']  # Completed weeks never change
+    if key != week_key('current') and load_cache_from_file(key):
+        return weekly_sessions_cache[key]['data']
 
-    start_date_str, end_date_str = date_range
-    start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-    end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-    symbol = config['symbol']
-    price_min = config['price_min']
-    price_max = config['price_max']
-
-    session_defs = [
-        ('pre_asia', 'Pre-Asia', 18, 0, 19, 0),
-        ('japan_ib', 'Japan', 19, 0, 20, 0),
-        ('china', 'China', 20, 0, 23, 0),
-        ('asia_close', 'Asia Close', 23, 0, 2, 0),
-        ('deadzone', 'Deadzone', 2, 0, 3, 0),
-        ('london', 'London', 3, 0, 6, 0),
-        ('low_volume', 'Low Vol', 6, 0, 8, 20),
-        ('us_ib', 'US IB', 8, 20, 9, 30),
-        ('ny_1h', 'NY 1H', 9, 30, 10, 30),
-        ('ny_2h', 'NY 2H', 10, 30, 11, 30),
-        ('lunch', 'Lunch', 11, 30, 13, 30),
-        ('ny_pm', 'NY PM', 13, 30, 16, 0),
-        ('ny_close', 'NY Close', 16, 0, 17, 0),
-    ]
-
+    start_date_str, end_date_str = get_week_date_range(key)
     try:
-        client = db.Historical(key=API_KEY)
-        et_tz = timezone(timedelta(hours=-5))
-
-        # Get trading days in range (skip weekends)
-        trading_days = []
-        check_date = end_date
-        while check_date >= start_date:
-            if check_date.weekday() < 5:  # Mon-Fri
-                trading_days.append(check_date)
-            check_date -= timedelta(days=1)
+        trading_days = week_trading_days(key)
 
         # Keep Fri at top, Mon at bottom (most recent first)
-        print(f"📅 Fetching {week_id} ({start_date_str} to {end_date_str}): {len(trading_days)} days")
-
-        result = []
-
-        for trading_date in trading_days:
-            # Format: "01-12 Mon" (MM-DD Day)
-            day_label = trading_date.strftime('%m-%d %a')
-            date_str = trading_date.strftime('%Y-%m-%d')
-
-            day_data = {
-                'date': date_str,
-                'label': day_label,
-                'sessions': {},
-                'day': {'o': 0, 'h': 0, 'l': 999999, 'c': 0}
-            }
-
-            prev_date = trading_date - timedelta(days=1)
-            start_utc = f"{prev_date.isoformat()}T23:00:00Z"
-            end_utc = f"{trading_date.isoformat()}T22:00:00Z"
-
-            try:
-                data = client.timeseries.get_range(
-                    dataset='GLBX.MDP3',
-                    symbols=[symbol],
-                    stype_in='parent',
-                    schema='trades',
-                    start=start_utc,
-                    end=end_utc
-                )
+        print(f"📅 Fetching {week_id} ({key}: {start_date_str} to {end_date_str}): {len(trading_days)} days")
 
-                df = data.to_df()
-                if df.empty:
-                    result.append(day_data)
-                    continue
-
-                if front_month_instrument_id and 'instrument_id' in df.columns:
-                    df = df[df['instrument_id'] == front_month_instrument_id]
-
-                df = df[(df['price'] > price_min) & (df['price'] < price_max)]
-
-                if df.empty:
-                    result.append(day_data)
-                    continue
-
-                df = df.sort_values('ts_event')
-
-                day_data['day'] = {
-                    'o': float(df.iloc[0]['price']),
-                    'h': float(df['price'].max()),
-                    'l': float(df['price'].min()),
-                    'c': float(df.iloc[-1]['price'])
-                }
-
-                df['et_time'] = df['ts_event'].dt.tz_convert(et_tz)
-                df['hour'] = df['et_time'].dt.hour
-                df['minute'] = df['et_time'].dt.minute
-
-                for sid, sname, start_h, start_m, end_h, end_m in session_defs:
-                    start_mins = start_h * 60 + start_m
-                    end_mins = end_h * 60 + end_m
-
-                    if end_mins < start_mins:
-                        mask = ((df['hour'] * 60 + df['minute']) >= start_mins) | \
-                               ((df['hour'] * 60 + df['minute']) < end_mins)
-                    else:
-                        mask = ((df['hour'] * 60 + df['minute']) >= start_mins) & \
-                               ((df['hour'] * 60 + df['minute']) < end_mins)
-
-                    session_df = df[mask]
-                    if not session_df.empty:
-                        day_data['sessions'][sid] = {
-                            'o': float(session_df.iloc[0]['price']),
-                            'h': float(session_df['price'].max()),
-                            'l': float(session_df['price'].min()),
-                            'c': float(session_df.iloc[-1]['price'])
-                        }
-
-                print(f"   ✅ {date_str}: {len(day_data['sessions'])} sessions")
-
-            except Exception as e:
-                print(f"   ⚠️ {date_str}: {e}")
-
-            result.append(day_data)
+        result = fetch_sessions_ohlc_days(trading_days, SESSION_DEFS)
+        for day_data in result:
+            print(f"   ✅ {day_data['date']}: {len(day_data['sessions'])} sessions")
+        ended = week_is_complete(key)
+        complete = ended and week_days_final(key)
+        if ended and not complete:
+            print(f"   ⚠️ {key}: not every day is stored yet - kept in memory, rebuilt on the next request")
 
         # Store in cache
-        weekly_sessions_cache[week_id]['data'] = result
-        weekly_sessions_cache[week_id]['timestamp'] = time.time()
-        weekly_sessions_cache[week_id]['ready'] = True
-        save_cache_to_file(week_id)
+        with weekly_sessions_lock:
+            weekly_sessions_cache[key] = {'data': result, 'timestamp': time.time(), 'ready': True, 'complete': complete}
+        if complete:
+            save_cache_to_file(key)
 
-        print(f"✅ {week_id} cached: {len(result)} days")
+        print(f"✅ {week_id} ({key}) cached: {len(result)} days")
         return result
 
     except Exception as e:
@@ -4884,15 +4981,17 @@ def fetch_week_sessions_ohlc(week_id):
         traceback.print_exc()
         return None
 
+def queue_week_sessions(week_id):
+    """fetch_week_sessions_ohlc on a background thread (the request serves the fallback meanwhile)"""
+    return _queue_session_job(('week', ACTIVE_CONTRACT, week_key(week_id)), lambda: fetch_week_sessions_ohlc(week_id),
+                              f"build of {week_id}")
+
+
 def fetch_all_historical_weeks():
-    """Fetch historical data for all past weeks (background task)"""
-    weeks_to_fetch = ['w5', 'w4', 'w3', 'w2', 'w1']  # 5 historic weeks (oldest to newest)
-    for week_id in weeks_to_fetch:
-        if not weekly_sessions_cache[week_id]['ready']:
-            date_range = get_week_date_range(week_id)
-            print(f"📊 Fetching {week_id} ({date_range[0]} to {date_range[1]})...")
+    """Build the past weeks not cached yet (background task) - completed weeks only once"""
+    for week_id in WEEK_IDS[:-1]:  # 5 historic weeks (oldest to newest)
+        if not week_cache(week_id)['complete']:
             fetch_week_sessions_ohlc(week_id)
-            time.sleep(1)  # Small delay between fetches
     print("✅ All historical weeks cached")
 
 # Market overview cache for Correlation Matrix
@@ -5275,7 +5374,7 @@ def fetch_historic_tpo_profiles(days=40):
 
     # Check cache
     now = time.time()
-    if historic_tpo_cache['data'] and (now - historic_tpo_cache['timestamp']) < historic_tpo_cache['ttl']:
+    if cache_is_fresh('historic_tpo', historic_tpo_cache, now):
         cached = historic_tpo_cache['data']
         if cached.get('days') == days:
             return cached
@@ -5319,7 +5418,8 @@ def fetch_historic_tpo_profiles(days=40):
 
         # Fetch OHLCV data with 1-hour bars (Databento doesn't support 30m directly)
         # We'll create synthetic 30-min periods from the hour data
-        data = client.timeseries.get_range(
+        data = historical_range(
+            client,
             dataset='GLBX.MDP3',
             symbols=[symbol],
             stype_in='parent',  # Use parent for more historical data
@@ -5328,17 +5428,12 @@ def fetch_historic_tpo_profiles(days=40):
             end=end_utc
         )
 
-        records = list(data)
-        print(f"   Got {len(records)} hourly bars")
-
-        if not records:
-            return {'profiles': [], 'days': days, 'error': 'No data available'}
-
-        # First pass: Group bars by trading day AND instrument_id to find front month
+        # First pass (streamed in batches): Group bars by trading day AND instrument_id to find front month
         daily_instrument_volumes = {}  # {date: {instrument_id: total_volume}}
+        bar_count = 0
 
-        for r in records:
-            ts_ns = r.ts_event
+        for ts_ns, iid, v in iter_rows(data, ('ts_event', 'instrument_id', 'volume')):
+            bar_count += 1
             ts_sec = ts_ns / 1e9
             bar_time = datetime.fromtimestamp(ts_sec, tz=pytz.UTC).astimezone(et_tz)
 
@@ -5352,15 +5447,17 @@ def fetch_historic_tpo_profiles(days=40):
             if bar_weekday >= 5:
                 continue
 
-            iid = r.instrument_id
-            v = r.volume
-
             if trade_date not in daily_instrument_volumes:
                 daily_instrument_volumes[trade_date] = {}
             if iid not in daily_instrument_volumes[trade_date]:
                 daily_instrument_volumes[trade_date][iid] = 0
             daily_instrument_volumes[trade_date][iid] += v
 
+        print(f"   Got {bar_count} hourly bars")
+
+        if not bar_count:
+            return {'profiles': [], 'days': days, 'error': 'No data available'}
+
         # Find front month (highest volume) instrument for each day
         daily_front_month = {}
         for date, instruments in daily_instrument_volumes.items():
@@ -5373,8 +5470,7 @@ def fetch_historic_tpo_profiles(days=40):
         # Second pass: Only use bars from front month contract for each day
         daily_data = {}
 
-        for r in records:
-            ts_ns = r.ts_event
+        for ts_ns, iid, o, h, l, c, v in iter_rows(data, ('ts_event', 'instrument_id', 'open', 'high', 'low', 'close', 'volume')):
             ts_sec = ts_ns / 1e9
             bar_time = datetime.fromtimestamp(ts_sec, tz=pytz.UTC).astimezone(et_tz)
 
@@ -5391,15 +5487,14 @@ def fetch_historic_tpo_profiles(days=40):
             # Only use front month contract for this day
             if trade_date not in daily_front_month:
                 continue
-            if r.instrument_id != daily_front_month[trade_date]:
+            if iid != daily_front_month[trade_date]:
                 continue
 
             # Get OHLCV values
-            o = r.open / 1e9 if r.open > 1e6 else r.open
-            h = r.high / 1e9 if r.high > 1e6 else r.high
-            l = r.low / 1e9 if r.low > 1e6 else r.low
-            c = r.close / 1e9 if r.close > 1e6 else r.close
-            v = r.volume
+            o = o / 1e9 if o > 1e6 else o
+            h = h / 1e9 if h > 1e6 else h
+            l = l / 1e9 if l > 1e6 else l
+            c = c / 1e9 if c > 1e6 else c
 
             # Filter invalid prices
             if h < price_min or l > price_max or h < l:
@@ -5505,6 +5600,16 @@ def fetch_historic_tpo_profiles(days=40):
         profiles = []
         sorted_dates = sorted(daily_data.keys(), reverse=True)[:days]  # Most recent first
 
+        # Day OHLC, volume, IB and POC/VAH/VAL come from the session store (1-minute bars) when
+        # it has the day; TPO letters and the drawn volume profile stay on the hourly bars
+        # Days missing from the store are backfilled in the background; the next call (cache
+        # reset when it is done) picks them up
+        stored_days = {}
+        if sorted_dates:
+            first, last = (datetime.strptime(sorted_dates[i], '%Y-%m-%d').date() for i in (-1, 0))
+            stored_days = session_summaries(first, last, load=False)
+            queue_session_backfill(first, last, then=lambda: historic_tpo_cache.update(timestamp=0))
+
         for date in sorted_dates:
             day = daily_data[date]
 
@@ -5512,6 +5617,12 @@ def fetch_historic_tpo_profiles(days=40):
             if len(day['bars']) < 5 or day['high'] == 0 or day['low'] >= 999999:
                 continue
 
+            stored = stored_days.get(date, {}).get('day')
+            if stored:
+                day.update({k: stored[k] for k in ('open', 'high', 'low', 'close', 'volume')})
+                day['ib_high'] = stored['ib_high'] or 0
+                day['ib_low'] = stored['ib_low'] or 999999
+
             # Calculate POC (price with highest volume)
             poc = 0
             max_vol = 0
@@ -5551,6 +5662,8 @@ def fetch_historic_tpo_profiles(days=40):
 
             vah = sorted_prices[va_high_idx] if sorted_prices else day['high']
             val = sorted_prices[va_low_idx] if sorted_prices else day['low']
+            if stored:
+                poc, vah, val = stored['poc'], stored['vah'], stored['val']
 
             # Calculate IB range
             ib_high = day['ib_high'] if day['ib_high'] > 0 else None
@@ -5558,22 +5671,7 @@ def fetch_historic_tpo_profiles(days=40):
             ib_range = (ib_high - ib_low) if ib_high and ib_low else None
 
             # Classify day type based on IB extension
-            day_type = 'normal'
-            if ib_high and ib_low and ib_range:
-                session_range = day['high'] - day['low']
-                ext_up = max(0, day['high'] - ib_high)
-                ext_down = max(0, ib_low - day['low'])
-                total_ext = ext_up + ext_down
-                ext_pct = (total_ext / ib_range * 100) if ib_range > 0 else 0
-
-                if ext_pct > 150 and (ext_up < ib_range * 0.1 or ext_down < ib_range * 0.1):
-                    day_type = 'trend'
-                elif ext_pct > 100:
-                    day_type = 'normal_var'
-                elif ext_up > ib_range * 0.3 and ext_down > ib_range * 0.3:
-                    day_type = 'neutral'
-                elif ext_pct < 30:
-                    day_type = 'non_trend'
+            day_type = ib_day_type(day['high'], day['low'], ib_high, ib_low)
 
             # Determine profile shape based on volume distribution
             mid_price = (day['high'] + day['low']) / 2
@@ -5671,7 +5769,7 @@ def fetch_market_overview():
 
     # Check cache freshness
     now = time.time()
-    if market_overview_cache['data'] and (now - market_overview_cache['timestamp']) < market_overview_cache['ttl']:
+    if cache_is_fresh('market_overview', market_overview_cache, now):
         return market_overview_cache['data']
 
     if not HAS_YFINANCE:
@@ -5902,7 +6000,7 @@ def fetch_btc_etf_flows():
     global etf_flow_cache
 
     now = time.time()
-    if etf_flow_cache['data'] and (now - etf_flow_cache['timestamp']) < etf_flow_cache['ttl']:
+    if cache_is_fresh('etf_flow', etf_flow_cache, now):
         return etf_flow_cache['data']
 
     if not HAS_YFINANCE:
@@ -6022,7 +6120,7 @@ def fetch_cot_data():
     global cot_data_cache
 
     now = time.time()
-    if cot_data_cache['data'] and (now - cot_data_cache['timestamp']) < cot_data_cache['ttl']:
+    if cache_is_fresh('cot_data', cot_data_cache, now):
         return cot_data_cache['data']
 
     try:
@@ -6123,7 +6221,7 @@ def fetch_wgc_data():
     global wgc_data_cache
 
     now = time.time()
-    if wgc_data_cache['data'] and (now - wgc_data_cache['timestamp']) < wgc_data_cache['ttl']:
+    if cache_is_fresh('wgc_data', wgc_data_cache, now):
         return wgc_data_cache['data']
 
     try:
@@ -6225,7 +6323,7 @@ def fetch_institutional_positions():
     global institutional_cache
 
     now = time.time()
-    if institutional_cache['data'] and (now - institutional_cache['timestamp']) < institutional_cache['ttl']:
+    if cache_is_fresh('institutional', institutional_cache, now):
         return institutional_cache['data']
 
     try:
@@ -6365,7 +6463,7 @@ def fetch_btc_whale_analysis():
     global btc_whale_cache
 
     now = time.time()
-    if btc_whale_cache['data'] and (now - btc_whale_cache['timestamp']) < btc_whale_cache['ttl']:
+    if cache_is_fresh('btc_whale', btc_whale_cache, now):
         return btc_whale_cache['data']
 
     result = {
@@ -6773,6 +6871,7 @@ class CryptoWebSocket:
         def on_message(ws, message):
             try:
                 self._msg_count += 1
+                WS_MESSAGES.labels(exchange_name).inc()
                 if self._msg_count <= 3:
                     print(f"📩 [{exchange_name}] msg #{self._msg_count}: {message[:150]}...")
 
@@ -7022,7 +7121,7 @@ def fetch_liquidations():
             return ws_data
 
     # Check cache for REST fallback
-    if liquidation_cache['data'] and (now - liquidation_cache['timestamp']) < liquidation_cache['ttl']:
+    if cache_is_fresh('liquidation', liquidation_cache, now):
         return liquidation_cache['data']
 
     result = {
@@ -7174,7 +7273,7 @@ def detect_iceberg_orders():
     global iceberg_cache
 
     now = time.time()
-    if iceberg_cache['data'] and (now - iceberg_cache['timestamp']) < iceberg_cache['ttl']:
+    if cache_is_fresh('iceberg', iceberg_cache, now):
         return iceberg_cache['data']
 
     icebergs = []
@@ -7388,7 +7487,7 @@ def fetch_whale_transactions():
     global whale_transactions_cache
 
     now = time.time()
-    if whale_transactions_cache['data'] and (now - whale_transactions_cache['timestamp']) < whale_transactions_cache['ttl']:
+    if cache_is_fresh('whale_transactions', whale_transactions_cache, now):
         return whale_transactions_cache['data']
 
     transactions = []
@@ -7727,7 +7826,7 @@ def fetch_deribit_options():
     global deribit_options_cache
 
     now = time.time()
-    if deribit_options_cache['data'] and (now - deribit_options_cache['timestamp']) < deribit_options_cache['ttl']:
+    if cache_is_fresh('deribit_options', deribit_options_cache, now):
         return deribit_options_cache['data']
 
     try:
@@ -7867,7 +7966,7 @@ def fetch_funding_rates():
     global funding_rate_cache
 
     now = time.time()
-    if funding_rate_cache['data'] and (now - funding_rate_cache['timestamp']) < funding_rate_cache['ttl']:
+    if cache_is_fresh('funding_rate', funding_rate_cache, now):
         return funding_rate_cache['data']
 
     try:
@@ -8203,34 +8302,11 @@ def fetch_session_history(days=50, force_refresh=False):
     # If cache is ready and not forcing, use fast path
     if session_history_cache['ready'] and not force_refresh:
         return get_session_history_fast()
-    symbol = config['symbol']
-    price_min = config['price_min']
-    price_max = config['price_max']
-
-    # Session definitions with UTC offsets (ET + 5 hours for EST)
-    # Each session: id, name, start_hour, start_min, end_hour, end_min
-    session_defs = [
-        ('pre_asia', 'Pre-Asia', 18, 0, 19, 0),
-        ('japan_ib', 'Japan IB', 19, 0, 20, 0),
-        ('china', 'China', 20, 0, 23, 0),
-        ('asia_close', 'Asia Closing', 23, 0, 2, 0),  # Overnight
-        ('deadzone', 'Deadzone', 2, 0, 3, 0),
-        ('london', 'London', 3, 0, 6, 0),
-        ('low_volume', 'Low Volume', 6, 0, 8, 20),
-        ('us_ib', 'US IB', 8, 20, 9, 30),
-        ('ny_1h', 'NY 1H', 9, 30, 10, 30),
-        ('ny_2h', 'NY 2H', 10, 30, 11, 30),
-        ('lunch', 'Lunch', 11, 30, 13, 30),
-        ('ny_pm', 'NY PM', 13, 30, 16, 0),
-        ('ny_close', 'NY Close', 16, 0, 17, 0),
-    ]
-
     try:
-        client = db.Historical(key=API_KEY)
         et_now = get_et_now()
 
         result = {}
-        for sid, name, start_h, start_m, end_h, end_m in session_defs:
+        for sid, name, start_h, start_m, end_h, end_m in SESSION_DEFS:
             result[sid] = {
                 'name': name,
                 'ranges': [],  # List of {date, high, low, range} for each day
@@ -8238,128 +8314,31 @@ def fetch_session_history(days=50, force_refresh=False):
 
         print(f"📊 Fetching {days} days of session history for VSI (optimized)...")
 
-        # Calculate date range - fetch ALL data in ONE call
+        # Calculate date range
         # Go back extra days to account for weekends
         start_date = et_now.date() - timedelta(days=days + 10)  # Buffer for weekends
 
-        # End at current time minus 30 min buffer (Databento Historical lags real-time)
-        # On weekends/holidays, data may not be available - fall back to Friday
-        utc_now = datetime.now(timezone.utc) - timedelta(minutes=30)
-        utc_start = f"{start_date}T23:00:00Z"  # 18:00 ET = 23:00 UTC
-        utc_end = utc_now.strftime("%Y-%m-%dT%H:%M:%SZ")
-
-        print(f"   Fetching all trades from {start_date} to now...")
-
-        # Try fetching, if fails due to data not available, fall back to Friday 22:00 UTC
-        try:
-            data = client.timeseries.get_range(
-                dataset='GLBX.MDP3',
-                symbols=[symbol],
-                stype_in='parent',
-                schema='trades',
-                start=utc_start,
-                end=utc_end
-            )
-        except Exception as e:
-            if '422' in str(e) or 'available' in str(e).lower():
-                # Data not available for current time - try ending at last Friday 22:00 UTC (17:00 ET)
-                et_now = get_et_now()
-                days_since_friday = (et_now.weekday() - 4) % 7
-                if days_since_friday == 0 and et_now.hour >= 17:
-                    days_since_friday = 0  # It's Friday after market close
-                elif days_since_friday == 0:
-                    days_since_friday = 7  # It's Friday before market close, use last Friday
-                last_friday = et_now.date() - timedelta(days=days_since_friday)
-                utc_end = f"{last_friday}T22:00:00Z"  # 17:00 ET Friday
-                print(f"   ⚠️ Data not available for today, falling back to {utc_end}")
-                data = client.timeseries.get_range(
-                    dataset='GLBX.MDP3',
-                    symbols=[symbol],
-                    stype_in='parent',
-                    schema='trades',
-                    start=utc_start,
-                    end=utc_end
-                )
-            else:
-                raise
-
-        records = list(data)
-        print(f"   Got {len(records)} total trade records")
-
-        if not records:
-            return result
-
-        # Find front month instrument (most trades)
-        by_instrument = {}
-        for r in records:
-            iid = r.instrument_id
-            if iid not in by_instrument:
-                by_instrument[iid] = 0
-            by_instrument[iid] += 1
-
-        front_month_id = max(by_instrument.items(), key=lambda x: x[1])[0] if by_instrument else None
-        print(f"   Front month instrument: {front_month_id}")
+        print(f"   Loading trading days from {start_date} (session store)...")
 
-        # Partition trades by session
+        # Session high/low are slices of the session store (settled days written once,
+        # the running day from its 1-minute bars)
         # Key: (trading_day_date, session_id) -> {'high': x, 'low': y}
         session_data = {}
+        summaries = session_summaries(start_date + timedelta(days=1), et_now.date() + timedelta(days=1))
 
-        for r in records:
-            if r.instrument_id != front_month_id:
-                continue
-
-            p = r.price / 1e9 if r.price > 1e6 else r.price
-            if p < price_min or p > price_max:
-                continue
-
-            # Convert timestamp to ET
-            ts_ns = r.ts_event
-            ts_sec = ts_ns / 1e9
-            utc_dt = datetime.fromtimestamp(ts_sec, tz=timezone.utc)
-            et_dt = utc_dt - timedelta(hours=5)  # UTC to ET
-
-            et_hour = et_dt.hour
-            et_min = et_dt.minute
-            et_time = et_hour * 100 + et_min
-
-            # Determine trading day (18:00 ET starts new day)
-            if et_hour >= 18:
-                trading_day = et_dt.date()
-            else:
-                trading_day = et_dt.date() - timedelta(days=1)
+        for closing, sessions in summaries.items():
+            # VSI dates a trading day by the ET date it opens on (18:00 ET)
+            trading_day = datetime.strptime(closing, '%Y-%m-%d').date() - timedelta(days=1)
 
             # Skip weekends
             if trading_day.weekday() >= 5:
                 continue
 
-            # Determine which session this trade belongs to
-            session_id = None
-            for sid, name, start_h, start_m, end_h, end_m in session_defs:
-                start_time = start_h * 100 + start_m
-                end_time = end_h * 100 + end_m
-
-                # Handle overnight sessions (e.g., asia_close 23:00-02:00)
-                if start_time > end_time:
-                    # Overnight: either after start OR before end
-                    if et_time >= start_time or et_time < end_time:
-                        session_id = sid
-                        break
-                else:
-                    if start_time <= et_time < end_time:
-                        session_id = sid
-                        break
-
-            if not session_id:
-                continue
-
-            key = (trading_day, session_id)
-            if key not in session_data:
-                session_data[key] = {'high': 0, 'low': float('inf')}
+            for sid, row in sessions.items():
+                if sid in SESSION_IDS:
+                    session_data[(trading_day, sid)] = {'high': row['high'], 'low': row['low']}
 
-            if p > session_data[key]['high']:
-                session_data[key]['high'] = p
-            if p < session_data[key]['low']:
-                session_data[key]['low'] = p
+        print(f"   Got {len(summaries)} trading days")
 
         # Convert session_data to result format
         for (trading_day, sid), stats in session_data.items():
@@ -8406,6 +8385,32 @@ def fetch_session_history(days=50, force_refresh=False):
         return None
 
 
+def fetch_sessions_ohlc_days(trading_dates, session_defs, summaries=None):
+    """Day and per-session OHLC of each trading date (the session closing 17:00 ET that day)
+    from the session store: [{date, label, sessions: {id: {o, h, l, c}}, day: {o, h, l, c}}, ...]"""
+    if summaries is None:
+        summaries = session_summaries(min(trading_dates), max(trading_dates)) if trading_dates else {}
+
+    result = []
+    for trading_date in trading_dates:
+        date_str = trading_date.strftime('%Y-%m-%d')
+        day_data = {
+            'date': date_str,
+            'label': trading_date.strftime('%m-%d %a'),  # 01-12 Mon format
+            'sessions': {},
+            'day': {'o': 0, 'h': 0, 'l': 999999, 'c': 0}
+        }
+        rows = summaries.get(date_str, {})
+        if 'day' in rows:
+            day_data['day'] = {k: rows['day'][f] for k, f in (('o', 'open'), ('h', 'high'), ('l', 'low'), ('c', 'close'))}
+            for sid in (d[0] for d in session_defs):
+                row = rows.get(sid)
+                if row:
+                    day_data['sessions'][sid] = {'o': row['open'], 'h': row['high'], 'l': row['low'], 'c': row['close']}
+        result.append(day_data)
+    return result
+
+
 def fetch_historical_sessions_ohlc(days=6):
     """Fetch 5-day historical session OHLC for stacked candle visualization"""
     global historical_sessions_ohlc_cache, ACTIVE_CONTRACT, front_month_instrument_id
@@ -8418,9 +8423,6 @@ def fetch_historical_sessions_ohlc(days=6):
     if not HAS_DATABENTO or not API_KEY:
         print("⚠️  No Databento credentials for historical sessions OHLC")
         return None
-    symbol = config['symbol']
-    price_min = config['price_min']
-    price_max = config['price_max']
 
     # Session definitions with ET time ranges
     session_defs = [
@@ -8440,7 +8442,6 @@ def fetch_historical_sessions_ohlc(days=6):
     ]
 
     try:
-        client = db.Historical(key=API_KEY)
         et_tz = timezone(timedelta(hours=-5))  # EST
 
         # Get last N trading days (skip weekends)
@@ -8456,98 +8457,7 @@ def fetch_historical_sessions_ohlc(days=6):
 
         print(f"📊 Fetching {days}-day historical session OHLC...")
 
-        result = []
-
-        for day_idx, trading_date in enumerate(trading_days):
-            day_label = trading_date.strftime('%m-%d %a')  # 01-12 Mon format
-            date_str = trading_date.strftime('%Y-%m-%d')
-
-            # For sessions that cross midnight, we need the previous day's date for start
-            day_data = {
-                'date': date_str,
-                'label': day_label,
-                'sessions': {},
-                'day': {'o': 0, 'h': 0, 'l': 999999, 'c': 0}
-            }
-
-            # Fetch full day's trades (18:00 prev day to 17:00 this day in UTC)
-            # Trading day N starts at 18:00 ET on day N-1 and ends at 17:00 ET on day N
-            prev_date = trading_date - timedelta(days=1)
-            start_utc = f"{prev_date.isoformat()}T23:00:00Z"  # 18:00 ET = 23:00 UTC
-            end_utc = f"{trading_date.isoformat()}T22:00:00Z"  # 17:00 ET = 22:00 UTC
-
-            try:
-                data = client.timeseries.get_range(
-                    dataset='GLBX.MDP3',
-                    symbols=[symbol],
-                    stype_in='parent',
-                    schema='trades',
-                    start=start_utc,
-                    end=end_utc
-                )
-
-                df = data.to_df()
-                if df.empty:
-                    result.append(day_data)
-                    continue
-
-                # Filter by front month if we have the instrument ID
-                if front_month_instrument_id and 'instrument_id' in df.columns:
-                    df = df[df['instrument_id'] == front_month_instrument_id]
-
-                # Filter valid prices
-                df = df[(df['price'] > price_min) & (df['price'] < price_max)]
-
-                if df.empty:
-                    result.append(day_data)
-                    continue
-
-                # Sort by timestamp
-                df = df.sort_values('ts_event')
-
-                # Calculate day OHLC
-                day_data['day'] = {
-                    'o': float(df.iloc[0]['price']),
-                    'h': float(df['price'].max()),
-                    'l': float(df['price'].min()),
-                    'c': float(df.iloc[-1]['price'])
-                }
-
-                # Convert timestamps to ET for session filtering
-                df['et_time'] = df['ts_event'].dt.tz_convert(et_tz)
-                df['hour'] = df['et_time'].dt.hour
-                df['minute'] = df['et_time'].dt.minute
-
-                # Calculate OHLC for each session
-                for sid, sname, start_h, start_m, end_h, end_m in session_defs:
-                    start_mins = start_h * 60 + start_m
-                    end_mins = end_h * 60 + end_m
-
-                    # Handle sessions that cross midnight
-                    if end_mins < start_mins:
-                        # Session crosses midnight (e.g., 23:00-02:00)
-                        mask = ((df['hour'] * 60 + df['minute']) >= start_mins) | \
-                               ((df['hour'] * 60 + df['minute']) < end_mins)
-                    else:
-                        mask = ((df['hour'] * 60 + df['minute']) >= start_mins) & \
-                               ((df['hour'] * 60 + df['minute']) < end_mins)
-
-                    session_df = df[mask]
-
-                    if not session_df.empty:
-                        day_data['sessions'][sid] = {
-                            'o': float(session_df.iloc[0]['price']),
-                            'h': float(session_df['price'].max()),
-                            'l': float(session_df['price'].min()),
-                            'c': float(session_df.iloc[-1]['price'])
-                        }
-
-            except Exception as e:
-                err_str = str(e)
-                if '422' not in err_str:  # Ignore "no data" errors silently
-                    print(f"   ⚠️ Error fetching {date_str}: {err_str[:50]}")
-
-            result.append(day_data)
+        result = fetch_sessions_ohlc_days(trading_days, session_defs)
 
         # Update cache
         historical_sessions_ohlc_cache['data'] = result
@@ -8599,6 +8509,7 @@ def fetch_current_session_history():
                 state['vwap'] = 0.0
                 state['vwap_numerator'] = 0.0
                 state['vwap_denominator'] = 0.0
+                vwap_engine.reset(anchor_id='vwap')
                 state['current_phase'] = 'MARKET CLOSED'
             return
 
@@ -8613,6 +8524,7 @@ def fetch_current_session_history():
                     state['vwap'] = 0.0
                     state['vwap_numerator'] = 0.0
                     state['vwap_denominator'] = 0.0
+                    vwap_engine.reset(anchor_id='vwap')
                     state['current_phase'] = 'PRE-ASIA'
             return
 
@@ -8653,84 +8565,23 @@ def fetch_current_session_history():
         print(f"   Session: {session_name} ({session_start} ET)")
         print(f"   Querying {symbol} trades from {utc_start} to {utc_end}...", flush=True)
 
-        client = db.Historical(key=API_KEY)
-        data = client.timeseries.get_range(
-            dataset='GLBX.MDP3',
-            symbols=[symbol],
-            stype_in='parent',
-            schema='trades',
-            start=utc_start,
-            end=utc_end
-        )
-
-        records = list(data)
-        print(f"   Got {len(records)} trades for {session_name}", flush=True)
+        frame = trade_history.window(ACTIVE_CONTRACT, _utc_str_to_ns(utc_start))
+        print(f"   Got {len(frame)} trades for {session_name}", flush=True)
 
-        if not records:
+        session_data = summary(frame.select(history_front_month(), price_min, price_max))
+        if session_data is None:
             print(f"   ⚠️  No trades found for current session")
             return
 
-        # Group by instrument ID to find front month
-        by_instrument = {}
-        for r in records:
-            iid = r.instrument_id
-            p = r.price / 1e9 if r.price > 1e6 else r.price
-            size = getattr(r, 'size', 1)
-            side = getattr(r, 'side', 'U')  # 'A' = Ask (buy), 'B' = Bid (sell)
-            ts = r.ts_event  # Timestamp for tracking first/last trade
-
-            if p < price_min or p > price_max:
-                continue
-
-            if iid not in by_instrument:
-                by_instrument[iid] = {
-                    'count': 0, 'high': 0, 'low': float('inf'),
-                    'vwap_num': 0, 'vwap_den': 0,
-                    'buy_volume': 0, 'sell_volume': 0,
-                    'first_ts': float('inf'), 'first_price': 0,
-                    'last_ts': 0, 'last_price': 0
-                }
-            by_instrument[iid]['count'] += 1
-            if p > by_instrument[iid]['high']:
-                by_instrument[iid]['high'] = p
-            if p < by_instrument[iid]['low']:
-                by_instrument[iid]['low'] = p
-            # Track first and last trade for open/close
-            if ts < by_instrument[iid]['first_ts']:
-                by_instrument[iid]['first_ts'] = ts
-                by_instrument[iid]['first_price'] = p
-            if ts > by_instrument[iid]['last_ts']:
-                by_instrument[iid]['last_ts'] = ts
-                by_instrument[iid]['last_price'] = p
-            # VWAP calculation
-            by_instrument[iid]['vwap_num'] += p * size
-            by_instrument[iid]['vwap_den'] += size
-            # Volume by side
-            if side == 'A':  # Ask = Buy
-                by_instrument[iid]['buy_volume'] += size
-            elif side == 'B':  # Bid = Sell
-                by_instrument[iid]['sell_volume'] += size
-
-        if not by_instrument:
-            return
-
-        # Use front month (most trades)
-        front_month = max(by_instrument.items(), key=lambda x: x[1]['count'])
-        iid, session_data = front_month
-
-        # Update front month ID if not set
-        if front_month_instrument_id is None:
-            front_month_instrument_id = iid
-
         session_high = session_data['high']
         session_low = session_data['low']
-        session_open = session_data['first_price']
+        session_open = session_data['open']
         session_vwap = session_data['vwap_num'] / session_data['vwap_den'] if session_data['vwap_den'] > 0 else 0
-        buy_vol = session_data['buy_volume']
-        sell_vol = session_data['sell_volume']
+        buy_vol = session_data['buy']
+        sell_vol = session_data['sell']
         delta = buy_vol - sell_vol
 
-        global last_session_id
+        global last_session_id, last_session_day
 
         with lock:
             state['session_high'] = session_high
@@ -8739,6 +8590,7 @@ def fetch_current_session_history():
             state['vwap'] = session_vwap
             state['vwap_numerator'] = session_data['vwap_num']
             state['vwap_denominator'] = session_data['vwap_den']
+            vwap_engine.get('vwap').seed(session_data['vwap_num'], session_data['vwap_den'])
             state['current_session_id'] = session_info['id']
             state['current_session_name'] = session_name
             state['current_session_start'] = session_start
@@ -8755,7 +8607,7 @@ def fetch_current_session_history():
                 state['day_low'] = session_low
 
             # FALLBACK: Set price from historical data if live stream not connected
-            last_price = session_data['last_price']
+            last_price = session_data['close']
             if last_price > 0 and state['price'] == 0:
                 state['price'] = last_price
                 state['current_price'] = last_price
@@ -8764,14 +8616,14 @@ def fetch_current_session_history():
 
         # Set last_session_id so the live stream doesn't reset the values
         last_session_id = session_info['id']
+        last_session_day = session_trading_day(get_et_now())
 
         print(f"   ✅ {session_name}: O=${session_open:.2f}, H=${session_high:.2f}, L=${session_low:.2f}, VWAP=${session_vwap:.2f}", flush=True)
         print(f"      Buy: {buy_vol:,}, Sell: {sell_vol:,}, Delta: {delta:,} (from {session_data['count']} trades)", flush=True)
 
     except Exception as e:
         print(f"❌ Error fetching current session history: {e}")
-        import traceback
-        traceback.print_exc()
+        raise  # Startup task fails (/ready)
 
 
 def fetch_historical_candle_volumes():
@@ -8785,7 +8637,6 @@ def fetch_historical_candle_volumes():
 
     if not HAS_DATABENTO or not API_KEY:
         return
-    symbol = config['symbol']
     price_min = config['price_min']
     price_max = config['price_max']
 
@@ -8812,117 +8663,39 @@ def fetch_historical_candle_volumes():
         utc_start = utc_end - timedelta(minutes=lookback_minutes)
 
         utc_start_str = utc_start.strftime('%Y-%m-%dT%H:%M:%SZ')
-        utc_end_str = utc_end.strftime('%Y-%m-%dT%H:%M:%SZ')
 
         print(f"   Fetching {lookback_minutes} min of trade data for candle volumes...")
 
-        client = db.Historical(key=API_KEY)
-        data = client.timeseries.get_range(
-            dataset='GLBX.MDP3',
-            symbols=[symbol],
-            stype_in='parent',
-            schema='trades',
-            start=utc_start_str,
-            end=utc_end_str
-        )
-
-        records = list(data)
-        print(f"   Got {len(records)} trades for candle volume history")
+        frame = trade_history.window(ACTIVE_CONTRACT, _utc_str_to_ns(utc_start_str))
+        print(f"   Got {len(frame)} trades for candle volume history")
 
-        if not records:
+        frame = frame.select(history_front_month(), price_min, price_max)
+        if not len(frame):
             print("   ⚠️  No trades found for candle history")
             return
 
-        # Bucket trades by timestamp into candles for each timeframe
-        timeframes = {
-            '5m': {'minutes': 5, 'candles': {}},
-            '15m': {'minutes': 15, 'candles': {}},
-            '30m': {'minutes': 30, 'candles': {}},
-            '1h': {'minutes': 60, 'candles': {}}
-        }
-
-        for r in records:
-            p = r.price / 1e9 if r.price > 1e6 else r.price
-            if p < price_min or p > price_max:
-                continue
-
-            # Use front month if known, otherwise accept all
-            if front_month_instrument_id and r.instrument_id != front_month_instrument_id:
-                continue
-
-            size = getattr(r, 'size', 1)
-            side = getattr(r, 'side', 'U')
-            ts = r.ts_event / 1e9  # nanoseconds to seconds
-
-            for tf_name, tf_data in timeframes.items():
-                candle_start = int(ts // (tf_data['minutes'] * 60)) * (tf_data['minutes'] * 60)
-                if candle_start not in tf_data['candles']:
-                    tf_data['candles'][candle_start] = {
-                        'buy': 0, 'sell': 0, 'delta': 0,
-                        'price_open': 0, 'price_high': 0, 'price_low': 999999, 'price_close': 0,
-                        'first_ts': float('inf'), 'last_ts': 0,
-                        'running_delta': 0, 'delta_open': None, 'delta_high': -999999, 'delta_low': 999999
-                    }
-
-                candle = tf_data['candles'][candle_start]
-
-                # Track buy/sell volume
-                if side == 'A':  # Ask = Buy
-                    candle['buy'] += size
-                elif side == 'B':  # Bid = Sell
-                    candle['sell'] += size
-
-                # Update running delta for delta OHLC
-                candle['running_delta'] = candle['buy'] - candle['sell']
-                if candle['delta_open'] is None:
-                    candle['delta_open'] = candle['running_delta']
-                candle['delta_high'] = max(candle['delta_high'], candle['running_delta'])
-                candle['delta_low'] = min(candle['delta_low'], candle['running_delta'])
-
-                # Track price OHLC
-                if ts < candle['first_ts']:
-                    candle['first_ts'] = ts
-                    candle['price_open'] = p
-                if ts > candle['last_ts']:
-                    candle['last_ts'] = ts
-                    candle['price_close'] = p
-                candle['price_high'] = max(candle['price_high'], p)
-                candle['price_low'] = min(candle['price_low'], p)
-
-        # Calculate delta for each candle and build history arrays
-        for tf_name, tf_data in timeframes.items():
-            for candle_start, candle in tf_data['candles'].items():
-                candle['delta'] = candle['buy'] - candle['sell']
-
-            # Sort by timestamp descending (most recent first), skip current incomplete candle
-            sorted_candles = sorted(tf_data['candles'].items(), key=lambda x: x[0], reverse=True)
-
-            # Get current candle start for this timeframe
-            current_candle_start = get_candle_start(time.time(), tf_data['minutes'])
-
-            # Filter out current candle and store up to 200 historical candles
-            # (Frontend shows 30, but stores more for scrolling/overflow)
-            max_history = 200
-            history = []
-            for candle_ts, candle_data in sorted_candles:
-                if candle_ts < current_candle_start:  # Only completed candles
-                    history.append({
-                        'buy': candle_data['buy'],
-                        'sell': candle_data['sell'],
-                        'delta': candle_data['delta'],
-                        'ts': candle_ts,
-                        # Price OHLC
-                        'price_open': candle_data.get('price_open', 0),
-                        'price_high': candle_data.get('price_high', 0),
-                        'price_low': candle_data.get('price_low', 999999) if candle_data.get('price_low', 999999) < 999999 else 0,
-                        'price_close': candle_data.get('price_close', 0),
-                        # Delta OHLC
-                        'delta_open': candle_data.get('delta_open', 0) or 0,
-                        'delta_high': candle_data.get('delta_high', 0) if candle_data.get('delta_high', -999999) > -999999 else 0,
-                        'delta_low': candle_data.get('delta_low', 0) if candle_data.get('delta_low', 999999) < 999999 else 0
-                    })
-                    if len(history) >= max_history:
-                        break
+        for tf_name, minutes in (('5m', 5), ('15m', 15), ('30m', 30), ('1h', 60)):
+            tf = candles(frame, minutes)
+
+            # Most recent first, completed candles only; keep up to 200 (frontend shows 30,
+            # the rest is for scrolling/overflow)
+            current_candle_start = get_candle_start(time.time(), minutes)
+            completed = np.flatnonzero(tf['start'] < current_candle_start)[::-1][:200]
+            history = [{
+                'buy': int(tf['buy'][i]),
+                'sell': int(tf['sell'][i]),
+                'delta': int(tf['buy'][i] - tf['sell'][i]),
+                'ts': int(tf['start'][i]),
+                # Price OHLC
+                'price_open': float(tf['open'][i]),
+                'price_high': float(tf['high'][i]),
+                'price_low': float(tf['low'][i]),
+                'price_close': float(tf['close'][i]),
+                # Delta OHLC
+                'delta_open': int(tf['delta_open'][i]),
+                'delta_high': int(tf['delta_high'][i]),
+                'delta_low': int(tf['delta_low'][i])
+            } for i in completed.tolist()]
 
             # Update state with historical candle data
             tf_key = f'volume_{tf_name}'
@@ -8933,8 +8706,7 @@ def fetch_historical_candle_volumes():
 
     except Exception as e:
         print(f"❌ Error fetching historical candle volumes: {e}")
-        import traceback
-        traceback.print_exc()
+        raise  # Startup task fails (/ready)
 
 
 # ============================================
@@ -8942,7 +8714,7 @@ def fetch_historical_candle_volumes():
 # ============================================
 def reset_state_for_contract(contract_key):
     """Reset all state when switching to a new contract"""
-    global state, front_month_instrument_id, delta_history, volume_history, last_session_id
+    global state, front_month_instrument_id, delta_history, volume_history, last_session_id, last_session_day
 
     config = CONTRACT_CONFIG.get(contract_key, CONTRACT_CONFIG['GC'])
 
@@ -8958,6 +8730,13 @@ def reset_state_for_contract(contract_key):
         state['price'] = 0.0
         state['bid'] = 0.0
         state['ask'] = 0.0
+        state['bid_size'] = 0
+        state['ask_size'] = 0
+        state['spread'] = 0.0
+        state['quote_imbalance'] = 0.0
+        state['microprice'] = 0.0
+        state['quote_ts'] = 0
+        reset_absorption_tracking()
         state['data_source'] = 'SWITCHING...'
 
         # Reset deltas
@@ -9019,16 +8798,37 @@ def reset_state_for_contract(contract_key):
         # Reset analysis
         state['buying_imbalance_pct'] = 0
         state['absorption_ratio'] = 0.0
+        state['stacked_buy_imbalances'] = 0
+        state['stacked_sell_imbalances'] = 0
         state['current_phase'] = 'SWITCHING...'
+        if footprint:
+            footprint.reset(config['tick_size'])
+        if mbo_book:
+            mbo_book.clear()
+        # Park the old contract's anchors, bring in the new contract's
+        previous_anchor_contract, previous_anchors = vwap_anchor_contract, vwap_engine.dump()
+        load_vwap_anchors(contract_key)
+        alert_engine.reset()
+        alert_zones['updated'] = 0.0
         state['conditions_met'] = 0
         state['entry_signal'] = False
         state['market_open'] = False
 
+    if previous_anchor_contract and previous_anchor_contract != contract_key:
+        try:
+            vwap_engine.save(get_vwap_anchor_path(previous_anchor_contract), previous_anchors)
+        except OSError as e:
+            print(f"⚠️  Could not save VWAP anchors: {e}")
+
     # Clear histories
+    global latest_quote
+    latest_quote = None
+    reset_event_watermark()
     delta_history.clear()
     volume_history.clear()
     front_month_instrument_id = None
     last_session_id = None
+    last_session_day = None
 
     # Clear historical session caches (important for contract switching)
     global historical_sessions_ohlc_cache, weekly_sessions_cache
@@ -9037,10 +8837,8 @@ def reset_state_for_contract(contract_key):
     historical_sessions_ohlc_cache['ready'] = False
 
     # Reset all weekly caches
-    for week_id in weekly_sessions_cache.keys():
-        weekly_sessions_cache[week_id]['data'] = None
-        weekly_sessions_cache[week_id]['timestamp'] = 0
-        weekly_sessions_cache[week_id]['ready'] = False
+    with weekly_sessions_lock:
+        weekly_sessions_cache.clear()
 
     print(f"🗑️ Cleared historical session caches for contract switch")
 
@@ -9090,6 +8888,7 @@ def stop_stream():
 
     print("⏹️  Stopping live stream...")
     stream_running = False
+    tick_archive.close_segment(ACTIVE_CONTRACT)
 
     if live_client:
         try:
@@ -9127,29 +8926,14 @@ def start_stream():
 
     # On initial startup, fetch historical data. On watchdog restarts, skip to live connection.
     if not startup_complete:
-        # Fetch critical historical data for this contract (required before live stream)
+        # Live-day history loads in parallel; the stream connects once the critical part is in
         print(f"\n📊 Fetching historical data for {config['name']}...")
-        fetch_pd_levels()
-        fetch_todays_ib()
+        startup.start(LIVE_DAY_TASKS)
+        startup.wait(CRITICAL_TASKS)
 
         # Mark startup as complete so HTTP handler can respond with partial data
         startup_complete = True
         print("✅ Critical data loaded - HTTP handler enabled")
-
-        # Background thread for non-critical historical data (doesn't block live stream)
-        def fetch_supplementary_history():
-            try:
-                print("📊 Fetching supplementary history (background)...")
-                fetch_ended_sessions_ohlc()  # Fetch OHLC for all ended sessions today
-                fetch_todays_tpo_data()  # Load full day TPO data for all periods (A-Z)
-                fetch_current_session_history()
-                fetch_historical_candle_volumes()
-                print("✅ Supplementary history loaded")
-            except Exception as e:
-                print(f"⚠️ Supplementary history error (non-critical): {e}")
-
-        supplementary_thread = threading.Thread(target=fetch_supplementary_history, daemon=True)
-        supplementary_thread.start()
     else:
         # On watchdog restart, check if PD date is stale and refresh
         et_now = get_et_now()
@@ -9166,34 +8950,14 @@ def start_stream():
                     fetch_pd_levels()
             except:
                 pass
-        print("⚡ Watchdog restart - skipping historical fetch, connecting to live...")
+        if checkpoint_status['resume_ns']:
+            print("⚡ Restored from checkpoint - skipping historical fetch, connecting to live...")
+        else:
+            print("⚡ Watchdog restart - skipping historical fetch, connecting to live...")
 
-    # Pre-fetch session history in background for VSI page (only on initial startup)
+    # VSI, session analysis and week levels from the session store (background)
     if not session_history_cache.get('ready', False):
-        def prefetch_session_history():
-            print("📊 Pre-fetching VSI session history (background)...")
-            fetch_session_history(days=50, force_refresh=True)  # Fetch max days
-            print("✅ VSI session history cached (50 days)")
-            # Also fetch 6-day historical sessions OHLC for candle visualization (shows 5 after skipping today)
-            print("📊 Pre-fetching 6-day historical sessions OHLC (background)...")
-            fetch_historical_sessions_ohlc(days=6)
-            # Fetch 'current' week using calendar week logic (Monday to today)
-            print("📊 Fetching current calendar week...")
-            fetch_week_sessions_ohlc('current')
-
-            # Initialize weekly_open from Monday's pre_asia session if not set
-            initialize_weekly_open_from_history()
-
-            # Fetch all historical weeks (5 weeks back)
-            print("📅 Pre-fetching 5 historical weeks...")
-            fetch_all_historical_weeks()
-
-            # Initialize week_high/week_low and rolling 20d from history
-            print("📊 Initializing week and monthly levels...")
-            initialize_week_levels_from_history()
-
-        prefetch_thread = threading.Thread(target=prefetch_session_history, daemon=True)
-        prefetch_thread.start()
+        startup.start(SESSION_TASKS, rerun=True)
 
     # Re-check if we should still be running (might have been stopped during historical fetch)
     # Also re-read the active contract in case it changed during historical fetch
@@ -9223,17 +8987,31 @@ def start_stream():
         try:
             live_client = db.Live(key=API_KEY)
 
-            live_client.subscribe(
-                dataset='GLBX.MDP3',
-                schema='trades',
-                stype_in='parent',
-                symbols=[symbol]
-            )
+            # After a checkpoint restore, replay trades since its last one (consumed once -
+            # a failed attempt reconnects without replay)
+            resume_ns, checkpoint_status['resume_ns'] = checkpoint_status['resume_ns'], None
+            subscribe_args = {'dataset': 'GLBX.MDP3', 'schema': 'trades', 'stype_in': 'parent', 'symbols': [symbol]}
+            if resume_ns:
+                subscribe_args['start'] = resume_ns
+                print(f"⏪ Replaying trades since checkpoint ({(time.time_ns() - resume_ns) / 1e9:.0f}s gap)")
+            live_client.subscribe(**subscribe_args)
 
             print(f"✅ Subscribed to {symbol} live trades")
+
+            # Optional top-of-book quotes on the same session (handled by the conflated quote path)
+            if QUOTE_SCHEMA in QUOTE_SCHEMAS:
+                live_client.subscribe(
+                    dataset='GLBX.MDP3',
+                    schema=QUOTE_SCHEMA,
+                    stype_in='parent',
+                    symbols=[symbol]
+                )
+                start_quote_worker()
+                print(f"✅ Subscribed to {symbol} {QUOTE_SCHEMA} quotes")
             state['data_source'] = 'DATABENTO_LIVE'
             state['market_open'] = True
             startup_complete = True  # HTTP handler can now respond with full data
+            tick_archive.open_segment(ACTIVE_CONTRACT, resume_ns)  # Trades from here on are archived without gaps
             update_last_trade_time()  # Reset watchdog timer on successful subscription
 
             # Send Discord alert if this was a reconnection
@@ -9249,12 +9027,18 @@ def start_stream():
             for record in live_client:
                 if not stream_running:
                     print("⏹️  Stream loop terminated")
+                    tick_archive.close_segment(ACTIVE_CONTRACT)
                     return
+                if isinstance(record, QUOTE_RECORD_TYPES):
+                    on_quote(record)
+                    continue
                 process_trade(record)
 
         except Exception as e:
             error_str = str(e)
             reconnect_attempt += 1
+            RECONNECTS.labels('trades').inc()
+            tick_archive.close_segment(ACTIVE_CONTRACT)
 
             # CRITICAL: Terminate old connection before retry to avoid connection limit
             if live_client:
@@ -9280,13 +9064,12 @@ def start_stream():
                 # Exponential backoff: 5s -> 10s -> 20s -> 40s -> 60s (max)
                 current_delay = min(60, reconnect_delay * (1.5 ** min(reconnect_attempt - 1, 5)))
 
-            # Send Discord alert on first error and every 5th attempt
-            if reconnect_attempt == 1 or reconnect_attempt % 5 == 0:
-                send_discord_alert(
-                    "⚠️ Connection Error",
-                    f"**Attempt #{reconnect_attempt}**\n\nError: `{error_str[:100]}`\n\nAuto-reconnecting in {current_delay:.0f}s...",
-                    color=16711680  # Red - error
-                )
+            # Send Discord alert - attempts within the coalescing window arrive as one message
+            send_discord_alert(
+                "⚠️ Connection Error",
+                f"**Attempt #{reconnect_attempt}**\n\nError: `{error_str[:100]}`\n\nAuto-reconnecting in {current_delay:.0f}s...",
+                color=16711680  # Red - error
+            )
             print(f"🔄 Reconnecting in {current_delay:.0f} seconds...")
 
             # Use yfinance fallback to keep showing prices while reconnecting
@@ -9316,34 +9099,18 @@ def update_last_trade_time():
     last_trade_timestamp = time.time()
 
 
-def send_discord_alert(title, message, color=16711680):
-    """Send alert to Discord webhook (color: red=16711680, green=65280, yellow=16776960)"""
-    if not DISCORD_WEBHOOK_URL:
-        return
-
-    try:
-        payload = {
-            "embeds": [{
-                "title": title,
-                "description": message,
-                "color": color,
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-                "footer": {"text": "Project Horizon Monitor"}
-            }]
-        }
+# Discord delivery runs on the dispatcher's worker so the feed / watchdog threads never
+# wait on the webhook; repeats of one title within the window arrive as one message
+NOTIFICATIONS_TOTAL = metrics_registry.counter('notifications_total', 'Discord notifications by outcome', ('outcome',))
+notifier = NotificationDispatcher(DISCORD_WEBHOOK_URL, counter=NOTIFICATIONS_TOTAL,
+                                  window=float(os.environ.get('NOTIFY_COALESCE_SECONDS', 60)))
+metrics_registry.gauge('notifications_pending', 'Discord notifications waiting for delivery',
+                       lambda: [({}, len(notifier.pending))])
 
-        data = json.dumps(payload).encode('utf-8')
-        req = urllib.request.Request(
-            DISCORD_WEBHOOK_URL,
-            data=data,
-            headers={'Content-Type': 'application/json', 'User-Agent': 'ProjectHorizon/1.0'}
-        )
 
-        with urllib.request.urlopen(req, timeout=10) as response:
-            if response.status == 204:
-                print("📨 Discord alert sent successfully")
-    except Exception as e:
-        print(f"⚠️  Discord alert failed: {e}")
+def send_discord_alert(title, message, color=16711680, key=None):
+    """Queue alert for the Discord webhook (color: red=16711680, green=65280, yellow=16776960)"""
+    notifier.notify(title, message, color, key=key)
 
 
 def fetch_yfinance_fallback_prices():
@@ -9603,7 +9370,7 @@ def fetch_spot_btc_price():
 # ============================================
 binance_ws = None
 binance_ws_running = False
-binance_trade_buffer = deque(maxlen=10000)  # Buffer recent trades
+binance_trade_buffer = RingBuffer(('time', 'price', 'qty', 'buy', 'sell', 'is_buy'), 10000)  # Recent trades
 
 def binance_ws_on_message(ws, message):
     """Handle incoming Binance aggTrade messages"""
@@ -9612,6 +9379,7 @@ def binance_ws_on_message(ws, message):
     # Guard: Don't process if WebSocket should be stopped or contract changed
     if not binance_ws_running or ACTIVE_CONTRACT != 'BTC-SPOT':
         return
+    WS_MESSAGES.labels('binance_spot').inc()
 
     try:
         data = json.loads(message)
@@ -9639,14 +9407,7 @@ def binance_ws_on_message(ws, message):
                 sell_vol = 0
 
             # Store trade in buffer for analysis
-            binance_trade_buffer.append({
-                'time': trade_time,
-                'price': price,
-                'qty': qty,
-                'buy': buy_vol,
-                'sell': sell_vol,
-                'is_buy': not is_buyer_maker
-            })
+            binance_trade_buffer.append(trade_time, price, qty, buy_vol, sell_vol, 0 if is_buyer_maker else 1)
 
             # Update state with real data
             with lock:
@@ -10435,7 +10196,7 @@ def build_btc_tpo_profile(candles):
     single_prints = [float(p) for p, letters in profiles.items() if len(letters) == 1]
 
     # Update tpo_state
-    with lock:
+    with tpo_lock:
         tpo_state['day']['profiles'] = profiles
         tpo_state['day']['poc'] = poc
         tpo_state['day']['vah'] = vah
@@ -10498,7 +10259,7 @@ def populate_btc_volume_history():
     if not candles:
         return
 
-    with lock:
+    with candles_lock:
         # Build 5m history
         history_5m = []
         cumulative_delta = 0
@@ -10909,28 +10670,9 @@ def switch_contract(new_contract):
         stream_thread = threading.Thread(target=start_stream, daemon=True)
         stream_thread.start()
 
-        # Fetch historical TPO data for futures contract (in background)
-        def fetch_futures_history():
-            try:
-                print(f"🆕 DEPLOY_v2: Starting historical fetch for {config['name']}...")
-                print(f"📊 Fetching historical data for {config['name']}...")
-                fetch_pd_levels()
-                fetch_todays_ib()
-                fetch_ended_sessions_ohlc()
-                fetch_todays_tpo_data()  # This populates the TPO profile
-                fetch_current_session_history()
-                # Fetch historical candle volumes for Price Ladder charts
-                fetch_historical_candle_volumes()
-                # Fetch historical sessions for Session Analysis page
-                print(f"📊 Fetching historical sessions OHLC for {config['name']}...")
-                fetch_historical_sessions_ohlc(days=6)
-                fetch_week_sessions_ohlc('current')
-                print(f"✅ Historical data loaded for {config['name']}")
-            except Exception as e:
-                print(f"⚠️ Historical fetch error: {e}")
-
-        history_thread = threading.Thread(target=fetch_futures_history, daemon=True)
-        history_thread.start()
+        # Same warm-up tasks as startup, rerun for the new contract (in background)
+        print(f"📊 Fetching historical data for {config['name']}...")
+        startup.start(SWITCH_TASKS, rerun=True)
 
     print("=" * 50)
     print(f"✅ SWITCH COMPLETE: Now streaming {CONTRACT_CONFIG[new_contract]['name']}")
@@ -10938,17 +10680,1281 @@ def switch_contract(new_contract):
     return True
 
 
+# ============================================
+# TOP-OF-BOOK QUOTES (MBP-1 / BBO-1S)
+# ============================================
+# The stream thread only overwrites latest_quote (no lock, O(1)); a worker applies
+# the newest quote to state at most every QUOTE_CONFLATE_INTERVAL so quote bursts
+# never queue up behind - or in front of - trade processing.
+QUOTE_SCHEMA = os.environ.get('DATABENTO_QUOTE_SCHEMA', 'mbp-1').lower()  # 'mbp-1', 'bbo-1s' or 'none'
+QUOTE_SCHEMAS = ('mbp-1', 'bbo-1s')
+QUOTE_CONFLATE_INTERVAL = 0.1  # seconds
+QUOTE_STALE_SECONDS = float(os.environ.get('QUOTE_STALE_SECONDS', 10))  # Older quotes -> trade-based absorption
+QUOTE_RECORD_TYPES = (db.MBP1Msg, db.BBOMsg) if HAS_DATABENTO else ()
+
+latest_quote = None  # (bid, ask, bid_size, ask_size, ts_event)
+quote_event = threading.Event()
+quote_worker_running = False
+
+# Volume traded into the current touch vs the size displayed there (guarded by lock)
+absorption_tracking = {
+    'bid_px': 0.0, 'bid_displayed': 0, 'traded_at_bid': 0,
+    'ask_px': 0.0, 'ask_displayed': 0, 'traded_at_ask': 0,
+}
+
+
+def reset_absorption_tracking():
+    """Clear touch absorption counters (contract switch)"""
+    absorption_tracking.update({
+        'bid_px': 0.0, 'bid_displayed': 0, 'traded_at_bid': 0,
+        'ask_px': 0.0, 'ask_displayed': 0, 'traded_at_ask': 0,
+    })
+
+
+def on_quote(record):
+    """Stream-thread side of the quote path: filter and conflate into latest_quote"""
+    global latest_quote
+
+    # Until the front month is known a back-month book would pass the price range too
+    if front_month_instrument_id is None or record.instrument_id != front_month_instrument_id:
+        RECORDS_DROPPED.labels('quote_front_month').inc()
+        return
+
+    QUOTES_TOTAL.labels(ACTIVE_CONTRACT).inc()
+    level = record.levels[0]
+    bid = level.bid_px / 1e9
+    ask = level.ask_px / 1e9
+    config = CONTRACT_CONFIG.get(ACTIVE_CONTRACT, CONTRACT_CONFIG['GC'])
+    # Undefined prices (empty side) decode to ~9.2e9 and fall outside the range
+    if bid < config['price_min'] or ask > config['price_max'] or ask <= bid:
+        return
+
+    latest_quote = (bid, ask, level.bid_sz, level.ask_sz, record.ts_event)
+    quote_event.set()
+
+
+def apply_quote(quote):
+    """Update bid/ask, spread, quote imbalance, microprice and touch tracking (under lock)"""
+    bid, ask, bid_size, ask_size, ts_event = quote
+    state['bid'] = bid
+    state['ask'] = ask
+    state['bid_size'] = bid_size
+    state['ask_size'] = ask_size
+    state['spread'] = round(ask - bid, 6)
+    state['quote_ts'] = time.time()
+
+    total_size = bid_size + ask_size
+    if total_size > 0:
+        state['quote_imbalance'] = (bid_size - ask_size) / total_size
+        # Size-weighted mid leans toward the side more likely to trade through
+        state['microprice'] = (bid * ask_size + ask * bid_size) / total_size
+    else:
+        state['quote_imbalance'] = 0.0
+        state['microprice'] = (bid + ask) / 2
+
+    # A new touch price starts a new absorption window
+    if bid != absorption_tracking['bid_px']:
+        absorption_tracking['bid_px'] = bid
+        absorption_tracking['bid_displayed'] = bid_size
+        absorption_tracking['traded_at_bid'] = 0
+    elif bid_size > absorption_tracking['bid_displayed']:
+        absorption_tracking['bid_displayed'] = bid_size
+
+    if ask != absorption_tracking['ask_px']:
+        absorption_tracking['ask_px'] = ask
+        absorption_tracking['ask_displayed'] = ask_size
+        absorption_tracking['traded_at_ask'] = 0
+    elif ask_size > absorption_tracking['ask_displayed']:
+        absorption_tracking['ask_displayed'] = ask_size
+
+
+def quote_worker():
+    """Apply the newest conflated quote at a bounded rate"""
+    while stream_running:
+        if not quote_event.wait(timeout=1.0):
+            continue
+        quote_event.clear()
+        quote = latest_quote
+        if quote:
+            try:
+                with lock:
+                    apply_quote(quote)
+            except Exception as e:
+                print(f"⚠️ Quote apply error: {e}")
+        time.sleep(QUOTE_CONFLATE_INTERVAL)
+
+
+def start_quote_worker():
+    """Start the quote worker once (survives reconnects)"""
+    global quote_worker_running
+    if quote_worker_running:
+        return
+    quote_worker_running = True
+
+    def run():
+        global quote_worker_running
+        try:
+            quote_worker()
+        finally:
+            quote_worker_running = False
+
+    threading.Thread(target=run, daemon=True).start()
+    print(f"✅ Quote worker started ({QUOTE_SCHEMA}, conflated {QUOTE_CONFLATE_INTERVAL * 1000:.0f}ms)")
+
+
+def update_touch_absorption(price, size, side):
+    """Add an aggressor trade to the touch it hit and return the absorption ratio (under lock)"""
+    if side == 'B' and price <= absorption_tracking['bid_px']:
+        absorption_tracking['traded_at_bid'] += size
+    elif side == 'A' and price >= absorption_tracking['ask_px'] > 0:
+        absorption_tracking['traded_at_ask'] += size
+
+    # >1 means more traded into the level than was ever displayed there (hidden liquidity)
+    bid_ratio = absorption_tracking['traded_at_bid'] / absorption_tracking['bid_displayed'] if absorption_tracking['bid_displayed'] > 0 else 0.0
+    ask_ratio = absorption_tracking['traded_at_ask'] / absorption_tracking['ask_displayed'] if absorption_tracking['ask_displayed'] > 0 else 0.0
+    return max(bid_ratio, ask_ratio)
+
+
+# ============================================
+# CME MARKET-BY-ORDER BOOK (icebergs / absorption)
+# ============================================
+# MBO runs on its own Live session and thread so book maintenance never
+# competes with trade processing; the book has its own lock (not the global one).
+MBO_ENABLED = os.environ.get('DATABENTO_MBO_ENABLED', 'false').lower() == 'true'
+MBO_MAX_LEVELS = int(os.environ.get('DATABENTO_MBO_LEVELS', '40'))
+mbo_book = MBOBook(max_levels=MBO_MAX_LEVELS) if HAS_MBO_BOOK else None
+mbo_status = {'running': False, 'contract': None, 'instrument_id': None, 'connected_at': 0, 'reconnects': 0, 'error': None}
+
+
+def _record_char(value):
+    """Databento char fields can arrive as str, bytes or enum"""
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    if isinstance(value, str):
+        return value
+    return str(getattr(value, 'value', value))
+
+
+def start_mbo_stream():
+    """Maintain the MBO book for the active (futures) contract - resubscribes on contract switch"""
+    if not (MBO_ENABLED and HAS_MBO_BOOK and HAS_DATABENTO and API_KEY):
+        return
+
+    mbo_status['running'] = True
+    reconnect_delay = 5
+
+    while True:
+        contract = ACTIVE_CONTRACT
+        config = CONTRACT_CONFIG.get(contract, CONTRACT_CONFIG['GC'])
+        if config.get('is_spot', False):
+            time.sleep(5)  # No CME book for spot - wait for a switch back to futures
+            continue
+        # The parent symbol streams every month and spread - subscribe once the front month
+        # is known so the snapshot never seeds the book with another instrument's orders
+        front = front_month_instrument_id
+        if front is None:
+            time.sleep(1)
+            continue
+
+        client = None
+        ended = False
+        try:
+            client = db.Live(key=API_KEY)
+            # snapshot=True replays the resting book so it is complete from the first event
+            client.subscribe(
+                dataset='GLBX.MDP3',
+                schema='mbo',
+                stype_in='parent',
+                symbols=[config['symbol']],
+                snapshot=True
+            )
+            mbo_book.clear()
+            mbo_status.update({'contract': contract, 'instrument_id': front, 'connected_at': time.time(), 'error': None})
+            print(f"✅ MBO book subscribed for {config['symbol']}")
+            reconnect_delay = 5
+
+            for record in client:
+                if ACTIVE_CONTRACT != contract:
+                    print(f"📘 MBO: contract switched to {ACTIVE_CONTRACT}, resubscribing...")
+                    break
+                if front_month_instrument_id != front:
+                    print(f"📘 MBO: front month changed to {front_month_instrument_id}, resubscribing...")
+                    break
+                if not isinstance(record, db.MBOMsg):
+                    continue
+                if record.instrument_id != front:
+                    continue
+                mbo_book.apply(
+                    _record_char(record.action),
+                    _record_char(record.side),
+                    record.order_id,
+                    record.price,
+                    record.size,
+                    record.ts_event
+                )
+            else:
+                ended = True  # Session closed without an error (gateway) - not a contract switch
+        except Exception as e:
+            mbo_status['error'] = str(e)[:200]
+            mbo_status['reconnects'] += 1
+            RECONNECTS.labels('mbo').inc()
+            print(f"⚠️ MBO stream error: {str(e)[:80]} - reconnecting in {reconnect_delay}s")
+            time.sleep(reconnect_delay)
+            reconnect_delay = min(60, reconnect_delay * 2)
+        finally:
+            if client:
+                try:
+                    client.terminate()
+                except Exception:
+                    pass
+        if ended:
+            mbo_status['reconnects'] += 1
+            RECONNECTS.labels('mbo').inc()
+            print(f"⚠️ MBO stream ended - resubscribing in {reconnect_delay}s")
+            time.sleep(reconnect_delay)
+            reconnect_delay = min(60, reconnect_delay * 2)
+
+
+# ============================================
+# EVENT-TIME WATERMARK
+# ============================================
+# Candles, TPO periods, sessions and big trades are bucketed by the record's ts_event,
+# so reconnect bursts, backfill and replay land in the same buckets as live trades.
+EVENT_TIME_TOLERANCE = float(os.environ.get('EVENT_TIME_TOLERANCE_MS', 2000)) / 1000
+event_watermark = {'ts': 0.0, 'reordered': 0, 'late': 0, 'max_lag_ms': 0.0}
+
+
+def reset_event_watermark():
+    """Forget the watermark (contract switch, replay of older data)"""
+    event_watermark.update({'ts': 0.0, 'reordered': 0, 'late': 0, 'max_lag_ms': 0.0})
+
+
+def event_time(record):
+    """Aggregation timestamp (epoch seconds) for a record - call under the state lock.
+
+    The watermark only moves forward. A record up to EVENT_TIME_TOLERANCE behind it is
+    counted at the watermark (never reopening a closed candle or TPO letter); anything
+    later returns None and is dropped. Records without ts_event fall back to wall clock.
+    """
+    ts_event = getattr(record, 'ts_event', 0)
+    ts = ts_event / 1e9 if ts_event else time.time()
+    watermark = event_watermark['ts']
+    if ts >= watermark:
+        event_watermark['ts'] = ts
+        return ts
+    lag = watermark - ts
+    if lag > EVENT_TIME_TOLERANCE:
+        event_watermark['late'] += 1
+        return None
+    event_watermark['reordered'] += 1
+    event_watermark['max_lag_ms'] = max(event_watermark['max_lag_ms'], round(lag * 1000, 3))
+    return watermark
+
+
+# ============================================
+# ANCHORED VWAP ENGINE
+# ============================================
+# Built-in anchors back the legacy state keys (vwap, day_vwap, rth_vwap, us_ib_vwap,
+# ny_1h_vwap, week_vwap, ibs[*].vwap). Custom anchors are added at runtime via /vwap.
+VWAP_DEFAULT_ANCHORS = (
+    {'id': 'vwap', 'kind': 'manual', 'label': 'VWAP'},                  # Seeded from the historical load
+    {'id': 'session', 'kind': 'session', 'label': 'Current Session'},   # Resets on every session change
+    {'id': 'day_vwap', 'kind': 'daily', 'label': 'Day VWAP', 'start': 1800},
+    {'id': 'rth_vwap', 'kind': 'daily', 'label': 'RTH VWAP', 'start': 930, 'end': 1600},
+    {'id': 'us_ib_vwap', 'kind': 'daily', 'label': 'US IB VWAP', 'start': 820, 'end': 1700},
+    {'id': 'ny_1h_vwap', 'kind': 'daily', 'label': 'NY 1H VWAP', 'start': 930, 'end': 1700},
+    {'id': 'week_vwap', 'kind': 'weekly', 'label': 'Week VWAP', 'weekday': 6, 'start': 1800},
+    {'id': 'ib_japan', 'kind': 'daily', 'label': 'Japan IB VWAP', 'start': 1900, 'end': 2000},
+    {'id': 'ib_london', 'kind': 'daily', 'label': 'London IB VWAP', 'start': 300, 'end': 400},
+    {'id': 'ib_us', 'kind': 'daily', 'label': 'US IB Window VWAP', 'start': 820, 'end': 930},
+    {'id': 'ib_ny', 'kind': 'daily', 'label': 'NY IB VWAP', 'start': 930, 'end': 1030},
+)
+VWAP_CACHE_DIR = os.path.join(os.path.dirname(__file__), '.cache', 'vwap')
+VWAP_SAVE_INTERVAL = 30  # Seconds between anchor snapshots
+
+vwap_engine = VWAPEngine(VWAP_DEFAULT_ANCHORS)
+vwap_anchor_contract = None  # Contract whose anchors are loaded
+
+
+def get_vwap_anchor_path(contract):
+    return os.path.join(VWAP_CACHE_DIR, f'{contract}_anchors.json')
+
+
+def save_vwap_anchors():
+    """Snapshot anchors under the lock, write the file outside it"""
+    with lock:
+        contract = vwap_anchor_contract
+        data = vwap_engine.dump()
+    if contract:
+        try:
+            vwap_engine.save(get_vwap_anchor_path(contract), data)
+        except OSError as e:
+            print(f"⚠️  Could not save VWAP anchors: {e}")
+
+
+def load_vwap_anchors(contract):
+    """Swap in the persisted anchors for a contract (call with the state lock held)"""
+    global vwap_anchor_contract
+    try:
+        count = vwap_engine.load(get_vwap_anchor_path(contract))
+    except (OSError, ValueError) as e:
+        print(f"⚠️  Could not load VWAP anchors for {contract}: {e}")
+        vwap_engine.anchors = {}
+        vwap_engine.restore_defaults()
+        count = len(vwap_engine.anchors)
+    vwap_anchor_contract = contract
+    print(f"📐 VWAP anchors loaded for {contract}: {count}")
+
+
+def backfill_vwap_anchor(anchor_id, contract):
+    """A timestamp anchor added after its start: fold in the trades from its ts up to the
+    first one it got live (background - the history may need a download)"""
+    anchor = vwap_engine.get(anchor_id)
+    if anchor is None or trade_history is None:
+        return
+    try:
+        frame = trade_history.window(contract, int(anchor.ts * 1_000_000_000))
+    except Exception as e:
+        print(f"⚠️  VWAP anchor {anchor_id}: history since its start not available: {e}")
+        return
+    config = CONTRACT_CONFIG.get(contract, CONTRACT_CONFIG['GC'])
+    with lock:
+        if vwap_engine.get(anchor_id) is not anchor or vwap_anchor_contract != contract:
+            return      # Removed or replaced meanwhile
+        end_ns = int(anchor.period_start * 1_000_000_000) if anchor.v else None
+        frame = frame.between(None, end_ns)
+        frame = frame.select(front_month_instrument_id or frame.most_active(), config['price_min'], config['price_max'])
+        anchor.fold_earlier(frame.ts / 1e9, frame.price, frame.size)
+    save_vwap_anchors()
+    print(f"📐 VWAP anchor {anchor_id} backfilled with {len(frame)} trades since its start")
+
+
+def vwap_persist_worker():
+    """Persist anchors periodically so custom anchors and running sums survive restarts"""
+    while True:
+        time.sleep(VWAP_SAVE_INTERVAL)
+        save_vwap_anchors()
+
+
+# ============================================
+# ALERT RULES
+# ============================================
+# Conditions over state keys, e.g. "crosses_above(price, pdpoc)", "delta_30m < -2500",
+# "near_zone(2)", "stacked_buy_imbalances >= 3". Evaluated on the trade path, but only
+# the rules whose fields changed on this trade are re-checked.
+ALERT_RULES_FILE = os.path.join(os.path.dirname(__file__), '.cache', 'alert_rules.json')
+ALERT_DEFAULT_RULES = (
+    {'id': 'entry_signal', 'name': 'Entry signal', 'when': 'conditions_met >= 4', 'cooldown': 600},
+)
+ALERT_ZONES_REFRESH = 5     # Seconds between collect_all_zones() refreshes for near_zone()
+
+alert_engine = AlertEngine()
+alert_stream = AlertStream()
+alert_zones = {'prices': (), 'updated': 0.0}
+# ts_event of the restored checkpoint's last trade: records up to it were already seen (and
+# alerted on) by the previous process - rules still evaluate them but fire nothing
+alert_replay_watermark = 0
+ALERTS_FIRED = metrics_registry.counter('alerts_fired_total', 'Alert rule firings', ('rule',))
+
+
+def _alert_lookup(field):
+    if field == 'zones':
+        return alert_zones['prices']
+    return state.get(field)
+
+
+def _alerts_on_trade(ctx):
+    """Evaluate alert rules whose inputs changed; firings go to SSE and the Discord queue"""
+    if not alert_engine.rules:
+        return
+    if alert_engine.uses('zones') and ctx.ts - alert_zones['updated'] >= ALERT_ZONES_REFRESH:
+        alert_zones['prices'] = tuple(sorted(z['price'] for z in collect_all_zones()))
+        alert_zones['updated'] = ctx.ts
+    firings = alert_engine.evaluate(_alert_lookup, ctx.ts, ctx.contract)
+    if firings and getattr(ctx.record, 'ts_event', 0) <= alert_replay_watermark:
+        return
+    for firing in firings:
+        ALERTS_FIRED.labels(firing['rule']).inc()
+        alert_stream.publish(firing)
+        if 'discord' in firing['channels']:
+            send_discord_alert(f"🔔 {firing['name']} ({firing.get('contract') or '-'})",
+                               firing['message'], color=16776960, key=f"alert:{firing['rule']}")
+
+
+def save_alert_rules():
+    try:
+        with lock:
+            alert_engine.save(ALERT_RULES_FILE)
+    except OSError as e:
+        print(f"⚠️  Could not save alert rules: {e}")
+
+
+def load_alert_rules():
+    try:
+        errors = alert_engine.load(ALERT_RULES_FILE, ALERT_DEFAULT_RULES)
+    except (OSError, ValueError) as e:
+        print(f"⚠️  Could not load alert rules: {e}")
+        return
+    for rule_id, error in errors.items():
+        print(f"⚠️  Alert rule {rule_id} skipped: {error}")
+    print(f"🔔 Alert rules loaded: {len(alert_engine.rules)}")
+
+
+
+# ============================================
+# STATE CHECKPOINT (warm restart)
+# ============================================
+# Everything the trade pipeline accumulates (state, TPO, delta/volume/price buffers,
+# footprint, VWAP anchors, watermark) in one file per contract. On boot a checkpoint
+# from the current trading day is restored before HTTP starts and the live stream
+# replays only the gap since its last trade (Databento intraday replay).
+CHECKPOINT_DIR = os.path.join(os.path.dirname(__file__), '.cache', 'checkpoint')
+CHECKPOINT_INTERVAL = float(os.environ.get('CHECKPOINT_INTERVAL', 15))
+CHECKPOINT_VERSION = 1
+checkpoint_status = {'saved': None, 'restored': None, 'resume_ns': None, 'last_ts_event': 0}
+
+
+def get_checkpoint_path(contract):
+    return os.path.join(CHECKPOINT_DIR, f'{contract}.ckpt')
+
+
+def save_checkpoint():
+    """Pickle engine state under the lock, compress and write outside it"""
+    started = time.perf_counter()
+    with lock:
+        last_ts_event = state.get('last_ts_event') or 0
+        if not last_ts_event or last_ts_event == checkpoint_status['last_ts_event']:
+            return False  # Nothing new since the previous checkpoint
+        contract = ACTIVE_CONTRACT
+        pickled = state_checkpoint.snapshot({
+            'state': state,
+            'tpo_state': tpo_state,
+            'delta_history': delta_history,
+            'volume_history': volume_history,
+            'price_history': price_history,
+            'binance_trade_buffer': binance_trade_buffer,
+            'footprint': footprint,
+            'vwap': vwap_engine.dump(),
+            'event_watermark': event_watermark,
+            'last_session_id': last_session_id,
+            'last_session_day': last_session_day,
+            'front_month_instrument_id': front_month_instrument_id,
+        })
+    locked_ms = (time.perf_counter() - started) * 1000
+    meta = {
+        'version': CHECKPOINT_VERSION,
+        'contract': contract,
+        'trading_day': trading_day(last_ts_event),
+        'last_ts_event': last_ts_event,
+        'created': time.time(),
+    }
+    try:
+        size = state_checkpoint.write(get_checkpoint_path(contract), meta, pickled)
+    except OSError as e:
+        print(f"⚠️  Checkpoint write failed: {e}")
+        return False
+    checkpoint_status['last_ts_event'] = last_ts_event
+    checkpoint_status['saved'] = dict(meta, bytes=size, locked_ms=round(locked_ms, 2),
+                                      total_ms=round((time.perf_counter() - started) * 1000, 2))
+    return True
+
+
+def restore_checkpoint(contract=None):
+    """Load this contract's checkpoint if it belongs to the current trading day.
+    Returns True when state was restored (the stream then resumes from its last trade)."""
+    global delta_history, volume_history, price_history, binance_trade_buffer, footprint
+    global last_session_id, last_session_day, front_month_instrument_id, alert_replay_watermark
+    contract = contract or ACTIVE_CONTRACT
+    path = get_checkpoint_path(contract)
+    if not os.path.exists(path):
+        print(f"📭 No checkpoint for {contract}")
+        return False
+    started = time.perf_counter()
+    try:
+        meta = state_checkpoint.read_meta(path)
+        today = trading_day(time.time_ns())
+        if meta.get('version') != CHECKPOINT_VERSION or meta.get('contract') != contract:
+            print(f"📭 Checkpoint for {contract} is from another version/contract - ignoring")
+            return False
+        if meta.get('trading_day') != today:
+            print(f"📭 Checkpoint for {contract} is from trading day {meta.get('trading_day')} (today {today}) - ignoring")
+            return False
+        meta, saved = state_checkpoint.read(path)
+    except Exception as e:
+        print(f"⚠️  Could not read checkpoint for {contract}: {e}")
+        return False
+
+    with lock:
+        state.update(saved['state'])
+        tpo_state.clear()
+        tpo_state.update(saved['tpo_state'])
+        delta_history = saved['delta_history']
+        volume_history = saved['volume_history']
+        price_history = saved['price_history']
+        binance_trade_buffer = saved['binance_trade_buffer']
+        if saved['footprint'] is not None:
+            footprint = saved['footprint']
+        vwap_engine.restore(saved['vwap'])
+        event_watermark.update(saved['event_watermark'])
+        last_session_id = saved['last_session_id']
+        last_session_day = saved.get('last_session_day')     # Absent in checkpoints from before the session store
+        front_month_instrument_id = saved['front_month_instrument_id']
+        state['data_source'] = 'CHECKPOINT'
+
+    age = time.time() - meta['created']
+    checkpoint_status['last_ts_event'] = meta['last_ts_event']
+    checkpoint_status['resume_ns'] = meta['last_ts_event'] + 1
+    alert_replay_watermark = meta['last_ts_event']
+    checkpoint_status['restored'] = dict(meta, age_seconds=round(age, 1),
+                                         restore_ms=round((time.perf_counter() - started) * 1000, 2))
+    print(f"⚡ Checkpoint restored for {contract} ({age:.0f}s old, "
+          f"{checkpoint_status['restored']['restore_ms']:.0f}ms) - live stream will replay the gap")
+    return True
+
+
+def checkpoint_worker():
+    """Checkpoint periodically while trades are flowing"""
+    while True:
+        time.sleep(CHECKPOINT_INTERVAL)
+        try:
+            save_checkpoint()
+        except Exception as e:
+            print(f"⚠️  Checkpoint failed: {e}")
+
+
+def _session_on_trade(ctx):
+    """Price, session change detection, session/day/week OHLC"""
+    global last_session_id, last_session_day
+    price, et = ctx.price, ctx.et
+
+    # Update price
+    state['price'] = price
+    state['current_price'] = price
+    state['last_update'] = datetime.now(pytz.timezone('America/New_York')).strftime('%H:%M:%S')
+
+    # Get current session info
+    session_info = get_session_info(ctx.hhmm)
+    session_id = session_info['id']
+    session_name = session_info['name']
+    ctx.session_id, ctx.session_name = session_id, session_name
+
+    # Update session info
+    state['current_session_id'] = session_id
+    state['current_session_name'] = session_name
+    state['current_session_start'] = session_info['start']
+    state['current_session_end'] = session_info['end']
+
+    # Detect session change
+    if last_session_id != session_id:
+        print(f"📍 Session change: {last_session_id} -> {session_id} ({session_name})")
+
+        # Store ended session OHLC, volume, and delta before resetting
+        ended = None
+        if last_session_id and state['session_high'] > 0:
+            session_volume = state['session_buy'] + state['session_sell']
+            session_delta = state['session_buy'] - state['session_sell']
+            ended = state['ended_sessions'][last_session_id] = {
+                'open': state['session_open'],
+                'high': state['session_high'],
+                'low': state['session_low'],
+                'close': state['current_price'],
+                'volume': session_volume,
+                'delta': session_delta
+            }
+            print(f"   💾 Stored {last_session_id} OHLC: O={state['session_open']:.2f} H={state['session_high']:.2f} L={state['session_low']:.2f} C={state['current_price']:.2f} V={session_volume} D={session_delta}")
+
+        previous_session_id, last_session_id = last_session_id, session_id
+        ctx.emit('session', previous_session_id)
+        if ended is not None and last_session_day:
+            ctx.emit('session_end', (last_session_day, previous_session_id, ended))
+        last_session_day = session_trading_day(et)
+
+        # Reset session levels for new session
+        state['session_high'] = price
+        state['session_low'] = price
+        state['session_open'] = price  # First trade of new session
+        state['session_buy'] = 0       # Reset session buy volume
+        state['session_sell'] = 0      # Reset session sell volume
+
+        # Reset day levels at 18:00 ET (pre_asia session start)
+        if session_id == 'pre_asia':
+            state['day_open'] = price
+            state['day_high'] = price
+            state['day_low'] = price
+            state['ended_sessions'] = {}  # Clear ended sessions for new day
+            print(f"   🌅 New trading day started - Day Open: ${price:.2f}")
+
+            # Track weekly open (Sunday 18:00 ET = start of trading week)
+            et_now = et
+            today_str = et_now.strftime('%Y-%m-%d')
+            # Sunday = 6, so Sunday 18:00 ET is start of week
+            if et_now.weekday() == 6:  # Sunday
+                state['weekly_open'] = price
+                state['weekly_open_date'] = today_str
+                # Reset week high/low for new week
+                state['week_high'] = price
+                state['week_low'] = price
+                print(f"   📅 New trading week started - Weekly Open: ${price:.2f}")
+            # Also set weekly open on Monday if not set (for edge cases)
+            elif et_now.weekday() == 0 and state['weekly_open'] == 0:  # Monday
+                state['weekly_open'] = price
+                state['weekly_open_date'] = today_str
+                # Initialize week high/low if not set
+                if state['week_high'] == 0:
+                    state['week_high'] = price
+                    state['week_low'] = price
+                print(f"   📅 Weekly Open initialized on Monday: ${price:.2f}")
+
+    # Track session high/low
+    if price > state['session_high']:
+        state['session_high'] = price
+    if price < state['session_low']:
+        state['session_low'] = price
+
+    # Track day high/low (full trading day 18:00-17:00 ET)
+    if state['day_open'] == 0:
+        state['day_open'] = price  # Initialize if not set
+    if price > state['day_high']:
+        state['day_high'] = price
+    if price < state['day_low'] or state['day_low'] == 999999.0:
+        state['day_low'] = price
+
+    # Track week high/low
+    if price > state['week_high']:
+        state['week_high'] = price
+    if price < state['week_low'] or state['week_low'] == 999999.0:
+        state['week_low'] = price
+
+
+def _ib_on_trade(ctx):
+    """4 IB tracking (status transitions, H/L) and legacy single-IB fields"""
+    price, session_name = ctx.price, ctx.session_name
+
+    # 4 IB Tracking - Each IB tracked independently
+    active_ib = get_active_ib(ctx.hhmm)
+    state['current_ib'] = active_ib
+
+    # Update all IB statuses
+    for ib_key in state['ibs']:
+        ib = state['ibs'][ib_key]
+        if ib_key == active_ib:
+            # This IB is currently active
+            if ib['status'] == 'WAITING':
+                # First time entering - only reset if no historical data
+                if ib['high'] == 0:
+                    ib['high'] = price
+                    ib['low'] = price
+                    print(f"   🔓 {ib['name']} STARTED - Init H/L to ${price:.2f}")
+                else:
+                    print(f"   🔓 {ib['name']} STARTED - Using historical H:${ib['high']:.2f} L:${ib['low']:.2f}")
+                ib['status'] = 'ACTIVE'
+
+            # Always update high/low if price exceeds range
+            if price > ib['high']:
+                ib['high'] = price
+            if price < ib['low'] or ib['low'] == 999999.0:
+                ib['low'] = price
+            ib['status'] = 'ACTIVE'
+        else:
+            # Not active - mark as ENDED if it was ACTIVE
+            if ib['status'] == 'ACTIVE':
+                ib['status'] = 'ENDED'
+                print(f"   🔒 {ib['name']} ENDED - H: ${ib['high']:.2f}, L: ${ib['low']:.2f}")
+
+    # Legacy single IB fields (for backward compatibility)
+    if active_ib:
+        active_ib_data = state['ibs'][active_ib]
+        state['ib_high'] = active_ib_data['high']
+        state['ib_low'] = active_ib_data['low']
+        state['ib_session_name'] = active_ib_data['name']
+        state['ib_status'] = 'OPEN'
+        state['ib_locked'] = False
+        state['current_phase'] = f"{active_ib_data['name'].upper().replace(' ', '_')}_FORMING"
+    else:
+        # Find most recent ended IB for legacy display
+        state['ib_status'] = 'ENDED'
+        state['ib_locked'] = True
+        state['current_phase'] = session_name.upper().replace(' ', '_')
+
+
+def _volume_on_trade(ctx):
+    """Aggressor volume, session buy/sell and cumulative delta"""
+    size, side, now = ctx.size, ctx.side, ctx.ts
+
+    # Volume tracking
+    if state['volume_start_time'] is None:
+        state['volume_start_time'] = now
+
+    state['total_volume'] += size
+    # A = Ask (hit) = Buy aggressor, B = Bid (hit) = Sell aggressor
+    if side == 'A':
+        state['buy_volume'] += size
+        state['session_buy'] += size  # Track session buy volume
+        state['cumulative_delta'] += size
+        volume_history.append(now, size, 0)
+    elif side == 'B':
+        state['sell_volume'] += size
+        state['session_sell'] += size  # Track session sell volume
+        state['cumulative_delta'] -= size
+        volume_history.append(now, 0, size)
+
+
+def _big_trades_on_trade(ctx):
+    """Big trade detection against the dynamic p90 size threshold"""
+    price, size, side, now = ctx.price, ctx.size, ctx.side, ctx.ts
+
+    # Big Trades Detection (Order Flow)
+    # Track trade sizes for dynamic threshold calculation (90th percentile)
+    state['trade_sizes'].append(size)
+    if len(state['trade_sizes']) > 1000:
+        state['trade_sizes'] = state['trade_sizes'][-1000:]
+
+    # Recalculate 90th percentile every 100 trades (once we have enough data)
+    if len(state['trade_sizes']) >= 100 and len(state['trade_sizes']) % 100 == 0:
+        sorted_sizes = sorted(state['trade_sizes'])
+        p90_index = int(len(sorted_sizes) * 0.90)
+        # Set minimum threshold based on contract type
+        min_thresholds = {'GC': 5, 'NQ': 3, 'ES': 5, 'CL': 10, 'BTC': 1, 'BTC-SPOT': 1}
+        min_threshold = min_thresholds.get(ACTIVE_CONTRACT, 5)
+        state['big_trade_threshold'] = max(sorted_sizes[p90_index], min_threshold)
+        state['threshold_stats'] = {
+            'sample_count': len(sorted_sizes),
+            'avg_size': sum(sorted_sizes) / len(sorted_sizes),
+            'p90_size': sorted_sizes[p90_index],
+            'min_size': sorted_sizes[0],
+            'max_size': sorted_sizes[-1]
+        }
+
+    # Use dynamic threshold (falls back to default if not enough data)
+    default_thresholds = {'GC': 10, 'NQ': 5, 'ES': 10, 'CL': 20, 'BTC': 2, 'BTC-SPOT': 1}
+    big_threshold = state.get('big_trade_threshold', default_thresholds.get(ACTIVE_CONTRACT, 10))
+
+    if size >= big_threshold:
+        delta_impact = size if side == 'A' else -size
+        big_trade = {
+            'ts': now,
+            'price': price,
+            'size': size,
+            'side': 'BUY' if side == 'A' else 'SELL',
+            'delta_impact': delta_impact
+        }
+        # Keep last 50 big trades in memory
+        state['big_trades'] = [big_trade] + state['big_trades'][:49]
+
+        # Persist to daily cache file for historical analysis
+        save_big_trade(big_trade)
+
+        # Update cumulative big trades
+        if side == 'A':
+            state['big_trades_buy'] += size
+        else:
+            state['big_trades_sell'] += size
+        state['big_trades_delta'] = state['big_trades_buy'] - state['big_trades_sell']
+
+
+def _candles_on_trade(ctx):
+    """Clock-aligned 5m/15m/30m/1h delta + price OHLC candles"""
+    price, size, side, now = ctx.price, ctx.size, ctx.side, ctx.ts
+
+    # Calculate candle-aligned volume (current candle only)
+    # Get current candle start times (clock-aligned)
+    def get_candle_start(ts, minutes):
+        return int(ts // (minutes * 60)) * (minutes * 60)
+
+    candle_5m_start = get_candle_start(now, 5)
+    candle_15m_start = get_candle_start(now, 15)
+    candle_30m_start = get_candle_start(now, 30)
+    candle_1h_start = get_candle_start(now, 60)
+
+    # Check if new candle started - store previous in history and reset
+    if state['volume_5m']['candle_start'] != candle_5m_start:
+        ctx.emit('candle', '5m')
+        prev = state['volume_5m']
+        history = prev.get('history', [])
+        # Add completed candle to history with delta OHLC and price OHLC for divergence
+        if prev['buy'] > 0 or prev['sell'] > 0:
+            history = [{
+                'buy': prev['buy'], 'sell': prev['sell'], 'delta': prev['delta'], 'ts': prev['candle_start'],
+                'delta_open': prev.get('delta_open', 0), 'delta_high': prev.get('delta_high', 0),
+                'delta_low': prev.get('delta_low', 0), 'delta_close': prev['delta'],
+                'price_open': prev.get('price_open', 0), 'price_high': prev.get('price_high', 0),
+                'price_low': prev.get('price_low', 999999), 'price_close': prev.get('price_close', 0)
+            }] + history[:29]  # Keep 30 candles of history
+        state['volume_5m'] = {'buy': 0, 'sell': 0, 'delta': 0, 'candle_start': candle_5m_start,
+                              'prev_buy': prev['buy'], 'prev_sell': prev['sell'], 'prev_delta': prev['delta'], 'history': history,
+                              'delta_open': None, 'delta_high': -999999, 'delta_low': 999999,
+                              'price_open': 0, 'price_high': 0, 'price_low': 999999, 'price_close': 0}
+    if state['volume_15m']['candle_start'] != candle_15m_start:
+        ctx.emit('candle', '15m')
+        prev = state['volume_15m']
+        history = prev.get('history', [])
+        if prev['buy'] > 0 or prev['sell'] > 0:
+            history = [{
+                'buy': prev['buy'], 'sell': prev['sell'], 'delta': prev['delta'], 'ts': prev['candle_start'],
+                'delta_open': prev.get('delta_open', 0), 'delta_high': prev.get('delta_high', 0),
+                'delta_low': prev.get('delta_low', 0), 'delta_close': prev['delta'],
+                'price_open': prev.get('price_open', 0), 'price_high': prev.get('price_high', 0),
+                'price_low': prev.get('price_low', 999999), 'price_close': prev.get('price_close', 0)
+            }] + history[:29]  # Keep 30 candles of history
+        state['volume_15m'] = {'buy': 0, 'sell': 0, 'delta': 0, 'candle_start': candle_15m_start,
+                               'prev_buy': prev['buy'], 'prev_sell': prev['sell'], 'prev_delta': prev['delta'], 'history': history,
+                               'delta_open': None, 'delta_high': -999999, 'delta_low': 999999,
+                               'price_open': 0, 'price_high': 0, 'price_low': 999999, 'price_close': 0}
+    if state['volume_30m']['candle_start'] != candle_30m_start:
+        ctx.emit('candle', '30m')
+        prev = state['volume_30m']
+        history = prev.get('history', [])
+        if prev['buy'] > 0 or prev['sell'] > 0:
+            history = [{
+                'buy': prev['buy'], 'sell': prev['sell'], 'delta': prev['delta'], 'ts': prev['candle_start'],
+                'delta_open': prev.get('delta_open', 0), 'delta_high': prev.get('delta_high', 0),
+                'delta_low': prev.get('delta_low', 0), 'delta_close': prev['delta'],
+                'price_open': prev.get('price_open', 0), 'price_high': prev.get('price_high', 0),
+                'price_low': prev.get('price_low', 999999), 'price_close': prev.get('price_close', 0)
+            }] + history[:29]  # Keep 30 candles of history
+        state['volume_30m'] = {'buy': 0, 'sell': 0, 'delta': 0, 'candle_start': candle_30m_start,
+                               'prev_buy': prev['buy'], 'prev_sell': prev['sell'], 'prev_delta': prev['delta'], 'history': history,
+                               'delta_open': None, 'delta_high': -999999, 'delta_low': 999999,
+                               'price_open': 0, 'price_high': 0, 'price_low': 999999, 'price_close': 0}
+    if state['volume_1h']['candle_start'] != candle_1h_start:
+        ctx.emit('candle', '1h')
+        prev = state['volume_1h']
+        history = prev.get('history', [])
+        if prev['buy'] > 0 or prev['sell'] > 0:
+            history = [{
+                'buy': prev['buy'], 'sell': prev['sell'], 'delta': prev['delta'], 'ts': prev['candle_start'],
+                'delta_open': prev.get('delta_open', 0), 'delta_high': prev.get('delta_high', 0),
+                'delta_low': prev.get('delta_low', 0), 'delta_close': prev['delta'],
+                'price_open': prev.get('price_open', 0), 'price_high': prev.get('price_high', 0),
+                'price_low': prev.get('price_low', 999999), 'price_close': prev.get('price_close', 0)
+            }] + history[:29]  # Keep 30 candles of history
+        state['volume_1h'] = {'buy': 0, 'sell': 0, 'delta': 0, 'candle_start': candle_1h_start,
+                              'prev_buy': prev['buy'], 'prev_sell': prev['sell'], 'prev_delta': prev['delta'], 'history': history,
+                              'delta_open': None, 'delta_high': -999999, 'delta_low': 999999,
+                              'price_open': 0, 'price_high': 0, 'price_low': 999999, 'price_close': 0}
+
+    # Add current trade to candle volumes
+    # Note: A = Ask (hit) = Buy aggressor, B = Bid (hit) = Sell aggressor
+    trade_buy = size if side == 'A' else 0
+    trade_sell = size if side == 'B' else 0
+
+    # Helper function to update OHLC for a timeframe
+    def update_candle_ohlc(tf_key, trade_buy, trade_sell, price):
+        tf = state[tf_key]
+        tf['buy'] += trade_buy
+        tf['sell'] += trade_sell
+        tf['delta'] = tf['buy'] - tf['sell']
+
+        # Update Delta OHLC (handle None values safely)
+        if tf.get('delta_open') is None:
+            tf['delta_open'] = tf['delta']  # First trade sets open
+        delta_high = tf.get('delta_high') if tf.get('delta_high') is not None else -999999
+        delta_low = tf.get('delta_low') if tf.get('delta_low') is not None else 999999
+        tf['delta_high'] = max(delta_high, tf['delta'])
+        tf['delta_low'] = min(delta_low, tf['delta'])
+
+        # Update Price OHLC (handle None values safely)
+        if tf.get('price_open', 0) == 0:
+            tf['price_open'] = price  # First trade sets open
+        price_high = tf.get('price_high') if tf.get('price_high') is not None else 0
+        price_low = tf.get('price_low') if tf.get('price_low') is not None else 999999
+        tf['price_high'] = max(price_high, price)
+        tf['price_low'] = min(price_low, price)
+        tf['price_close'] = price  # Always update close to latest price
+
+    update_candle_ohlc('volume_5m', trade_buy, trade_sell, price)
+    update_candle_ohlc('volume_15m', trade_buy, trade_sell, price)
+    update_candle_ohlc('volume_30m', trade_buy, trade_sell, price)
+    update_candle_ohlc('volume_1h', trade_buy, trade_sell, price)
+
+
+def _footprint_on_trade(ctx):
+    """Footprint volume-at-price and stacked imbalances"""
+    price, size, side, now = ctx.price, ctx.size, ctx.side, ctx.ts
+
+    # Footprint: volume-at-price, diagonal imbalances, stacked runs (developing 5m candle)
+    if footprint:
+        footprint.on_trade(now, price, size, side)
+        state['stacked_buy_imbalances'], state['stacked_sell_imbalances'] = footprint.stacked_imbalances('5m')
+
+
+def _delta_on_trade(ctx):
+    """Delta history and rolling 5m/30m deltas"""
+    now = ctx.ts
+
+    # Log every 100 trades for verification
+    if state['total_volume'] % 100 == 0:
+        print(f"📊 Vol: {state['total_volume']} | Buy: {state['buy_volume']} | Sell: {state['sell_volume']} | Delta: {state['cumulative_delta']}")
+
+    # Delta history
+    delta_history.append(now, state['cumulative_delta'])
+
+    # Calculate rolling deltas (bisect on the ring buffer timestamps)
+    cumulative = state['cumulative_delta']
+    state['delta_5m'] = cumulative - int(delta_history.first_since(now - 300, 'delta', cumulative))
+    state['delta_30m'] = cumulative - int(delta_history.first_since(now - 1800, 'delta', cumulative))
+
+
+def _vwap_on_trade(ctx):
+    """All anchored VWAPs via the VWAP engine; legacy state keys mirror the built-in anchors"""
+    vwap_engine.on_trade(ctx.ts, ctx.price, ctx.size)
+    session = vwap_engine.get('vwap')
+    state['vwap'] = session.vwap
+    state['vwap_numerator'] = session.vwap * session.v
+    state['vwap_denominator'] = session.v
+    for key in ('day_vwap', 'rth_vwap', 'us_ib_vwap', 'ny_1h_vwap', 'week_vwap'):
+        state[key] = vwap_engine.value(key)
+
+
+def _ib_vwap_on_trade(ctx):
+    """IB mid and POC during active IB windows (VWAP from the ib_* engine anchors)"""
+    price, size, current_hhmm = ctx.price, ctx.size, ctx.hhmm
+
+    # === IB POC and VWAP Tracking ===
+    # Update IB VWAP and TPO prices during active IB periods
+    ib_sessions = [
+        (1900, 2000, 'japan'),   # Japan IB: 19:00-20:00 ET
+        (300, 400, 'london'),    # London IB: 03:00-04:00 ET
+        (820, 930, 'us'),        # US IB: 08:20-09:30 ET
+        (930, 1030, 'ny'),       # NY IB: 09:30-10:30 ET
+    ]
+
+    for start, end, ib_key in ib_sessions:
+        if start <= current_hhmm < end:
+            ib = state['ibs'].get(ib_key, {})
+            if ib.get('status') in ['WAITING', None]:
+                # IB session starting - reset
+                ib['high'] = price
+                ib['low'] = price
+                ib['tpo_prices'] = {round(price / 0.1) * 0.1: size}
+                ib['status'] = 'ACTIVE'
+            else:
+                # Update high/low
+                if price > ib.get('high', 0):
+                    ib['high'] = price
+                if price < ib.get('low', 999999):
+                    ib['low'] = price
+                # Track TPO for POC
+                tpo_key = round(price / 0.1) * 0.1
+                tpo_prices = ib.get('tpo_prices', {})
+                tpo_prices[tpo_key] = tpo_prices.get(tpo_key, 0) + size
+                ib['tpo_prices'] = tpo_prices
+
+            # Calculate mid, VWAP, POC
+            if ib['high'] > 0 and ib['low'] < 999999:
+                ib['mid'] = (ib['high'] + ib['low']) / 2
+            anchor = vwap_engine.get(f'ib_{ib_key}')  # Window anchor - the vwap stage already added this trade
+            if anchor and anchor.v > 0:
+                ib['vwap'] = anchor.vwap
+                ib['vwap_num'] = anchor.vwap * anchor.v
+                ib['vwap_den'] = anchor.v
+            if ib.get('tpo_prices'):
+                poc_price = max(ib['tpo_prices'], key=ib['tpo_prices'].get)
+                ib['poc'] = poc_price
+
+            state['ibs'][ib_key] = ib
+            # Update legacy IB
+            state['ib_high'] = ib['high']
+            state['ib_low'] = ib['low']
+            state['ib_locked'] = False
+            break
+        elif current_hhmm >= end and state['ibs'].get(ib_key, {}).get('status') == 'ACTIVE':
+            # IB just ended - lock it
+            ib = state['ibs'][ib_key]
+            ib['status'] = 'ENDED'
+            state['ibs'][ib_key] = ib
+            state['ib_locked'] = True
+            print(f"🔒 {ib_key.upper()} IB Complete: H=${ib['high']:.2f} L=${ib['low']:.2f} POC=${ib.get('poc', 0):.2f} VWAP=${ib.get('vwap', 0):.2f}")
+
+
+def _signals_on_trade(ctx):
+    """Buying imbalance, absorption and Signal Matrix conditions"""
+    price, size, side = ctx.price, ctx.size, ctx.side
+
+    # Buying imbalance
+    if state['sell_volume'] > 0:
+        state['buying_imbalance_pct'] = int((state['buy_volume'] / state['sell_volume']) * 100)
+
+    # Absorption ratio - real touch absorption when quotes are streaming (and fresh),
+    # otherwise fall back to the cumulative delta / volume proxy
+    if state['quote_ts'] > 0 and time.time() - state['quote_ts'] < QUOTE_STALE_SECONDS:
+        state['absorption_ratio'] = update_touch_absorption(price, size, side)
+    elif state['total_volume'] > 0:
+        state['absorption_ratio'] = abs(state['cumulative_delta']) / state['total_volume']
+
+    # Entry conditions check (matching Signal Matrix exactly)
+    conditions = 0
+    if state['delta_30m'] < -2500:
+        conditions += 1
+    if state['buying_imbalance_pct'] >= 400:
+        conditions += 1
+    ib_low = state['ib_low'] if state['ib_low'] < 999999 else 0
+    if ib_low > 0 and state['current_price'] < ib_low:
+        conditions += 1
+    if state['absorption_ratio'] > 1.2:
+        conditions += 1
+    if state['stacked_buy_imbalances'] >= 3:
+        conditions += 1
+    # At pdPOC = within $2 of pdPOC
+    if state['pdpoc'] > 0 and abs(state['current_price'] - state['pdpoc']) <= 2.0:
+        conditions += 1
+
+    state['conditions_met'] = conditions
+    state['entry_signal'] = conditions >= 4
+
+
+def _tpo_on_trade(ctx):
+    """Day and session TPO profiles (4-session structure)"""
+    price, now, current_hhmm = ctx.price, ctx.ts, ctx.hhmm
+
+    config = CONTRACT_CONFIG.get(ACTIVE_CONTRACT, CONTRACT_CONFIG['GC'])
+    tick_size = config['tick_size']
+
+    # Round price to tick size for TPO level
+    tpo_price = round(price / tick_size) * tick_size
+
+    # Determine active TPO session
+    current_tpo_session = get_tpo_session_for_time(current_hhmm)
+    day = tpo_state['day']
+
+    # Initialize day start on first trade after 18:00 ET or on reset
+    if tpo_state['day_start_time'] == 0:
+        tpo_state['day_start_time'] = now
+        day['current_period_start'] = int(now // 1800) * 1800  # Clock-aligned 30-min
+        day['open_price'] = price
+        tpo_state['active_session'] = current_tpo_session
+        print(f"📊 TPO: Day started at {price:.2f}, Period A, Session: {current_tpo_session}")
+
+    # Handle session transitions
+    if current_tpo_session and current_tpo_session != tpo_state['active_session']:
+        old_session = tpo_state['active_session']
+        tpo_state['active_session'] = current_tpo_session
+        # Reset session profile for new session
+        reset_session_profile(current_tpo_session)
+        session_data = tpo_state['sessions'][current_tpo_session]
+        session_data['open_price'] = price
+        session_data['current_period_start'] = int(now // 1800) * 1800
+        session_name_display = TPO_SESSIONS[current_tpo_session]['display']
+        print(f"📊 TPO: Session changed from {old_session} to {current_tpo_session} ({session_name_display})")
+
+    # Get active session data
+    session_data = None
+    session_config = None
+    if current_tpo_session:
+        session_data = tpo_state['sessions'][current_tpo_session]
+        session_config = TPO_SESSIONS[current_tpo_session]
+
+    # Check if new period started
+    current_period_start = int(now // 1800) * 1800
+
+    # Note: Uses the outer get_session_period_index function which handles
+    # variable period durations (London last 20 min, US first 40 min)
+
+    # Day profile period tracking - calculate from 18:00 ET (day start)
+    day_start_mins = 18 * 60  # 18:00 = 1080 minutes
+    current_mins = (current_hhmm // 100) * 60 + (current_hhmm % 100)
+    if current_hhmm < 1800:  # Before 18:00, we're in next day's periods
+        current_mins += 24 * 60
+    day_period_idx = (current_mins - day_start_mins) // 30
+
+    if current_period_start != day['current_period_start'] or day['period_count'] != day_period_idx:
+        if day['period_count'] != day_period_idx:
+            day['period_count'] = day_period_idx
+        day['current_period_start'] = current_period_start
+        new_letter = get_tpo_letter(day['period_count'])
+        print(f"📊 TPO: Day period {new_letter} (#{day['period_count']})")
+
+        # Calculate BC overlap when C period starts (day level)
+        if day['period_count'] == 3:
+            bc_overlap = calculate_overlap(
+                (day['b_high'], day['b_low']),
+                (day['c_high'], day['c_low'])
+            )
+            day['bc_overlap'] = bc_overlap
+
+    # Session profile period tracking - calculate from session start time
+    if session_data and session_config:
+        session_period_idx = get_session_period_index(current_tpo_session, current_hhmm)
+
+        if current_period_start != session_data['current_period_start'] or session_data['period_count'] != session_period_idx:
+            if session_data['period_count'] != session_period_idx:
+                session_data['period_count'] = session_period_idx
+            session_data['current_period_start'] = current_period_start
+            session_letter = get_tpo_letter(session_data['period_count'])
+            print(f"   📊 Session {current_tpo_session} period {session_letter} (#{session_data['period_count']})")
+
+        # Check IB complete for session
+        if session_data['period_count'] == 2 and not session_data['ib_complete']:
+            session_data['ib_complete'] = True
+            if session_data['ib_high'] > 0 and session_data['ib_low'] < 999999:
+                ib_range = session_data['ib_high'] - session_data['ib_low']
+                print(f"   🔒 Session IB Complete: H={session_data['ib_high']:.2f} L={session_data['ib_low']:.2f} Range={ib_range:.2f}")
+
+    # Get current period letters
+    day_letter = get_tpo_letter(day['period_count'])
+    session_letter = get_tpo_letter(session_data['period_count']) if session_data else None
+
+    # Add TPO to DAY profile
+    if tpo_price not in day['profiles']:
+        day['profiles'][tpo_price] = set()
+    day['profiles'][tpo_price].add(day_letter)
+
+    # Add TPO to SESSION profile
+    if session_data and session_letter:
+        if tpo_price not in session_data['profiles']:
+            session_data['profiles'][tpo_price] = set()
+        session_data['profiles'][tpo_price].add(session_letter)
+        # Update session high/low
+        if price > session_data.get('high', 0):
+            session_data['high'] = price
+        if price < session_data.get('low', 999999):
+            session_data['low'] = price
+
+    # Update period ranges for A, B, C (day level - for RTH open type detection)
+    day_period_idx = day['period_count']
+    if day_period_idx == 0:  # A period
+        if price > day['a_high']:
+            day['a_high'] = price
+        if price < day['a_low']:
+            day['a_low'] = price
+    elif day_period_idx == 1:  # B period
+        if price > day['b_high']:
+            day['b_high'] = price
+        if price < day['b_low']:
+            day['b_low'] = price
+    elif day_period_idx == 2:  # C period
+        if price > day['c_high']:
+            day['c_high'] = price
+        if price < day['c_low']:
+            day['c_low'] = price
+
+    # Update session-specific A/B tracking for RTH open type
+    if current_tpo_session == 'tpo3_us_am' and session_data:
+        session_period_idx = session_data['period_count']
+        if session_period_idx == 0:  # A period
+            if price > session_data['a_high']:
+                session_data['a_high'] = price
+            if price < session_data['a_low']:
+                session_data['a_low'] = price
+        elif session_period_idx == 1:  # B period
+            if price > session_data['b_high']:
+                session_data['b_high'] = price
+            if price < session_data['b_low']:
+                session_data['b_low'] = price
+        # AB overlap for RTH session
+        if session_period_idx >= 1:
+            session_data['ab_overlap'] = calculate_overlap(
+                (session_data['a_high'], session_data['a_low']),
+                (session_data['b_high'], session_data['b_low'])
+            )
+
+    # Update DAY IB during RTH session (09:30-10:30 = first 2 periods of tpo3_us_am)
+    if current_tpo_session == 'tpo3_us_am' and session_data:
+        session_period_idx = session_data['period_count']
+        if session_period_idx < 2:  # During IB formation
+            if price > day['ib_high']:
+                day['ib_high'] = price
+            if price < day['ib_low']:
+                day['ib_low'] = price
+        elif session_period_idx == 2 and not day['ib_complete']:
+            day['ib_complete'] = True
+            ib_range = day['ib_high'] - day['ib_low']
+            print(f"📊 TPO: RTH IB Complete: H={day['ib_high']:.2f} L={day['ib_low']:.2f} Range={ib_range:.2f}")
+
+    # Update SESSION IB based on session-specific IB times
+    if session_data and session_config:
+        ib_start = session_config.get('ib_start')
+        ib_end = session_config.get('ib_end')
+        if ib_start is not None and ib_end is not None:
+            # Check if within session IB time
+            if ib_start <= current_hhmm < ib_end:
+                if price > session_data['ib_high']:
+                    session_data['ib_high'] = price
+                if price < session_data['ib_low']:
+                    session_data['ib_low'] = price
+            elif current_hhmm >= ib_end and not session_data['ib_complete']:
+                session_data['ib_complete'] = True
+                if session_data['ib_high'] > 0 and session_data['ib_low'] < 999999:
+                    ib_range = session_data['ib_high'] - session_data['ib_low']
+                    print(f"   🔒 {session_config['name']} IB Complete: H={session_data['ib_high']:.2f} L={session_data['ib_low']:.2f}")
+
+    # Recalculate TPO metrics periodically (every 50 trades)
+    if state['total_volume'] % 50 == 0:
+        calculate_tpo_metrics()
+        classify_day_type()
+        classify_open_type()
+
+
+def _vwap_on_boundary(kind, detail, ctx):
+    if kind == 'session':
+        vwap_engine.reset(kind='session')
+
+
+def _tpo_on_boundary(kind, detail, ctx):
+    """Reset the TPO day at 18:00 ET (first trade of pre_asia after another session).
+    detail is the previous session id - None on the first trade after startup, when
+    the TPO todays_tpo just loaded must survive"""
+    if kind != 'session' or ctx.session_id != 'pre_asia' or detail is None:
+        return
+    reset_tpo_for_new_day()
+    day = tpo_state['day']
+    tpo_state['day_start_time'] = ctx.ts
+    day['current_period_start'] = int(ctx.ts // 1800) * 1800
+    day['open_price'] = ctx.price
+    tpo_state['active_session'] = get_tpo_session_for_time(ctx.hhmm)
+
+
+def _candle_snapshot():
+    return {tf: {k: v for k, v in state[tf].items() if k != 'history'}
+            for tf in ('volume_5m', 'volume_15m', 'volume_30m', 'volume_1h')}
+
+
+# Stage order matters: later stages read what earlier ones wrote (signals read deltas,
+# stacked imbalances and IB levels). AGGREGATORS_DISABLED='NQ:footprint,tpo;*:ib_vwap'
+trade_pipeline = AggregatorPipeline(AGGREGATOR_SECONDS)
+trade_pipeline.register(Aggregator('session', _session_on_trade, required=True, snapshot=lambda: {
+    k: state[k] for k in ('current_session_id', 'session_open', 'session_high', 'session_low',
+                          'day_open', 'day_high', 'day_low', 'week_high', 'week_low')}))
+trade_pipeline.register(Aggregator('ib', _ib_on_trade, snapshot=lambda: {
+    k: {f: ib.get(f) for f in ('name', 'status', 'high', 'low', 'mid')} for k, ib in state['ibs'].items()}))
+trade_pipeline.register(Aggregator('volume', _volume_on_trade, required=True, snapshot=lambda: {
+    k: state[k] for k in ('total_volume', 'buy_volume', 'sell_volume', 'session_buy', 'session_sell', 'cumulative_delta')}))
+trade_pipeline.register(Aggregator('big_trades', _big_trades_on_trade, snapshot=lambda: {
+    'threshold': state.get('big_trade_threshold'), 'recent': state['big_trades'][:10],
+    'delta': state['big_trades_delta']}))
+trade_pipeline.register(Aggregator('candles', _candles_on_trade, snapshot=_candle_snapshot))
+trade_pipeline.register(Aggregator('footprint', _footprint_on_trade, snapshot=lambda: {
+    'stacked_buy': state['stacked_buy_imbalances'], 'stacked_sell': state['stacked_sell_imbalances']}))
+trade_pipeline.register(Aggregator('delta', _delta_on_trade, snapshot=lambda: {
+    'delta_5m': state['delta_5m'], 'delta_30m': state['delta_30m'], 'history': len(delta_history)}))
+trade_pipeline.register(Aggregator('vwap', _vwap_on_trade, on_boundary=_vwap_on_boundary,
+                                   snapshot=lambda: vwap_engine.bands()))
+trade_pipeline.register(Aggregator('ib_vwap', _ib_vwap_on_trade, snapshot=lambda: {
+    k: {f: ib.get(f) for f in ('vwap', 'poc', 'mid')} for k, ib in state['ibs'].items()}))
+trade_pipeline.register(Aggregator('signals', _signals_on_trade, snapshot=lambda: {
+    k: state[k] for k in ('buying_imbalance_pct', 'absorption_ratio', 'conditions_met', 'entry_signal')}))
+trade_pipeline.register(Aggregator('tpo', _tpo_on_trade, on_boundary=_tpo_on_boundary, snapshot=lambda: {
+    'active_session': tpo_state['active_session'], 'period_count': tpo_state['day']['period_count'],
+    'poc': tpo_state['day']['poc'], 'vah': tpo_state['day']['vah'], 'val': tpo_state['day']['val']}))
+trade_pipeline.register(Aggregator('alerts', _alerts_on_trade, snapshot=alert_engine.stats))
+trade_pipeline.register(Aggregator('session_store', on_boundary=_session_store_on_boundary,
+                                   snapshot=lambda: dict(session_store_live)))
+
+
 def process_trade(record):
     """Process incoming trade data - only front month contract"""
     global state, last_session_id, front_month_instrument_id, ACTIVE_CONTRACT
 
+    started_ns = time.perf_counter_ns()
     try:
         if not hasattr(record, 'price'):
+            RECORDS_DROPPED.labels('not_trade').inc()
             return
 
         # Filter to only process front month trades
         if front_month_instrument_id is not None:
             if hasattr(record, 'instrument_id') and record.instrument_id != front_month_instrument_id:
+                RECORDS_DROPPED.labels('front_month').inc()
                 return  # Skip trades from other contracts
 
         price = record.price / 1e9 if record.price > 1e6 else record.price
@@ -10968,693 +11974,48 @@ def process_trade(record):
         # Use dynamic price range from contract config
         config = CONTRACT_CONFIG.get(ACTIVE_CONTRACT, CONTRACT_CONFIG['GC'])
         if price < config['price_min'] or price > config['price_max']:
+            RECORDS_DROPPED.labels('price_range').inc()
             return
 
+        # Archive every front-month trade - also the late ones the watermark drops below
+        ts_event = getattr(record, 'ts_event', 0)
+        if ts_event and TICK_ARCHIVE_ENABLED:
+            tick_archive.append(ACTIVE_CONTRACT, config['tick_size'], ts_event, price, size, side,
+                                getattr(record, 'instrument_id', 0))
+
         # Update watchdog timer
         update_last_trade_time()
 
         with lock:
-            # Update price
-            state['price'] = price
-            state['current_price'] = price
-            state['last_update'] = datetime.now(pytz.timezone('America/New_York')).strftime('%H:%M:%S')
-
-            # Get current session info
-            session_info = get_session_info()
-            session_id = session_info['id']
-            session_name = session_info['name']
-            is_ib_session = session_info['is_ib_session']
-            ib_locked = session_info['ib_locked']
-            
-            # Update session info
-            state['current_session_id'] = session_id
-            state['current_session_name'] = session_name
-            state['current_session_start'] = session_info['start']
-            state['current_session_end'] = session_info['end']
-            
-            # Detect session change
-            if last_session_id != session_id:
-                print(f"📍 Session change: {last_session_id} -> {session_id} ({session_name})")
-
-                # Store ended session OHLC, volume, and delta before resetting
-                if last_session_id and state['session_high'] > 0:
-                    session_volume = state['session_buy'] + state['session_sell']
-                    session_delta = state['session_buy'] - state['session_sell']
-                    state['ended_sessions'][last_session_id] = {
-                        'open': state['session_open'],
-                        'high': state['session_high'],
-                        'low': state['session_low'],
-                        'close': state['current_price'],
-                        'volume': session_volume,
-                        'delta': session_delta
-                    }
-                    print(f"   💾 Stored {last_session_id} OHLC: O={state['session_open']:.2f} H={state['session_high']:.2f} L={state['session_low']:.2f} C={state['current_price']:.2f} V={session_volume} D={session_delta}")
-
-                last_session_id = session_id
-
-                # Reset session levels for new session
-                state['session_high'] = price
-                state['session_low'] = price
-                state['session_open'] = price  # First trade of new session
-                state['session_buy'] = 0       # Reset session buy volume
-                state['session_sell'] = 0      # Reset session sell volume
-
-                # Reset day levels at 18:00 ET (pre_asia session start)
-                if session_id == 'pre_asia':
-                    state['day_open'] = price
-                    state['day_high'] = price
-                    state['day_low'] = price
-                    state['ended_sessions'] = {}  # Clear ended sessions for new day
-                    print(f"   🌅 New trading day started - Day Open: ${price:.2f}")
-
-                    # Track weekly open (Sunday 18:00 ET = start of trading week)
-                    et_now = get_et_now()
-                    today_str = et_now.strftime('%Y-%m-%d')
-                    # Sunday = 6, so Sunday 18:00 ET is start of week
-                    if et_now.weekday() == 6:  # Sunday
-                        state['weekly_open'] = price
-                        state['weekly_open_date'] = today_str
-                        # Reset week high/low for new week
-                        state['week_high'] = price
-                        state['week_low'] = price
-                        print(f"   📅 New trading week started - Weekly Open: ${price:.2f}")
-                    # Also set weekly open on Monday if not set (for edge cases)
-                    elif et_now.weekday() == 0 and state['weekly_open'] == 0:  # Monday
-                        state['weekly_open'] = price
-                        state['weekly_open_date'] = today_str
-                        # Initialize week high/low if not set
-                        if state['week_high'] == 0:
-                            state['week_high'] = price
-                            state['week_low'] = price
-                        print(f"   📅 Weekly Open initialized on Monday: ${price:.2f}")
-
-            # Track session high/low
-            if price > state['session_high']:
-                state['session_high'] = price
-            if price < state['session_low']:
-                state['session_low'] = price
-
-            # Track day high/low (full trading day 18:00-17:00 ET)
-            if state['day_open'] == 0:
-                state['day_open'] = price  # Initialize if not set
-            if price > state['day_high']:
-                state['day_high'] = price
-            if price < state['day_low'] or state['day_low'] == 999999.0:
-                state['day_low'] = price
-
-            # Track week high/low
-            if price > state['week_high']:
-                state['week_high'] = price
-            if price < state['week_low'] or state['week_low'] == 999999.0:
-                state['week_low'] = price
-
-            # 4 IB Tracking - Each IB tracked independently
-            active_ib = get_active_ib()
-            state['current_ib'] = active_ib
-
-            # Update all IB statuses
-            for ib_key in state['ibs']:
-                ib = state['ibs'][ib_key]
-                if ib_key == active_ib:
-                    # This IB is currently active
-                    if ib['status'] == 'WAITING':
-                        # First time entering - only reset if no historical data
-                        if ib['high'] == 0:
-                            ib['high'] = price
-                            ib['low'] = price
-                            print(f"   🔓 {ib['name']} STARTED - Init H/L to ${price:.2f}")
-                        else:
-                            print(f"   🔓 {ib['name']} STARTED - Using historical H:${ib['high']:.2f} L:${ib['low']:.2f}")
-                        ib['status'] = 'ACTIVE'
-
-                    # Always update high/low if price exceeds range
-                    if price > ib['high']:
-                        ib['high'] = price
-                    if price < ib['low'] or ib['low'] == 999999.0:
-                        ib['low'] = price
-                    ib['status'] = 'ACTIVE'
-                else:
-                    # Not active - mark as ENDED if it was ACTIVE
-                    if ib['status'] == 'ACTIVE':
-                        ib['status'] = 'ENDED'
-                        print(f"   🔒 {ib['name']} ENDED - H: ${ib['high']:.2f}, L: ${ib['low']:.2f}")
-
-            # Legacy single IB fields (for backward compatibility)
-            if active_ib:
-                active_ib_data = state['ibs'][active_ib]
-                state['ib_high'] = active_ib_data['high']
-                state['ib_low'] = active_ib_data['low']
-                state['ib_session_name'] = active_ib_data['name']
-                state['ib_status'] = 'OPEN'
-                state['ib_locked'] = False
-                state['current_phase'] = f"{active_ib_data['name'].upper().replace(' ', '_')}_FORMING"
-            else:
-                # Find most recent ended IB for legacy display
-                state['ib_status'] = 'ENDED'
-                state['ib_locked'] = True
-                state['current_phase'] = session_name.upper().replace(' ', '_')
-            
-            # Volume tracking
-            now = time.time()
-            if state['volume_start_time'] is None:
-                state['volume_start_time'] = now
-
-            state['total_volume'] += size
-            # A = Ask (hit) = Buy aggressor, B = Bid (hit) = Sell aggressor
-            if side == 'A':
-                state['buy_volume'] += size
-                state['session_buy'] += size  # Track session buy volume
-                state['cumulative_delta'] += size
-                volume_history.append((now, size, 0))  # (ts, buy, sell)
-            elif side == 'B':
-                state['sell_volume'] += size
-                state['session_sell'] += size  # Track session sell volume
-                state['cumulative_delta'] -= size
-                volume_history.append((now, 0, size))  # (ts, buy, sell)
-
-            # Big Trades Detection (Order Flow)
-            # Track trade sizes for dynamic threshold calculation (90th percentile)
-            state['trade_sizes'].append(size)
-            if len(state['trade_sizes']) > 1000:
-                state['trade_sizes'] = state['trade_sizes'][-1000:]
-
-            # Recalculate 90th percentile every 100 trades (once we have enough data)
-            if len(state['trade_sizes']) >= 100 and len(state['trade_sizes']) % 100 == 0:
-                sorted_sizes = sorted(state['trade_sizes'])
-                p90_index = int(len(sorted_sizes) * 0.90)
-                # Set minimum threshold based on contract type
-                min_thresholds = {'GC': 5, 'NQ': 3, 'ES': 5, 'CL': 10, 'BTC': 1, 'BTC-SPOT': 1}
-                min_threshold = min_thresholds.get(ACTIVE_CONTRACT, 5)
-                state['big_trade_threshold'] = max(sorted_sizes[p90_index], min_threshold)
-                state['threshold_stats'] = {
-                    'sample_count': len(sorted_sizes),
-                    'avg_size': sum(sorted_sizes) / len(sorted_sizes),
-                    'p90_size': sorted_sizes[p90_index],
-                    'min_size': sorted_sizes[0],
-                    'max_size': sorted_sizes[-1]
-                }
-
-            # Use dynamic threshold (falls back to default if not enough data)
-            default_thresholds = {'GC': 10, 'NQ': 5, 'ES': 10, 'CL': 20, 'BTC': 2, 'BTC-SPOT': 1}
-            big_threshold = state.get('big_trade_threshold', default_thresholds.get(ACTIVE_CONTRACT, 10))
-
-            if size >= big_threshold:
-                delta_impact = size if side == 'A' else -size
-                big_trade = {
-                    'ts': now,
-                    'price': price,
-                    'size': size,
-                    'side': 'BUY' if side == 'A' else 'SELL',
-                    'delta_impact': delta_impact
-                }
-                # Keep last 50 big trades in memory
-                state['big_trades'] = [big_trade] + state['big_trades'][:49]
-
-                # Persist to daily cache file for historical analysis
-                save_big_trade(big_trade)
-
-                # Update cumulative big trades
-                if side == 'A':
-                    state['big_trades_buy'] += size
-                else:
-                    state['big_trades_sell'] += size
-                state['big_trades_delta'] = state['big_trades_buy'] - state['big_trades_sell']
-
-            # Calculate candle-aligned volume (current candle only)
-            # Get current candle start times (clock-aligned)
-            def get_candle_start(ts, minutes):
-                return int(ts // (minutes * 60)) * (minutes * 60)
-
-            candle_5m_start = get_candle_start(now, 5)
-            candle_15m_start = get_candle_start(now, 15)
-            candle_30m_start = get_candle_start(now, 30)
-            candle_1h_start = get_candle_start(now, 60)
-
-            # Check if new candle started - store previous in history and reset
-            if state['volume_5m']['candle_start'] != candle_5m_start:
-                prev = state['volume_5m']
-                history = prev.get('history', [])
-                # Add completed candle to history with delta OHLC and price OHLC for divergence
-                if prev['buy'] > 0 or prev['sell'] > 0:
-                    history = [{
-                        'buy': prev['buy'], 'sell': prev['sell'], 'delta': prev['delta'], 'ts': prev['candle_start'],
-                        'delta_open': prev.get('delta_open', 0), 'delta_high': prev.get('delta_high', 0),
-                        'delta_low': prev.get('delta_low', 0), 'delta_close': prev['delta'],
-                        'price_open': prev.get('price_open', 0), 'price_high': prev.get('price_high', 0),
-                        'price_low': prev.get('price_low', 999999), 'price_close': prev.get('price_close', 0)
-                    }] + history[:29]  # Keep 30 candles of history
-                state['volume_5m'] = {'buy': 0, 'sell': 0, 'delta': 0, 'candle_start': candle_5m_start,
-                                      'prev_buy': prev['buy'], 'prev_sell': prev['sell'], 'prev_delta': prev['delta'], 'history': history,
-                                      'delta_open': None, 'delta_high': -999999, 'delta_low': 999999,
-                                      'price_open': 0, 'price_high': 0, 'price_low': 999999, 'price_close': 0}
-            if state['volume_15m']['candle_start'] != candle_15m_start:
-                prev = state['volume_15m']
-                history = prev.get('history', [])
-                if prev['buy'] > 0 or prev['sell'] > 0:
-                    history = [{
-                        'buy': prev['buy'], 'sell': prev['sell'], 'delta': prev['delta'], 'ts': prev['candle_start'],
-                        'delta_open': prev.get('delta_open', 0), 'delta_high': prev.get('delta_high', 0),
-                        'delta_low': prev.get('delta_low', 0), 'delta_close': prev['delta'],
-                        'price_open': prev.get('price_open', 0), 'price_high': prev.get('price_high', 0),
-                        'price_low': prev.get('price_low', 999999), 'price_close': prev.get('price_close', 0)
-                    }] + history[:29]  # Keep 30 candles of history
-                state['volume_15m'] = {'buy': 0, 'sell': 0, 'delta': 0, 'candle_start': candle_15m_start,
-                                       'prev_buy': prev['buy'], 'prev_sell': prev['sell'], 'prev_delta': prev['delta'], 'history': history,
-                                       'delta_open': None, 'delta_high': -999999, 'delta_low': 999999,
-                                       'price_open': 0, 'price_high': 0, 'price_low': 999999, 'price_close': 0}
-            if state['volume_30m']['candle_start'] != candle_30m_start:
-                prev = state['volume_30m']
-                history = prev.get('history', [])
-                if prev['buy'] > 0 or prev['sell'] > 0:
-                    history = [{
-                        'buy': prev['buy'], 'sell': prev['sell'], 'delta': prev['delta'], 'ts': prev['candle_start'],
-                        'delta_open': prev.get('delta_open', 0), 'delta_high': prev.get('delta_high', 0),
-                        'delta_low': prev.get('delta_low', 0), 'delta_close': prev['delta'],
-                        'price_open': prev.get('price_open', 0), 'price_high': prev.get('price_high', 0),
-                        'price_low': prev.get('price_low', 999999), 'price_close': prev.get('price_close', 0)
-                    }] + history[:29]  # Keep 30 candles of history
-                state['volume_30m'] = {'buy': 0, 'sell': 0, 'delta': 0, 'candle_start': candle_30m_start,
-                                       'prev_buy': prev['buy'], 'prev_sell': prev['sell'], 'prev_delta': prev['delta'], 'history': history,
-                                       'delta_open': None, 'delta_high': -999999, 'delta_low': 999999,
-                                       'price_open': 0, 'price_high': 0, 'price_low': 999999, 'price_close': 0}
-            if state['volume_1h']['candle_start'] != candle_1h_start:
-                prev = state['volume_1h']
-                history = prev.get('history', [])
-                if prev['buy'] > 0 or prev['sell'] > 0:
-                    history = [{
-                        'buy': prev['buy'], 'sell': prev['sell'], 'delta': prev['delta'], 'ts': prev['candle_start'],
-                        'delta_open': prev.get('delta_open', 0), 'delta_high': prev.get('delta_high', 0),
-                        'delta_low': prev.get('delta_low', 0), 'delta_close': prev['delta'],
-                        'price_open': prev.get('price_open', 0), 'price_high': prev.get('price_high', 0),
-                        'price_low': prev.get('price_low', 999999), 'price_close': prev.get('price_close', 0)
-                    }] + history[:29]  # Keep 30 candles of history
-                state['volume_1h'] = {'buy': 0, 'sell': 0, 'delta': 0, 'candle_start': candle_1h_start,
-                                      'prev_buy': prev['buy'], 'prev_sell': prev['sell'], 'prev_delta': prev['delta'], 'history': history,
-                                      'delta_open': None, 'delta_high': -999999, 'delta_low': 999999,
-                                      'price_open': 0, 'price_high': 0, 'price_low': 999999, 'price_close': 0}
-
-            # Add current trade to candle volumes
-            # Note: A = Ask (hit) = Buy aggressor, B = Bid (hit) = Sell aggressor
-            trade_buy = size if side == 'A' else 0
-            trade_sell = size if side == 'B' else 0
-
-            # Helper function to update OHLC for a timeframe
-            def update_candle_ohlc(tf_key, trade_buy, trade_sell, price):
-                tf = state[tf_key]
-                tf['buy'] += trade_buy
-                tf['sell'] += trade_sell
-                tf['delta'] = tf['buy'] - tf['sell']
-
-                # Update Delta OHLC (handle None values safely)
-                if tf.get('delta_open') is None:
-                    tf['delta_open'] = tf['delta']  # First trade sets open
-                delta_high = tf.get('delta_high') if tf.get('delta_high') is not None else -999999
-                delta_low = tf.get('delta_low') if tf.get('delta_low') is not None else 999999
-                tf['delta_high'] = max(delta_high, tf['delta'])
-                tf['delta_low'] = min(delta_low, tf['delta'])
-
-                # Update Price OHLC (handle None values safely)
-                if tf.get('price_open', 0) == 0:
-                    tf['price_open'] = price  # First trade sets open
-                price_high = tf.get('price_high') if tf.get('price_high') is not None else 0
-                price_low = tf.get('price_low') if tf.get('price_low') is not None else 999999
-                tf['price_high'] = max(price_high, price)
-                tf['price_low'] = min(price_low, price)
-                tf['price_close'] = price  # Always update close to latest price
-
-            update_candle_ohlc('volume_5m', trade_buy, trade_sell, price)
-            update_candle_ohlc('volume_15m', trade_buy, trade_sell, price)
-            update_candle_ohlc('volume_30m', trade_buy, trade_sell, price)
-            update_candle_ohlc('volume_1h', trade_buy, trade_sell, price)
-
-            # Log every 100 trades for verification
-            if state['total_volume'] % 100 == 0:
-                print(f"📊 Vol: {state['total_volume']} | Buy: {state['buy_volume']} | Sell: {state['sell_volume']} | Delta: {state['cumulative_delta']}")
-
-            # Delta history
-            delta_history.append((now, state['cumulative_delta']))
-            
-            # Calculate rolling deltas
-            cutoff_5m = now - 300
-            cutoff_30m = now - 1800
-            
-            delta_5m_start = state['cumulative_delta']
-            delta_30m_start = state['cumulative_delta']
-            
-            for ts, delta in delta_history:
-                if ts >= cutoff_5m:
-                    delta_5m_start = delta
-                    break
-            
-            for ts, delta in delta_history:
-                if ts >= cutoff_30m:
-                    delta_30m_start = delta
-                    break
-            
-            state['delta_5m'] = state['cumulative_delta'] - delta_5m_start
-            state['delta_30m'] = state['cumulative_delta'] - delta_30m_start
-            
-            # VWAP calculation
-            state['vwap_numerator'] += price * size
-            state['vwap_denominator'] += size
-            if state['vwap_denominator'] > 0:
-                state['vwap'] = state['vwap_numerator'] / state['vwap_denominator']
-
-            # === Anchored VWAPs (Databento live stream) ===
-            et = get_et_now()
-            today_date = et.strftime('%Y-%m-%d')
-            current_hhmm = et.hour * 100 + et.minute
-
-            # Day VWAP (full trading day 18:00-17:00 ET)
-            if current_hhmm < 1800:
-                trading_day = (et - timedelta(days=1)).strftime('%Y-%m-%d')
-            else:
-                trading_day = today_date
-
-            if state.get('day_vwap_date', '') != trading_day:
-                state['day_vwap_numerator'] = 0.0
-                state['day_vwap_denominator'] = 0.0
-                state['day_vwap'] = 0.0
-                state['day_vwap_date'] = trading_day
-
-            state['day_vwap_numerator'] = state.get('day_vwap_numerator', 0) + (price * size)
-            state['day_vwap_denominator'] = state.get('day_vwap_denominator', 0) + size
-            if state['day_vwap_denominator'] > 0:
-                state['day_vwap'] = state['day_vwap_numerator'] / state['day_vwap_denominator']
-
-            # US IB Anchored VWAP (08:20-17:00 ET)
-            if state.get('us_ib_vwap_date', '') != today_date and current_hhmm >= 820:
-                state['us_ib_vwap_numerator'] = 0.0
-                state['us_ib_vwap_denominator'] = 0.0
-                state['us_ib_vwap'] = 0.0
-                state['us_ib_vwap_date'] = today_date
-
-            if current_hhmm >= 820 and current_hhmm < 1700:
-                state['us_ib_vwap_numerator'] = state.get('us_ib_vwap_numerator', 0) + (price * size)
-                state['us_ib_vwap_denominator'] = state.get('us_ib_vwap_denominator', 0) + size
-                if state['us_ib_vwap_denominator'] > 0:
-                    state['us_ib_vwap'] = state['us_ib_vwap_numerator'] / state['us_ib_vwap_denominator']
-
-            # NY 1H Anchored VWAP (09:30-17:00 ET)
-            if state.get('ny_1h_vwap_date', '') != today_date and current_hhmm >= 930:
-                state['ny_1h_vwap_numerator'] = 0.0
-                state['ny_1h_vwap_denominator'] = 0.0
-                state['ny_1h_vwap'] = 0.0
-                state['ny_1h_vwap_date'] = today_date
-
-            if current_hhmm >= 930 and current_hhmm < 1700:
-                state['ny_1h_vwap_numerator'] = state.get('ny_1h_vwap_numerator', 0) + (price * size)
-                state['ny_1h_vwap_denominator'] = state.get('ny_1h_vwap_denominator', 0) + size
-                if state['ny_1h_vwap_denominator'] > 0:
-                    state['ny_1h_vwap'] = state['ny_1h_vwap_numerator'] / state['ny_1h_vwap_denominator']
-
-            # === IB POC and VWAP Tracking ===
-            # Update IB VWAP and TPO prices during active IB periods
-            ib_sessions = [
-                (1900, 2000, 'japan'),   # Japan IB: 19:00-20:00 ET
-                (300, 400, 'london'),    # London IB: 03:00-04:00 ET
-                (820, 930, 'us'),        # US IB: 08:20-09:30 ET
-                (930, 1030, 'ny'),       # NY IB: 09:30-10:30 ET
-            ]
-
-            for start, end, ib_key in ib_sessions:
-                if start <= current_hhmm < end:
-                    ib = state['ibs'].get(ib_key, {})
-                    if ib.get('status') in ['WAITING', None]:
-                        # IB session starting - reset
-                        ib['high'] = price
-                        ib['low'] = price
-                        ib['vwap_num'] = price * size
-                        ib['vwap_den'] = size
-                        ib['tpo_prices'] = {round(price / 0.1) * 0.1: size}
-                        ib['status'] = 'ACTIVE'
-                    else:
-                        # Update high/low
-                        if price > ib.get('high', 0):
-                            ib['high'] = price
-                        if price < ib.get('low', 999999):
-                            ib['low'] = price
-                        # Update VWAP
-                        ib['vwap_num'] = ib.get('vwap_num', 0) + (price * size)
-                        ib['vwap_den'] = ib.get('vwap_den', 0) + size
-                        # Track TPO for POC
-                        tpo_key = round(price / 0.1) * 0.1
-                        tpo_prices = ib.get('tpo_prices', {})
-                        tpo_prices[tpo_key] = tpo_prices.get(tpo_key, 0) + size
-                        ib['tpo_prices'] = tpo_prices
-
-                    # Calculate mid, VWAP, POC
-                    if ib['high'] > 0 and ib['low'] < 999999:
-                        ib['mid'] = (ib['high'] + ib['low']) / 2
-                    if ib.get('vwap_den', 0) > 0:
-                        ib['vwap'] = ib['vwap_num'] / ib['vwap_den']
-                    if ib.get('tpo_prices'):
-                        poc_price = max(ib['tpo_prices'], key=ib['tpo_prices'].get)
-                        ib['poc'] = poc_price
-
-                    state['ibs'][ib_key] = ib
-                    # Update legacy IB
-                    state['ib_high'] = ib['high']
-                    state['ib_low'] = ib['low']
-                    state['ib_locked'] = False
-                    break
-                elif current_hhmm >= end and state['ibs'].get(ib_key, {}).get('status') == 'ACTIVE':
-                    # IB just ended - lock it
-                    ib = state['ibs'][ib_key]
-                    ib['status'] = 'ENDED'
-                    state['ibs'][ib_key] = ib
-                    state['ib_locked'] = True
-                    print(f"🔒 {ib_key.upper()} IB Complete: H=${ib['high']:.2f} L=${ib['low']:.2f} POC=${ib.get('poc', 0):.2f} VWAP=${ib.get('vwap', 0):.2f}")
-
-            # Buying imbalance
-            if state['sell_volume'] > 0:
-                state['buying_imbalance_pct'] = int((state['buy_volume'] / state['sell_volume']) * 100)
-            
-            # Absorption ratio
-            if state['total_volume'] > 0:
-                state['absorption_ratio'] = abs(state['cumulative_delta']) / state['total_volume']
-            
-            # Entry conditions check (matching Signal Matrix exactly)
-            conditions = 0
-            if state['delta_30m'] < -2500:
-                conditions += 1
-            if state['buying_imbalance_pct'] >= 400:
-                conditions += 1
-            ib_low = state['ib_low'] if state['ib_low'] < 999999 else 0
-            if ib_low > 0 and state['current_price'] < ib_low:
-                conditions += 1
-            if state['absorption_ratio'] > 1.2:
-                conditions += 1
-            if state['stacked_buy_imbalances'] >= 3:
-                conditions += 1
-            # At pdPOC = within $2 of pdPOC
-            if state['pdpoc'] > 0 and abs(state['current_price'] - state['pdpoc']) <= 2.0:
-                conditions += 1
-            
-            state['conditions_met'] = conditions
-            state['entry_signal'] = conditions >= 4
-
-            # ============================================
-            # TPO / MARKET PROFILE TRACKING (4-Session Structure)
-            # ============================================
-            config = CONTRACT_CONFIG.get(ACTIVE_CONTRACT, CONTRACT_CONFIG['GC'])
-            tick_size = config['tick_size']
-
-            # Round price to tick size for TPO level
-            tpo_price = round(price / tick_size) * tick_size
-
-            # Get current ET time for session detection
-            et = get_et_now()
-            current_hhmm = et.hour * 100 + et.minute
-
-            # Determine active TPO session
-            current_tpo_session = get_tpo_session_for_time(current_hhmm)
-            day = tpo_state['day']
-
-            # Initialize day start on first trade after 18:00 ET or on reset
-            if tpo_state['day_start_time'] == 0:
-                tpo_state['day_start_time'] = now
-                day['current_period_start'] = int(now // 1800) * 1800  # Clock-aligned 30-min
-                day['open_price'] = price
-                tpo_state['active_session'] = current_tpo_session
-                print(f"📊 TPO: Day started at {price:.2f}, Period A, Session: {current_tpo_session}")
-
-            # Reset TPO at 18:00 ET (new trading day)
-            if session_id == 'pre_asia' and last_session_id != 'pre_asia':
-                reset_tpo_for_new_day()
-                tpo_state['day_start_time'] = now
-                day['current_period_start'] = int(now // 1800) * 1800
-                day['open_price'] = price
-                tpo_state['active_session'] = current_tpo_session
-
-            # Handle session transitions
-            if current_tpo_session and current_tpo_session != tpo_state['active_session']:
-                old_session = tpo_state['active_session']
-                tpo_state['active_session'] = current_tpo_session
-                # Reset session profile for new session
-                reset_session_profile(current_tpo_session)
-                session_data = tpo_state['sessions'][current_tpo_session]
-                session_data['open_price'] = price
-                session_data['current_period_start'] = int(now // 1800) * 1800
-                session_name_display = TPO_SESSIONS[current_tpo_session]['display']
-                print(f"📊 TPO: Session changed from {old_session} to {current_tpo_session} ({session_name_display})")
-
-            # Get active session data
-            session_data = None
-            session_config = None
-            if current_tpo_session:
-                session_data = tpo_state['sessions'][current_tpo_session]
-                session_config = TPO_SESSIONS[current_tpo_session]
-
-            # Check if new period started
-            current_period_start = int(now // 1800) * 1800
-
-            # Note: Uses the outer get_session_period_index function which handles
-            # variable period durations (London last 20 min, US first 40 min)
-
-            # Day profile period tracking - calculate from 18:00 ET (day start)
-            day_start_mins = 18 * 60  # 18:00 = 1080 minutes
-            current_mins = (current_hhmm // 100) * 60 + (current_hhmm % 100)
-            if current_hhmm < 1800:  # Before 18:00, we're in next day's periods
-                current_mins += 24 * 60
-            day_period_idx = (current_mins - day_start_mins) // 30
-
-            if current_period_start != day['current_period_start'] or day['period_count'] != day_period_idx:
-                if day['period_count'] != day_period_idx:
-                    day['period_count'] = day_period_idx
-                day['current_period_start'] = current_period_start
-                new_letter = get_tpo_letter(day['period_count'])
-                print(f"📊 TPO: Day period {new_letter} (#{day['period_count']})")
-
-                # Calculate BC overlap when C period starts (day level)
-                if day['period_count'] == 3:
-                    bc_overlap = calculate_overlap(
-                        (day['b_high'], day['b_low']),
-                        (day['c_high'], day['c_low'])
-                    )
-                    day['bc_overlap'] = bc_overlap
-
-            # Session profile period tracking - calculate from session start time
-            if session_data and session_config:
-                session_period_idx = get_session_period_index(current_tpo_session, current_hhmm)
-
-                if current_period_start != session_data['current_period_start'] or session_data['period_count'] != session_period_idx:
-                    if session_data['period_count'] != session_period_idx:
-                        session_data['period_count'] = session_period_idx
-                    session_data['current_period_start'] = current_period_start
-                    session_letter = get_tpo_letter(session_data['period_count'])
-                    print(f"   📊 Session {current_tpo_session} period {session_letter} (#{session_data['period_count']})")
-
-                # Check IB complete for session
-                if session_data['period_count'] == 2 and not session_data['ib_complete']:
-                    session_data['ib_complete'] = True
-                    if session_data['ib_high'] > 0 and session_data['ib_low'] < 999999:
-                        ib_range = session_data['ib_high'] - session_data['ib_low']
-                        print(f"   🔒 Session IB Complete: H={session_data['ib_high']:.2f} L={session_data['ib_low']:.2f} Range={ib_range:.2f}")
-
-            # Get current period letters
-            day_letter = get_tpo_letter(day['period_count'])
-            session_letter = get_tpo_letter(session_data['period_count']) if session_data else None
-
-            # Add TPO to DAY profile
-            if tpo_price not in day['profiles']:
-                day['profiles'][tpo_price] = set()
-            day['profiles'][tpo_price].add(day_letter)
-
-            # Add TPO to SESSION profile
-            if session_data and session_letter:
-                if tpo_price not in session_data['profiles']:
-                    session_data['profiles'][tpo_price] = set()
-                session_data['profiles'][tpo_price].add(session_letter)
-                # Update session high/low
-                if price > session_data.get('high', 0):
-                    session_data['high'] = price
-                if price < session_data.get('low', 999999):
-                    session_data['low'] = price
-
-            # Update period ranges for A, B, C (day level - for RTH open type detection)
-            day_period_idx = day['period_count']
-            if day_period_idx == 0:  # A period
-                if price > day['a_high']:
-                    day['a_high'] = price
-                if price < day['a_low']:
-                    day['a_low'] = price
-            elif day_period_idx == 1:  # B period
-                if price > day['b_high']:
-                    day['b_high'] = price
-                if price < day['b_low']:
-                    day['b_low'] = price
-            elif day_period_idx == 2:  # C period
-                if price > day['c_high']:
-                    day['c_high'] = price
-                if price < day['c_low']:
-                    day['c_low'] = price
-
-            # Update session-specific A/B tracking for RTH open type
-            if current_tpo_session == 'tpo3_us_am' and session_data:
-                session_period_idx = session_data['period_count']
-                if session_period_idx == 0:  # A period
-                    if price > session_data['a_high']:
-                        session_data['a_high'] = price
-                    if price < session_data['a_low']:
-                        session_data['a_low'] = price
-                elif session_period_idx == 1:  # B period
-                    if price > session_data['b_high']:
-                        session_data['b_high'] = price
-                    if price < session_data['b_low']:
-                        session_data['b_low'] = price
-                # AB overlap for RTH session
-                if session_period_idx >= 1:
-                    session_data['ab_overlap'] = calculate_overlap(
-                        (session_data['a_high'], session_data['a_low']),
-                        (session_data['b_high'], session_data['b_low'])
-                    )
+            # Exchange event time drives every bucket below (wall clock only for last_update)
+            now = event_time(record)
+            if now is None:
+                RECORDS_DROPPED.labels('late').inc()
+                return
+            et = get_et_now(now)
 
-            # Update DAY IB during RTH session (09:30-10:30 = first 2 periods of tpo3_us_am)
-            if current_tpo_session == 'tpo3_us_am' and session_data:
-                session_period_idx = session_data['period_count']
-                if session_period_idx < 2:  # During IB formation
-                    if price > day['ib_high']:
-                        day['ib_high'] = price
-                    if price < day['ib_low']:
-                        day['ib_low'] = price
-                elif session_period_idx == 2 and not day['ib_complete']:
-                    day['ib_complete'] = True
-                    ib_range = day['ib_high'] - day['ib_low']
-                    print(f"📊 TPO: RTH IB Complete: H={day['ib_high']:.2f} L={day['ib_low']:.2f} Range={ib_range:.2f}")
-
-            # Update SESSION IB based on session-specific IB times
-            if session_data and session_config:
-                ib_start = session_config.get('ib_start')
-                ib_end = session_config.get('ib_end')
-                if ib_start is not None and ib_end is not None:
-                    # Check if within session IB time
-                    if ib_start <= current_hhmm < ib_end:
-                        if price > session_data['ib_high']:
-                            session_data['ib_high'] = price
-                        if price < session_data['ib_low']:
-                            session_data['ib_low'] = price
-                    elif current_hhmm >= ib_end and not session_data['ib_complete']:
-                        session_data['ib_complete'] = True
-                        if session_data['ib_high'] > 0 and session_data['ib_low'] < 999999:
-                            ib_range = session_data['ib_high'] - session_data['ib_low']
-                            print(f"   🔒 {session_config['name']} IB Complete: H={session_data['ib_high']:.2f} L={session_data['ib_low']:.2f}")
-
-            # Recalculate TPO metrics periodically (every 50 trades)
-            if state['total_volume'] % 50 == 0:
-                calculate_tpo_metrics()
-                classify_day_type()
-                classify_open_type()
-
-            # ============================================
-            # END TPO TRACKING
-            # ============================================
+            # Event-time context shared by every aggregator stage
+            ctx = TradeContext(record, price, size, side, now, et, ACTIVE_CONTRACT)
+            trade_pipeline.run(ctx)
+            session_id = ctx.session_id
 
             # PD levels should come from Databento historical API
             # If not loaded, they remain 0 - no hardcoded fallbacks
             if not state['pd_loaded'] and price > 0 and state['pd_high'] == 0:
                 print("⚠️  PD levels not loaded from Databento - displaying as 0 until fetched")
-            
+
+            processed_ns = time.time_ns()
+            state['last_processed_ns'] = processed_ns
+            state['last_ts_event'] = getattr(record, 'ts_event', 0)
+
+        # Latency instrumentation (outside the state lock)
+        ts_recv = getattr(record, 'ts_recv', 0)
+        if ts_event and ts_recv:
+            latency_tracker.record('exchange_to_recv', ACTIVE_CONTRACT, session_id, (ts_recv - ts_event) // 1000)
+            latency_tracker.record('recv_to_processed', ACTIVE_CONTRACT, session_id, (processed_ns - ts_recv) // 1000)
+        TRADES_TOTAL.labels(ACTIVE_CONTRACT).inc()
+        PROCESS_TRADE_SECONDS.labels().observe_ns(time.perf_counter_ns() - started_ns)
+
     except Exception as e:
         print(f"Error processing trade: {e}")
 
@@ -11933,20 +12294,208 @@ def generate_gex_levels(state):
     return levels
 
 
+# ============================================
+# METRICS GAUGES (computed at scrape time)
+# ============================================
+# Long-lived thread targets that should always be running
+EXPECTED_THREADS = ('start_http_server', 'watchdog_thread')
+_trade_rate_sample = {'ts': time.time(), 'count': 0}
+
+
+def _trade_rate_gauge():
+    """Trades/sec since the previous scrape"""
+    now = time.time()
+    count = sum(child.value for child in list(TRADES_TOTAL.children.values()))
+    elapsed = now - _trade_rate_sample['ts']
+    rate = (count - _trade_rate_sample['count']) / elapsed if elapsed > 0 else 0.0
+    _trade_rate_sample['ts'] = now
+    _trade_rate_sample['count'] = count
+    yield {'contract': ACTIVE_CONTRACT}, round(rate, 3)
+
+
+def _cache_age_gauge():
+    """Seconds since each *_cache was last filled"""
+    now = time.time()
+    for name, cache in list(globals().items()):
+        if not name.endswith('_cache') or not isinstance(cache, dict):
+            continue
+        label = name[:-len('_cache')]
+        if name == 'weekly_sessions_cache':
+            for week_id, week in cache.items():
+                if week.get('timestamp'):
+                    yield {'cache': f'{label}_{week_id}'}, round(now - week['timestamp'], 1)
+            continue
+        ts = cache.get('timestamp') or cache.get('last_loaded')
+        if ts:
+            yield {'cache': label}, round(now - ts, 1)
+
+
+def _cache_hit_ratio_gauge():
+    totals = {}
+    for (cache, result), child in list(CACHE_REQUESTS.children.items()):
+        hits, total = totals.get(cache, (0, 0))
+        totals[cache] = (hits + (child.value if result == 'hit' else 0), total + child.value)
+    for cache, (hits, total) in totals.items():
+        if total:
+            yield {'cache': cache}, round(hits / total, 4)
+
+
+def _thread_gauge():
+    """Alive threads per target function (Thread names look like 'Thread-3 (watchdog_thread)')"""
+    counts = {name: 0 for name in EXPECTED_THREADS}
+    for t in threading.enumerate():
+        name = t.name
+        if '(' in name and name.endswith(')'):
+            name = name[name.rindex('(') + 1:-1]
+        counts[name] = counts.get(name, 0) + (1 if t.is_alive() else 0)
+    for name, count in counts.items():
+        yield {'thread': name}, count
+
+
+def _feed_gauge():
+    yield {'metric': 'last_trade_age_seconds'}, round(time.time() - last_trade_timestamp, 1)
+    yield {'metric': 'stream_running'}, 1 if stream_running else 0
+    yield {'metric': 'startup_complete'}, 1 if startup_complete else 0
+    yield {'metric': 'lock_locked'}, 1 if lock.locked() else 0
+
+
+metrics_registry.gauge('trades_per_second', 'Trade rate since previous scrape', _trade_rate_gauge)
+metrics_registry.gauge('cache_age_seconds', 'Seconds since cache was last filled', _cache_age_gauge)
+metrics_registry.gauge('cache_hit_ratio', 'Cache hits / lookups since start', _cache_hit_ratio_gauge)
+metrics_registry.gauge('threads_alive', 'Alive threads per target function', _thread_gauge)
+metrics_registry.gauge('feed_status', 'Live feed status values', _feed_gauge)
+metrics_registry.gauge('process_resident_bytes', 'Process RSS', lambda: [({}, rss_bytes() or 0)])
+
+
+# ============================================
+# MEMORY ACCOUNTING (/debug/memory)
+# ============================================
+# MEMORY_BUDGETS='delta_history=20,tpo=50' (MB, per structure or subsystem) flags overruns
+memory_lock = LockDomain(lock, 'memory')
+memory = MemoryAccountant()
+memory.register('delta_history', lambda: delta_history, 'ingest')
+memory.register('volume_history', lambda: volume_history, 'ingest')
+memory.register('price_history', lambda: price_history, 'ingest')
+memory.register('ended_sessions', lambda: state['ended_sessions'], 'ingest')
+memory.register('state', lambda: state, 'ingest')
+memory.register('tpo_state', lambda: tpo_state, 'tpo')
+memory.register('footprint', lambda: footprint.history if footprint else {}, 'footprint')
+memory.register('mbo_book_orders', lambda: mbo_book.orders if mbo_book else {}, 'mbo')
+memory.register('binance_trade_buffer', lambda: binance_trade_buffer, 'crypto')
+memory.register('bybit_large_trades', lambda: bybit_ws.large_trades, 'crypto')
+memory.register('red_folder_transcript',
+                lambda: getattr(sys.modules.get('red_folder_service'), 'red_folder_state', {}).get('transcript_buffer', []),
+                'red_folder')
+for _name, _value in list(globals().items()):
+    if _name.endswith('_cache') and isinstance(_value, dict):
+        memory.register(_name, lambda n=_name: globals()[n],
+                        'sessions' if _name in ('weekly_sessions_cache', 'session_history_cache',
+                                                'historical_sessions_ohlc_cache') else 'caches')
+
+
+class CountingWriter:
+    """Wraps the handler's wfile to count response bytes"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        return self.raw.write(data)
+
+    def flush(self):
+        return self.raw.flush()
+
+
 # ============================================
 # HTTP SERVER
 # ============================================
 class LiveDataHandler(BaseHTTPRequestHandler):
     def log_message(self, format, *args):
         pass
-    
+
+    def _timed(self, method, handler):
+        """Run a handler recording per-route latency and response size"""
+        from urllib.parse import urlparse
+        started_ns = time.perf_counter_ns()
+        writer = self.wfile = CountingWriter(self.wfile)
+        try:
+            handler()
+        finally:
+            self.wfile = writer.raw
+            route = urlparse(self.path).path
+            HTTP_REQUEST_SECONDS.labels(method, route).observe_ns(time.perf_counter_ns() - started_ns)
+            HTTP_RESPONSE_BYTES.labels(method, route).observe(writer.bytes_written)
+
     def do_GET(self):
+        self._timed('GET', self.handle_get)
+
+    def do_POST(self):
+        self._timed('POST', self.handle_post)
+
+    def handle_get(self):
         # Parse path and query params
         from urllib.parse import urlparse, parse_qs
         parsed = urlparse(self.path)
         path = parsed.path
         query_params = parse_qs(parsed.query)
 
+        # Prometheus scrape endpoint (text format, so it answers before the JSON headers)
+        if path == '/metrics':
+            body = metrics_registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        # On-demand sampling profile: /debug/profile?seconds=5&hz=100&thread=http&format=collapsed|json
+        if path == '/debug/profile':
+            profile = profiler.profile(
+                seconds=float(query_params.get('seconds', ['5'])[0]),
+                hz=int(query_params.get('hz', [str(sampling_profiler.DEFAULT_HZ)])[0]))
+            if profile is None:
+                body = json.dumps({'error': 'Profile already running', 'last_run': profiler.last_run}).encode()
+                self.send_response(409)
+                content_type = 'application/json'
+            elif query_params.get('format', ['collapsed'])[0] == 'json':
+                body = json.dumps(sampling_profiler.by_thread(profile)).encode()
+                self.send_response(200)
+                content_type = 'application/json'
+            else:
+                body = sampling_profiler.collapsed(profile, query_params.get('thread', [None])[0]).encode()
+                self.send_response(200)
+                content_type = 'text/plain; charset=utf-8'
+            self.send_header('Content-Type', content_type)
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        # Alert firings as Server-Sent Events: /alerts/stream (resumes from Last-Event-ID)
+        if path == '/alerts/stream':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            seq = int(self.headers.get('Last-Event-ID') or query_params.get('since', [alert_stream.seq])[0])
+            try:
+                while True:
+                    firings = alert_stream.wait(seq, 15)
+                    if not firings:
+                        self.wfile.write(b': keepalive\n\n')
+                    for firing in firings:
+                        seq = firing['seq']
+                        self.wfile.write(f"id: {seq}\nevent: alert\ndata: {json.dumps(firing)}\n\n".encode())
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            return
+
         self.send_response(200)
         self.send_header('Content-Type', 'application/json')
         self.send_header('Access-Control-Allow-Origin', '*')
@@ -11959,6 +12508,19 @@ class LiveDataHandler(BaseHTTPRequestHandler):
             self.wfile.write(json.dumps({'status': 'ok', 'timestamp': time.time()}).encode())
             return
 
+        # Warm-up readiness per subsystem (which panels are live) and boot timing
+        if path == '/ready':
+            report = startup.report()
+            report.update({
+                'contract': ACTIVE_CONTRACT,
+                'startup_complete': startup_complete,
+                'stream_running': stream_running,
+                'data_source': state.get('data_source'),
+                'timestamp': time.time(),
+            })
+            self.wfile.write(json.dumps(report).encode())
+            return
+
         # Red Folder economic calendar endpoint
         if path == '/redfolder':
             try:
@@ -12092,14 +12654,14 @@ class LiveDataHandler(BaseHTTPRequestHandler):
             try:
                 print("🔄 Manual session cache refresh triggered")
                 # Clear existing cache
-                weekly_sessions_cache['current']['ready'] = False
-                weekly_sessions_cache['current']['data'] = None
-                # Fetch fresh data
-                data = fetch_week_sessions_ohlc('current')
+                with weekly_sessions_lock:
+                    weekly_sessions_cache.pop(week_key('current'), None)
+                # Rebuilt in the background (may download missing days)
+                queued = queue_week_sessions('current')
                 self.wfile.write(json.dumps({
                     'status': 'ok',
-                    'days': len(data) if data else 0,
-                    'message': 'Session cache refreshed'
+                    'queued': queued,
+                    'message': 'Session cache refresh queued' if queued else 'Session cache refresh already running'
                 }).encode())
             except Exception as e:
                 self.wfile.write(json.dumps({'status': 'error', 'message': str(e)}).encode())
@@ -12107,7 +12669,7 @@ class LiveDataHandler(BaseHTTPRequestHandler):
 
         # Zone Participation endpoint
         if path == '/zones':
-            with lock:
+            with zones_lock:
                 zones = collect_all_zones()
                 buy_zones = rank_buy_zones(zones, target_pts=10)
                 current_price = state.get('current_price', 0)
@@ -12175,12 +12737,13 @@ class LiveDataHandler(BaseHTTPRequestHandler):
         # Handle /session-history endpoint for VSI analysis
         if path == '/session-history':
             # FAST PATH: Get instantly from cache (fixed 10 historical days)
+            CACHE_REQUESTS.labels('session_history', 'hit' if session_history_cache['ready'] else 'miss').inc()
             if session_history_cache['ready']:
                 history_data = get_session_history_fast()
 
                 if history_data:
                     # Merge in live current session data from state
-                    with lock:
+                    with cache_lock:
                         current_session = state.get('current_session_id', '')
                         session_high = state.get('session_high', 0)
                         session_low = state.get('session_low', 999999)
@@ -12199,95 +12762,34 @@ class LiveDataHandler(BaseHTTPRequestHandler):
             return
 
         # Handle /historical-sessions endpoint for 5-day OHLC candle visualization
-        # Supports ?week=w5|w4|w3|w2|w1|current parameter (dynamic week IDs)
+        # Supports ?week=w5|w4|w3|w2|w1|current (resolved to ISO weeks) or ?week=2026-W42 within that window
         if path == '/historical-sessions':
             # Get week parameter from query_params (already parsed by urlparse)
             week_id = query_params.get('week', ['current'])[0]
-            print(f"📅 Historical sessions request for week: {week_id}")
-
-            # Check weekly cache first (for specific weeks)
-            if week_id in weekly_sessions_cache and weekly_sessions_cache[week_id]['ready']:
-                data = weekly_sessions_cache[week_id]['data']
-
-                # For current week, merge today's live ended_sessions from state
-                if week_id == 'current' and data and len(data) > 0:
-                    today_str = datetime.now(timezone(timedelta(hours=-5))).strftime('%Y-%m-%d')
-                    # Find today in the data
-                    for day_data in data:
-                        if day_data.get('date') == today_str:
-                            with lock:
-                                ended = state.get('ended_sessions', {})
-                                day_high = state.get('day_high', 0)
-                                day_low = state.get('day_low', 999999)
-                                day_open = state.get('day_open', 0)
-                                current_price = state.get('current_price', 0)
-
-                                # Update day OHLC with live data
-                                if day_high > 0:
-                                    day_data['day'] = {
-                                        'o': day_open,
-                                        'h': day_high,
-                                        'l': day_low if day_low < 999999 else day_high,
-                                        'c': current_price
-                                    }
-
-                                # Merge in ended sessions for today
-                                for sid, sdata in ended.items():
-                                    day_data['sessions'][sid] = {
-                                        'o': sdata.get('open', 0),
-                                        'h': sdata.get('high', 0),
-                                        'l': sdata.get('low', 0),
-                                        'c': sdata.get('close', 0)
-                                    }
-                            break
-
-                self.wfile.write(json.dumps({'days': data, 'week': week_id, 'cached': True}).encode())
+            key = week_key(week_id)
+            if key not in {week_key(w) for w in WEEK_IDS}:
+                key = None      # Outside the window: never built on request, the fallback below
+            print(f"📅 Historical sessions request for week: {week_id} ({key})")
+
+            # Check weekly cache first; the running week gets live data overlaid on a copy
+            cached = week_cache(week_id) if key else {'ready': False}
+            if cached['ready']:
+                data = cached['data']
+                if key == week_key('current') and data:
+                    data = overlay_live_sessions(data)
+                self.wfile.write(json.dumps({'days': data, 'week': week_id, 'iso_week': key, 'cached': True}).encode())
                 return
 
-            # If any week (including 'current') is requested and not cached, fetch on demand
-            valid_weeks = ['w5', 'w4', 'w3', 'w2', 'w1', 'current']
-            if week_id in valid_weeks and week_id in weekly_sessions_cache and not weekly_sessions_cache[week_id]['ready']:
-                print(f"📊 Fetching {week_id} on demand...")
-                try:
-                    data = fetch_week_sessions_ohlc(week_id)
-                    if data:
-                        self.wfile.write(json.dumps({'days': data, 'week': week_id, 'cached': False, 'fresh': True}).encode())
-                        return
-                except Exception as e:
-                    print(f"❌ Error fetching {week_id}: {e}")
+            # Not cached yet (any week, including 'current'): built in the background, the
+            # fallback / loading reply below until it is
+            if key and week_monday(key) <= get_et_now().date() and queue_week_sessions(week_id):
+                print(f"📊 Building {week_id} in the background...")
 
             # Fall back to legacy cache (works for 'current' and as fallback for uncached weeks)
+            CACHE_REQUESTS.labels('historical_sessions_ohlc', 'hit' if historical_sessions_ohlc_cache['ready'] else 'miss').inc()
             if historical_sessions_ohlc_cache['ready']:
-                # Return cached data - merge with today's live data for day 0
-                data = historical_sessions_ohlc_cache['data']
-
-                if data and len(data) > 0:
-                    # Update today's (index 0) session data with live ended sessions
-                    with lock:
-                        ended = state.get('ended_sessions', {})
-                        day_high = state.get('day_high', 0)
-                        day_low = state.get('day_low', 999999)
-                        day_open = state.get('day_open', 0)
-                        current_price = state.get('current_price', 0)
-
-                        # Update day 0 with live data
-                        if day_high > 0:
-                            data[0]['day'] = {
-                                'o': day_open,
-                                'h': day_high,
-                                'l': day_low if day_low < 999999 else day_high,
-                                'c': current_price
-                            }
-
-                        # Merge in ended sessions for today
-                        for sid, sdata in ended.items():
-                            data[0]['sessions'][sid] = {
-                                'o': sdata.get('open', 0),
-                                'h': sdata.get('high', 0),
-                                'l': sdata.get('low', 0),
-                                'c': sdata.get('close', 0)
-                            }
-
+                # Return cached data - today's entry overlaid with live data on a copy
+                data = overlay_live_sessions(historical_sessions_ohlc_cache['data'])
                 self.wfile.write(json.dumps({'days': data, 'week': week_id, 'cached': True, 'fallback': week_id != 'current'}).encode())
                 return
             else:
@@ -12297,7 +12799,7 @@ class LiveDataHandler(BaseHTTPRequestHandler):
 
         # Handle /market-profile endpoint for TPO data
         if path == '/market-profile':
-            with lock:
+            with tpo_lock:
                 day = tpo_state['day']
 
                 # Helper to sort letters chronologically (by period index, not alphabetically)
@@ -12633,7 +13135,7 @@ class LiveDataHandler(BaseHTTPRequestHandler):
                     self.wfile.write(json.dumps({'error': 'Missing required params'}).encode())
                     return
                 try:
-                    bars = fetch_historical_bars_for_trade(contract, entry_date, entry_time, API_KEY)
+                    bars = fetch_historical_bars_for_trade(contract, entry_date, entry_time, API_KEY, cache=dbn_cache)
                 except Exception as fetch_err:
                     self.wfile.write(json.dumps({"error": f"Fetch error: {fetch_err}", "entry_date": entry_date}).encode())
                     return
@@ -12715,6 +13217,35 @@ class LiveDataHandler(BaseHTTPRequestHandler):
             self.wfile.write(json.dumps(response).encode())
             return
 
+        # Footprint candles: /footprint?tf=5m&start=<unix>&end=<unix>&limit=20
+        if path == '/footprint':
+            try:
+                if not footprint:
+                    self.wfile.write(json.dumps({'error': 'Footprint engine not available', 'candles': []}).encode())
+                    return
+                tf = query_params.get('tf', ['5m'])[0]
+                start = query_params.get('start', [None])[0]
+                end = query_params.get('end', [None])[0]
+                limit = min(int(query_params.get('limit', ['20'])[0]), footprint.max_candles + 1)
+                with candles_lock:
+                    candles = footprint.get_candles(
+                        tf,
+                        start=float(start) if start else None,
+                        end=float(end) if end else None,
+                        limit=limit
+                    )
+                self.wfile.write(json.dumps({
+                    'contract': ACTIVE_CONTRACT,
+                    'timeframe': tf,
+                    'timeframes': list(footprint.timeframes.keys()),
+                    'imbalance_ratio': FOOTPRINT_IMBALANCE_RATIO,
+                    'candles': candles,
+                    'timestamp': time.time()
+                }).encode())
+            except Exception as e:
+                self.wfile.write(json.dumps({'error': str(e), 'candles': []}).encode())
+            return
+
         # Iceberg Order Detection (BTC)
         if path == '/icebergs':
             iceberg_data = {
@@ -12723,9 +13254,212 @@ class LiveDataHandler(BaseHTTPRequestHandler):
                 'timestamp': datetime.now().isoformat(),
                 'note': 'Potential iceberg orders detected from trade patterns and order book'
             }
+            # CME: true refills from the MBO book (same price, right after the display was filled)
+            if mbo_book and mbo_status['contract'] == ACTIVE_CONTRACT:
+                iceberg_data['cme'] = {
+                    'contract': ACTIVE_CONTRACT,
+                    'icebergs': mbo_book.get_icebergs(),
+                    'absorptions': mbo_book.get_absorptions()
+                }
             self.wfile.write(json.dumps(iceberg_data).encode())
             return
 
+        # Rolling delta / aggressor volume series from the ring buffers: /delta-history?minutes=30
+        if path == '/delta-history':
+            minutes = min(float(query_params.get('minutes', ['30'])[0]), 600)
+            since = time.time() - minutes * 60
+            with lock:
+                delta = delta_history.export(since)
+                buy = volume_history.window_sum('buy', since)
+                sell = volume_history.window_sum('sell', since)
+            self.wfile.write(json.dumps({
+                'minutes': minutes,
+                'ts': delta['ts'],
+                'delta': delta['delta'],
+                'buy_volume': int(buy),
+                'sell_volume': int(sell),
+                'net_delta': int(buy - sell),
+            }).encode())
+            return
+
+        # Anchored VWAPs: /vwap (list), /vwap?add=swing1&kind=timestamp&ts=1767000000&price=2650.5&label=Swing Low,
+        # /vwap?add=london&kind=daily&start=300&end=1130, /vwap?remove=swing1
+        if path == '/vwap':
+            result = {}
+            add_id = query_params.get('add', [None])[0]
+            remove_id = query_params.get('remove', [None])[0]
+            changed = False
+            with lock:
+                if add_id:
+                    try:
+                        spec = {}
+                        for key, cast in (('label', str), ('start', int), ('end', int), ('weekday', int),
+                                          ('ts', float), ('price', float)):
+                            if key in query_params:
+                                spec[key] = cast(query_params[key][0])
+                        anchor = vwap_engine.add(add_id, query_params.get('kind', ['timestamp'])[0], **spec)
+                        result['added'] = add_id
+                        changed = True
+                        # Started in the past: the trades since then come from the history
+                        if anchor.kind == 'timestamp' and anchor.ts < time.time():
+                            threading.Thread(target=backfill_vwap_anchor, args=(add_id, vwap_anchor_contract),
+                                             name='vwap_backfill', daemon=True).start()
+                            result['backfilling'] = True
+                    except (TypeError, ValueError) as e:
+                        result['error'] = str(e)
+                if remove_id:
+                    result['removed'] = vwap_engine.remove(remove_id)
+                    changed = changed or result['removed']
+                result['anchors'] = {a.id: dict(a.bands(), start=a.start, end=a.end, weekday=a.weekday, ts=a.ts)
+                                     for a in vwap_engine.anchors.values()}
+            if changed:
+                save_vwap_anchors()
+            result['contract'] = vwap_anchor_contract
+            self.wfile.write(json.dumps(result).encode())
+            return
+
+        # Alert rules and recent firings: /alerts?delete=<id>&enable=<id>&disable=<id>&limit=50
+        if path == '/alerts':
+            changed = {}
+            with lock:
+                for rule_id in query_params.get('delete', []):
+                    changed[rule_id] = 'deleted' if alert_engine.remove(rule_id) else 'not found'
+                for action in ('enable', 'disable'):
+                    for rule_id in query_params.get(action, []):
+                        rule = alert_engine.rules.get(rule_id)
+                        if rule:
+                            rule.enabled = action == 'enable'
+                        changed[rule_id] = action + 'd' if rule else 'not found'
+                rules = [rule.status() for rule in alert_engine.rules.values()]
+                stats = alert_engine.stats()
+            if changed:
+                save_alert_rules()
+            self.wfile.write(json.dumps({
+                'rules': rules,
+                'stats': stats,
+                'changed': changed,
+                'recent': alert_stream.recent(int(query_params.get('limit', ['50'])[0])),
+                'notifications': notifier.report(),
+            }).encode())
+            return
+
+        # Tick archive: recorded days and gap-free ranges for /ticks?contract=GC
+        if path == '/ticks':
+            contract = query_params.get('contract', [ACTIVE_CONTRACT])[0]
+            self.wfile.write(json.dumps(tick_archive.report(contract)).encode())
+            return
+
+        # Warm-restart checkpoint: last save/restore (?save=1 forces a checkpoint now)
+        if path == '/checkpoint':
+            if query_params.get('save', ['0'])[0] == '1':
+                save_checkpoint()
+            self.wfile.write(json.dumps(dict(checkpoint_status, interval=CHECKPOINT_INTERVAL)).encode())
+            return
+
+        # Databento Historical cache: chunks on disk, hits vs fetches
+        if path == '/dbn-cache':
+            self.wfile.write(json.dumps(dbn_cache.report() if dbn_cache else {'enabled': False}).encode())
+            return
+
+        # Shared historical trade and 1-minute bar frames: days in memory, loads vs hits
+        if path == '/trade-history':
+            if trade_history is None:
+                self.wfile.write(json.dumps({'enabled': False}).encode())
+                return
+            self.wfile.write(json.dumps({'trades': trade_history.report(), 'bars': bar_history.report()}).encode())
+            return
+
+        # Materialized per-day / per-session summaries: ?days=N adds the rows of the last N days
+        if path == '/session-store':
+            contract = query_params.get('contract', [ACTIVE_CONTRACT])[0]
+            report = session_store.report(contract)
+            days = int(query_params.get('days', ['0'])[0])
+            if days > 0:
+                first = (get_et_now().date() - timedelta(days=days)).isoformat()
+                report['sessions'] = session_store.by_day(contract, first)
+            self.wfile.write(json.dumps(report).encode())
+            return
+
+        # Discord dispatcher state: queue, coalesced repeats, rate limiting, delivery counts
+        if path == '/notifications':
+            self.wfile.write(json.dumps(notifier.report()).encode())
+            return
+
+        # Aggregator stages: /pipeline?contract=NQ&disable=footprint,tpo&enable=ib_vwap&snapshot=tpo
+        if path == '/pipeline':
+            contract = query_params.get('contract', [ACTIVE_CONTRACT])[0]
+            changed = {}
+            with lock:
+                for action in ('enable', 'disable'):
+                    for name in filter(None, query_params.get(action, [''])[0].split(',')):
+                        changed[name] = trade_pipeline.set_enabled(name, action == 'enable', contract)
+                report = trade_pipeline.report(contract)
+                snapshot = query_params.get('snapshot', [None])[0]
+                if snapshot:
+                    report['snapshot'] = {snapshot: trade_pipeline.snapshot(snapshot)}
+            report['contract'] = contract
+            if changed:
+                report['changed'] = changed
+            self.wfile.write(json.dumps(report, default=str).encode())
+            return
+
+        # Structure sizes + tracemalloc growth: /debug/memory?tracemalloc=start|stop&top=20
+        if path == '/debug/memory':
+            action = query_params.get('tracemalloc', [None])[0]
+            if action == 'start':
+                memory.start_tracing()
+            elif action == 'stop':
+                memory.stop_tracing()
+            report = memory.report(memory_lock)
+            report['tracemalloc'] = memory.tracemalloc_diff(int(query_params.get('top', ['20'])[0]))
+            self.wfile.write(json.dumps(report).encode())
+            return
+
+        # Lock contention per call site: /debug/locks?profile=on|off&reset=1&limit=25
+        if path == '/debug/locks':
+            toggle = query_params.get('profile', [None])[0]
+            reset = query_params.get('reset', ['0'])[0] == '1'
+            if toggle in ('on', 'off') or reset:
+                lock.set_profiling(toggle == 'on' if toggle else lock.profile, reset=reset)
+            limit = int(query_params.get('limit', ['25'])[0])
+            report = lock.contention_report(limit)
+            if not report['profiling'] and not report['sites']:
+                report['note'] = 'Profiling off - enable with ?profile=on or LOCK_PROFILE=true'
+            self.wfile.write(json.dumps(report).encode())
+            return
+
+        # Feed latency histograms (ms): /latency?contract=GC (omit for all contracts)
+        if path == '/latency':
+            contract = query_params.get('contract', [None])[0]
+            self.wfile.write(json.dumps({
+                'contract': contract or 'ALL',
+                'unit': 'ms',
+                'stages': latency_tracker.summary(contract),
+                'event_watermark': dict(event_watermark, lag_ms=round((time.time() - event_watermark['ts']) * 1000, 1)
+                                        if event_watermark['ts'] else None),
+                'timestamp': time.time()
+            }).encode())
+            return
+
+        # CME MBO book depth, iceberg refills and absorption events
+        if path == '/mbo-book':
+            if not mbo_book or not MBO_ENABLED:
+                self.wfile.write(json.dumps({'error': 'MBO book disabled (set DATABENTO_MBO_ENABLED=true)'}).encode())
+                return
+            levels = min(int(query_params.get('levels', ['10'])[0]), MBO_MAX_LEVELS)
+            limit = int(query_params.get('limit', ['20'])[0])
+            book_data = {
+                'contract': mbo_status['contract'],
+                'status': mbo_status,
+                'summary': mbo_book.summary(),
+                'depth': mbo_book.depth(levels),
+                'icebergs': mbo_book.get_icebergs(limit),
+                'absorptions': mbo_book.get_absorptions(limit),
+                'timestamp': time.time()
+            }
+            self.wfile.write(json.dumps(book_data).encode())
+            return
+
         # BTC Options with Enhanced Gamma (HIRO-like)
         if path == '/btc-gamma':
             options_raw = fetch_deribit_options()
@@ -12762,17 +13496,15 @@ class LiveDataHandler(BaseHTTPRequestHandler):
         if path == '/trade-analytics':
             try:
                 import os
-                # Try local clawdbot folder first, then project file
+                # Try local clawdbot folder first, then the project trade idea store
                 trades_file = os.path.expanduser('~/.clawdbot/trade_analytics/trades.json')
-                project_trades_file = os.path.join(os.path.dirname(__file__), 'trades_data.json')
                 if os.path.exists(trades_file):
                     with open(trades_file, 'r') as f:
                         trades = json.load(f)
-                elif os.path.exists(project_trades_file):
-                    with open(project_trades_file, 'r') as f:
-                        trades = json.load(f)
                 else:
-                    trades = []
+                    # Aggregates run as indexed queries in SQLite
+                    self.wfile.write(json.dumps(trade_store.analytics()).encode())
+                    return
 
                 # Filter evaluated trades only
                 evaluated = [t for t in trades if t.get('outcome', {}).get('primary_outcome', {}).get('result') in ['WIN', 'LOSS']]
@@ -12943,15 +13675,12 @@ class LiveDataHandler(BaseHTTPRequestHandler):
                 import os
                 # Load Clawd trades from file
                 trades_file = os.path.expanduser('~/.clawdbot/trade_analytics/trades.json')
-                project_trades_file = os.path.join(os.path.dirname(__file__), 'trades_data.json')
                 if os.path.exists(trades_file):
                     with open(trades_file, 'r') as f:
                         clawd_trades = json.load(f)
-                elif os.path.exists(project_trades_file):
-                    with open(project_trades_file, 'r') as f:
-                        clawd_trades = json.load(f)
                 else:
-                    clawd_trades = []
+                    # Only evaluated (WIN/LOSS) ideas are used below - fetch those by index
+                    clawd_trades = trade_store.query(evaluated=True)
 
                 # Get current active contract to filter trades
                 current_asset = ACTIVE_CONTRACT  # GC, BTC-SPOT, NQ, ES, etc.
@@ -13371,8 +14100,16 @@ class LiveDataHandler(BaseHTTPRequestHandler):
             state_snapshot['volume_30m'] = copy.copy(state['volume_30m'])
             state_snapshot['volume_1h'] = copy.copy(state['volume_1h'])
             state_snapshot['big_trades'] = copy.copy(state.get('big_trades', []))
+            state_snapshot['vwap_bands'] = vwap_engine.bands()
             current_price = state.get('current_price', 0)
 
+        # Latency of the newest trade the first time it is published
+        global last_published_ns
+        if state_snapshot['last_processed_ns'] > last_published_ns:
+            last_published_ns = state_snapshot['last_processed_ns']
+            latency_tracker.record('processed_to_published', ACTIVE_CONTRACT, state_snapshot['current_session_id'],
+                                   (time.time_ns() - last_published_ns) // 1000)
+
         # Now build response without holding the lock
         s = state_snapshot  # Alias for brevity
         ib_high = s['ib_high'] if s['ib_high'] > 0 else 0
@@ -13390,6 +14127,14 @@ class LiveDataHandler(BaseHTTPRequestHandler):
             'price': s.get('price', s['current_price']),  # Primary price field for frontend
             'current_price': s['current_price'],
             'spot_gold_price': get_spot_gold_price(),  # XAUUSD from Yahoo Finance
+            'bid': s['bid'],
+            'ask': s['ask'],
+            'bid_size': s['bid_size'],
+            'ask_size': s['ask_size'],
+            'spread': s['spread'],
+            'quote_imbalance': round(s['quote_imbalance'], 4),
+            'microprice': round(s['microprice'], 4),
+            'quote_age': round(time.time() - s['quote_ts'], 1) if s['quote_ts'] > 0 else None,
             'delta_5m': s['delta_5m'],
             'delta_30m': s['delta_30m'],
             'cumulative_delta': s['cumulative_delta'],
@@ -13472,6 +14217,8 @@ class LiveDataHandler(BaseHTTPRequestHandler):
             'day_vwap': s.get('day_vwap', 0),  # Full day VWAP from 18:00 ET
             'us_ib_vwap': s.get('us_ib_vwap', 0),  # US IB anchored VWAP from 08:20 ET
             'ny_1h_vwap': s.get('ny_1h_vwap', 0),  # NY 1H anchored VWAP from 09:30 ET
+            'week_vwap': s.get('week_vwap', 0),  # Week VWAP from Sunday 18:00 ET
+            'vwap_bands': s['vwap_bands'],  # Every anchor: vwap, sd, upper/lower 1-3 sigma
 
             'current_session_id': s['current_session_id'],
             'current_session_name': s['current_session_name'],
@@ -13482,6 +14229,7 @@ class LiveDataHandler(BaseHTTPRequestHandler):
             'buying_imbalance_pct': s['buying_imbalance_pct'],
             'absorption_ratio': s['absorption_ratio'],
             'stacked_buy_imbalances': s['stacked_buy_imbalances'],
+            'stacked_sell_imbalances': s['stacked_sell_imbalances'],
             'current_phase': s['current_phase'],
             'conditions_met': s['conditions_met'],
             'entry_signal': s['entry_signal'],
@@ -13518,6 +14266,8 @@ class LiveDataHandler(BaseHTTPRequestHandler):
 
             # Meta
             'last_update': s['last_update'],
+            'latency': latency_totals(ACTIVE_CONTRACT),
+            'feed_age_ms': round((time.time_ns() - s['last_ts_event']) / 1e6, 1) if s['last_ts_event'] else None,
             'current_et_time': get_et_now().strftime('%H:%M:%S'),
             'current_et_date': get_et_now().strftime('%Y-%m-%d'),
             'data_source': s['data_source'],
@@ -13563,7 +14313,7 @@ class LiveDataHandler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
         self.end_headers()
 
-    def do_POST(self):
+    def handle_post(self):
         """Handle POST requests - volume reset, contract switch"""
         global volume_history, ACTIVE_CONTRACT
 
@@ -13730,6 +14480,28 @@ class LiveDataHandler(BaseHTTPRequestHandler):
                 self.end_headers()
                 self.wfile.write(json.dumps({'error': str(e)}).encode())
 
+        elif self.path == '/alerts/rules':
+            # Add or replace a rule: {"id", "when", "name", "hysteresis", "cooldown", "contracts", "channels"}
+            content_length = int(self.headers.get('Content-Length', 0))
+            body = self.rfile.read(content_length).decode('utf-8')
+            try:
+                spec = json.loads(body) if body else {}
+                with lock:
+                    rule = alert_engine.upsert(spec)
+                    status = rule.status()
+                save_alert_rules()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                self.wfile.write(json.dumps({'status': 'ok', 'rule': status}).encode())
+            except (RuleError, ValueError, TypeError, AttributeError) as e:
+                self.send_response(400)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                self.wfile.write(json.dumps({'error': str(e)}).encode())
+
         elif self.path == '/reconnect':
             # Force reconnection to Databento - useful after errno 54 errors
             # Rate limited to prevent reconnection loops
@@ -14047,23 +14819,66 @@ def start_http_server():
 # MAIN
 # ============================================
 def preload_market_overview():
-    """Background preload of market overview data for faster Correlation Matrix"""
+    """Market overview data for a faster Correlation Matrix"""
     if HAS_YFINANCE:
-        print("📊 Preloading market overview data...")
-        try:
-            fetch_market_overview()
-            print("✅ Market overview preloaded")
-        except Exception as e:
-            print(f"⚠️ Market overview preload failed: {e}")
+        fetch_market_overview()
+
+
+# ============================================
+# STARTUP ORCHESTRATOR (/ready)
+# ============================================
+# Warm-up fetches declared with what they must run after; independent ones overlap on
+# STARTUP_WORKERS threads. The stream connects once CRITICAL_TASKS are in, the rest
+# fills panels in the background. Loaders that swallow their errors either raise for the
+# orchestrator or have a check. /ready reports each subsystem and the boot time.
+STARTUP_WORKERS = int(os.environ.get('STARTUP_WORKERS', '4'))
+startup = StartupOrchestrator(max_workers=STARTUP_WORKERS)
+
+# Live trading day (futures): everything slices the trade history warmed first
+startup.add('trade_history', warm_trade_history, subsystem='history')
+startup.add('pd_levels', fetch_pd_levels, after=('trade_history',), subsystem='levels',
+            check=lambda: state['pd_loaded'])
+startup.add('todays_ib', fetch_todays_ib, after=('trade_history',), subsystem='levels')
+startup.add('ended_sessions', fetch_ended_sessions_ohlc, after=('trade_history',), subsystem='sessions')
+# Only fills the day OHLC the ended sessions left unset
+startup.add('current_session', fetch_current_session_history, after=('ended_sessions',), subsystem='sessions')
+startup.add('todays_tpo', fetch_todays_tpo_data, after=('trade_history',), subsystem='tpo')
+startup.add('candle_volumes', fetch_historical_candle_volumes, after=('trade_history',), subsystem='charts')
+
+# Session store readers: VSI backfills its 50 days first so the others only read them
+startup.add('vsi', lambda: fetch_session_history(days=50, force_refresh=True), subsystem='vsi',
+            check=lambda: session_history_cache['ready'])
+startup.add('historical_sessions', lambda: fetch_historical_sessions_ohlc(days=6), after=('vsi',),
+            subsystem='session_analysis', check=lambda: historical_sessions_ohlc_cache['ready'])
+startup.add('current_week', lambda: fetch_week_sessions_ohlc('current'), after=('vsi',), subsystem='session_analysis',
+            check=lambda: week_cache('current')['ready'])
+startup.add('weekly_open', initialize_weekly_open_from_history, after=('current_week',), subsystem='levels')
+startup.add('historical_weeks', fetch_all_historical_weeks, after=('vsi',), subsystem='session_analysis',
+            check=lambda: all(week_cache(w)['ready'] for w in WEEK_IDS[:-1]))
+startup.add('week_levels', initialize_week_levels_from_history, after=('vsi',), subsystem='levels')
+
+# Independent of the contract's history - own threads, so they never hold up CRITICAL_TASKS
+startup.add('market_overview', preload_market_overview, subsystem='market_overview', background=True,
+            check=lambda: not HAS_YFINANCE or market_overview_cache['data'])
+startup.add('spot_gold', fetch_spot_gold_price, subsystem='gex', background=True,
+            check=lambda: not HAS_YFINANCE or _spot_gold_price > 0)
+startup.add('big_trades', fetch_historical_big_trades_from_databento, subsystem='big_trades', background=True)
+
+CRITICAL_TASKS = ('trade_history', 'pd_levels', 'todays_ib')
+LIVE_DAY_TASKS = CRITICAL_TASKS + ('ended_sessions', 'current_session', 'todays_tpo', 'candle_volumes')
+SESSION_TASKS = ('vsi', 'historical_sessions', 'current_week', 'weekly_open', 'historical_weeks', 'week_levels')
+SWITCH_TASKS = LIVE_DAY_TASKS + ('historical_sessions', 'current_week')
+MARKET_TASKS = ('market_overview', 'spot_gold', 'big_trades')
+
+
+def _startup_gauge():
+    for name, task in startup.report()['tasks'].items():
+        if task['seconds'] is not None:
+            yield {'task': name, 'status': task['status']}, task['seconds']
+
+
+metrics_registry.gauge('startup_task_seconds', 'Duration of each warm-up task (so far, while running)', _startup_gauge)
 
-def preload_historical_big_trades():
-    """Background preload of historical big trades for 1H chart coverage"""
-    print("📊 Preloading historical big trades (for 1H chart coverage)...")
-    try:
-        fetch_historical_big_trades_from_databento()
-        print("✅ Historical big trades preloaded")
-    except Exception as e:
-        print(f"⚠️ Historical big trades preload failed: {e}")
 
 def main():
     print("=" * 60)
@@ -14073,23 +14888,36 @@ def main():
     print(f"🔑 API: {API_KEY[:10]}..." if API_KEY else "🔑 API: NOT SET")
     print("=" * 60)
 
-    global stream_running
+    global stream_running, startup_complete
+
+    # Discord delivery worker (send_discord_alert only enqueues)
+    notifier.start()
+
+    # Tick archive writer (process_trade only buffers)
+    if TICK_ARCHIVE_ENABLED:
+        tick_archive.start()
+
+    # Anchored VWAPs survive restarts (custom anchors + running sums)
+    with lock:
+        load_vwap_anchors(ACTIVE_CONTRACT)
+
+    # Alert rules (firings go out through the notification dispatcher) - before HTTP and the feed use them
+    with lock:
+        load_alert_rules()
+
+    # Warm restart: the checkpoint (when from today) replaces the blocking historical fetch
+    if restore_checkpoint():
+        startup_complete = True
+        startup.restore(LIVE_DAY_TASKS)
+    checkpoint_thread = threading.Thread(target=checkpoint_worker, daemon=True)
+    checkpoint_thread.start()
 
     # Start HTTP server
     http_thread = threading.Thread(target=start_http_server, daemon=True)
     http_thread.start()
 
-    # Preload market overview in background (for faster Correlation Matrix)
-    market_thread = threading.Thread(target=preload_market_overview, daemon=True)
-    market_thread.start()
-
-    # Fetch spot gold price in background (for GEX calculations)
-    spot_thread = threading.Thread(target=fetch_spot_gold_price, daemon=True)
-    spot_thread.start()
-
-    # Preload historical big trades in background (for 1H chart coverage)
-    big_trades_thread = threading.Thread(target=preload_historical_big_trades, daemon=True)
-    big_trades_thread.start()
+    # Market overview (Correlation Matrix), spot gold (GEX) and historical big trades (1H chart)
+    startup.start(MARKET_TASKS)
 
     # Start multi-exchange WebSocket for real-time BTC data
     # Tries: Kraken (most permissive) → OKX → Bybit
@@ -14107,6 +14935,14 @@ def main():
     watchdog = threading.Thread(target=watchdog_thread, daemon=True)
     watchdog.start()
 
+    vwap_thread = threading.Thread(target=vwap_persist_worker, daemon=True)
+    vwap_thread.start()
+
+    # Optional CME MBO book (separate Live session)
+    if MBO_ENABLED and HAS_MBO_BOOK:
+        mbo_thread = threading.Thread(target=start_mbo_stream, daemon=True)
+        mbo_thread.start()
+
     print("\n📊 Starting live data stream...\n")
     
     try:
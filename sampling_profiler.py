@@ -0,0 +1,134 @@
+"""
+Sampling Profiler for Project Horizon
+Periodically snapshots every thread's stack via sys._current_frames() and
+aggregates them into collapsed stacks (flamegraph.pl / speedscope format)
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+DEFAULT_HZ = 100        # Samples per second
+MAX_HZ = 250            # Hard cap on sampling rate
+MAX_SECONDS = 60        # Hard cap on one profile run
+MAX_DEPTH = 64          # Frames kept per stack (leaf side)
+
+_THREAD_TARGET = re.compile(r'^Thread-\d+ \((.+)\)$')
+
+
+def thread_group(name):
+    """Collapse thread names into roles: every HTTP handler thread is 'http'"""
+    match = _THREAD_TARGET.match(name)
+    target = match.group(1) if match else name
+    if target == 'process_request_thread':
+        return 'http'
+    return target
+
+
+class SamplingProfiler:
+    """On-demand stack sampler - one run at a time, bounded rate and duration"""
+
+    def __init__(self):
+        self._running = threading.Lock()
+        self._labels = {}   # code object -> "file.py:function"
+        self.last_run = None
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{os.path.basename(code.co_filename)}:{code.co_name}"
+            self._labels[code] = label
+        return label
+
+    def _stack(self, frame):
+        """Root-first frame labels, truncated at MAX_DEPTH from the leaf"""
+        labels = []
+        while frame is not None and len(labels) < MAX_DEPTH:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        labels.reverse()
+        return ';'.join(labels)
+
+    def _sample(self, seconds, hz, skip_ids, stacks, totals):
+        interval = 1.0 / hz
+        deadline = time.perf_counter() + seconds
+        samples = 0
+        next_tick = time.perf_counter()
+        while next_tick < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident in skip_ids:
+                    continue
+                group = thread_group(names.get(ident, f'thread-{ident}'))
+                stacks[(group, self._stack(frame))] += 1
+                totals[group] += 1
+            samples += 1
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.perf_counter()  # Fell behind - don't burst to catch up
+        return samples
+
+    def profile(self, seconds=5, hz=DEFAULT_HZ):
+        """Sample all threads for `seconds` on a background thread and wait for the result.
+
+        Returns None if another profile is already running.
+        """
+        seconds = max(0.1, min(float(seconds), MAX_SECONDS))
+        hz = max(1, min(int(hz), MAX_HZ))
+        if not self._running.acquire(blocking=False):
+            return None
+        try:
+            stacks = Counter()
+            totals = Counter()
+            result = {}
+            caller = threading.get_ident()
+
+            def run():
+                skip = {caller, threading.get_ident()}
+                started = time.time()
+                result['samples'] = self._sample(seconds, hz, skip, stacks, totals)
+                result['started'] = started
+                result['elapsed'] = round(time.time() - started, 3)
+
+            sampler = threading.Thread(target=run, name='sampling-profiler', daemon=True)
+            sampler.start()
+            sampler.join(seconds + 5)
+
+            profile = {
+                'seconds': seconds,
+                'hz': hz,
+                'started': result.get('started'),
+                'elapsed': result.get('elapsed'),
+                'samples': result.get('samples', 0),
+                'threads': {group: count for group, count in totals.most_common()},
+                'stacks': stacks,
+            }
+            self.last_run = {k: v for k, v in profile.items() if k != 'stacks'}
+            return profile
+        finally:
+            self._running.release()
+
+
+def collapsed(profile, thread=None):
+    """flamegraph.pl input: 'group;frame;...;leaf count' per line, heaviest first"""
+    lines = []
+    for (group, stack), count in profile['stacks'].most_common():
+        if thread and group != thread:
+            continue
+        lines.append(f"{group};{stack} {count}" if stack else f"{group} {count}")
+    return '\n'.join(lines) + '\n'
+
+
+def by_thread(profile, limit=50):
+    """JSON view: per thread group, sample count and its heaviest collapsed stacks"""
+    threads = {}
+    for (group, stack), count in profile['stacks'].most_common():
+        entry = threads.setdefault(group, {'samples': profile['threads'].get(group, 0), 'stacks': []})
+        if len(entry['stacks']) < limit:
+            entry['stacks'].append({'stack': stack, 'count': count})
+    return {k: v for k, v in profile.items() if k != 'stacks'} | {'threads': threads}
@@ -0,0 +1,157 @@
+"""
+Session Store for Project Horizon
+One row per (contract, trading day, session) in a WAL-mode SQLite file: OHLC, volume,
+delta, POC/VAH/VAL, IB and day type. session 'day' is the whole trading day. Completed
+days are written once (backfilled from history, sessions ended live at the session
+change); VSI, weekly session OHLC, historic TPO and the week levels read indexed slices
+"""
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    contract TEXT NOT NULL,
+    trading_day TEXT NOT NULL,
+    session TEXT NOT NULL,
+    open REAL,
+    high REAL,
+    low REAL,
+    close REAL,
+    volume INTEGER,
+    delta INTEGER,
+    poc REAL,
+    vah REAL,
+    val REAL,
+    ib_high REAL,
+    ib_low REAL,
+    day_type TEXT,
+    source TEXT,
+    updated REAL,
+    PRIMARY KEY (contract, trading_day, session)
+);
+CREATE INDEX IF NOT EXISTS sessions_contract_session_day ON sessions (contract, session, trading_day);
+"""
+
+DAY = 'day'                 # Session id of the whole-trading-day row
+EMPTY = 'empty'             # Marker row: settled day without bars (volume = times found empty, updated = last time)
+COLUMNS = ('contract', 'trading_day', 'session', 'open', 'high', 'low', 'close', 'volume', 'delta',
+           'poc', 'vah', 'val', 'ib_high', 'ib_low', 'day_type', 'source', 'updated')
+# A later write without these (bars have no delta, a live session no profile) keeps the stored value
+KEEP = ('delta', 'poc', 'vah', 'val', 'ib_high', 'ib_low', 'day_type')
+
+UPSERT = 'INSERT INTO sessions ({names}) VALUES ({marks}) ON CONFLICT (contract, trading_day, session) DO UPDATE SET {updates}'.format(
+    names=', '.join(COLUMNS),
+    marks=', '.join('?' for _ in COLUMNS),
+    updates=', '.join(f'{c} = COALESCE(excluded.{c}, {c})' if c in KEEP else f'{c} = excluded.{c}'
+                      for c in COLUMNS[3:]))
+
+MARK_EMPTY = ('INSERT INTO sessions (contract, trading_day, session, volume, source, updated) VALUES (?, ?, ?, 1, ?, ?) '
+              'ON CONFLICT (contract, trading_day, session) DO UPDATE SET volume = volume + 1, '
+              'source = excluded.source, updated = excluded.updated')
+
+
+class SessionStore:
+    """One connection per thread (WAL: readers never block the writer). Trading days are
+    'YYYY-MM-DD' of the ET date the day closes on (17:00 ET)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._write_lock:
+            self.conn.executescript(SCHEMA)
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    # ----------------------------------------
+    # Writes
+    # ----------------------------------------
+    def upsert(self, rows):
+        """Insert or replace rows (dicts with the COLUMNS keys, missing = NULL)"""
+        now = time.time()
+        values = [tuple(now if c == 'updated' else row.get(c) for c in COLUMNS) for row in rows]
+        if not values:
+            return 0
+        with self._write_lock, self.conn:
+            self.conn.executemany(UPSERT, values)
+        return len(values)
+
+    def mark_empty(self, contract, trading_day, source=None):
+        """Record (count) that a settled trading day had no bars - the caller decides when to ask again"""
+        with self._write_lock, self.conn:
+            self.conn.execute(MARK_EMPTY, (contract, trading_day, EMPTY, source, time.time()))
+        return 1
+
+    def delete(self, contract, first=None, last=None):
+        """Drop a contract's rows (optionally only trading days first..last) so they are rebuilt"""
+        where, params = self._where(contract, first, last, markers=True)
+        with self._write_lock, self.conn:
+            return self.conn.execute(f'DELETE FROM sessions{where}', params).rowcount
+
+    # ----------------------------------------
+    # Reads
+    # ----------------------------------------
+    @staticmethod
+    def _where(contract, first=None, last=None, session=None, markers=False):
+        clauses, params = ['contract = ?'], [contract]
+        if session is None:
+            if not markers:
+                clauses.append(f"session != '{EMPTY}'")
+        elif isinstance(session, tuple):
+            clauses.append(f"session IN ({', '.join('?' for _ in session)})")
+            params.extend(session)
+        else:
+            clauses.append('session = ?')
+            params.append(session)
+        if first is not None:
+            clauses.append('trading_day >= ?')
+            params.append(first)
+        if last is not None:
+            clauses.append('trading_day <= ?')
+            params.append(last)
+        return ' WHERE ' + ' AND '.join(clauses), params
+
+    def rows(self, contract, first=None, last=None, session=None):
+        """Row dicts of trading days first..last (inclusive), oldest first (no EMPTY markers)"""
+        where, params = self._where(contract, first, last, session)
+        cursor = self.conn.execute(f'SELECT {", ".join(COLUMNS)} FROM sessions{where} ORDER BY trading_day, session', params)
+        return [dict(zip(COLUMNS, row)) for row in cursor]
+
+    def by_day(self, contract, first=None, last=None):
+        """{trading_day: {session: row}}"""
+        days = {}
+        for row in self.rows(contract, first, last):
+            days.setdefault(row['trading_day'], {})[row['session']] = row
+        return days
+
+    def stored_days(self, contract, first=None, last=None):
+        """Trading days that have their whole-day row (complete in the store)"""
+        where, params = self._where(contract, first, last, DAY)
+        return {row[0] for row in self.conn.execute(f'SELECT trading_day FROM sessions{where}', params)}
+
+    def empty_days(self, contract, first=None, last=None):
+        """{trading_day: (times found empty, last time)} of the EMPTY markers"""
+        where, params = self._where(contract, first, last, EMPTY)
+        return {day: (checks or 1, updated) for day, checks, updated
+                in self.conn.execute(f'SELECT trading_day, volume, updated FROM sessions{where}', params)}
+
+    def report(self, contract):
+        where, params = self._where(contract)
+        count, days, first, last = self.conn.execute(
+            f"SELECT COUNT(*), SUM(session = '{DAY}'), MIN(trading_day), MAX(trading_day) FROM sessions{where}", params).fetchone()
+        empty = self.conn.execute('SELECT COUNT(*) FROM sessions WHERE contract = ? AND session = ?',
+                                  (contract, EMPTY)).fetchone()[0]
+        sources = dict(self.conn.execute(f'SELECT source, COUNT(*) FROM sessions{where} GROUP BY source', params).fetchall())
+        return {'path': self.path, 'contract': contract, 'rows': count, 'days': days or 0,
+                'empty_days': empty, 'first': first, 'last': last, 'sources': sources}
@@ -0,0 +1,216 @@
+"""
+Startup Orchestrator for Project Horizon
+Warm-up tasks declared once with the tasks they must run after and the subsystem
+(frontend panel) they fill. start() runs every requested task as soon as its
+dependencies have finished, on at most max_workers daemon threads (background tasks
+get their own, outside that cap), so independent fetches overlap; per-task status and
+duration back /ready and the boot time metric
+"""
+import threading
+import time
+from collections import deque
+
+MAX_WORKERS = 4
+
+IDLE = 'idle'           # Registered, not requested yet
+WAITING = 'waiting'     # Requested, a dependency has not finished
+QUEUED = 'queued'       # Dependencies finished, waiting for a worker
+RUNNING = 'running'
+OK = 'ok'
+FAILED = 'failed'
+RESTORED = 'restored'   # Not run: its data came from a checkpoint
+FINISHED = (OK, FAILED, RESTORED)
+ACTIVE = (WAITING, QUEUED, RUNNING)
+
+
+class StartupTask:
+    __slots__ = ('name', 'fn', 'after', 'subsystem', 'check', 'background', 'status', 'started', 'finished',
+                 'error', 'runs', 'rerun')
+
+    def __init__(self, name, fn, after, subsystem, check=None, background=False):
+        self.name = name
+        self.fn = fn
+        self.after = tuple(after)
+        self.subsystem = subsystem
+        self.check = check          # Loaders that log and swallow their errors: False = nothing loaded
+        self.background = background
+        self.status = IDLE
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.runs = 0
+        self.rerun = False          # Requested again while in flight - runs once more when it ends
+
+    @property
+    def seconds(self):
+        if self.started is None:
+            return None
+        return round((self.finished if self.status in FINISHED else time.time()) - self.started, 3)
+
+    def to_dict(self):
+        return {'status': self.status, 'subsystem': self.subsystem, 'after': list(self.after),
+                'seconds': self.seconds, 'started': self.started, 'error': self.error, 'runs': self.runs}
+
+
+class StartupOrchestrator:
+    """Dependencies only order tasks: a dependent also runs after a failed one (the loaders
+    cope with missing data), the failure shows up in its subsystem's readiness. A task
+    fails when fn raises or its check() is false afterwards"""
+
+    def __init__(self, max_workers=MAX_WORKERS, log=print):
+        self.max_workers = max(1, max_workers)
+        self.log = log
+        self.tasks = {}             # name -> StartupTask, in registration order
+        self.ready = deque()        # QUEUED tasks
+        self.workers = 0
+        self.run_started = None     # First start() since the orchestrator was last idle
+        self.run_finished = None
+        self.cond = threading.Condition()
+
+    def add(self, name, fn, after=(), subsystem=None, check=None, background=False):
+        with self.cond:
+            for dep in after:
+                if dep not in self.tasks:
+                    raise ValueError(f'{name}: unknown dependency {dep}')
+            self.tasks[name] = StartupTask(name, fn, after, subsystem or name, check, background)
+
+    # ----------------------------------------
+    # Running
+    # ----------------------------------------
+    def start(self, names=None, rerun=False):
+        """Run the named tasks (default all) plus dependencies that never ran; returns at once.
+        rerun=True also repeats named tasks that already finished; ones still in flight run
+        again after their current run (a contract switch during the boot warm-up)"""
+        with self.cond:
+            requested = list(self.tasks) if names is None else list(names)
+            todo, stack, again = [], list(reversed(requested)), []
+            while stack:
+                task = self.tasks[stack.pop()]
+                if rerun and task.status in ACTIVE and task.name in requested:
+                    if task.status == RUNNING and task not in again:
+                        task.rerun = True       # Waiting / queued ones have not started - they see the new state
+                        again.append(task)
+                elif task.status == IDLE or (rerun and task.status in FINISHED and task.name in requested):
+                    if task not in todo:
+                        todo.append(task)
+                        stack.extend(dep for dep in task.after if self.tasks[dep].status == IDLE)
+            if not todo:
+                return [task.name for task in again]
+            if not self._busy():
+                self.run_started, self.run_finished = time.time(), None
+            for task in todo:
+                task.status, task.started, task.finished, task.error = WAITING, None, None, None
+            for task in todo:
+                self._promote(task)
+            self._spawn()
+            return [task.name for task in todo + again]
+
+    def restore(self, names):
+        """Mark tasks whose data a checkpoint brought back as finished without running them"""
+        with self.cond:
+            now = time.time()
+            for name in names:
+                task = self.tasks[name]
+                if task.status not in ACTIVE:
+                    task.status, task.started, task.finished, task.error = RESTORED, now, now, None
+            self.cond.notify_all()
+
+    def wait(self, names=None, timeout=None):
+        """Block until the named tasks (default all requested) have finished; False on timeout"""
+        with self.cond:
+            return self.cond.wait_for(lambda: not any(self.tasks[n].status in ACTIVE for n in (names or self.tasks)),
+                                      timeout)
+
+    def _busy(self):
+        return any(task.status in ACTIVE for task in self.tasks.values())
+
+    def _promote(self, task):
+        if task.status == WAITING and all(self.tasks[dep].status in FINISHED for dep in task.after):
+            if task.background:
+                self._begin(task)
+                threading.Thread(target=self._run, args=(task,), name=f'startup-{task.name}', daemon=True).start()
+            else:
+                task.status = QUEUED
+                self.ready.append(task)
+
+    def _spawn(self):
+        while self.ready and self.workers < self.max_workers:
+            self.workers += 1
+            threading.Thread(target=self._work, name=f'startup-{self.workers}', daemon=True).start()
+
+    def _work(self):
+        while True:
+            with self.cond:
+                if not self.ready:
+                    self.workers -= 1
+                    return
+                task = self.ready.popleft()
+                self._begin(task)
+            self._run(task)
+
+    def _begin(self, task):
+        task.status, task.started = RUNNING, time.time()
+        task.runs += 1
+
+    def _run(self, task):
+        error = None
+        try:
+            task.fn()
+            if task.check and not task.check():
+                error = 'loaded nothing'
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+        with self.cond:
+            task.status, task.finished, task.error = (FAILED if error else OK), time.time(), error
+            if task.rerun:
+                # Dependents keep waiting for the repeat run
+                task.rerun = False
+                task.status = WAITING
+                self._promote(task)
+            else:
+                for other in self.tasks.values():
+                    if task.name in other.after:
+                        self._promote(other)
+            if not self._busy():
+                self.run_finished = time.time()
+            self._spawn()
+            self.cond.notify_all()
+        if error:
+            self.log(f"⚠️ Startup task {task.name} failed after {task.seconds:.1f}s: {error}")
+        else:
+            self.log(f"⏱️  Startup task {task.name} done in {task.seconds:.1f}s")
+
+    # ----------------------------------------
+    # Readiness
+    # ----------------------------------------
+    def subsystems(self):
+        """{subsystem: 'idle' | 'loading' | 'ready' | 'failed'} over its tasks"""
+        grouped = {}
+        for task in self.tasks.values():
+            grouped.setdefault(task.subsystem, []).append(task.status)
+        out = {}
+        for subsystem, statuses in grouped.items():
+            if any(s in ACTIVE for s in statuses):
+                out[subsystem] = 'loading'
+            elif FAILED in statuses:
+                out[subsystem] = 'failed'
+            elif OK in statuses or RESTORED in statuses:
+                out[subsystem] = 'ready'
+            else:
+                out[subsystem] = 'idle'
+        return out
+
+    def report(self):
+        with self.cond:
+            tasks = {name: task.to_dict() for name, task in self.tasks.items()}
+            subsystems = self.subsystems()
+            busy = self._busy()
+            started, finished = self.run_started, self.run_finished
+        return {
+            'complete': started is not None and not busy,
+            'seconds': round((finished or time.time()) - started, 3) if started else None,
+            'started': started,
+            'max_workers': self.max_workers,
+            'subsystems': subsystems,
+            'tasks': tasks,
+        }
@@ -0,0 +1,63 @@
+"""
+State Checkpoints for Project Horizon
+Single-file binary snapshots of the engine state: a small JSON header (readable
+without loading the rest) followed by a zlib-compressed pickle and its CRC
+"""
+import json
+import os
+import pickle
+import struct
+import zlib
+
+MAGIC = b'HZCKPT01'
+LENGTH = struct.Struct('<I')
+COMPRESS_LEVEL = 1          # Checkpoints are taken every few seconds - favour speed
+
+
+class CheckpointError(ValueError):
+    pass
+
+
+def snapshot(payload):
+    """Pickle the live objects - the only step that needs the state lock"""
+    return pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def write(path, meta, pickled):
+    """Compress and write atomically: the previous checkpoint stays intact until the new one is complete"""
+    blob = zlib.compress(pickled, COMPRESS_LEVEL)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    header = json.dumps(meta).encode('utf-8')
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(LENGTH.pack(len(header)))
+        f.write(header)
+        f.write(LENGTH.pack(zlib.crc32(blob)))
+        f.write(blob)
+    os.replace(tmp, path)
+    return len(blob) + len(header) + len(MAGIC) + 2 * LENGTH.size
+
+
+def _read_header(f, path):
+    if f.read(len(MAGIC)) != MAGIC:
+        raise CheckpointError(f'not a checkpoint: {path}')
+    (length,) = LENGTH.unpack(f.read(LENGTH.size))
+    return json.loads(f.read(length).decode('utf-8'))
+
+
+def read_meta(path):
+    """Header only - cheap validation before unpickling"""
+    with open(path, 'rb') as f:
+        return _read_header(f, path)
+
+
+def read(path):
+    """(meta, payload); raises CheckpointError on a torn or corrupt file"""
+    with open(path, 'rb') as f:
+        meta = _read_header(f, path)
+        (crc,) = LENGTH.unpack(f.read(LENGTH.size))
+        blob = f.read()
+    if zlib.crc32(blob) != crc:
+        raise CheckpointError(f'checkpoint CRC mismatch: {path}')
+    return meta, pickle.loads(zlib.decompress(blob))
@@ -0,0 +1,288 @@
+"""
+Tick Archive for Project Horizon
+Every live front-month trade appended to a per-contract, per-trading-day binary
+file of fixed 32-byte records (readable with numpy.memmap), plus the time ranges
+the recorder was connected so a restart can tell what it can rebuild locally
+"""
+import json
+import os
+import struct
+import threading
+import time
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+MAGIC = b'HZTICKS1'
+HEADER = struct.Struct('<8sIId16s24x')      # magic, record size, version, tick size, contract
+RECORD = struct.Struct('<qqIIB7x')          # ts_event ns, price ticks, size, instrument_id, side
+HEADER_SIZE = HEADER.size                   # 64
+RECORD_SIZE = RECORD.size                   # 32
+FLUSH_INTERVAL = 1.0
+MAX_SEGMENTS = 500
+NS = 1_000_000_000
+ET_OFFSET_NS = -5 * 3600 * NS               # Same fixed UTC-5 as get_et_now()
+DAY_ROLL_NS = 6 * 3600 * NS                 # Trading day starts 18:00 ET
+
+if HAS_NUMPY:
+    TICK_DTYPE = np.dtype([('ts_event', '<i8'), ('price', '<i8'), ('size', '<u4'),
+                           ('instrument_id', '<u4'), ('side', 'u1'), ('_pad', 'V7')])
+
+
+def trading_day(ts_ns):
+    """YYYYMMDD of the trading day (18:00 ET -> 17:00 ET next day) containing ts"""
+    return time.strftime('%Y%m%d', time.gmtime((ts_ns + ET_OFFSET_NS + DAY_ROLL_NS) // NS))
+
+
+class ArchivedTrade:
+    """Quacks like a Databento TradeMsg for the historical loaders (fixed-point price)"""
+    __slots__ = ('ts_event', 'price', 'size', 'side', 'instrument_id')
+
+    def __init__(self, ts_event, price, size, side, instrument_id):
+        self.ts_event = ts_event
+        self.price = price
+        self.size = size
+        self.side = side
+        self.instrument_id = instrument_id
+
+
+class TickArchive:
+    """append() only packs bytes into a buffer; a background thread writes them out"""
+
+    def __init__(self, root, flush_interval=FLUSH_INTERVAL):
+        self.root = root
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.pending = {}               # (contract, day) -> bytearray
+        self.tick_sizes = {}            # contract -> tick size
+        self.open_segments = {}         # contract -> [start_ns, end_ns] while recording
+        self.closed = []                # (contract, segment) closed since the last flush
+        self.recorded_until = {}        # contract -> ts already on disk from an earlier run
+        self.segments = {}              # contract -> [[start_ns, end_ns], ...] (loaded lazily)
+        self.segments_lock = threading.Lock()
+        self.stats = {'appended': 0, 'written': 0, 'flushes': 0, 'errors': 0}
+        self.thread = None
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, name='tick_archive', daemon=True)
+            self.thread.start()
+
+    def path(self, contract, day):
+        return os.path.join(self.root, contract, f'{day}.ticks')
+
+    # ----------------------------------------
+    # Recording
+    # ----------------------------------------
+    def open_segment(self, contract, start_ns=None):
+        """Live stream (re)subscribed: trades from now (or from start_ns when the stream
+        replays from there) are complete until close_segment()"""
+        with self.segments_lock:
+            recorded = max((end for _, end in self.get_segments(contract)), default=0)
+        with self.lock:
+            if contract not in self.open_segments:
+                start = start_ns or time.time_ns()
+                self.open_segments[contract] = [start, start]
+                # A replay can resend trades an earlier run already wrote - skip those
+                self.recorded_until[contract] = recorded if start <= recorded else 0
+
+    def close_segment(self, contract):
+        """Stream dropped / switched away - later trades start a new covered range"""
+        with self.lock:
+            segment = self.open_segments.pop(contract, None)
+            if segment is not None:
+                self.closed.append((contract, segment))
+
+    def append(self, contract, tick_size, ts_event, price, size, side, instrument_id=0):
+        ticks = int(round(price / tick_size))
+        side_code = ord(side[0]) if side else 0
+        packed = RECORD.pack(ts_event, ticks, size, instrument_id or 0, side_code)
+        day = trading_day(ts_event)
+        with self.lock:
+            if ts_event <= self.recorded_until.get(contract, 0):
+                return
+            buf = self.pending.get((contract, day))
+            if buf is None:
+                buf = self.pending[(contract, day)] = bytearray()
+                self.tick_sizes[contract] = tick_size
+            buf += packed
+            segment = self.open_segments.get(contract)
+            if segment is not None and ts_event > segment[1]:
+                segment[1] = ts_event
+            self.stats['appended'] += 1
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            tick_sizes = dict(self.tick_sizes)
+            open_segments = {c: list(s) for c, s in self.open_segments.items()}
+            closed, self.closed = self.closed, []
+        for (contract, day), buf in pending.items():
+            path = self.path(contract, day)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'ab') as f:
+                    if f.tell() == 0:
+                        f.write(HEADER.pack(MAGIC, RECORD_SIZE, 1, tick_sizes[contract], contract.encode()[:16]))
+                    elif f.tell() > HEADER_SIZE and (f.tell() - HEADER_SIZE) % RECORD_SIZE:
+                        # Torn write from a crash - pad to a record boundary so later records stay aligned
+                        f.write(b'\0' * (RECORD_SIZE - (f.tell() - HEADER_SIZE) % RECORD_SIZE))
+                    f.write(buf)
+                self.stats['written'] += len(buf) // RECORD_SIZE
+            except OSError as e:
+                self.stats['errors'] += 1
+                print(f"⚠️  Tick archive write failed ({path}): {e}")
+        # Segments are persisted only after the trades they cover are on disk
+        with self.segments_lock:
+            changed = {contract for contract, segment in closed + list(open_segments.items())
+                       if self._merge_segment(contract, segment)}
+            for contract in changed:
+                self._save_segments(contract)
+        self.stats['flushes'] += 1
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"⚠️  Tick archive flush failed: {e}")
+
+    # ----------------------------------------
+    # Coverage
+    # ----------------------------------------
+    def _segments_path(self, contract):
+        return os.path.join(self.root, contract, 'segments.json')
+
+    def get_segments(self, contract):
+        segments = self.segments.get(contract)
+        if segments is None:
+            try:
+                with open(self._segments_path(contract)) as f:
+                    segments = [list(s) for s in json.load(f)]
+            except (OSError, ValueError):
+                segments = []
+            self.segments[contract] = segments
+        return segments
+
+    def _merge_segment(self, contract, segment):
+        """Insert a recorded range or extend the one it starts in. True if changed."""
+        segments = self.get_segments(contract)
+        for existing in segments:
+            if existing[0] <= segment[0] <= existing[1]:
+                if segment[1] <= existing[1]:
+                    return False
+                existing[1] = segment[1]
+                return True
+        segments.append(list(segment))
+        segments.sort()
+        del segments[:-MAX_SEGMENTS]
+        return True
+
+    def _save_segments(self, contract):
+        path = self._segments_path(contract)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(self.get_segments(contract), f)
+            os.replace(tmp, path)
+        except OSError as e:
+            self.stats['errors'] += 1
+            print(f"⚠️  Tick archive segments not saved: {e}")
+
+    def covered_until(self, contract, start_ns):
+        """End (ns) of the recorded range containing start_ns - everything in
+        [start_ns, end] is on disk - or None if start_ns was not being recorded"""
+        with self.segments_lock:
+            segments = [list(s) for s in self.get_segments(contract)]
+        for seg_start, seg_end in segments:
+            if seg_start <= start_ns <= seg_end:
+                return seg_end
+        return None
+
+    # ----------------------------------------
+    # Readback
+    # ----------------------------------------
+    def days(self, contract):
+        try:
+            return sorted(name[:-6] for name in os.listdir(os.path.join(self.root, contract)) if name.endswith('.ticks'))
+        except OSError:
+            return []
+
+    def header(self, contract, day):
+        with open(self.path(contract, day), 'rb') as f:
+            magic, record_size, version, tick_size, name = HEADER.unpack(f.read(HEADER_SIZE))
+        if magic != MAGIC or record_size != RECORD_SIZE:
+            raise ValueError(f'not a tick archive file: {self.path(contract, day)}')
+        return {'tick_size': tick_size, 'contract': name.rstrip(b'\0').decode(), 'version': version}
+
+    def memmap(self, contract, day):
+        """Zero-copy structured view of a day file (ts_event, price ticks, size, instrument_id, side)"""
+        if not HAS_NUMPY:
+            raise RuntimeError('numpy not installed')
+        path = self.path(contract, day)
+        count = (os.path.getsize(path) - HEADER_SIZE) // RECORD_SIZE
+        if count <= 0:
+            return np.empty(0, dtype=TICK_DTYPE)
+        return np.memmap(path, dtype=TICK_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+
+    def _rows(self, contract, day):
+        """(ts_event, ticks, size, instrument_id, side) tuples of a day file"""
+        if HAS_NUMPY:
+            ticks = self.memmap(contract, day)
+            return zip(ticks['ts_event'].tolist(), ticks['price'].tolist(), ticks['size'].tolist(),
+                       ticks['instrument_id'].tolist(), ticks['side'].tolist())
+        with open(self.path(contract, day), 'rb') as f:
+            f.seek(HEADER_SIZE)
+            data = f.read()
+        data = data[:len(data) - len(data) % RECORD_SIZE]
+        return RECORD.iter_unpack(data)
+
+    def trades(self, contract, start_ns, end_ns):
+        """ArchivedTrade objects with start_ns <= ts_event < end_ns, oldest day first"""
+        first, last = trading_day(start_ns), trading_day(end_ns)
+        out = []
+        for day in self.days(contract):
+            if day < first or day > last:
+                continue
+            scale = int(round(self.header(contract, day)['tick_size'] * NS))
+            for ts, ticks, size, instrument_id, side in self._rows(contract, day):
+                if start_ns <= ts < end_ns:
+                    out.append(ArchivedTrade(ts, ticks * scale, size, chr(side) if side else 'N', instrument_id))
+        return out
+
+    def window(self, contract, start_ns, end_ns):
+        """[(rows, tick_size), ...] per day file: memmap slices with start_ns <= ts_event < end_ns"""
+        first, last = trading_day(start_ns), trading_day(end_ns)
+        out = []
+        for day in self.days(contract):
+            if first <= day <= last:
+                rows = self.memmap(contract, day)
+                rows = rows[(rows['ts_event'] >= start_ns) & (rows['ts_event'] < end_ns)]
+                out.append((rows, self.header(contract, day)['tick_size']))
+        return out
+
+    def report(self, contract):
+        days = []
+        for day in self.days(contract)[-10:]:
+            size = os.path.getsize(self.path(contract, day))
+            days.append({'day': day, 'trades': max(0, (size - HEADER_SIZE) // RECORD_SIZE), 'mb': round(size / 1048576, 2)})
+        with self.lock:
+            pending = sum(len(b) for b in self.pending.values()) // RECORD_SIZE
+            recording = contract in self.open_segments
+        with self.segments_lock:
+            segments = self.get_segments(contract)[-10:]
+        return {
+            'root': self.root,
+            'recording': recording,
+            'pending': pending,
+            'stats': dict(self.stats),
+            'days': days,
+            'segments': [{'start': s / NS, 'end': e / NS, 'minutes': round((e - s) / NS / 60, 1)}
+                         for s, e in segments],
+        }
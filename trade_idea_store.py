@@ -0,0 +1,313 @@
+"""
+Trade Idea Store for Project Horizon
+Zone Participation ideas and Clawd signals in a WAL-mode SQLite file: inserts are
+a single row, duplicate checks and analytics are indexed queries instead of
+re-parsing / rewriting trades_data.json
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+IDEAS_TABLE = """
+CREATE TABLE IF NOT EXISTS ideas (
+    id INTEGER PRIMARY KEY,
+    source TEXT,                -- ZONE / CLAWD; NULL for legacy ideas recorded without one
+    asset TEXT,
+    contract TEXT,
+    zone_name TEXT,
+    zone_price REAL,
+    timestamp TEXT,
+    ts REAL NOT NULL,
+    status TEXT,
+    confidence TEXT,
+    direction TEXT,
+    result TEXT,
+    outcome_direction TEXT,
+    pnl_points REAL DEFAULT 0,
+    pnl_dollars REAL DEFAULT 0,
+    reward_risk REAL DEFAULT 0,
+    mae REAL DEFAULT 0,
+    mfe REAL DEFAULT 0,
+    mae_dollars REAL DEFAULT 0,
+    t1_hit INTEGER DEFAULT 0,
+    t2_hit INTEGER DEFAULT 0,
+    t3_hit INTEGER DEFAULT 0,
+    data TEXT NOT NULL
+);
+"""
+
+SCHEMA = IDEAS_TABLE + """
+CREATE INDEX IF NOT EXISTS ideas_source_asset_ts ON ideas (source, asset, ts);
+CREATE INDEX IF NOT EXISTS ideas_source_zone_ts ON ideas (source, zone_name, ts);
+CREATE INDEX IF NOT EXISTS ideas_source_contract_ts ON ideas (source, contract, ts);
+CREATE INDEX IF NOT EXISTS ideas_timestamp ON ideas (timestamp);
+CREATE INDEX IF NOT EXISTS ideas_ts ON ideas (ts);
+CREATE INDEX IF NOT EXISTS ideas_result ON ideas (result, confidence, outcome_direction);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+EVALUATED = "result IN ('WIN', 'LOSS')"
+
+
+def _parse_ts(value):
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _columns(idea):
+    """Indexed / aggregated columns pulled out of an idea dict"""
+    outcome = idea.get('outcome') or {}
+    primary = outcome.get('primary_outcome') or {}
+    return {
+        'source': idea.get('source'),
+        'asset': idea.get('asset'),
+        'contract': idea.get('contract'),
+        'zone_name': idea.get('zone_name'),
+        'zone_price': idea.get('zone_price'),
+        'timestamp': idea.get('timestamp'),
+        'ts': idea.get('timestamp_unix') or _parse_ts(idea.get('timestamp')),
+        'status': idea.get('status'),
+        'confidence': idea.get('confidence'),
+        'direction': idea.get('direction'),
+        'result': primary.get('result'),
+        'outcome_direction': outcome.get('direction'),
+        'pnl_points': primary.get('pnl_points', 0) or 0,
+        'pnl_dollars': primary.get('pnl_dollars', 0) or 0,
+        'reward_risk': primary.get('reward_risk', 0) or 0,
+        'mae': primary.get('mae', 0) or 0,
+        'mfe': primary.get('mfe', 0) or 0,
+        'mae_dollars': primary.get('mae_dollars', 0) or 0,
+        't1_hit': int(bool(primary.get('t1_hit'))),
+        't2_hit': int(bool(primary.get('t2_hit'))),
+        't3_hit': int(bool(primary.get('t3_hit'))),
+        'data': json.dumps(idea),
+    }
+
+
+def _stats_row(row):
+    """Aggregate row -> the {count, wins, losses, win_rate, pnl, avg_*} shape used by /trade-analytics"""
+    count, wins, losses, pnl, avg_rr, avg_mae, avg_mfe = row[:7]
+    return {
+        'count': count,
+        'wins': wins or 0,
+        'losses': losses or 0,
+        'win_rate': round((wins or 0) / count * 100, 1) if count else 0,
+        'pnl': pnl or 0,
+        'avg_rr': round(avg_rr, 2) if avg_rr else 0,
+        'avg_mae': round(avg_mae, 1) if avg_mae else 0,
+        'avg_mfe': round(avg_mfe, 1) if avg_mfe else 0,
+    }
+
+
+STATS_SELECT = """
+    COUNT(*), SUM(result = 'WIN'), SUM(result = 'LOSS'), TOTAL(pnl_dollars),
+    AVG(CASE WHEN reward_risk > 0 THEN reward_risk END), AVG(mae), AVG(mfe)
+"""
+
+
+class TradeIdeaStore:
+    """One connection per thread (WAL: readers never block the writer)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._write_lock:
+            self._unsourced_as_null()
+            self.conn.executescript(SCHEMA)
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _unsourced_as_null(self):
+        """Stores from before source was nullable stamped legacy unsourced ideas CLAWD: rebuild
+        the table without the NOT NULL and put those back to NULL (indexes recreated by SCHEMA)"""
+        columns = {row[1]: row[3] for row in self.conn.execute('PRAGMA table_info(ideas)')}
+        if not columns.get('source'):
+            return
+        unsourced = [(row_id,) for row_id, data in self.conn.execute('SELECT id, data FROM ideas')
+                     if 'source' not in json.loads(data)]
+        self.conn.executescript(f"""
+            BEGIN;
+            ALTER TABLE ideas RENAME TO ideas_old;
+            {IDEAS_TABLE}
+            INSERT INTO ideas SELECT * FROM ideas_old;
+            DROP TABLE ideas_old;
+            COMMIT;
+        """)
+        with self.conn:
+            self.conn.executemany('UPDATE ideas SET source = NULL WHERE id = ?', unsourced)
+
+    # ----------------------------------------
+    # Writes
+    # ----------------------------------------
+    def insert(self, idea):
+        cols = _columns(idea)
+        names = ', '.join(cols)
+        marks = ', '.join('?' for _ in cols)
+        with self._write_lock, self.conn:
+            return self.conn.execute(f'INSERT INTO ideas ({names}) VALUES ({marks})', tuple(cols.values())).lastrowid
+
+    def update_outcome(self, key, outcome):
+        """Set outcome/status on the idea whose timestamp (ISO) or timestamp_unix equals key"""
+        with self._write_lock, self.conn:
+            if isinstance(key, str):
+                row = self.conn.execute('SELECT id, data FROM ideas WHERE timestamp = ? ORDER BY id LIMIT 1', (key,)).fetchone()
+            else:
+                row = self.conn.execute('SELECT id, data FROM ideas WHERE ts = ? ORDER BY id LIMIT 1', (key,)).fetchone()
+            if row is None:
+                return False
+            idea = json.loads(row[1])
+            idea['outcome'] = outcome
+            idea['status'] = outcome.get('result', 'EVALUATED')
+            cols = _columns(idea)
+            assignments = ', '.join(f'{k} = ?' for k in cols)
+            self.conn.execute(f'UPDATE ideas SET {assignments} WHERE id = ?', tuple(cols.values()) + (row[0],))
+            return True
+
+    def migrate_json(self, json_path):
+        """One-time import of trades_data.json (recorded in meta, so re-runs are no-ops)"""
+        done = self.conn.execute("SELECT value FROM meta WHERE key = 'migrated_json'").fetchone()
+        if done or not os.path.exists(json_path):
+            return 0
+        with open(json_path) as f:
+            ideas = json.load(f)
+        rows = [_columns(idea) for idea in ideas if isinstance(idea, dict)]
+        with self._write_lock, self.conn:
+            if rows:
+                names = ', '.join(rows[0])
+                marks = ', '.join('?' for _ in rows[0])
+                self.conn.executemany(f'INSERT INTO ideas ({names}) VALUES ({marks})', [tuple(r.values()) for r in rows])
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('migrated_json', ?)",
+                              (json.dumps({'path': json_path, 'rows': len(rows), 'at': time.time()}),))
+        return len(rows)
+
+    # ----------------------------------------
+    # Reads
+    # ----------------------------------------
+    def _where(self, source=None, asset=None, since=None, contract_prefix=None, zone_name=None, evaluated=False):
+        clauses, params = [], []
+        if source is not None:
+            clauses.append('source = ?')
+            params.append(source)
+        if asset is not None:
+            clauses.append('asset = ?')
+            params.append(asset)
+        if zone_name is not None:
+            clauses.append('zone_name = ?')
+            params.append(zone_name)
+        if contract_prefix is not None:
+            clauses.append("contract LIKE ? ESCAPE '\\'")
+            params.append(contract_prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        if since is not None:
+            clauses.append('ts > ?')
+            params.append(since)
+        if evaluated:
+            clauses.append(EVALUATED)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def query(self, limit=None, **filters):
+        """Idea dicts oldest first"""
+        where, params = self._where(**filters)
+        sql = f'SELECT data FROM ideas{where} ORDER BY ts, id'
+        if limit:
+            sql = f'SELECT data FROM (SELECT data, ts, id FROM ideas{where} ORDER BY ts DESC, id DESC LIMIT {int(limit)}) ORDER BY ts, id'
+        return [json.loads(row[0]) for row in self.conn.execute(sql, params)]
+
+    def count(self, **filters):
+        where, params = self._where(**filters)
+        return self.conn.execute(f'SELECT COUNT(*) FROM ideas{where}', params).fetchone()[0]
+
+    def recent_zone_idea(self, zone_name, contract_prefix, zone_price, since, tolerance=5):
+        """Duplicate check: same zone at about the same price since `since`"""
+        where, params = self._where(source='ZONE', zone_name=zone_name, contract_prefix=contract_prefix, since=since)
+        sql = f'SELECT 1 FROM ideas{where} AND ABS(COALESCE(zone_price, 0) - ?) < ? LIMIT 1'
+        return self.conn.execute(sql, params + [zone_price, tolerance]).fetchone() is not None
+
+    def recent_signal(self, source, contract, since):
+        sql = 'SELECT 1 FROM ideas WHERE source = ? AND contract = ? AND ts > ? LIMIT 1'
+        return self.conn.execute(sql, (source, contract, since)).fetchone() is not None
+
+    def analytics(self):
+        """/trade-analytics over evaluated ideas (WIN/LOSS) - aggregates run in SQLite"""
+        conn = self.conn
+        overall = conn.execute(f"""
+            SELECT {STATS_SELECT},
+                   AVG(CASE WHEN result = 'WIN' THEN pnl_dollars END), AVG(CASE WHEN result = 'LOSS' THEN pnl_dollars END),
+                   SUM(t1_hit), SUM(t2_hit), SUM(t3_hit), AVG(mae_dollars), MAX(mae_dollars)
+            FROM ideas WHERE {EVALUATED}""").fetchone()
+        stats = _stats_row(overall)
+        evaluated = stats['count']
+        avg_winner, avg_loser, t1, t2, t3, avg_mae_dollars, max_mae_dollars = overall[7:]
+
+        def grouped(column, keys):
+            rows = {row[0]: _stats_row(row[1:]) for row in conn.execute(
+                f'SELECT {column}, {STATS_SELECT} FROM ideas WHERE {EVALUATED} GROUP BY {column}')}
+            return {key: rows.get(key, _stats_row((0, 0, 0, 0, None, None, None))) for key in keys}
+
+        def rate(hits):
+            return round((hits or 0) / evaluated * 100, 1) if evaluated else 0
+
+        trades = []
+        for t in self.query(evaluated=True):
+            outcome = t.get('outcome') or {}
+            primary = outcome.get('primary_outcome') or {}
+            framework = t.get('bullish', {}) if outcome.get('direction') == 'LONG' else t.get('bearish', {})
+            trades.append({
+                'timestamp': t.get('timestamp'),
+                'contract': t.get('contract'),
+                'bias': t.get('bias'),
+                'confidence': t.get('confidence'),
+                'direction': outcome.get('direction'),
+                'entry': framework.get('entry'),
+                'stop': framework.get('stop'),
+                'targets': framework.get('targets'),
+                'result': primary.get('result'),
+                'pnl_pts': primary.get('pnl_points', 0),
+                'pnl_dollars': primary.get('pnl_dollars', 0),
+                'mae': primary.get('mae', 0),
+                'mfe': primary.get('mfe', 0),
+                'rr': primary.get('reward_risk', 0),
+                't1_hit': primary.get('t1_hit', False),
+                't2_hit': primary.get('t2_hit', False),
+                't3_hit': primary.get('t3_hit', False),
+                'signal_time': t.get('signal_time', ''),
+            })
+
+        return {
+            'summary': {
+                'total_signals': self.count(),
+                'evaluated': evaluated,
+                'wins': stats['wins'],
+                'losses': stats['losses'],
+                'win_rate': stats['win_rate'],
+                'total_pnl': stats['pnl'],
+                'avg_winner': round(avg_winner, 2) if avg_winner else 0,
+                'avg_loser': round(avg_loser, 2) if avg_loser else 0,
+                'avg_rr': stats['avg_rr'],
+                'avg_mae': stats['avg_mae'],
+                'avg_mfe': stats['avg_mfe'],
+            },
+            'by_confidence': grouped('confidence', ('HIGH', 'MEDIUM')),
+            'by_direction': grouped('outcome_direction', ('LONG', 'SHORT')),
+            'target_hit_rates': {'t1': rate(t1), 't2': rate(t2), 't3': rate(t3)},
+            'drawdown': {
+                'avg_mae_pts': stats['avg_mae'],
+                'avg_mae_dollars': round(avg_mae_dollars, 0) if avg_mae_dollars else 0,
+                'max_mae_dollars': max_mae_dollars or 0,
+                'avg_mfe_pts': stats['avg_mfe'],
+            },
+            'trades': trades,
+        }
@@ -7,23 +7,21 @@ from collections import defaultdict
 import pytz
 import os
 
-def aggregate_trades_to_bars(trade_records, front_month_iid):
-    """Aggregate tick data into 1-minute OHLCV bars"""
+def aggregate_trades_to_bars(trade_rows, front_month_iid):
+    """Aggregate tick data ((ts_event, instrument_id, price, size) rows) into 1-minute OHLCV bars"""
     bars_dict = defaultdict(lambda: {'open': None, 'high': 0, 'low': float('inf'), 'close': None, 'volume': 0, 'trades': 0})
     
-    for record in trade_records:
-        if record.instrument_id != front_month_iid:
+    for ts_ns, instrument_id, price, size in trade_rows:
+        if instrument_id != front_month_iid:
             continue
         
         # Get timestamp and round to minute
-        ts_ns = record.ts_event
         ts_sec = ts_ns / 1e9
         ts_dt = datetime.utcfromtimestamp(ts_sec)
         minute_key = ts_dt.replace(second=0, microsecond=0)
         
         # Get price (fixed-point in Databento)
-        price = record.price / 1e9
-        size = record.size
+        price = price / 1e9
         
         bar = bars_dict[minute_key]
         if bar['open'] is None:
@@ -204,9 +202,10 @@ def process_bars_for_trade_metrics(bars, entry_price, direction, stop_price, tar
     }
 
 
-def fetch_historical_bars_for_trade(contract, entry_date, entry_time, api_key=None):
+def fetch_historical_bars_for_trade(contract, entry_date, entry_time, api_key=None, cache=None):
     """
     Fetch trades from Databento (futures) or Binance (crypto) and aggregate to 1-min bars.
+    cache: optional DBNCache - completed days are then read from disk instead of Databento.
     """
     # Route crypto to Binance
     crypto_symbols = ['BTCUSD', 'BTCUSDT', 'ETHUSD', 'ETHUSDT', 'BTC', 'ETH']
@@ -222,6 +221,7 @@ def fetch_historical_bars_for_trade(contract, entry_date, entry_time, api_key=No
     
     try:
         import databento as db
+        from historical_pipeline import iter_rows, instrument_totals
     except ImportError:
         print("ERROR: Databento not installed")
         return {"debug": "binance_error", "error": str(e), "traceback": tb[:300]} if "tb" in dir() else None
@@ -255,7 +255,8 @@ def fetch_historical_bars_for_trade(contract, entry_date, entry_time, api_key=No
         print(f"   Range: {start_ts} to {end_ts}")
         
         client = db.Historical(key=api_key)
-        data = client.timeseries.get_range(
+        get_range = client.timeseries.get_range if cache is None else lambda **kw: cache.get_range(client, **kw)
+        data = get_range(
             dataset='GLBX.MDP3',
             symbols=['GC.FUT'],
             stype_in='parent',
@@ -264,31 +265,28 @@ def fetch_historical_bars_for_trade(contract, entry_date, entry_time, api_key=No
             end=end_ts
         )
         
-        records = list(data)
-        print(f"   Got {len(records)} trade records")
+        # Streamed in batches twice (front month, then bars) instead of holding every record
+        by_instrument = instrument_totals(data)
+        record_count = int(sum(by_instrument.values()))
+        print(f"   Got {record_count} trade records")
         
-        if not records:
+        if not record_count:
             print("   WARNING: No trade records returned")
             return {"debug": "no_records", "start": start_ts, "end": end_ts}
         
         # Find front month instrument
-        by_instrument = {}
-        for r in records:
-            iid = r.instrument_id
-            by_instrument[iid] = by_instrument.get(iid, 0) + 1
-        
         front_month_iid = max(by_instrument.items(), key=lambda x: x[1])[0]
         print(f"   Front month instrument ID: {front_month_iid}")
         
         # Aggregate to 1-min bars
-        bars = aggregate_trades_to_bars(records, front_month_iid)
+        bars = aggregate_trades_to_bars(iter_rows(data, ('ts_event', 'instrument_id', 'price', 'size')), front_month_iid)
         print(f"   Aggregated to {len(bars)} 1-min bars")
         
         if bars:
             print(f"   First bar: {bars[0]['timestamp']} O:{bars[0]['open']:.2f} H:{bars[0]['high']:.2f} L:{bars[0]['low']:.2f} C:{bars[0]['close']:.2f}")
             print(f"   Last bar: {bars[-1]['timestamp']} C:{bars[-1]['close']:.2f}")
         
-        return bars if bars else {"debug": "no_bars_after_agg", "record_count": len(records)}
+        return bars if bars else {"debug": "no_bars_after_agg", "record_count": record_count}
         
     except Exception as e:
         import traceback
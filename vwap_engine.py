@@ -0,0 +1,233 @@
+"""
+Anchored VWAP Engine for Project Horizon
+One accumulator type for every VWAP (session, day, IB windows, RTH, week, custom
+timestamps / swing points) with O(1) updates and 1/2/3 sigma bands
+"""
+import json
+import math
+import os
+
+DAY = 86400
+WEEK = 7 * DAY
+ET_OFFSET = -5 * 3600       # Same fixed UTC-5 as get_et_now()
+ANCHOR_KINDS = ('daily', 'weekly', 'session', 'manual', 'timestamp')
+REQUIRED_FIELDS = {'daily': ('start',), 'weekly': ('weekday', 'start'), 'timestamp': ('ts',)}
+
+
+def _hhmm_seconds(hhmm):
+    return (hhmm // 100) * 3600 + (hhmm % 100) * 60
+
+
+class Anchor:
+    """Running sums for one VWAP. Prices are accumulated relative to the first
+    trade (ref) so the variance term keeps its precision on large volumes."""
+
+    def __init__(self, anchor_id, kind, label=None, start=None, end=None, weekday=None, ts=None, price=None):
+        if kind not in ANCHOR_KINDS:
+            raise ValueError(f"unknown anchor kind '{kind}'")
+        fields = {'start': start, 'weekday': weekday, 'ts': ts}
+        missing = [f for f in REQUIRED_FIELDS.get(kind, ()) if fields[f] is None]
+        if missing:
+            raise ValueError(f"{kind} anchor '{anchor_id}' needs {', '.join(missing)}")
+        self.id = anchor_id
+        self.kind = kind
+        self.label = label or anchor_id
+        self.start = start          # daily/weekly: HHMM ET the anchor rolls at
+        self.end = end              # daily: HHMM ET it stops accumulating (None = whole day)
+        self.weekday = weekday      # weekly: 0=Mon .. 6=Sun
+        self.ts = ts                # timestamp: epoch seconds the anchor starts at
+        self.price = price          # timestamp: swing price, informational
+        self.reset(None)
+
+    def reset(self, period_start):
+        self.period_start = period_start
+        self.ref = 0.0
+        self.v = 0.0
+        self.dv = 0.0               # sum (p - ref) * v
+        self.d2v = 0.0              # sum (p - ref)^2 * v
+        self.trades = 0
+        self.last_ts = None
+
+    # ----------------------------------------
+    # Period arithmetic (pure epoch math, no datetime per trade)
+    # ----------------------------------------
+    def current_period(self, ts):
+        """(period_start, accumulating) for ts, or (None, False) before a timestamp anchor"""
+        if self.kind == 'daily':
+            since = (ts + ET_OFFSET - _hhmm_seconds(self.start)) % DAY
+            if self.end is None:
+                return ts - since, True
+            length = (_hhmm_seconds(self.end) - _hhmm_seconds(self.start)) % DAY
+            return ts - since, since < length
+        if self.kind == 'weekly':
+            et = ts + ET_OFFSET
+            week_pos = ((int(et // DAY) + 3) % 7) * DAY + et % DAY     # 1970-01-01 was a Thursday
+            since = (week_pos - self.weekday * DAY - _hhmm_seconds(self.start)) % WEEK
+            return ts - since, True
+        if self.kind == 'timestamp':
+            return (self.ts, True) if ts >= self.ts else (None, False)
+        return self.period_start, True    # session / manual: reset explicitly
+
+    def add(self, ts, price, size):
+        period_start, accumulating = self.current_period(ts)
+        if self.kind in ('daily', 'weekly') and period_start != self.period_start:
+            self.reset(period_start)
+        elif self.kind == 'timestamp' and period_start is None:
+            return
+        if not accumulating:
+            return
+        if not self.v:
+            self.ref = price
+            if self.period_start is None:
+                self.period_start = ts
+        d = price - self.ref
+        self.v += size
+        self.dv += d * size
+        self.d2v += d * d * size
+        self.trades += 1
+        self.last_ts = ts
+
+    def fold_earlier(self, ts, price, size):
+        """Fold in trades from before the ones accumulated so far (arrays sorted by ts - a
+        timestamp anchor added after its start, replayed from history)"""
+        if not len(price):
+            return
+        ref = float(price[0])
+        d = price - ref
+        v, dv, d2v = float(size.sum()), float((d * size).sum()), float((d * d * size).sum())
+        shift = self.ref - ref if self.v else 0.0   # Re-base the later sums on the earlier ref
+        self.d2v += d2v + 2 * shift * self.dv + shift * shift * self.v
+        self.dv += dv + shift * self.v
+        self.ref = ref
+        self.v += v
+        self.trades += len(price)
+        self.period_start = float(ts[0])
+        self.last_ts = self.last_ts or float(ts[-1])
+
+    def seed(self, pv, v, period_start=None):
+        """Load a VWAP computed elsewhere (historical backfill) - no variance known"""
+        self.reset(period_start)
+        if v > 0:
+            self.ref = pv / v
+            self.v = v
+
+    # ----------------------------------------
+    # Values
+    # ----------------------------------------
+    @property
+    def vwap(self):
+        return self.ref + self.dv / self.v if self.v else 0.0
+
+    @property
+    def sd(self):
+        if not self.v:
+            return 0.0
+        mean = self.dv / self.v
+        return math.sqrt(max(self.d2v / self.v - mean * mean, 0.0))
+
+    def bands(self):
+        vwap, sd = self.vwap, self.sd
+        out = {'label': self.label, 'kind': self.kind, 'vwap': round(vwap, 4), 'sd': round(sd, 4),
+               'volume': self.v, 'trades': self.trades, 'since': self.period_start}
+        for k in (1, 2, 3):
+            out[f'upper_{k}'] = round(vwap + k * sd, 4) if self.v else 0.0
+            out[f'lower_{k}'] = round(vwap - k * sd, 4) if self.v else 0.0
+        if self.price is not None:
+            out['anchor_price'] = self.price
+        return out
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in ('id', 'kind', 'label', 'start', 'end', 'weekday', 'ts', 'price',
+                                               'period_start', 'ref', 'v', 'dv', 'd2v', 'trades', 'last_ts')}
+
+    @classmethod
+    def from_dict(cls, data):
+        anchor = cls(data['id'], data['kind'], data.get('label'), data.get('start'), data.get('end'),
+                     data.get('weekday'), data.get('ts'), data.get('price'))
+        for k in ('period_start', 'ref', 'v', 'dv', 'd2v', 'trades', 'last_ts'):
+            if k in data:
+                setattr(anchor, k, data[k])
+        return anchor
+
+
+class VWAPEngine:
+    """Registry of anchors updated on every trade. Not thread-safe - call under the state lock."""
+
+    def __init__(self, defaults=()):
+        self.defaults = [dict(d) for d in defaults]
+        self.anchors = {}
+        self.restore_defaults()
+
+    def restore_defaults(self):
+        for spec in self.defaults:
+            if spec['id'] not in self.anchors:
+                self.anchors[spec['id']] = Anchor(spec['id'], spec['kind'],
+                                                  **{k: v for k, v in spec.items() if k not in ('id', 'kind')})
+
+    def add(self, id, kind, **kwargs):
+        if any(d['id'] == id for d in self.defaults):
+            raise ValueError(f"'{id}' is a built-in anchor")
+        anchor = Anchor(id, kind, **kwargs)
+        self.anchors[id] = anchor
+        return anchor
+
+    def remove(self, anchor_id):
+        if any(d['id'] == anchor_id for d in self.defaults):
+            return False  # Built-in anchors feed legacy state keys
+        return self.anchors.pop(anchor_id, None) is not None
+
+    def get(self, anchor_id):
+        return self.anchors.get(anchor_id)
+
+    def on_trade(self, ts, price, size):
+        for anchor in self.anchors.values():
+            anchor.add(ts, price, size)
+
+    def reset(self, kind=None, anchor_id=None, period_start=None):
+        """Reset session/manual anchors (session change, market close, contract switch)"""
+        for anchor in self.anchors.values():
+            if (anchor_id is None or anchor.id == anchor_id) and (kind is None or anchor.kind == kind):
+                anchor.reset(period_start)
+
+    def value(self, anchor_id):
+        anchor = self.anchors.get(anchor_id)
+        return anchor.vwap if anchor else 0.0
+
+    def bands(self):
+        return {anchor_id: anchor.bands() for anchor_id, anchor in self.anchors.items() if anchor.v}
+
+    # ----------------------------------------
+    # Persistence
+    # ----------------------------------------
+    def dump(self):
+        return {'anchors': [a.to_dict() for a in self.anchors.values()]}
+
+    def save(self, path, data=None):
+        """Atomic write of every anchor (definition + running sums). Pass data from
+        dump() to take the snapshot under a lock and write outside it."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data if data is not None else self.dump(), f)
+        os.replace(tmp, path)
+
+    def load(self, path):
+        """Replace anchors with a saved set; defaults missing from the file are re-added.
+        Stale daily/weekly sums reset themselves on the next trade."""
+        data = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+        return self.restore(data)
+
+    def restore(self, data):
+        """Replace anchors with a dump() (defaults missing from it are re-added)"""
+        self.anchors = {}
+        for item in data.get('anchors', []):
+            try:
+                anchor = Anchor.from_dict(item)
+            except (KeyError, ValueError):
+                continue
+            self.anchors[anchor.id] = anchor
+        self.restore_defaults()
+        return len(self.anchors)